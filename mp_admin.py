@@ -0,0 +1,213 @@
+"""Admin control socket for a running mp_server.py (started with --admin ADDRESS).
+
+Nothing in this module runs unless --admin is given: there is no background sampling, tracing or timing, and
+every probe only costs while an admin command is running. ADDRESS is a Unix socket path, or a port number to
+listen on 127.0.0.1 (on systems without Unix sockets). Commands are one per line, and each gets a one-line
+JSON reply:
+
+  sessions                table state, players, and every connection's read and write queue depths
+  stats                   input, compression and bot counters (mp_server.get_server_stats())
+  profile SECONDS         samples the event loop's stack for SECONDS (at most 60), returns the hottest stacks and lines
+  tracemalloc start [N]   starts tracing allocations, keeping N frames per allocation (default 1)
+  tracemalloc snapshot    top allocation sites; the snapshot becomes the baseline for diff
+  tracemalloc diff        allocation growth since the baseline
+  tracemalloc stop        stops tracing and frees the traces
+  lag SECONDS             event loop lag measured over SECONDS (at most 60)
+  help                    this list
+
+Usage: python mp_admin.py ADDRESS COMMAND [ARGS...]
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import stat
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+SAMPLE_INTERVAL = 0.005 # Seconds between two stack samples of the profiler
+LAG_PROBE_INTERVAL = 0.05 # Seconds between two lag probes of the lag command
+MAX_PROFILE_SECONDS = 60
+MAX_LAG_SECONDS = 60
+TOP_ENTRIES = 25 # Stacks, lines or allocation sites per reply
+MAX_COMMAND_BYTES = 1024
+
+admin_state = {"loop_thread": None, "profiling": False, "baseline": None}
+
+
+# --- Probes ---
+def _frame_label(frame) -> str:
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}"
+
+def sample_stacks(thread_id, seconds, interval=SAMPLE_INTERVAL) -> dict:
+    """Samples a thread's Python stack every `interval` seconds. Runs in its own thread, next to the loop."""
+    stacks, lines = Counter(), Counter()
+    samples = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            lines[f"{_frame_label(frame)}:{frame.f_lineno}"] += 1
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            stacks[";".join(reversed(labels))] += 1 # Folded format, ready for flamegraph tools
+            samples += 1
+        time.sleep(interval)
+    return {"seconds": seconds, "samples": samples,
+            "stacks": [[stack, count] for stack, count in stacks.most_common(TOP_ENTRIES)],
+            "lines": [[line, count] for line, count in lines.most_common(TOP_ENTRIES)]}
+
+async def profile(seconds) -> dict:
+    if admin_state["profiling"]:
+        return {"error": "A profile is already running."}
+    admin_state["profiling"] = True
+    try:
+        return await asyncio.get_running_loop().run_in_executor(None, sample_stacks, admin_state["loop_thread"], seconds)
+    finally:
+        admin_state["profiling"] = False
+
+def _allocation_sites(statistics) -> list:
+    return [[str(entry.traceback[0]), entry.size, entry.count] for entry in statistics[:TOP_ENTRIES]]
+
+def _allocation_changes(statistics) -> list:
+    return [[str(entry.traceback[0]), entry.size_diff, entry.count_diff] for entry in statistics[:TOP_ENTRIES]]
+
+def trace_memory(action, frames=1) -> dict:
+    """Runs in an executor: snapshots and their statistics are slow on big heaps."""
+    if action == "start":
+        tracemalloc.start(frames)
+        admin_state["baseline"] = None
+        return {"tracing": True, "frames": frames}
+    if action == "stop":
+        tracemalloc.stop()
+        admin_state["baseline"] = None
+        return {"tracing": False}
+    if not tracemalloc.is_tracing():
+        return {"error": "Not tracing, send 'tracemalloc start' first."}
+    snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+    current, peak = tracemalloc.get_traced_memory()
+    reply = {"traced_bytes": current, "peak_bytes": peak}
+    if action == "snapshot":
+        admin_state["baseline"] = snapshot
+        reply["sites"] = _allocation_sites(snapshot.statistics("lineno")) # [site, bytes, blocks]
+    elif admin_state["baseline"] is None:
+        return {"error": "No baseline, send 'tracemalloc snapshot' first."}
+    else:
+        reply["changes"] = _allocation_changes(snapshot.compare_to(admin_state["baseline"], "lineno")) # [site, bytes, blocks]
+    return reply
+
+async def measure_lag(seconds, interval=LAG_PROBE_INTERVAL) -> dict:
+    """How late the loop runs a callback scheduled `interval` seconds ahead, over `seconds`."""
+    loop = asyncio.get_running_loop()
+    lags = []
+    deadline = loop.time() + seconds
+    while loop.time() < deadline:
+        scheduled = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - scheduled - interval)
+    if not lags:
+        return {"error": "No lag probe ran, try a longer duration."}
+    lags.sort()
+    return {"probes": len(lags), "avg_ms": round(1000 * sum(lags) / len(lags), 3),
+            "p99_ms": round(1000 * lags[int(0.99 * (len(lags) - 1))], 3), "max_ms": round(1000 * lags[-1], 3)}
+
+
+# --- Control Socket ---
+def _number(args, default):
+    return float(args[0]) if args else default
+
+def _seconds(args, default, maximum):
+    """A duration argument, capped at `maximum`. Raises ValueError unless it is a positive finite number."""
+    seconds = _number(args, default)
+    if not math.isfinite(seconds) or seconds <= 0:
+        raise ValueError(f"SECONDS must be a positive number, got {args[0]}")
+    return min(seconds, maximum)
+
+async def run_command(line, commands) -> dict:
+    """Runs one admin command line. `commands` maps extra command names to functions of the argument list."""
+    words = line.split()
+    if not words:
+        return {"error": "Empty command."}
+    name, args = words[0].lower(), words[1:]
+    loop = asyncio.get_running_loop()
+    try:
+        if name in commands:
+            return commands[name](args)
+        if name == "profile":
+            return await profile(_seconds(args, 5, MAX_PROFILE_SECONDS))
+        if name == "tracemalloc":
+            action = args[0].lower() if args else ""
+            if action not in ("start", "snapshot", "diff", "stop"):
+                return {"error": "Use tracemalloc start [frames] | snapshot | diff | stop."}
+            return await loop.run_in_executor(None, trace_memory, action, int(_number(args[1:], 1)))
+        if name == "lag":
+            return await measure_lag(_seconds(args, 1, MAX_LAG_SECONDS))
+        if name == "help":
+            return {"commands": sorted(list(commands) + ["profile", "tracemalloc", "lag", "help"])}
+    except ValueError as e:
+        return {"error": f"Bad argument: {e}"}
+    return {"error": f"Unknown command '{name}', try help."}
+
+async def handle_admin_connection(reader, writer, commands):
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            reply = await run_command(line.decode(errors="replace"), commands)
+            writer.write(json.dumps(reply, default=str).encode() + b"\n")
+            await writer.drain()
+    except (ConnectionError, asyncio.LimitOverrunError, ValueError) as e:
+        print(f"Admin connection error: {e}")
+    finally:
+        writer.close()
+
+async def start_admin_server(address, commands):
+    """Serves the control socket on a Unix socket path, or on 127.0.0.1 if address is a port number."""
+    admin_state["loop_thread"] = threading.get_ident()
+    handler = lambda reader, writer: handle_admin_connection(reader, writer, commands)
+    if str(address).isdigit():
+        server = await asyncio.start_server(handler, "127.0.0.1", int(address), limit=MAX_COMMAND_BYTES)
+    else:
+        if os.path.exists(address) and stat.S_ISSOCK(os.stat(address).st_mode):
+            os.unlink(address) # Left behind by a previous run
+        # Owner only from the moment it exists: the socket exposes game state and heap contents
+        previous_umask = os.umask(0o077)
+        try:
+            server = await asyncio.start_unix_server(handler, address, limit=MAX_COMMAND_BYTES)
+        finally:
+            os.umask(previous_umask)
+    print(f"Admin socket listening on {address}")
+    return server
+
+
+# --- Client ---
+def send_admin_command(address, command, timeout=MAX_PROFILE_SECONDS + 30) -> dict:
+    if str(address).isdigit():
+        sock = socket.create_connection(("127.0.0.1", int(address)), timeout=timeout)
+    else:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect(address)
+    with sock, sock.makefile("rb") as replies:
+        sock.sendall(command.encode() + b"\n")
+        return json.loads(replies.readline())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send a command to the admin socket of a running mp_server.py.")
+    parser.add_argument("address", help="Unix socket path or 127.0.0.1 port given to --admin")
+    parser.add_argument("command", nargs="+", help="e.g. sessions, profile 10, tracemalloc snapshot, lag 5")
+    cli_args = parser.parse_args()
+    try:
+        print(json.dumps(send_admin_command(cli_args.address, " ".join(cli_args.command)), indent=2))
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
@@ -0,0 +1,126 @@
+"""Decision policies for server-side bot players (see mp_server.py --bots).
+
+Policies are plain functions so they can run in a thread or process pool: the server never calls them on its
+event loop. Thread pools are handed the table's CompiledStory (see story_catalog.py) itself. Process pools get
+a small (story_id, version, path) reference instead, and each process loads that version of the story once, so
+each decision only ships the reference, node id, the bot's role, stats and inventory, and the candidate choice
+indices.
+"""
+import os
+import random
+
+from story_catalog import CompiledStory, load_compiled_story
+from story_compiler import compile_role_tables
+from story_reachability import load_reachability
+from mp_game import apply_chooser_effects
+from story_engine import check_conditions
+
+LOOKAHEAD_DEPTH = 6 # Choices deep the lookahead policy explores from the current node
+TERMINAL_BONUS = 10 # Value of reaching a node with no choices (an ending) within the lookahead horizon
+
+_stories = {} # story_id: CompiledStory this process last loaded (process pools only)
+
+
+def story_reference(story, for_process_pool):
+    """What the server passes as `story` to the policies: the snapshot itself, or a reference a process can load."""
+    return (story.story_id, story.version, story.path) if for_process_pool else story
+
+
+def _compile(story_data, path=None):
+    return {"role_tables": compile_role_tables(story_data), "reachability": load_reachability(story_data, path, "chooser")}
+
+
+def _get_story(story):
+    """Returns (story_data, role_tables, reachability), or None if the referenced version is no longer on disk."""
+    if not isinstance(story, CompiledStory):
+        story_id, version, path = story
+        compiled = _stories.get(story_id)
+        if compiled is None or compiled.version != version:
+            try:
+                if os.stat(path).st_mtime_ns != version:
+                    return None # The file changed again since the table started: the bot plays at random
+                compiled = _stories[story_id] = load_compiled_story(story_id, path, _compile)
+            except (OSError, ValueError):
+                return None
+            if compiled.version != version: # Saved while we were reading it
+                return None
+        story = compiled
+    return story.data, story.derived["role_tables"], story.derived["reachability"]
+
+
+def _state_value(stats, inventory):
+    return sum(v for v in stats.values() if isinstance(v, (int, float))) + len(inventory)
+
+
+def _horizon_value(story, node_id, stats, inventory):
+    """Value of a state the lookahead stops at: the closer an ending it still has an open route to, the better.
+    A state with none is stuck (or only has detours the reachability index doesn't know about)."""
+    nearest = story[2].nearest_ending(node_id, stats, inventory)
+    if nearest is None:
+        return _state_value(stats, inventory) - TERMINAL_BONUS
+    return _state_value(stats, inventory) + TERMINAL_BONUS / (1 + nearest[1])
+
+
+def _after_choice(choice, stats, inventory, by_vote=False):
+    """Returns (stats, inventory) after the table takes a choice, exactly as GameCore applies it."""
+    stats, inventory = dict(stats), list(inventory)
+    if not by_vote: # A passed vote moves the story on without changing anyone's stats
+        apply_chooser_effects(choice, stats, inventory)
+    return stats, inventory
+
+
+def _choices_for(story, node_id, node, role, stats, inventory):
+    role_tables = story[1]
+    choices = node.get("choices", [])
+    if node_id in role_tables["vote_choice"]:
+        return [choices[role_tables["vote_choice"][node_id]]] # The server only runs the vote on such nodes (assume it passes)
+    candidates = role_tables["role_choices"][node_id].get(role, ())
+    return [choices[idx] for idx in candidates if check_conditions(choices[idx].get("conditions"), stats, inventory)]
+
+
+def _lookahead_value(story, node_id, role, stats, inventory, depth, visiting):
+    node = story[0].get("nodes", {}).get(node_id)
+    if node is None:
+        return float("-inf") # Broken link, never worth taking
+    if not node.get("choices"):
+        return _state_value(stats, inventory) + TERMINAL_BONUS
+    if depth == 0 or node_id in visiting:
+        return _horizon_value(story, node_id, stats, inventory)
+    visiting.add(node_id)
+    # Other players act in between, so this is an optimistic single-player estimate of where the path leads
+    best = _state_value(stats, inventory)
+    by_vote = node_id in story[1]["vote_choice"]
+    for choice in _choices_for(story, node_id, node, role, stats, inventory):
+        next_stats, next_inventory = _after_choice(choice, stats, inventory, by_vote)
+        best = max(best, _lookahead_value(story, choice.get("target_node_id"), role, next_stats, next_inventory, depth - 1, visiting))
+    visiting.discard(node_id)
+    return best
+
+
+def _score(story, policy, choice, role, stats, inventory, by_vote=False):
+    next_stats, next_inventory = _after_choice(choice, stats, inventory, by_vote)
+    if policy == "greedy":
+        return _state_value(next_stats, next_inventory)
+    return _lookahead_value(story, choice.get("target_node_id"), role, next_stats, next_inventory, LOOKAHEAD_DEPTH - 1, set())
+
+
+def choose_action(policy, story, node_id, role, stats, inventory, candidate_indices):
+    """Returns the position in candidate_indices (indices into the node's choices) the bot picks."""
+    story = None if policy == "random" or len(candidate_indices) == 1 else _get_story(story)
+    if story is None:
+        return random.randrange(len(candidate_indices))
+    choices = story[0]["nodes"][node_id]["choices"]
+    scores = [_score(story, policy, choices[idx], role, stats, inventory) for idx in candidate_indices]
+    best = max(scores)
+    return random.choice([pos for pos, score in enumerate(scores) if score == best]) # Break ties randomly
+
+
+def choose_vote(policy, story, node_id, role, stats, inventory):
+    """Returns "yes" or "no" for the vote choice of the given node."""
+    story = None if policy == "random" else _get_story(story)
+    if story is None:
+        return random.choice(["yes", "no"])
+    vote_choice = story[0]["nodes"][node_id]["choices"][story[1]["vote_choice"][node_id]]
+    # A failed vote leaves the table on this node with nothing gained, which is the baseline to beat
+    if_passed = _score(story, policy, vote_choice, role, stats, inventory, by_vote=True)
+    return "yes" if if_passed >= _state_value(stats, inventory) else "no"
@@ -1,205 +1,417 @@
+import argparse
 import asyncio
+import json
+import os
+import random
 import sys
+import zlib
 
+from mp_protocol import (
+    GuardedReader, FrameTooLarge, ReadTimeout, decode_text, encode_text, encode_message,
+    PROTOCOL_TEXT, PROTOCOL_BINARY, COMPRESSION_ZLIB, CLIENT_MAX_FRAME_BYTES, CLIENT_READ_TIMEOUT
+)
+
+CLIENT_COMMANDS = ("PROFILE", "STORY", "ROLE", "SPECTATE", "CHOICE", "VOTE", "quit")
+RECONNECT_FIRST_DELAY = 0.5 # Seconds before the first reconnection attempt, doubled after each failure
+RECONNECT_MAX_DELAY = 8.0
+RECONNECT_GIVE_UP = 60.0 # Seconds of failed attempts after which the seat is gone anyway (server's default grace)
+RENDER_DELAY = 0.01 # Seconds of output gathered into one terminal write
+STDIN_READ_BYTES = 64 * 1024
+
+preferred_protocol = PROTOCOL_BINARY # Requested when the server advertises it, see --protocol
+protocol = PROTOCOL_TEXT # Protocol currently used for what we send
+use_compression = True # Ask for zlib compression of large server frames (bin1 only), see --no-compression
 player_id = None
 is_my_turn = False
 expecting_role_choice = False
 expecting_action_choice = False
 expecting_vote = False
+resume_token = None # From ROLE_CONFIRMED, sent back with RESUME after a dropped connection
+resuming = False # Reconnected and waiting for the server's STATE catch-up
+quitting = False
+server_writer = None # Writer of the current connection, replaced on every reconnection
+spectating = False # Watch the table instead of playing, see --spectate
+profile_name = None # Sent with PROFILE right after connecting, see --name
+headless = False # Render nothing, for bots and scripts driving the client through stdin, see --headless
+pending_output = [] # Lines waiting for the next terminal write
+render_handle = None
+
+def show(text):
+    """Queues a line for the terminal. Everything shown within RENDER_DELAY goes out in one write, so a burst of
+    server messages (a vote's PLAYER_VOTED...) costs one terminal write instead of several per message."""
+    global render_handle
+    if headless:
+        return
+    pending_output.append(text)
+    if render_handle is None:
+        render_handle = asyncio.get_running_loop().call_later(RENDER_DELAY, flush_output)
+
+def flush_output():
+    global render_handle
+    if render_handle:
+        render_handle.cancel()
+        render_handle = None
+    if pending_output:
+        sys.stdout.write("\n".join(pending_output) + "\n")
+        sys.stdout.flush()
+        pending_output.clear()
 
-async def display_server_message(message):
+def open_stdin():
+    """Returns a StreamReader the event loop fills from stdin whenever it is readable, with no thread involved.
+    Returns None where the loop can't watch stdin (Windows event loops, stdin redirected from a regular file)."""
+    loop = asyncio.get_running_loop()
+    stdin_reader = asyncio.StreamReader()
+    try:
+        fd = sys.stdin.fileno()
+    except (AttributeError, ValueError, OSError):
+        return None
+
+    def on_readable():
+        data = os.read(fd, STDIN_READ_BYTES) # Won't block: the loop saw data (or EOF) waiting
+        if data:
+            stdin_reader.feed_data(data)
+        else:
+            loop.remove_reader(fd)
+            stdin_reader.feed_eof()
+
+    try:
+        loop.add_reader(fd, on_readable)
+    except (NotImplementedError, OSError, ValueError):
+        return None
+    return stdin_reader
+
+async def send_command(writer, msg_type, *fields):
+    """Encodes a command in the current protocol and sends it to the server."""
+    writer.write(encode_message(protocol, msg_type, fields))
+    await writer.drain()
+
+async def display_server_message(msg_type, fields):
     """Helper to print server messages, could be expanded for UI."""
-    global is_my_turn, expecting_role_choice, expecting_action_choice, expecting_vote
+    global is_my_turn, expecting_role_choice, expecting_action_choice, expecting_vote, resume_token, resuming
 
-    print(f"[Server] {message}")
+    if resuming and msg_type in ("WELCOME", "ROLES_AVAILABLE"):
+        return # Greeting of the new connection: our seat comes back with STATE instead
+    if not headless:
+        show(f"[Server] {encode_text(msg_type, fields)}")
+    if spectating:
+        if msg_type == "GAME_END":
+            show("Exiting client.")
+            asyncio.get_event_loop().stop()
+        return # Spectators just see the table's messages
 
-    if message.startswith("WELCOME:"):
-        parts = message.split(":", 2)
+    if msg_type == "WELCOME":
         # global player_id # Not strictly needed if only one client instance per script
-        # player_id = parts[1] # Store our assigned temp ID
-        print(f"You are connected. Your temporary ID is {parts[1]}.")
+        # player_id = fields[0] # Store our assigned temp ID
+        show(f"You are connected. Your temporary ID is {fields[0]}.")
         expecting_role_choice = True
-    elif message.startswith("ROLES_AVAILABLE:"):
-        roles = message.split(":",1)[1]
-        print(f"Available roles: {roles}. Choose one by typing 'ROLE:YourChosenRoleName'")
-    elif message.startswith("ROLE_CONFIRMED:"):
-        parts = message.split(":",2)
-        confirmed_role = parts[1]
+    elif msg_type == "STORIES":
+        show("Stories on this server:")
+        for entry in fields:
+            show(f"  {entry}")
+        show("Choose one by typing 'STORY:story_id'")
+    elif msg_type == "ROLES_AVAILABLE":
+        roles = ",".join(fields)
+        show(f"Available roles: {roles}. Choose one by typing 'ROLE:YourChosenRoleName'")
+    elif msg_type == "ROLE_CONFIRMED":
+        confirmed_role = fields[0]
         global player_id # Now set the actual player ID to the role name
         player_id = confirmed_role
-        print(f"Role confirmed: You are {player_id}.")
-        print(f"Initial state: {parts[2]}")
+        show(f"Role confirmed: You are {player_id}.")
+        show(f"Initial state: {fields[1]}")
         expecting_role_choice = False
-    elif message.startswith("SERVER_FULL:") or message.startswith("GAME_END:"):
-        print("Exiting client.")
+        resume_token = fields[2] if len(fields) > 2 else None
+    elif msg_type == "STATE":
+        state = json.loads(fields[0])
+        resuming = False
+        is_my_turn = state["turn"] == player_id
+        expecting_action_choice = "choices" in state
+        expecting_vote = "vote" in state and not state["vote"]["voted"]
+        show(f"Back in the game as {state['role']}. Stats: {state['stats']}, Inv: {state['inventory']}")
+        show(state["text"])
+        if "vote" in state:
+            show(f"A vote is in progress: '{state['vote']['text']}'.")
+            show("You have already voted." if state["vote"]["voted"] else "Type 'VOTE:yes' or 'VOTE:no'.")
+        elif "choices" in state:
+            show("Your available actions:")
+            for choice in state["choices"]:
+                show(f"  {choice}")
+            show("Choose an action by typing 'CHOICE:number'.")
+        else:
+            show(f"It is now {state['turn']}'s turn.")
+    elif msg_type == "ERROR" and resuming:
+        show("Could not get our seat back. Choose a role to join the next game.")
+        resuming = False
+        resume_token = None
+        expecting_role_choice = True
+    elif msg_type in ("SERVER_FULL", "GAME_END"):
+        resume_token = None
+        show("Exiting client.")
         asyncio.get_event_loop().stop()
-    elif message.startswith("YOUR_TURN:"):
+    elif msg_type == "YOUR_TURN":
         is_my_turn = True
-        print("It's YOUR turn to act.")
+        show("It's YOUR turn to act.")
         # Server will follow up with ACTIVE_PLAYER_CHOICES if actions are available
-    elif message.startswith("TURN:"):
-        current_turn_player = message.split(":",1)[1]
+    elif msg_type == "TURN":
+        current_turn_player = fields[0]
         if current_turn_player != player_id:
             is_my_turn = False
-            print(f"It is now {current_turn_player}'s turn.")
+            show(f"It is now {current_turn_player}'s turn.")
         else: # Should be caught by YOUR_TURN but as a fallback
             is_my_turn = True
-            print("It's YOUR turn.")
-    elif message.startswith("ACTIVE_PLAYER_CHOICES:"):
+            show("It's YOUR turn.")
+    elif msg_type == "ACTIVE_PLAYER_CHOICES":
         if is_my_turn:
-            choices_str = message.split(":",1)[1]
-            choices = choices_str.split("|")
-            print("Your available actions:")
-            for choice in choices:
-                print(f"  {choice}")
-            print("Choose an action by typing 'CHOICE:number'.")
+            show("Your available actions:")
+            for choice in fields:
+                show(f"  {choice}")
+            show("Choose an action by typing 'CHOICE:number'.")
             expecting_action_choice = True
             expecting_vote = False # Not expecting vote if choosing action
         else:
             # If it's not our turn, we might still see choices for other players (if server broadcasts all)
             # For Phase 1, server sends ACTIVE_PLAYER_CHOICES only to active player.
             pass
-    elif message.startswith("VOTE_START:"):
-        vote_text = message.split(":",2)[1]
-        print(f"A vote has started: '{vote_text}'.")
-        print("Type 'VOTE:yes' or 'VOTE:no'.")
+    elif msg_type == "VOTE_START":
+        vote_text = fields[0]
+        show(f"A vote has started: '{vote_text}'.")
+        show("Type 'VOTE:yes' or 'VOTE:no'.")
         expecting_vote = True
         expecting_action_choice = False # Not expecting action if voting
-    elif message.startswith("VOTE_RESULT:"):
+    elif msg_type == "VOTE_RESULT":
         expecting_vote = False # Vote concluded
-    elif message.startswith("PLAYER_UPDATE:"):
+    elif msg_type == "ROUND_START":
+        is_my_turn = True # Everyone acts at once; ACTIVE_PLAYER_CHOICES follows if we have actions
+        show(f"Everyone acts this round ({fields[0].replace('timeout=', '')}s).")
+    elif msg_type == "ROUND_RESULT":
+        result = json.loads(fields[0])
+        is_my_turn = expecting_action_choice = False
+        for line in result["actions"]:
+            show(line)
+        if player_id in result["updates"]:
+            state = result["updates"][player_id]
+            show(f"Your state has been updated: Stats: {state.get('stats')}, Inv: {state.get('inventory')}")
+        if result["missed"]:
+            show(f"No action in time from: {', '.join(result['missed'])}.")
+        show(result["outcome"])
+    elif msg_type == "PLAYER_UPDATE":
         try:
-            _, updated_pid, state_json = message.split(":", 2)
+            updated_pid, state_json = fields
             state = json.loads(state_json)
             if updated_pid == player_id:
-                print(f"Your state has been updated: Stats: {state.get('stats')}, Inv: {state.get('inventory')}")
+                show(f"Your state has been updated: Stats: {state.get('stats')}, Inv: {state.get('inventory')}")
             else:
-                print(f"Player {updated_pid}'s state updated (details: {state_json}).")
+                show(f"Player {updated_pid}'s state updated (details: {state_json}).")
         except Exception as e:
-            print(f"Error parsing PLAYER_UPDATE: {e}")
+            show(f"Error parsing PLAYER_UPDATE: {e}")
 
 
-async def receive_messages(reader):
-    """Continuously receives messages from the server and displays them."""
+async def receive_messages(reader, writer):
+    """Receives messages from the server and displays them. Returns True if the connection was lost."""
+    global protocol
+    guarded_reader = GuardedReader(reader, CLIENT_MAX_FRAME_BYTES, read_timeout=CLIENT_READ_TIMEOUT)
     while True:
         try:
-            data = await reader.readline()
+            data = await guarded_reader.read_message()
             if not data:
-                print("Server closed the connection.")
+                show("Server closed the connection.")
                 break
-            message = data.decode().strip()
-            await display_server_message(message) # Use the new display helper
+            msg_type, fields = data
+            # Protocol negotiation is handled here, not shown to the user
+            if msg_type == "PROTOCOLS":
+                if preferred_protocol != PROTOCOL_TEXT and preferred_protocol in fields:
+                    wants_zlib = use_compression and COMPRESSION_ZLIB in fields
+                    await send_command(writer, "PROTO", preferred_protocol, *([COMPRESSION_ZLIB] if wants_zlib else []))
+                    protocol = preferred_protocol # Everything we send after PROTO uses the new protocol
+                if resuming:
+                    await send_command(writer, "RESUME", resume_token) # After PROTO: the server ignores PROTO once seated
+                elif spectating:
+                    await send_command(writer, "SPECTATE")
+                elif profile_name:
+                    await send_command(writer, "PROFILE", profile_name)
+                continue
+            if msg_type == "PROTO_OK":
+                guarded_reader.protocol = fields[0] # Everything the server sends after PROTO_OK does too
+                if COMPRESSION_ZLIB in fields[1:]:
+                    guarded_reader.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+                continue
+            if msg_type == "COMPRESSION_DICT":
+                continue # Only there to prime the decompressor
+            await display_server_message(msg_type, fields) # Use the new display helper
 
+        except (ReadTimeout, FrameTooLarge) as e:
+            show(f"Dropping server connection: {e}")
+            break
         except ConnectionResetError:
-            print("Connection to the server was reset.")
+            show("Connection to the server was reset.")
             break
         except asyncio.CancelledError:
-            print("Receive messages task cancelled.")
-            break
+            show("Receive messages task cancelled.")
+            raise
         except Exception as e:
-            print(f"Error receiving message: {e}")
+            show(f"Error receiving message: {e}")
             break
-    
-    if not asyncio.get_event_loop().is_running(): return
-    asyncio.get_event_loop().stop()
+    return not quitting
 
-async def send_user_input(writer):
+async def send_user_input():
     """Handles user input and sends messages to the server."""
     loop = asyncio.get_event_loop()
-    global expecting_role_choice, expecting_action_choice, expecting_vote, is_my_turn
+    global expecting_role_choice, expecting_action_choice, expecting_vote, is_my_turn, quitting, spectating
+    stdin_reader = open_stdin()
     
     while True:
         try:
-            # Use run_in_executor for blocking input()
-            raw_input_message = await loop.run_in_executor(None, sys.stdin.readline)
-            input_message = raw_input_message.strip()
+            if stdin_reader:
+                raw_input_message = (await stdin_reader.readline()).decode(errors="replace")
+            else:
+                # No way to watch stdin from the loop here: blocking readline() in a thread
+                raw_input_message = await loop.run_in_executor(None, sys.stdin.readline)
+            input_message = raw_input_message.strip() if raw_input_message else "quit" # EOF (Ctrl-D) quits
+            writer = server_writer
 
-            if not writer.is_closing():
+            if input_message.lower() == "quit" and (writer is None or writer.is_closing()):
+                break
+            if writer is not None and not writer.is_closing():
                 if not input_message: continue # Skip empty inputs
 
+                msg_type, fields = decode_text(input_message)
+                msg_type = "quit" if input_message.lower() == "quit" else msg_type.upper()
+                if msg_type not in CLIENT_COMMANDS:
+                    show("Unknown command. Use PROFILE:name, STORY:id, ROLE:name, SPECTATE, CHOICE:number, VOTE:yes/no or quit.")
+                    continue
+
                 # Basic validation based on expected input state
-                if expecting_role_choice and not input_message.upper().startswith("ROLE:"):
-                    print("Please choose a role first, e.g., 'ROLE:Scout'")
+                if spectating and msg_type != "quit":
+                    show("You are spectating. Type 'quit' to leave.")
                     continue
-                elif is_my_turn and expecting_action_choice and not input_message.upper().startswith("CHOICE:"):
-                    print("It's your turn to act. Please use 'CHOICE:number'.")
+                elif expecting_role_choice and msg_type not in ("PROFILE", "STORY", "ROLE", "SPECTATE", "quit"):
+                    show("Please choose a role first, e.g., 'ROLE:Scout'")
                     continue
-                elif expecting_vote and not input_message.upper().startswith("VOTE:"):
-                     print("A vote is in progress. Please use 'VOTE:yes' or 'VOTE:no'.")
+                elif is_my_turn and expecting_action_choice and msg_type not in ("CHOICE", "quit"):
+                    show("It's your turn to act. Please use 'CHOICE:number'.")
+                    continue
+                elif expecting_vote and msg_type not in ("VOTE", "quit"):
+                     show("A vote is in progress. Please use 'VOTE:yes' or 'VOTE:no'.")
                      continue
 
-                writer.write(f"{input_message}\n".encode())
-                await writer.drain()
+                await send_command(writer, msg_type, *fields)
 
                 # Reset flags after sending
-                if input_message.upper().startswith("ROLE:"): expecting_role_choice = False
-                if input_message.upper().startswith("CHOICE:"): expecting_action_choice = False; is_my_turn = False # Turn ends after choice
+                if msg_type == "ROLE": expecting_role_choice = False
+                if msg_type == "SPECTATE": expecting_role_choice = False; spectating = True
+                if msg_type == "CHOICE": expecting_action_choice = False; is_my_turn = False # Turn ends after choice
                 # expecting_vote is reset by VOTE_RESULT from server
 
-                if input_message.lower() == "quit":
-                    print("Disconnecting...")
+                if msg_type == "quit":
+                    show("Disconnecting...")
+                    quitting = True
                     break
             else:
-                print("Writer is closing, cannot send message.")
-                break
+                show("Not connected to the server right now, try again in a moment.")
         except ConnectionResetError:
-            print("Connection lost while trying to send.")
-            break
+            show("Connection lost while trying to send.")
         except asyncio.CancelledError:
-            print("Send input task cancelled.")
+            show("Send input task cancelled.")
             break
         except Exception as e:
-            print(f"Error sending message: {e}")
+            show(f"Error sending message: {e}")
             break
             
-    if not writer.is_closing():
-        writer.close()
-        await writer.wait_closed()
+    quitting = True
+    if server_writer is not None and not server_writer.is_closing():
+        server_writer.close()
+        await server_writer.wait_closed()
     
     if not asyncio.get_event_loop().is_running(): return
     asyncio.get_event_loop().stop()
 
-async def main_client_logic():
-    print("Attempting to connect to HDVELH Phase 1 Server (127.0.0.1:8889)...")
+async def connect():
+    """Opens a connection to the server, printing why it failed. Returns (reader, writer) or None."""
     try:
         # Changed port to 8889
-        reader, writer = await asyncio.open_connection('127.0.0.1', 8889) 
+        return await asyncio.open_connection('127.0.0.1', 8889, limit=CLIENT_MAX_FRAME_BYTES)
     except ConnectionRefusedError:
-        print("Connection refused. Is the server running on port 8889?")
-        return
+        show("Connection refused. Is the server running on port 8889?")
     except Exception as e:
-        print(f"Failed to connect: {e}")
+        show(f"Failed to connect: {e}")
+    return None
+
+async def reconnect():
+    """Retries with exponential backoff and jitter while the server may still hold our seat."""
+    delay = RECONNECT_FIRST_DELAY
+    deadline = asyncio.get_running_loop().time() + RECONNECT_GIVE_UP
+    while asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(delay * random.uniform(0.5, 1.0)) # Jitter, so a server restart isn't hit by every client at once
+        show("Reconnecting...")
+        connection = await connect()
+        if connection:
+            return connection
+        delay = min(delay * 2, RECONNECT_MAX_DELAY)
+    return None
+
+async def main_client_logic():
+    global server_writer, resuming, protocol
+    show("Attempting to connect to HDVELH Phase 1 Server (127.0.0.1:8889)...")
+    connection = await connect()
+    if not connection:
+        asyncio.get_event_loop().stop()
         return
 
-    print("Connected. Waiting for server messages. Type 'quit' to disconnect.")
-    
-    receive_task = asyncio.create_task(receive_messages(reader))
-    send_task = asyncio.create_task(send_user_input(writer))
+    show("Connected. Waiting for server messages. Type 'quit' to disconnect.")
+    send_task = asyncio.create_task(send_user_input())
 
     try:
-        # Keep main_client_logic alive until event loop is stopped by tasks
-        await asyncio.Event().wait() 
+        while connection:
+            reader, writer = connection
+            server_writer = writer
+            protocol = PROTOCOL_TEXT # Every connection starts in text mode
+            resuming = resume_token is not None
+            lost = await receive_messages(reader, writer)
+            if not writer.is_closing():
+                writer.close()
+            if not lost or not resume_token:
+                break
+            show("Lost the connection to the server, trying to get our seat back.")
+            server_writer = None
+            connection = await reconnect()
+            if not connection:
+                show("Could not reach the server again.")
     except asyncio.CancelledError:
-        print("Client main logic cancelled.")
+        show("Client main logic cancelled.")
+        raise
     finally:
-        print("Cleaning up client resources...")
-        if not writer.is_closing():
-            writer.close()
-            try: await writer.wait_closed()
+        show("Cleaning up client resources...")
+        if server_writer and not server_writer.is_closing():
+            server_writer.close()
+            try: await server_writer.wait_closed()
             except: pass
-        if not receive_task.done(): receive_task.cancel()
         if not send_task.done(): send_task.cancel()
         # Allow tasks to process cancellation
         await asyncio.sleep(0.1)
+    asyncio.get_event_loop().stop()
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="HDVELH multiplayer client.")
+    parser.add_argument("--protocol", choices=[PROTOCOL_TEXT, PROTOCOL_BINARY], default=PROTOCOL_BINARY,
+                        help="Wire protocol to request from the server (default: bin1, falls back to text)")
+    parser.add_argument("--no-compression", action="store_true", help="Don't ask the server to compress large frames")
+    parser.add_argument("--spectate", action="store_true", help="Watch the table instead of taking a role")
+    parser.add_argument("--name", help="Profile to play under, on servers that keep profiles: your progress and history are kept across sessions")
+    parser.add_argument("--headless", action="store_true", help="Print nothing; for bots and scripts sending commands on stdin")
+    cli_args = parser.parse_args()
+    preferred_protocol = cli_args.protocol
+    use_compression = not cli_args.no_compression and not cli_args.spectate # Spectator frames are never compressed
+    spectating = cli_args.spectate
+    profile_name = cli_args.name
+    headless = cli_args.headless
+
     loop = asyncio.get_event_loop()
     client_task = None
     try:
         client_task = loop.create_task(main_client_logic())
         loop.run_forever() 
     except KeyboardInterrupt:
+        flush_output()
         print("Client shutting down (KeyboardInterrupt)...")
     finally:
         if client_task and not client_task.done():
@@ -219,4 +431,6 @@ if __name__ == '__main__':
             loop.stop()
         if not loop.is_closed():
             loop.close()
-        print("Client fully shut down.")
+        flush_output() # Whatever was shown after the loop's last render
+        if not headless:
+            print("Client fully shut down.")
@@ -0,0 +1,397 @@
+"""Rules of a multiplayer table, without sockets, tasks or clocks.
+
+GameCore holds one game: the seated players (role, stats, inventory) in turn order, the current node, whose turn
+it is and the vote or round in progress. Every command (start, choose, vote, vote_timeout, end) applies the rules
+synchronously and returns the events it produced, in order. An event is (msg_type, fields, target, exclude): a
+protocol message for every player (target and exclude None), for one player (target) or for all but one
+(exclude). mp_server.py sends them over the network and reacts to a few of them: VOTE_START starts the vote
+timer, ACTIVE_PLAYER_CHOICES for a bot schedules its decision, GAME_END closes the table.
+
+Stories with "turn_mode": "rounds" are played in simultaneous rounds instead of turns: at every node without a
+vote, each player gets their choices at once (ROUND_START) and the round resolves when all of them have chosen,
+or when the server's timer calls round_timeout() after "round_timeout" seconds. Resolution applies every
+action's effects_for_chooser, highest choice "priority" first, then in seat order starting with the round's lead
+player, and moves the story to the target of the first action; a node with "round_resolution": "majority" goes
+to the target most players chose instead (ties broken by the same order). The outcome is one ROUND_RESULT
+message: the actions, the resulting stats and inventories, and what the story does next.
+
+Nothing here waits: a player without any choice passes at once, and the game ends if nobody at the table can act.
+That makes whole games cheap to run in-process, for balancing, fuzzing and benchmarks:
+
+Usage: python mp_game.py mp_story_phase1.json [--games 10000] [--seed 1]
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+from story_compiler import compile_role_tables
+from story_engine import apply_effects, check_conditions
+
+VOTE_TIMEOUT_SECONDS = 30 # Announced with VOTE_START; the server's timer calls vote_timeout() after it
+ROUND_TIMEOUT_SECONDS = 30 # Default deadline of a round (story key "round_timeout"); the timer calls round_timeout()
+ROUND_RESOLUTIONS = ("priority", "majority") # Node key "round_resolution", "priority" when absent
+
+
+def apply_chooser_effects(choice, stats, inventory):
+    """Applies, in place, everything taking `choice` changes at a table: its effects_for_chooser, on the chooser.
+    The target node's "effects" and the choice's own team-wide "effects" are never applied in multiplayer, and a
+    choice taken by a vote changes no one's stats. Bots simulate choices with this too (see mp_bots.py)."""
+    apply_effects(choice.get("effects_for_chooser"), stats, inventory)
+
+
+class GameCore:
+    def __init__(self, story_data: dict, role_tables: dict):
+        self.story = story_data
+        self.role_tables = role_tables # See story_compiler.compile_role_tables()
+        self.available_roles = list(story_data.get("player_character_templates", {}))
+        self.rounds = story_data.get("turn_mode") == "rounds" # Simultaneous rounds instead of turns
+        self.round_seconds = story_data.get("round_timeout", ROUND_TIMEOUT_SECONDS)
+        self.players = {} # player_id: {"role": role, "stats": {}, "inventory": []}
+        self.order = [] # Player ids in turn order (the order they took their seat)
+        self.active = False
+        self.node_id = None
+        self.turn_idx = 0
+        self.vote_choice = None # The choice being voted on while a vote is in progress
+        self.votes = {} # player_id: "yes"/"no"
+        self.round_choices = None # player_id: [(original index, choice)] offered this round, while a round is open
+        self.submitted = {} # player_id: position in round_choices[player_id]
+        self.passes = 0 # Players in a row who had nothing to do
+        self.events = []
+
+    # --- Events ---
+    def _broadcast(self, msg_type, *fields, exclude=None):
+        self.events.append((msg_type, fields, None, exclude))
+
+    def _send(self, player_id, msg_type, *fields):
+        self.events.append((msg_type, fields, player_id, None))
+
+    def _take_events(self) -> list:
+        events, self.events = self.events, []
+        return events
+
+    # --- Seats ---
+    def add_player(self, player_id, role) -> bool:
+        """Seats a player in one of the available roles, with the role's initial stats and inventory."""
+        if role not in self.available_roles:
+            return False
+        self.available_roles.remove(role)
+        template = self.story["player_character_templates"][role]
+        self.players[player_id] = {"role": role, "stats": dict(template.get("initial_stats", {})),
+                                   "inventory": list(template.get("initial_inventory", []))}
+        self.order.append(player_id)
+        return True
+
+    def remove_player(self, player_id):
+        """Frees a seat. Before the game starts, the role can be taken again."""
+        player = self.players.pop(player_id, None)
+        if player is None:
+            return
+        self.order.remove(player_id)
+        if not self.active:
+            self.available_roles.append(player["role"])
+
+    # --- State ---
+    def current_player(self):
+        if not self.order or not self.active:
+            return None
+        return self.order[self.turn_idx % len(self.order)]
+
+    def vote_in_progress(self) -> bool:
+        return self.vote_choice is not None
+
+    def may_choose(self, player_id) -> bool:
+        if self.round_choices is not None:
+            return player_id in self.round_choices and player_id not in self.submitted
+        return self.active and self.vote_choice is None and not self.rounds and player_id == self.current_player()
+
+    def available_choices(self, player_id) -> list:
+        """[(original index, choice)] of the non-vote choices the player can take at the current node."""
+        choices = self.story["nodes"][self.node_id]["choices"]
+        player = self.players[player_id]
+        # Role eligibility is precomputed at load; only the conditions of this role's candidates depend on the game
+        candidates = self.role_tables["role_choices"][self.node_id].get(player["role"], ())
+        return [(idx, choices[idx]) for idx in candidates if check_conditions(choices[idx].get("conditions"), player["stats"], player["inventory"])]
+
+    def node_text(self) -> str:
+        """The current node's text, with the names of the player whose turn it is filled in."""
+        node_text = self.story["nodes"].get(self.node_id, {}).get("text", "")
+        current_player_id = self.current_player()
+        if current_player_id:
+            role = self.players[current_player_id]["role"]
+            node_text = node_text.replace("{current_player_name}", role).replace("{acting_player_name}", role)
+        return node_text
+
+    def at_ending(self) -> bool:
+        return bool(self.node_id) and not self.story["nodes"].get(self.node_id, {}).get("choices")
+
+    # --- Snapshots ---
+    def to_json(self) -> dict:
+        """The game's state as JSON data. Choices are stored by index: from_json() needs the same story."""
+        return {"players": self.players, "order": self.order, "available_roles": self.available_roles,
+                "active": self.active, "node_id": self.node_id, "turn_idx": self.turn_idx,
+                "vote": self.vote_choice is not None, "votes": self.votes, "passes": self.passes,
+                "round": None if self.round_choices is None else {pid: [idx for idx, _ in offered] for pid, offered in self.round_choices.items()},
+                "submitted": self.submitted}
+
+    @classmethod
+    def from_json(cls, story_data, role_tables, data):
+        game = cls(story_data, role_tables)
+        for key in ("players", "order", "available_roles", "active", "node_id", "turn_idx", "votes", "passes", "submitted"):
+            setattr(game, key, data[key])
+        choices = story_data["nodes"][game.node_id]["choices"] if game.node_id in story_data.get("nodes", {}) else []
+        if data["vote"]:
+            game.vote_choice = choices[role_tables["vote_choice"][game.node_id]]
+        if data["round"] is not None:
+            game.round_choices = {pid: [(idx, choices[idx]) for idx in offered] for pid, offered in data["round"].items()}
+        return game
+
+    # --- Commands ---
+    def start(self) -> list:
+        """Starts the adventure at the story's start node; the first seated player acts first."""
+        self.active = True
+        self.node_id = self.story["start_node_id"]
+        self.turn_idx = 0
+        self._broadcast("GAME_START", "All players have chosen roles. The adventure begins!")
+        self._announce_turn()
+        self._enter_node()
+        return self._take_events()
+
+    def choose(self, player_id, choice_pos) -> list:
+        """The player takes one of their available choices (0-based position in available_choices()).
+        In a round, the choice is only recorded; it takes effect when the round is resolved."""
+        if not self.may_choose(player_id):
+            return [] # Not their turn (or already chosen this round): ignored
+        available = self.round_choices[player_id] if self.round_choices is not None else self.available_choices(player_id)
+        if not 0 <= choice_pos < len(available):
+            self._send(player_id, "ERROR", "Invalid choice index.")
+            return self._take_events()
+        if self.round_choices is not None:
+            self.submitted[player_id] = choice_pos
+            if len(self.submitted) == len(self.round_choices):
+                self._resolve_round()
+            else:
+                self._send(player_id, "INFO", "Your action is locked in. Waiting for the others.")
+            return self._take_events()
+        _, choice = available[choice_pos]
+        role = self.players[player_id]["role"]
+        self._broadcast("PLAYER_ACTION", f"{player_id} (as {role}) chose: '{choice['text'].replace('{acting_player_name}', role)}'")
+        self._apply_choice(player_id, choice)
+        self.passes = 0
+        self.node_id = choice["target_node_id"]
+        self._advance_turn()
+        self._enter_node()
+        return self._take_events()
+
+    def vote(self, player_id, vote_value) -> list:
+        """Records a "yes"/"no" vote; the vote is resolved once every player has voted."""
+        if self.vote_choice is None or player_id not in self.players:
+            return []
+        if player_id in self.votes:
+            self._send(player_id, "INFO", "You have already voted.")
+            return self._take_events()
+        self.votes[player_id] = vote_value
+        self._broadcast("PLAYER_VOTED", f"{player_id} (as {self.players[player_id]['role']}) has voted.")
+        if len(self.votes) == len(self.players):
+            self._resolve_vote()
+        return self._take_events()
+
+    def vote_timeout(self) -> list:
+        if self.vote_choice is not None:
+            self._broadcast("VOTE_TIMEOUT", "The vote has timed out.")
+            self._resolve_vote()
+        return self._take_events()
+
+    def round_timeout(self) -> list:
+        """Resolves the open round with the actions submitted so far."""
+        if self.round_choices is not None:
+            self._resolve_round()
+        return self._take_events()
+
+    def end(self, reason) -> list:
+        if self.active:
+            self._end(reason)
+        return self._take_events()
+
+    # --- Rules ---
+    def _end(self, reason):
+        self.active = False
+        self.vote_choice = self.round_choices = None
+        self._broadcast("GAME_END", reason)
+
+    def _apply_choice(self, player_id, choice):
+        player = self.players[player_id]
+        apply_chooser_effects(choice, player["stats"], player["inventory"])
+        if choice.get("effects_for_chooser"):
+            self._broadcast("PLAYER_UPDATE", player_id, json.dumps({"stats": player["stats"], "inventory": player["inventory"]}))
+
+    def _announce_turn(self):
+        current_player_id = self.current_player()
+        if current_player_id and not self.rounds: # Rounds: everyone acts, the lead player only sets the names in the text
+            self._broadcast("TURN", current_player_id)
+            self._send(current_player_id, "YOUR_TURN", "It's your turn to act.")
+
+    def _advance_turn(self):
+        self.turn_idx = (self.turn_idx + 1) % len(self.order)
+        self._announce_turn()
+
+    def _enter_node(self):
+        """Shows the current node and asks the table (vote) or the current player (choices) for what comes next.
+        Players with nothing to do pass, until someone can act or everyone has passed in a row."""
+        while self.active:
+            node = self.story["nodes"].get(self.node_id)
+            if not node:
+                self._end(f"Error: Node '{self.node_id}' not found.")
+                return
+            self._broadcast("NODE_TEXT", self.node_text())
+            if not node.get("choices"):
+                self._end("Story ended: No more choices.")
+                return
+            vote_idx = self.role_tables["vote_choice"].get(self.node_id)
+            if vote_idx is not None:
+                self.vote_choice = node["choices"][vote_idx]
+                self.votes = {}
+                self._broadcast("VOTE_START", self.vote_choice["text"], f"timeout={VOTE_TIMEOUT_SECONDS}")
+                return
+            if self.rounds:
+                self._open_round()
+                return
+            current_player_id = self.current_player()
+            available = self.available_choices(current_player_id)
+            if available:
+                self._send(current_player_id, "ACTIVE_PLAYER_CHOICES", *[f"{i+1}. {c['text']}" for i, (_, c) in enumerate(available)])
+                return
+            self._send(current_player_id, "INFO", "No actions available for you this turn or for your role.")
+            self.passes += 1
+            if self.passes >= len(self.order):
+                self._end("Story ended: No player can act.")
+                return
+            self._advance_turn()
+
+    def _open_round(self):
+        self.round_choices = {}
+        self.submitted = {}
+        self._broadcast("ROUND_START", f"timeout={self.round_seconds}")
+        for player_id in self.order:
+            available = self.available_choices(player_id)
+            if available:
+                self.round_choices[player_id] = available
+                self._send(player_id, "ACTIVE_PLAYER_CHOICES", *[f"{i+1}. {c['text']}" for i, (_, c) in enumerate(available)])
+            else:
+                self._send(player_id, "INFO", "No actions available for you this turn or for your role.")
+        if not self.round_choices:
+            self.round_choices = None
+            self._end("Story ended: No player can act.")
+
+    def _resolve_round(self):
+        offered, submitted = self.round_choices, self.submitted
+        self.round_choices, self.submitted = None, {}
+        seats = self.order[self.turn_idx:] + self.order[:self.turn_idx] # The round's lead player first
+        actions = [(player_id, offered[player_id][submitted[player_id]][1]) for player_id in seats if player_id in submitted]
+        actions.sort(key=lambda action: -action[1].get("priority", 0)) # Stable: seat order among equal priorities
+        lines, updates = [], {}
+        for player_id, choice in actions:
+            player = self.players[player_id]
+            lines.append(f"{player_id} (as {player['role']}) chose: '{choice['text'].replace('{acting_player_name}', player['role'])}'")
+            if choice.get("effects_for_chooser"):
+                apply_chooser_effects(choice, player["stats"], player["inventory"])
+                updates[player_id] = {"stats": player["stats"], "inventory": player["inventory"]}
+        if actions:
+            self.passes = 0
+            decider, choice = actions[0]
+            if self.story["nodes"][self.node_id].get("round_resolution") == "majority":
+                counts = {}
+                for _, other in actions:
+                    counts[other["target_node_id"]] = counts.get(other["target_node_id"], 0) + 1
+                target = max(counts, key=counts.get) # First in resolution order among the most chosen
+                decider, choice = next(action for action in actions if action[1]["target_node_id"] == target)
+            outcome = f"The story follows {decider}'s action."
+            self.node_id = choice["target_node_id"]
+        else:
+            outcome = "Nobody acted in time. The situation remains."
+        self._broadcast("ROUND_RESULT", json.dumps({"actions": lines, "updates": updates, "outcome": outcome,
+                                                    "missed": [player_id for player_id in offered if player_id not in submitted]}))
+        self._advance_turn() # The next player leads the next round
+        self._enter_node()
+
+    def _resolve_vote(self):
+        choice, votes = self.vote_choice, self.votes
+        self.vote_choice, self.votes = None, {}
+        yes_votes = sum(1 for vote in votes.values() if vote == "yes")
+        no_votes = sum(1 for vote in votes.values() if vote == "no")
+        if len(votes) == len(self.players): # Everyone voted: majority wins
+            vote_passed = yes_votes > no_votes
+            outcome_message = f"Vote for '{choice['text']}' {'passed' if vote_passed else 'failed'}! ({yes_votes} yes, {no_votes} no)"
+        else: # Timed out: fails unless everyone voted
+            vote_passed = False
+            outcome_message = (f"Vote for '{choice['text']}' timed out or not all voted, outcome: failed. "
+                               f"({yes_votes} yes, {no_votes} no, {len(self.players) - len(votes)} did not vote)")
+        self._broadcast("VOTE_RESULT", "passed" if vote_passed else "failed", outcome_message)
+        if vote_passed:
+            self.passes = 0
+            # The choice's "effects" are team-wide and have no player to apply to; the story handles them
+            self.node_id = choice.get("target_node_id") or self.node_id
+        else:
+            self._broadcast("INFO", "The vote failed. The situation remains.")
+        self._advance_turn()
+        self._enter_node()
+
+
+# --- In-process simulation ---
+def simulate(story_data, games, seed=None, max_steps=1000) -> dict:
+    """Plays `games` full games where every seat picks random choices and votes. A step is one command (a choice or
+    a vote). Returns throughput and outcomes."""
+    rng = random.Random(seed)
+    role_tables = compile_role_tables(story_data)
+    roles = list(story_data.get("player_character_templates", {}))
+    steps = events = 0
+    endings = {}
+    started = time.perf_counter()
+    for _ in range(games):
+        game = GameCore(story_data, role_tables)
+        for role in roles[:story_data.get("max_players", len(roles))]:
+            game.add_player(role, role)
+        events += len(game.start())
+        for _ in range(max_steps):
+            if not game.active:
+                break
+            if game.vote_choice is not None:
+                player_id = next(pid for pid in game.order if pid not in game.votes)
+                events += len(game.vote(player_id, rng.choice(("yes", "no"))))
+            elif game.round_choices is not None:
+                player_id = next(pid for pid in game.round_choices if pid not in game.submitted)
+                events += len(game.choose(player_id, rng.randrange(len(game.round_choices[player_id]))))
+            else:
+                player_id = game.current_player()
+                events += len(game.choose(player_id, rng.randrange(len(game.available_choices(player_id)))))
+            steps += 1
+        else:
+            events += len(game.end("Step limit reached."))
+        ending = game.node_id if game.at_ending() else "(unfinished)"
+        endings[ending] = endings.get(ending, 0) + 1
+    elapsed = time.perf_counter() - started
+    return {"games": games, "steps": steps, "events": events, "seconds": round(elapsed, 3),
+            "steps_per_second": round(steps / elapsed) if elapsed else 0, "endings": endings}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate random multiplayer games of a story in-process.")
+    parser.add_argument("story_filepath", help="Path to the multiplayer story JSON file")
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--seed", type=int)
+    cli_args = parser.parse_args()
+    try:
+        with open(cli_args.story_filepath, encoding="utf-8") as f:
+            story = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Error: can't load {cli_args.story_filepath}: {e}")
+        sys.exit(1)
+    if not story.get("player_character_templates"):
+        print("Error: No player character templates defined in the story file!")
+        sys.exit(1)
+    report = simulate(story, cli_args.games, cli_args.seed)
+    print(f"{report['games']} games, {report['steps']} steps, {report['events']} events in {report['seconds']}s: "
+          f"{report['steps_per_second']} steps/s.")
+    for ending, count in sorted(report["endings"].items(), key=lambda item: -item[1]):
+        print(f"  {ending}: {count}")
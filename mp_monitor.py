@@ -0,0 +1,147 @@
+"""Event loop lag and slow callback monitor for mp_server.py.
+
+The monitor is off unless mp_server.py runs with --slow-callback-ms: install() replaces asyncio's private
+Handle._run, which is fine for a diagnostic mode but not something every server should pay for. Once installed,
+it times every callback the asyncio loop runs (Handle._run, which also runs every task step). Durations
+go into per-step histograms, and callbacks over the slow threshold go into a slow log. A step is the protocol
+command or game event the work belongs to: handlers run inside `with step("CHOICE"):`, or are decorated with
+@labelled("vote timeout") and so on. The label lives in a context variable, so tasks created while handling a
+command (broadcasts, turn notifications...) are attributed to that command too, and it is reset when the step
+ends, even if it fails. Unlabelled callbacks are counted under "other", and
+their slow log entries name the coroutine or function instead.
+
+watch_lag() measures loop lag continuously: how late a sleep of LAG_INTERVAL seconds wakes up.
+"""
+import asyncio
+import contextlib
+import contextvars
+import functools
+import time
+from bisect import bisect_left
+from collections import deque
+
+SLOW_CALLBACK_SECONDS = 0.02 # Default threshold of install(): callbacks holding the loop longer than this are logged
+LAG_INTERVAL = 0.1 # Seconds between two lag probes
+SLOW_LOG_SIZE = 200
+BUCKET_BOUNDS_MS = [0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000] # Upper bounds; the last bucket counts everything above
+
+current_step = contextvars.ContextVar("current_step", default="other")
+
+monitor_state = {
+    "installed": False,
+    "task": None, # watch_lag() task
+    "threshold": SLOW_CALLBACK_SECONDS,
+    "steps": {}, # step: {"counts": [per bucket], "calls", "total", "max"}, callback durations in seconds
+    "lag": {"counts": [0] * (len(BUCKET_BOUNDS_MS) + 1), "calls": 0, "total": 0.0, "max": 0.0},
+    "slow_log": deque(maxlen=SLOW_LOG_SIZE), # {"at", "step", "ms", "callback"}, oldest first
+}
+
+_original_run = asyncio.events.Handle._run
+
+
+@contextlib.contextmanager
+def step(label):
+    """Attributes the work done in the block (and the tasks it creates) to `label`, then restores the previous label."""
+    token = current_step.set(label)
+    try:
+        yield
+    finally:
+        try:
+            current_step.reset(token)
+        except ValueError: # A pending task's coroutine closed by the garbage collector, outside its own context
+            pass
+
+
+def labelled(label):
+    """Decorator running a whole coroutine function inside step(label)."""
+    def decorate(func):
+        @functools.wraps(func)
+        async def run_labelled(*args, **kwargs):
+            with step(label):
+                return await func(*args, **kwargs)
+        return run_labelled
+    return decorate
+
+
+def _new_histogram():
+    return {"counts": [0] * (len(BUCKET_BOUNDS_MS) + 1), "calls": 0, "total": 0.0, "max": 0.0}
+
+
+def _record(histogram, seconds):
+    histogram["counts"][bisect_left(BUCKET_BOUNDS_MS, seconds * 1000)] += 1
+    histogram["calls"] += 1
+    histogram["total"] += seconds
+    if seconds > histogram["max"]:
+        histogram["max"] = seconds
+
+
+def _describe(handle) -> str:
+    callback = handle._callback
+    task = getattr(callback, "__self__", None)
+    if isinstance(task, asyncio.Task): # A task step: name the coroutine rather than Task.__step
+        coro = task.get_coro()
+        return getattr(coro, "__qualname__", repr(coro))
+    return getattr(callback, "__qualname__", repr(callback))
+
+
+def _timed_run(handle):
+    started = time.perf_counter()
+    _original_run(handle)
+    elapsed = time.perf_counter() - started
+    label = handle._context.get(current_step, "other") if handle._context is not None else "other"
+    histogram = monitor_state["steps"].get(label)
+    if histogram is None:
+        histogram = monitor_state["steps"][label] = _new_histogram()
+    _record(histogram, elapsed)
+    if elapsed >= monitor_state["threshold"]:
+        callback = _describe(handle)
+        monitor_state["slow_log"].append({"at": round(time.time(), 3), "step": label, "ms": round(elapsed * 1000, 3),
+                                          "callback": callback})
+        print(f"Slow callback: {callback} ({label}) held the loop for {elapsed * 1000:.1f} ms")
+
+
+def install(threshold=SLOW_CALLBACK_SECONDS):
+    """Starts timing every callback of every asyncio loop in this process."""
+    monitor_state["threshold"] = threshold
+    if not monitor_state["installed"]:
+        asyncio.events.Handle._run = _timed_run # TimerHandle inherits it
+        monitor_state["installed"] = True
+
+
+def uninstall():
+    """Puts asyncio's own Handle._run back. The histograms and slow log are kept."""
+    if monitor_state["installed"]:
+        asyncio.events.Handle._run = _original_run
+        monitor_state["installed"] = False
+
+
+@labelled("lag monitor")
+async def watch_lag(interval=LAG_INTERVAL):
+    loop = asyncio.get_running_loop()
+    while True:
+        scheduled = loop.time()
+        await asyncio.sleep(interval)
+        _record(monitor_state["lag"], max(0.0, loop.time() - scheduled - interval))
+
+
+def _summarize(histogram) -> dict:
+    calls = histogram["calls"]
+    return {"calls": calls, "avg_ms": round(1000 * histogram["total"] / calls, 3) if calls else 0.0,
+            "max_ms": round(1000 * histogram["max"], 3), "counts": list(histogram["counts"])}
+
+
+def get_loop_stats(args=None) -> dict:
+    """Lag and per-step callback histograms; counts[i] is the number of samples up to BUCKET_BOUNDS_MS[i] ms."""
+    steps = sorted(monitor_state["steps"].items(), key=lambda item: -item[1]["total"])
+    return {"bounds_ms": BUCKET_BOUNDS_MS, "slow_threshold_ms": monitor_state["threshold"] * 1000,
+            "lag": _summarize(monitor_state["lag"]), "steps": {label: _summarize(h) for label, h in steps},
+            "slow_callbacks": len(monitor_state["slow_log"])}
+
+
+def get_slow_log(args=None) -> list:
+    """The most recent slow callbacks, newest last (admin 'slowlog [N]' command). Raises ValueError unless N is a
+    positive integer."""
+    if args and not (args[0].isdecimal() and int(args[0]) > 0):
+        raise ValueError(f"N must be a positive integer, got {args[0]}")
+    limit = int(args[0]) if args else SLOW_LOG_SIZE
+    return list(monitor_state["slow_log"])[-limit:]
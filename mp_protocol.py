@@ -0,0 +1,350 @@
+"""Wire-level helpers shared by the multiplayer server (mp_server.py) and client (mp_client.py)."""
+import asyncio
+import struct
+import time
+import zlib
+
+# --- Input limits ---
+SERVER_MAX_FRAME_BYTES = 4096 # Client commands are tiny (ROLE:, CHOICE:, VOTE:), anything bigger is abuse
+CLIENT_MAX_FRAME_BYTES = 256 * 1024 # Server frames carry node text, so allow much more on the client side
+SERVER_IDLE_TIMEOUT = 900 # Seconds a client may stay silent (waiting for other players' turns) before being dropped
+SERVER_READ_TIMEOUT = 10 # Seconds allowed to finish a frame once its first byte has arrived
+CLIENT_READ_TIMEOUT = 30
+COMMAND_RATE_PER_SEC = 4 # Sustained commands per second per connection
+COMMAND_BURST = 10 # Commands a connection may send back to back before the rate applies
+
+# --- Protocol modes ---
+# "text" is the original newline-delimited protocol (TYPE:field:field). "bin1" frames are a 4-byte big-endian
+# length followed by one message-type byte and the fields, each as a varint length plus UTF-8 bytes.
+# Both sides start in text; the server advertises PROTOCOLS after WELCOME and a client may answer PROTO:bin1.
+# The client->server direction switches right after the PROTO line, server->client right after PROTO_OK.
+# PROTO:bin1:zlib additionally turns on zlib stream compression for large server->client frames (see FrameCompressor).
+PROTOCOL_TEXT = "text"
+PROTOCOL_BINARY = "bin1"
+SUPPORTED_PROTOCOLS = [PROTOCOL_TEXT, PROTOCOL_BINARY]
+COMPRESSION_ZLIB = "zlib"
+
+# Order matters: the index is the type byte on the wire. Only ever append to this list.
+MESSAGE_TYPES = [
+    # Server -> client
+    "WELCOME", "ROLES_AVAILABLE", "ROLE_CONFIRMED", "PLAYER_JOINED", "PLAYER_LEFT", "PLAYER_UPDATE",
+    "GAME_START", "GAME_END", "SERVER_FULL", "TURN", "YOUR_TURN", "NODE_TEXT", "ACTIVE_PLAYER_CHOICES",
+    "PLAYER_ACTION", "VOTE_START", "PLAYER_VOTED", "VOTE_TIMEOUT", "VOTE_RESULT", "INFO", "ERROR",
+    "PROTOCOLS", "PROTO_OK",
+    # Client -> server
+    "ROLE", "CHOICE", "VOTE", "PROTO", "quit",
+    # Server -> client
+    "COMPRESSION_DICT", "STORIES",
+    # Client -> server
+    "STORY",
+    # Client -> server, then server -> client
+    "RESUME", "STATE",
+    # Client -> server
+    "SPECTATE", "PROFILE",
+    # Server -> client
+    "ROUND_START", "ROUND_RESULT",
+]
+MESSAGE_TYPE_CODES = {name: code for code, name in enumerate(MESSAGE_TYPES)}
+
+# How each message type maps onto the text protocol.
+TEXT_LIST_SEPARATORS = {"ACTIVE_PLAYER_CHOICES": "|", "ROLES_AVAILABLE": ",", "PROTOCOLS": ",", "PROTO": ":", "PROTO_OK": ":",
+                        "STORIES": "|"}
+TEXT_FIELD_COUNTS = {"WELCOME": 2, "ROLE_CONFIRMED": 2, "PLAYER_UPDATE": 2, "VOTE_RESULT": 2}
+TEXT_TRAILING_FIELD_TYPES = {"VOTE_START", "ROLE_CONFIRMED"} # Last field is split from the right (VOTE_START:text:timeout=N)
+BINARY_HEADER = struct.Struct(">I")
+COMPRESSED_FLAG = 0x80000000 # High bit of the bin1 length prefix marks a zlib-compressed payload
+
+# --- Compression tuning ---
+# Level 1 deflate costs a few microseconds per KiB; frames below COMPRESSION_MIN_BYTES (TURN, YOUR_TURN,
+# PLAYER_VOTED...) are sent as-is since the sync-flush overhead would eat most of the saving.
+COMPRESSION_LEVEL = 1
+COMPRESSION_MEM_LEVEL = 5 # ~150 KiB of zlib state per connection instead of ~270 KiB at the default level
+COMPRESSION_MIN_BYTES = 200
+COMPRESSION_DICT_BYTES = 8192
+COMPRESSION_PROBE_FRAMES = 20 # Compressed frames to look at before deciding whether compression pays off
+COMPRESSION_MAX_RATIO = 0.9 # Stop compressing a connection whose frames shrink by less than 10%
+ZLIB_SYNC_TAIL = b"\x00\x00\xff\xff" # Every Z_SYNC_FLUSH ends with this, so it is stripped on the wire
+
+
+class FrameTooLarge(Exception):
+    """Raised when a peer sends a frame longer than the configured maximum."""
+
+
+class ReadTimeout(Exception):
+    """Raised when a peer stays idle too long or takes too long to finish a frame."""
+
+
+def encode_text(msg_type: str, fields) -> str:
+    """Builds the text-protocol line (without newline) for a message."""
+    if not fields:
+        return msg_type
+    separator = TEXT_LIST_SEPARATORS.get(msg_type)
+    if separator:
+        return f"{msg_type}:{separator.join(fields)}"
+    return ":".join((msg_type,) + tuple(fields))
+
+
+def decode_text(line: str):
+    """Splits a text-protocol line into (msg_type, fields)."""
+    msg_type, sep, rest = line.partition(":")
+    if not sep:
+        return msg_type, []
+    separator = TEXT_LIST_SEPARATORS.get(msg_type)
+    if separator:
+        return msg_type, rest.split(separator) if rest else []
+    if msg_type in TEXT_TRAILING_FIELD_TYPES and ":" in rest:
+        head, last = rest.rsplit(":", 1)
+        return msg_type, head.split(":", TEXT_FIELD_COUNTS.get(msg_type, 1) - 1) + [last]
+    return msg_type, rest.split(":", TEXT_FIELD_COUNTS.get(msg_type, 1) - 1)
+
+
+def _encode_varint(value: int, out: bytearray):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode_binary(msg_type: str, fields) -> bytes:
+    """Builds a complete length-prefixed bin1 frame for a message."""
+    payload = bytearray((MESSAGE_TYPE_CODES[msg_type],))
+    for field in fields:
+        data = str(field).encode()
+        _encode_varint(len(data), payload)
+        payload += data
+    return BINARY_HEADER.pack(len(payload)) + payload
+
+
+def decode_binary(payload: bytes):
+    """Splits a bin1 payload (without its length prefix) into (msg_type, fields)."""
+    if not payload or payload[0] >= len(MESSAGE_TYPES):
+        raise ValueError("Unknown binary message type")
+    fields = []
+    pos, end = 1, len(payload)
+    while pos < end:
+        length, shift = 0, 0
+        while True:
+            if pos == end:
+                raise ValueError("Truncated binary field length")
+            byte = payload[pos]
+            pos += 1
+            length |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        if pos + length > end:
+            raise ValueError("Truncated binary field")
+        fields.append(payload[pos:pos + length].decode())
+        pos += length
+    return MESSAGE_TYPES[payload[0]], fields
+
+
+def encode_message(protocol: str, msg_type: str, fields=()) -> bytes:
+    """Encodes a message for the wire in the given protocol mode."""
+    if protocol == PROTOCOL_BINARY:
+        return encode_binary(msg_type, fields)
+    return f"{encode_text(msg_type, fields)}\n".encode()
+
+
+def build_compression_dictionary(texts, max_bytes=COMPRESSION_DICT_BYTES) -> str:
+    """Builds a shared compression dictionary from story texts.
+
+    `texts` should be ordered from least to most frequently sent: zlib matches nearby data more cheaply,
+    so the most common strings are kept at the end and the oldest ones are dropped when over budget.
+    """
+    picked, size = [], 0
+    seen = set()
+    for text in reversed(list(texts)):
+        if not text or text in seen:
+            continue
+        seen.add(text)
+        size += len(text.encode())
+        if size > max_bytes:
+            break
+        picked.append(text)
+    return "\n".join(reversed(picked))
+
+
+class FrameCompressor:
+    """Per-connection zlib stream compressor for server->client bin1 frames.
+
+    All compressed frames of a connection share one deflate stream, so a frame can reference text from any
+    earlier compressed frame. Frames sent uncompressed never touch the stream, which is what allows small
+    frames to skip compression. If `dictionary` (a frame holding the story dictionary) is set, it primes the
+    stream just before the first frame that gets compressed, which gives the peer the same effect as a preset
+    zlib dictionary at a fraction of its size. A connection that only ever gets small frames never receives it.
+    """
+
+    def __init__(self, level=COMPRESSION_LEVEL, min_bytes=COMPRESSION_MIN_BYTES, dictionary=b""):
+        self.level = level
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, COMPRESSION_MEM_LEVEL)
+        self.min_bytes = min_bytes
+        self.enabled = True
+        self.dictionary = dictionary # Dictionary frame not sent yet
+        self.stats = {"raw_bytes": 0, "wire_bytes": 0, "compressed_frames": 0, "plain_frames": 0, "compress_seconds": 0.0}
+        self._probe_raw = 0
+        self._probe_wire = 0
+
+    def _deflate(self, frame: bytes) -> bytes:
+        started = time.perf_counter()
+        if self.compressor is None:
+            self.compressor = zlib.compressobj(self.level, zlib.DEFLATED, -zlib.MAX_WBITS, COMPRESSION_MEM_LEVEL)
+        body = self.compressor.compress(frame[BINARY_HEADER.size:]) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        self.stats["compress_seconds"] += time.perf_counter() - started
+        body = body[:-len(ZLIB_SYNC_TAIL)]
+        return BINARY_HEADER.pack(len(body) | COMPRESSED_FLAG) + body
+
+    def release(self, dictionary=b""):
+        """Frees the zlib state of an idle connection; the next compressed frame starts a new one. Every frame
+        ends on a sync flush, so the new compressor's blocks simply continue the peer's stream, they just can't
+        refer to the frames sent before. `dictionary` (the dictionary frame, if any) primes the new one again."""
+        self.compressor = None
+        if self.enabled:
+            self.dictionary = dictionary
+
+    def prime(self, frame: bytes) -> bytes:
+        """Compresses the dictionary frame. It is not counted when judging whether compression pays off."""
+        out = self._deflate(frame)
+        self.stats["raw_bytes"] += len(frame)
+        self.stats["wire_bytes"] += len(out)
+        return out
+
+    def pack(self, frame: bytes) -> bytes:
+        """Returns the frame to put on the wire: compressed if large enough and still worth it, else unchanged."""
+        self.stats["raw_bytes"] += len(frame)
+        if not self.enabled or len(frame) - BINARY_HEADER.size < self.min_bytes:
+            self.stats["plain_frames"] += 1
+            self.stats["wire_bytes"] += len(frame)
+            return frame
+        primer = b""
+        if self.dictionary:
+            primer, self.dictionary = self.prime(self.dictionary), b""
+        out = self._deflate(frame)
+        self.stats["compressed_frames"] += 1
+        self.stats["wire_bytes"] += len(out)
+        if self.stats["compressed_frames"] <= COMPRESSION_PROBE_FRAMES:
+            self._probe_raw += len(frame)
+            self._probe_wire += len(out)
+            if self.stats["compressed_frames"] == COMPRESSION_PROBE_FRAMES and self._probe_wire > self._probe_raw * COMPRESSION_MAX_RATIO:
+                self.enabled = False # Not worth the CPU for this connection's traffic
+        return primer + out
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `burst` tokens."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last_refill = time.monotonic()
+
+    def consume(self) -> bool:
+        """Takes one token if available. Returns False when the caller is over its rate."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class GuardedReader:
+    """Wraps an asyncio.StreamReader with a frame size cap, idle/read deadlines and optional rate limiting.
+
+    The underlying StreamReader should be created with limit=max_frame_bytes (see asyncio.start_server /
+    asyncio.open_connection) so a peer can never make us buffer more than about twice that amount.
+    Frames dropped by the rate limiter are never returned to the caller; they only show up in `stats`.
+    Set `protocol` to PROTOCOL_BINARY to switch from newline-delimited lines to length-prefixed frames.
+    """
+
+    def __init__(self, reader, max_frame_bytes, idle_timeout=None, read_timeout=None, rate=None, burst=None):
+        self.reader = reader
+        self.max_frame_bytes = max_frame_bytes
+        self.idle_timeout = idle_timeout
+        self.read_timeout = read_timeout
+        self.bucket = TokenBucket(rate, burst or 1) if rate else None
+        self.protocol = PROTOCOL_TEXT
+        self.decompressor = None # Set to zlib.decompressobj(-zlib.MAX_WBITS) once compression is negotiated
+        self.stats = {"frames": 0, "bytes_in": 0, "rate_limited": 0, "oversized": 0, "timeouts": 0}
+
+    async def _wait(self, awaitable, timeout, kind):
+        if timeout is None:
+            return await awaitable
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise ReadTimeout(f"{kind} timeout after {timeout}s")
+
+    async def read_message(self):
+        """Returns the next accepted message as (msg_type, fields), or None on EOF."""
+        if self.protocol == PROTOCOL_BINARY:
+            payload = await self._read_binary_frame()
+            return decode_binary(payload) if payload else None
+        line = await self.readline()
+        return decode_text(line.decode().strip()) if line else None
+
+    async def _read_binary_frame(self) -> bytes:
+        while True:
+            first = await self._wait(self.reader.read(1), self.idle_timeout, "Idle")
+            if not first:
+                return b""
+            try:
+                header = first + await self._wait(self.reader.readexactly(BINARY_HEADER.size - 1), self.read_timeout, "Read")
+                (length,) = BINARY_HEADER.unpack(header)
+                compressed = length & COMPRESSED_FLAG
+                length &= ~COMPRESSED_FLAG
+                if length > self.max_frame_bytes:
+                    self.stats["oversized"] += 1
+                    raise FrameTooLarge(f"Frame exceeds {self.max_frame_bytes} bytes")
+                payload = await self._wait(self.reader.readexactly(length), self.read_timeout, "Read")
+            except asyncio.IncompleteReadError:
+                return b"" # Peer closed mid-frame; a partial binary frame is useless
+            self.stats["frames"] += 1
+            self.stats["bytes_in"] += BINARY_HEADER.size + length
+            if compressed:
+                payload = self._inflate(payload)
+            if self.bucket and not self.bucket.consume():
+                self.stats["rate_limited"] += 1
+                continue
+            return payload
+
+    def _inflate(self, payload: bytes) -> bytes:
+        if self.decompressor is None:
+            raise ValueError("Compressed frame received but compression was not negotiated")
+        data = self.decompressor.decompress(payload + ZLIB_SYNC_TAIL, self.max_frame_bytes)
+        if self.decompressor.unconsumed_tail:
+            self.stats["oversized"] += 1
+            raise FrameTooLarge(f"Decompressed frame exceeds {self.max_frame_bytes} bytes")
+        return data
+
+    async def readline(self) -> bytes:
+        """Returns the next accepted line (including the trailing newline), or b"" on EOF."""
+        while True:
+            # Idle deadline: waiting for the first byte of the next frame
+            first = await self._wait(self.reader.read(1), self.idle_timeout, "Idle")
+            if not first:
+                return b""
+            if first == b"\n":
+                line = first
+            else:
+                # Read deadline: the rest of the frame must follow promptly
+                try:
+                    line = first + await self._wait(self.reader.readuntil(b"\n"), self.read_timeout, "Read")
+                except asyncio.LimitOverrunError:
+                    self.stats["oversized"] += 1
+                    raise FrameTooLarge(f"Frame exceeds {self.max_frame_bytes} bytes")
+                except asyncio.IncompleteReadError as e:
+                    line = first + e.partial # Peer closed mid-frame, hand back what we got like readline()
+            if len(line) > self.max_frame_bytes:
+                self.stats["oversized"] += 1
+                raise FrameTooLarge(f"Frame exceeds {self.max_frame_bytes} bytes")
+
+            self.stats["frames"] += 1
+            self.stats["bytes_in"] += len(line)
+            if self.bucket and not self.bucket.consume():
+                self.stats["rate_limited"] += 1
+                continue # Drop the frame without waking up any game logic
+            return line
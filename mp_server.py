@@ -1,33 +1,108 @@
+import argparse
 import asyncio
+import base64
+import hmac
 import json
+import os
 import random # For selecting first player if needed
+import secrets
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
+import mp_admin
+import mp_bots
+import mp_monitor
+import mp_spectators
+import player_profiles
+from mp_game import GameCore, VOTE_TIMEOUT_SECONDS
+from mp_trace import TraceRecorder, TRACE_IN, TRACE_EOF
+from story_catalog import StoryCatalog, DEFAULT_MEMORY_BUDGET, load_compiled_story
+from story_compiler import compile_role_tables
+from story_reachability import load_reachability
+
+from mp_protocol import (
+    GuardedReader, FrameTooLarge, ReadTimeout, FrameCompressor, encode_message, encode_text, build_compression_dictionary,
+    PROTOCOL_TEXT, PROTOCOL_BINARY, SUPPORTED_PROTOCOLS, COMPRESSION_ZLIB, MESSAGE_TYPES,
+    SERVER_MAX_FRAME_BYTES, SERVER_IDLE_TIMEOUT, SERVER_READ_TIMEOUT, COMMAND_RATE_PER_SEC, COMMAND_BURST, COMPRESSION_MIN_BYTES
+)
+
+# The story of the current table, bound by use_story() from game_state["story"]
 STORY_DATA = {}
+ROLE_TABLES = {} # Role bitmasks and per-role candidate choices of every node, see story_compiler.py
 MAX_PLAYERS = 0
+STORY_CATALOG = None # StoryCatalog when serving a directory of stories (--stories): each table picks its story
+STORY_MEMORY_BUDGET = DEFAULT_MEMORY_BUDGET # Estimated bytes of compiled stories the catalog keeps cached
+SERVED_STORY = None # Single-story mode: newest snapshot of the story file, which the next table plays
+STORY_WATCH_INTERVAL = 2.0 # Seconds between checks for changed story files (0: no hot reload)
+story_watch = {"task": None, "failed_version": None} # failed_version: mtime of a story file that failed to load (single-story mode)
 connected_clients = [] # List of (asyncio.StreamWriter, player_id_temp) before role selection
-players_data = {} # player_id: { "writer": writer, "role": role, "stats": {}, "inventory": [], "id": player_id }
+client_protocols = {} # player_id_temp: protocol of connections that haven't chosen a role yet
+players_data = {} # player_id: { "writer": writer, "protocol": "text"/"bin1", "compressor": FrameCompressor or None, "role": role, "id": player_id }; stats and inventory live in the GameCore
 player_id_counter = 1
+connection_stats = {} # temp_player_id: input counters from the connection's GuardedReader
+compression_stats = {} # temp_player_id: output counters from the connection's FrameCompressor
+client_streams = {} # temp_player_id: (GuardedReader, StreamWriter) of every live connection, for the admin socket
+resume_tokens = {} # token sent with ROLE_CONFIRMED: player_id, so a dropped player can RESUME their seat
+RESUME_GRACE_SECONDS = 60 # How long a dropped player's seat is held for them mid-game (0: no holding)
+RESUME_TOKEN_KEY = secrets.token_bytes(16) # Tokens are HMACs of a counter under this key; traces record it so replays issue the same ones
+resume_tokens_issued = 0
+MAX_SPECTATORS = 500 # Watch-only connections a table accepts on top of its players (see mp_spectators.py)
+PROFILE_DB = None # SQLite file of the persistent player profiles (see player_profiles.py), None leaves them off
+PROFILES = None # ProfileStore once opened
+profile_writer = {"task": None} # Write-behind task saving changed profiles in batches
+ADMIN_ADDRESS = None # Unix socket path or localhost port of the admin socket (--admin), off by default
+RECORD_PATH = None # Trace file every session is recorded to (--record, see mp_trace.py), off by default
+TRACE = None # TraceRecorder while recording
+SLOW_CALLBACK_SECONDS = 0 # Loop monitor threshold (see mp_monitor.py); 0 leaves the monitor off
+COMPRESSION_DICTIONARY = "" # Built from the story's texts when it is compiled, sent to a compressed connection before its first compressed frame
+HIBERNATE_AFTER = 300 # Seconds without any player or bot action after which a game in progress is moved to disk (0: never)
+HIBERNATE_DIR = "hibernated_tables" # Where hibernating tables are kept, one file per server process
+HIBERNATE_SWEEP_INTERVAL = 5 # Seconds between checks for an idle table
+hibernate_watch = {"task": None}
+
+# --- Bot players (off unless started with --bots) ---
+BOT_POLICIES = ["random", "greedy", "lookahead"]
+BOT_POLICY = None # Policy used for bots filling open roles and replacing players who drop mid-game
+BOT_FILL_DELAY = 20 # Seconds after the first human picks a role before bots take the remaining roles
+BOT_PROCESSES = 2 # Process pool size for the lookahead policy, which is CPU heavy
+bot_executor = None # Thread or process pool the policies run in, never the event loop
+bot_stats = {"decisions": 0, "latencies": deque(maxlen=1000)} # Latency in seconds of recent bot decisions
 
 game_state = {
-    "current_node_id": None,
-    "game_active": False,
-    "vote_in_progress": False,
-    "vote_choice_data": None,
+    "game": None, # GameCore of the table (see mp_game.py): seats, stats, inventories, turn, current node and votes
     "vote_timer_task": None,
-    "player_votes": {}, # player_id: "yes"/"no"
-    "current_turn_player_idx": 0,
-    "available_roles": []
+    "round_timer_task": None, # Deadline of the open round (stories played in simultaneous rounds)
+    "hibernated": None, # Path of the file holding the game while the table hibernates (the GameCore is then None)
+    "wake_task": None, # Task reading the hibernated game back, shared by everything waiting for it
+    "last_activity": 0.0, # time.monotonic() of the last command or bot action
+    "bot_fill_task": None,
+    "story": None # CompiledStory this table plays; in catalog mode None until the first player picks one
 }
 
 # --- Utility Functions ---
-async def broadcast(message, exclude_player_id=None, target_player_id=None):
-    """Sends a message to players. Can exclude one or target one."""
-    print(f"Broadcasting: {message} (Exclude: {exclude_player_id}, Target: {target_player_id})")
+async def broadcast(msg_type, *fields, exclude_player_id=None, target_player_id=None):
+    """Sends a message to players. Can exclude one or target one.
+    The message is encoded at most once per protocol mode, however many players receive it;
+    only the per-connection compression step (bin1 + zlib) is repeated per player."""
+    print(f"Broadcasting: {encode_text(msg_type, fields)} (Exclude: {exclude_player_id}, Target: {target_player_id})")
+    if target_player_id is None and exclude_player_id is None and msg_type in mp_spectators.PUBLIC_TYPES:
+        spectator_feed.publish(msg_type, fields) # Only queued: spectators are written to later, in one batch
+    frames = {} # protocol: encoded bytes
+    def frame_for(player):
+        protocol = player.get("protocol", PROTOCOL_TEXT)
+        if protocol not in frames:
+            frames[protocol] = encode_message(protocol, msg_type, fields)
+        if player.get("compressor"):
+            return player["compressor"].pack(frames[protocol])
+        return frames[protocol]
+
     if target_player_id:
         player = players_data.get(target_player_id)
         if player and player["writer"]:
             try:
-                player["writer"].write(f"{message}\n".encode())
+                player["writer"].write(frame_for(player))
                 await player["writer"].drain()
             except ConnectionResetError:
                 await handle_disconnect(target_player_id, player["writer"])
@@ -35,11 +110,11 @@ async def broadcast(message, exclude_player_id=None, target_player_id=None):
                 print(f"Error sending to {target_player_id}: {e}")
         return
 
-    for pid, player in players_data.items():
+    for pid, player in list(players_data.items()): # A failed write may remove players mid-loop
         if pid == exclude_player_id or not player["writer"]:
             continue
         try:
-            player["writer"].write(f"{message}\n".encode())
+            player["writer"].write(frame_for(player))
             await player["writer"].drain()
         except ConnectionResetError:
             await handle_disconnect(pid, player["writer"]) # Schedule disconnect handling
@@ -47,18 +122,63 @@ async def broadcast(message, exclude_player_id=None, target_player_id=None):
             print(f"Error broadcasting to {pid}: {e}")
 
 
-async def send_to_player(player_id, message):
-    await broadcast(message, target_player_id=player_id)
+async def send_to_player(player_id, msg_type, *fields):
+    await broadcast(msg_type, *fields, target_player_id=player_id)
+
+async def send_direct(writer, protocol, msg_type, *fields):
+    """Sends a message on a connection that may not have a players_data entry yet.
+    Never compressed: frames that bypass the compressor leave its stream untouched, so this is always safe."""
+    writer.write(encode_message(protocol, msg_type, fields))
+    await writer.drain()
+
+async def dispatch(events):
+    """Sends the events a GameCore command returned, in order, and starts what they call for: the vote timer and
+    bot votes on VOTE_START, the round timer on ROUND_START, a bot's decision when it gets its choices, closing the
+    table on GAME_END."""
+    if events and events[-1][0] == "GAME_END":
+        for player_data in players_data.values(): # Before any await: players can drop while the last events go out
+            record_profile_game(player_data, events[-1][1][0])
+    game = table_game()
+    for msg_type, fields, target_player_id, exclude_player_id in events:
+        if msg_type == "GAME_END":
+            await close_table(*fields)
+            return
+        await broadcast(msg_type, *fields, exclude_player_id=exclude_player_id, target_player_id=target_player_id)
+        if msg_type == "VOTE_START":
+            start_timer("vote_timer_task", vote_timeout_logic, VOTE_TIMEOUT_SECONDS)
+            for pid, player in list(players_data.items()):
+                if player.get("bot"):
+                    schedule_bot_vote(pid)
+        elif msg_type == "ROUND_START":
+            start_timer("round_timer_task", round_timeout_logic, game.round_seconds)
+        elif msg_type == "VOTE_RESULT":
+            cancel_timer("vote_timer_task") # Everyone voted before the timeout
+        elif msg_type == "ROUND_RESULT":
+            cancel_timer("round_timer_task")
+        elif msg_type == "ACTIVE_PLAYER_CHOICES" and players_data.get(target_player_id, {}).get("bot") and game.may_choose(target_player_id):
+            schedule_bot_turn(target_player_id, [idx for idx, _ in game.available_choices(target_player_id)])
+
+def start_timer(name, timeout_logic, seconds):
+    cancel_timer(name)
+    game_state[name] = asyncio.create_task(timeout_logic(seconds))
+
+def cancel_timer(name):
+    """Cancels the vote or round timer, unless it is the task running this (a timer resolving its own deadline)."""
+    task = game_state[name]
+    if task and not task.done() and task is not asyncio.current_task():
+        task.cancel()
 
 async def end_game(reason="Game ended."):
-    if not game_state["game_active"]:
-        return
-    game_state["game_active"] = False
-    game_state["vote_in_progress"] = False
-    if game_state["vote_timer_task"] and not game_state["vote_timer_task"].done():
-        game_state["vote_timer_task"].cancel()
-    
-    await broadcast(f"GAME_END:{reason}")
+    if await wake_table():
+        await dispatch(table_game().end(reason))
+
+async def close_table(reason):
+    """Sends GAME_END, disconnects everyone and resets the table for the next game."""
+    cancel_timer("vote_timer_task")
+    cancel_timer("round_timer_task")
+
+    await broadcast("GAME_END", reason)
+    spectator_feed.close_all()
     for pid, player_data in list(players_data.items()): # Iterate over a copy for modification
         writer = player_data["writer"]
         if writer and not writer.is_closing():
@@ -69,13 +189,18 @@ async def end_game(reason="Game ended."):
                 print(f"Error during writer close for {pid}: {e}")
     
     # Reset server state for a potential new game (simplified for PoC)
+    for player_data in players_data.values():
+        if player_data.get("away_task") and player_data["away_task"] is not asyncio.current_task():
+            player_data["away_task"].cancel()
     connected_clients.clear()
     players_data.clear()
+    resume_tokens.clear()
     global player_id_counter
     player_id_counter = 1 # Reset for new connections if server stays up
-    game_state["current_node_id"] = None
-    game_state["current_turn_player_idx"] = 0
-    game_state["available_roles"] = list(STORY_DATA.get("player_character_templates", {}).keys())
+    release_story() # A new GameCore for the next table
+    if game_state["bot_fill_task"] and not game_state["bot_fill_task"].done():
+        game_state["bot_fill_task"].cancel()
+    game_state["bot_fill_task"] = None
 
 
     print(f"Game ended: {reason}. Server ready for new connections if applicable.")
@@ -91,13 +216,29 @@ def get_player_by_writer(writer_to_find):
             return temp_id, {"writer": writer, "id": temp_id} # Partial data for temp client
     return None, None
 
+@mp_monitor.labelled("disconnect")
 async def handle_disconnect(player_id, writer):
     print(f"Player {player_id} disconnected or connection error.")
     
-    # Remove from active players
+    # Remove from active players, or hand their seat to a bot so the table can keep playing
     if player_id in players_data:
-        del players_data[player_id]
-        await broadcast(f"PLAYER_LEFT:{player_id} has left the game.")
+        await wake_table() # If the game can't be restored, the table is closed and the player is gone
+    if player_id in players_data:
+        player = players_data[player_id]
+        game = table_game()
+        if RESUME_GRACE_SECONDS and game.active and player["writer"] is writer and player.get("token"):
+            player.update(writer=None, compressor=None, away_task=asyncio.create_task(release_held_seat(player_id)))
+            await broadcast("INFO", f"{player_id} lost their connection. Their seat is held for {RESUME_GRACE_SECONDS:g}s.")
+        elif BOT_POLICY and game.active and player["writer"] is writer and has_human_players(exclude_player_id=player_id):
+            player.update(writer=None, compressor=None, bot=BOT_POLICY)
+            await broadcast("PLAYER_LEFT", f"{player_id} has left the game. A bot takes over their role.")
+            resume_bot(player_id)
+        elif player["writer"] is writer:
+            if game.active:
+                record_profile_game(player, "Left the game.")
+            unseat_player(player_id) # Before the game starts, someone else can pick the role
+            resume_tokens.pop(player.get("token"), None)
+            await broadcast("PLAYER_LEFT", f"{player_id} has left the game.")
     
     # Remove from temporary connections if they hadn't chosen a role yet
     client_to_remove = None
@@ -117,236 +258,484 @@ async def handle_disconnect(player_id, writer):
         except Exception as e:
             print(f"Error closing writer for {player_id}: {e}")
 
-    if game_state["game_active"] and len(players_data) < MAX_PLAYERS:
+    game_active = table_active()
+    if game_active and len(players_data) < MAX_PLAYERS:
         await end_game(f"Player {player_id} disconnected. Not enough players to continue.")
-    elif not game_state["game_active"] and len(players_data) < MAX_PLAYERS:
+    elif game_active and not has_human_players():
+        await end_game("All human players have left.")
+    elif not game_active and len(players_data) < MAX_PLAYERS:
         # If game hasn't started, just update available roles if the player had picked one (not implemented here)
         print("A player disconnected before the game started.")
+        if STORY_CATALOG and not players_data and not connected_clients:
+            release_story() # Empty table: the next one picks its own story
+
 
+def get_server_stats():
+    """Returns per-connection input counters and compression ratios, plus input totals across all live connections."""
+    totals = {}
+    connections = {}
+    for cid, stats in connection_stats.items():
+        for key, value in stats.items():
+            totals[key] = totals.get(key, 0) + value
+        connections[cid] = dict(stats)
+        out_stats = compression_stats.get(cid)
+        if out_stats:
+            ratio = out_stats["wire_bytes"] / out_stats["raw_bytes"] if out_stats["raw_bytes"] else 1.0
+            connections[cid]["compression"] = dict(out_stats, ratio=round(ratio, 3))
+    latencies = sorted(bot_stats["latencies"])
+    bots = {"decisions": bot_stats["decisions"]}
+    if latencies:
+        bots.update(avg_ms=round(1000 * sum(latencies) / len(latencies), 3),
+                    p95_ms=round(1000 * latencies[int(0.95 * (len(latencies) - 1))], 3),
+                    max_ms=round(1000 * latencies[-1], 3))
+    loop = mp_monitor.get_loop_stats() if mp_monitor.monitor_state["installed"] else None
+    return {"connections": connections, "totals": totals, "bots": bots, "loop": loop, "spectators": spectator_feed.get_stats(),
+            "profiles": PROFILES.get_stats() if PROFILES else None}
 
-# --- Game Logic Functions ---
-def apply_effects_to_player(player_id, effects_list):
+def get_session_dump(args=None):
+    """Table state, players, and the read/write queue depths of every connection (admin 'sessions' command)."""
+    story, game = game_state["story"], game_state["game"] # Looking doesn't wake a hibernated table
+    table = {"story": story and {"id": story.story_id, "version": story.version}, "hibernated": game_state["hibernated"]}
+    if game:
+        table.update(game_active=game.active, current_node_id=game.node_id,
+                     turn=game.current_player(), vote_in_progress=game.vote_in_progress(),
+                     votes=len(game.votes), round_open=game.round_choices is not None, round_submitted=len(game.submitted),
+                     available_roles=game.available_roles)
+    players = {pid: {"role": p["role"], "bot": p.get("bot"), "connected": p["writer"] is not None, "held": bool(p.get("away_task")),
+                     "protocol": p["protocol"]}
+               for pid, p in players_data.items()}
+    if game:
+        for pid, player in players.items():
+            player.update(stats=game.players[pid]["stats"], inventory=game.players[pid]["inventory"])
+    connections = {}
+    for temp_id, (guarded_reader, writer) in client_streams.items():
+        player_id, _ = get_player_by_writer(writer)
+        transport = writer.transport
+        connections[temp_id] = {"player": player_id, "protocol": guarded_reader.protocol,
+                                "read_buffer": len(getattr(guarded_reader.reader, "_buffer", b"")), # Bytes received, not yet parsed
+                                "write_buffer": transport.get_write_buffer_size() if not transport.is_closing() else 0,
+                                "input": dict(guarded_reader.stats)}
+    return {"table": table, "players": players, "connections": connections,
+            "waiting_for_role": [temp_id for _, temp_id in connected_clients], "spectators": len(spectator_feed.spectators)}
+
+
+# --- Game Logic Functions (the rules themselves are in mp_game.py) ---
+def unseat_player(player_id):
+    """Removes a player's connection state and their seat in the game. Before the game starts, the role is free again."""
+    table_game().remove_player(player_id)
+    return players_data.pop(player_id)
+
+async def start_game():
+    """Starts the adventure once every role is taken (by players or bots)."""
+    if game_state["bot_fill_task"] and not game_state["bot_fill_task"].done() and game_state["bot_fill_task"] is not asyncio.current_task():
+        game_state["bot_fill_task"].cancel()
+    await dispatch(table_game().start())
+
+
+# --- Resumable Sessions ---
+def issue_resume_token(player_id):
+    global resume_tokens_issued
+    resume_tokens_issued += 1
+    digest = hmac.new(RESUME_TOKEN_KEY, f"{resume_tokens_issued}:{player_id}".encode(), "sha256").digest()
+    token = base64.urlsafe_b64encode(digest[:16]).rstrip(b"=").decode()
+    players_data[player_id]["token"] = token
+    resume_tokens[token] = player_id
+    return token
+
+def reclaimable_seats():
+    """Seats whose player dropped mid-game (held, or played by a bot) and may come back with RESUME."""
+    return sum(1 for p in players_data.values() if not p["writer"] and p.get("token"))
+
+@mp_monitor.labelled("seat expiry")
+async def release_held_seat(player_id):
+    """Gives up a dropped player's seat once the grace period is over: a bot takes it if enabled, else the player leaves."""
+    await asyncio.sleep(RESUME_GRACE_SECONDS)
+    if not await wake_table():
+        return
     player = players_data.get(player_id)
-    if not player or not effects_list:
+    if not player or player["writer"] or not table_game().active:
         return
+    player["away_task"] = None
+    if BOT_POLICY and has_human_players(exclude_player_id=player_id):
+        player["bot"] = BOT_POLICY # The token stays valid: the player can still take the seat back from the bot
+        await broadcast("PLAYER_LEFT", f"{player_id} has left the game. A bot takes over their role.")
+        resume_bot(player_id)
+        return
+    record_profile_game(player, "Left the game.")
+    unseat_player(player_id)
+    resume_tokens.pop(player["token"], None)
+    await broadcast("PLAYER_LEFT", f"{player_id} has left the game.")
+    if len(players_data) < MAX_PLAYERS:
+        await end_game(f"Player {player_id} did not come back. Not enough players to continue.")
+    elif not has_human_players():
+        await end_game("All human players have left.")
 
-    for effect in effects_list:
-        effect_type = effect.get("type")
-        if effect_type == "stat_change":
-            stat_name = effect.get("stat")
-            if stat_name:
-                change_by = effect.get("change_by")
-                set_to = effect.get("set_to")
-                if change_by is not None:
-                    player["stats"][stat_name] = player["stats"].get(stat_name, 0) + change_by
-                elif set_to is not None:
-                    player["stats"][stat_name] = set_to
-                print(f"Applied stat_change to {player_id}: {stat_name} now {player['stats'][stat_name]}")
-        elif effect_type == "inventory_change":
-            item_name = effect.get("item")
-            action = effect.get("action")
-            if item_name and action:
-                if action == "add" and item_name not in player["inventory"]:
-                    player["inventory"].append(item_name)
-                    print(f"Applied inventory_change to {player_id}: added {item_name}")
-                elif action == "remove" and item_name in player["inventory"]:
-                    player["inventory"].remove(item_name)
-                    print(f"Applied inventory_change to {player_id}: removed {item_name}")
-    
-    # Broadcast player update
-    updated_data = {"stats": player["stats"], "inventory": player["inventory"]}
-    asyncio.create_task(broadcast(f"PLAYER_UPDATE:{player_id}:{json.dumps(updated_data)}"))
+def build_catch_up(player_id) -> dict:
+    """Everything a resuming player needs to pick the game up where it is, instead of the history they missed."""
+    game = table_game()
+    seat = game.players[player_id]
+    current_player_id = game.current_player()
+    state = {"player": player_id, "role": seat["role"], "node_id": game.node_id, "text": game.node_text(),
+             "stats": seat["stats"], "inventory": seat["inventory"], "turn": current_player_id}
+    if game.vote_in_progress():
+        state["vote"] = {"text": game.vote_choice["text"], "voted": player_id in game.votes}
+    elif game.may_choose(player_id):
+        available = game.round_choices[player_id] if game.round_choices is not None else game.available_choices(player_id)
+        state["choices"] = [f"{i+1}. {c['text']}" for i, (_, c) in enumerate(available)]
+    return state
 
+async def resume_seat(player_id, writer, protocol, compressor):
+    """Hands a held (or bot-played) seat back to its player on a new connection and sends one STATE catch-up frame."""
+    player = players_data[player_id]
+    old_writer = player["writer"]
+    if player.get("away_task"):
+        player["away_task"].cancel()
+    player.update(writer=writer, protocol=protocol, compressor=compressor, bot=None, away_task=None)
+    if old_writer and not old_writer.is_closing():
+        old_writer.close() # Half-open previous connection: the newest one wins, its handler won't touch the seat
+    await send_to_player(player_id, "STATE", json.dumps(build_catch_up(player_id)))
+    await broadcast("INFO", f"{player_id} is back.", exclude_player_id=player_id)
+
+
+# --- Player Profiles ---
+def describe_profile(profile):
+    if not profile["games_played"]:
+        return f"New profile '{profile['name']}': your games will be saved to it."
+    role = player_profiles.preferred_role(profile)
+    available = " (available)" if role in table_game().available_roles else ""
+    return (f"Welcome back, {profile['name']}: {profile['games_played']} games played, {profile['games_finished']} finished. "
+            f"Preferred role: {role}{available}.")
+
+def record_profile_game(player, result):
+    """Adds the game to the player's profile, if they gave one. Memory only, the profile writer saves it later."""
+    if not PROFILES or not player.get("profile"):
+        return
+    game = table_game()
+    player["profile"] = PROFILES.record_game(player["profile"], game_state["story"].story_id, player["role"], game.node_id,
+                                             game.at_ending(), result)
+
+async def open_profiles(path):
+    """Opens the profile database and starts its write-behind task. Profiles stay off if the database can't be opened."""
+    global PROFILES
+    store = player_profiles.ProfileStore(path)
+    try:
+        await store.open()
+    except sqlite3.Error as e:
+        print(f"Error: can't open the player profile database {path}: {e}. Profiles are off.")
+        return
+    PROFILES = store
+    profile_writer["task"] = asyncio.create_task(store.run_writer())
+
+async def close_profiles():
+    """Stops the writer and saves whatever is still pending."""
+    global PROFILES
+    if profile_writer["task"]:
+        profile_writer["task"].cancel()
+        profile_writer["task"] = None
+    if PROFILES:
+        store, PROFILES = PROFILES, None
+        await store.close()
 
-def check_conditions_for_player(player_id, conditions_list):
-    player = players_data.get(player_id)
-    if not player or not conditions_list:
-        return True # No conditions means they are met
-
-    for condition in conditions_list:
-        condition_type = condition.get("type")
-        if condition_type == "stat_condition":
-            stat_name = condition.get("stat")
-            current_val = player["stats"].get(stat_name, 0)
-            if condition.get("requires_greater_than") is not None and not current_val > condition["requires_greater_than"]: return False
-            if condition.get("requires_less_than") is not None and not current_val < condition["requires_less_than"]: return False
-            if condition.get("requires_equal_to") is not None and not current_val == condition["requires_equal_to"]: return False
-        elif condition_type == "inventory_condition":
-            item_name = condition.get("item")
-            requirement = condition.get("requires")
-            if requirement == "present" and item_name not in player["inventory"]: return False
-            if requirement == "absent" and item_name in player["inventory"]: return False
-    return True
 
-def get_current_player_id():
-    if not players_data or not game_state["game_active"]:
-        return None
-    player_ids = list(players_data.keys())
-    return player_ids[game_state["current_turn_player_idx"]]
+# --- Spectators ---
+def spectator_scene():
+    """What a spectator needs to follow the table from now on: the current node, whose turn it is and any vote."""
+    game = table_game()
+    if game is None: # Hibernating: nothing has happened since the spectators' last events
+        return [("INFO", ["The table is idle. You will see the game as soon as it moves on."])]
+    if not game.active:
+        return [("INFO", ["The game hasn't started yet. You will see it from the first turn."])]
+    scene = [("NODE_TEXT", [game.node_text()]), ("TURN", [game.current_player()])]
+    if game.vote_in_progress():
+        scene.append(("INFO", [f"A vote is in progress: '{game.vote_choice['text']}'."]))
+    return scene
 
-def advance_turn():
-    game_state["current_turn_player_idx"] = (game_state["current_turn_player_idx"] + 1) % len(players_data)
-    current_player_id = get_current_player_id()
-    if current_player_id:
-        asyncio.create_task(broadcast(f"TURN:{current_player_id}"))
-        asyncio.create_task(send_to_player(current_player_id, "YOUR_TURN:It's your turn to act."))
+spectator_feed = mp_spectators.SpectatorFeed(spectator_scene)
 
 
-async def send_node_to_players(acting_player_id_override=None):
-    """acting_player_id_override is for when an action immediately leads to a new state for the same player"""
-    if not game_state["current_node_id"] or not game_state["game_active"]:
+# --- Bot Players ---
+def has_human_players(exclude_player_id=None):
+    """Players on a held seat count: they may still come back."""
+    return any(p["writer"] or p.get("away_task") for pid, p in players_data.items() if pid != exclude_player_id)
+
+async def run_bot_decision(func, *args):
+    """Runs a policy function in the bot executor and records how long the decision took."""
+    started = time.perf_counter()
+    result = await asyncio.get_running_loop().run_in_executor(bot_executor, func, *args)
+    bot_stats["decisions"] += 1
+    bot_stats["latencies"].append(time.perf_counter() - started)
+    return result
+
+def bot_story_reference():
+    """The table's snapshot as the policies receive it (processes load it themselves, see mp_bots.py)."""
+    return mp_bots.story_reference(game_state["story"], for_process_pool=isinstance(bot_executor, ProcessPoolExecutor))
+
+@mp_monitor.labelled("bot turn")
+async def bot_turn(player_id, candidate_indices):
+    if not await wake_table():
+        return
+    game = table_game()
+    seat = game.players[player_id]
+    node_id = game.node_id
+    choice_pos = await run_bot_decision(mp_bots.choose_action, players_data[player_id]["bot"], bot_story_reference(), node_id, seat["role"],
+                                        dict(seat["stats"]), list(seat["inventory"]), candidate_indices)
+    # The table may have moved on while the policy was thinking (game ended, player came back, table hibernated...)
+    if not await wake_table():
         return
+    game = table_game()
+    if game.may_choose(player_id) and game.node_id == node_id and players_data[player_id].get("bot"):
+        touch_table()
+        await dispatch(game.choose(player_id, choice_pos))
 
-    node_data = STORY_DATA['nodes'].get(game_state["current_node_id"])
-    if not node_data:
-        await end_game(f"Error: Node '{game_state['current_node_id']}' not found.")
+@mp_monitor.labelled("bot vote")
+async def bot_vote(player_id):
+    if not await wake_table():
         return
+    game = table_game()
+    seat = game.players[player_id]
+    node_id = game.node_id
+    vote_value = await run_bot_decision(mp_bots.choose_vote, players_data[player_id]["bot"], bot_story_reference(), node_id, seat["role"],
+                                        dict(seat["stats"]), list(seat["inventory"]))
+    if not await wake_table():
+        return
+    game = table_game()
+    if game.vote_in_progress() and game.node_id == node_id and player_id in players_data \
+            and players_data[player_id].get("bot"):
+        touch_table()
+        await dispatch(game.vote(player_id, vote_value))
 
-    current_player_id_for_node = acting_player_id_override if acting_player_id_override else get_current_player_id()
-    
-    # Text replacement
-    node_text = node_data['text']
-    if current_player_id_for_node: # Might be None if game ending
-        node_text = node_text.replace("{current_player_name}", players_data[current_player_id_for_node]['role']) # Use role as name for now
-        node_text = node_text.replace("{acting_player_name}", players_data[current_player_id_for_node]['role']) 
-    
-    await broadcast(f"NODE_TEXT:{node_text}")
+def schedule_bot_turn(player_id, candidate_indices):
+    asyncio.create_task(bot_turn(player_id, candidate_indices))
+
+def schedule_bot_vote(player_id):
+    asyncio.create_task(bot_vote(player_id))
 
-    if not node_data.get('choices'):
-        await end_game("Story ended: No more choices.")
+def resume_bot(player_id):
+    """Lets a bot that just took over a seat act on whatever the table is currently waiting for."""
+    game = table_game()
+    if game.vote_in_progress():
+        if player_id not in game.votes:
+            schedule_bot_vote(player_id)
+    elif game.may_choose(player_id):
+        available_choices = game.available_choices(player_id)
+        if available_choices:
+            schedule_bot_turn(player_id, [idx for idx, _ in available_choices])
+
+@mp_monitor.labelled("bot fill")
+async def fill_with_bots(delay):
+    """Gives every role still open after `delay` seconds to a bot, then starts the game."""
+    await asyncio.sleep(delay)
+    game = table_game()
+    if game.active or not has_human_players():
         return
+    for role in list(game.available_roles):
+        game.add_player(role, role)
+        players_data[role] = {
+            "writer": None,
+            "protocol": PROTOCOL_TEXT,
+            "compressor": None,
+            "role": role,
+            "id": role,
+            "bot": BOT_POLICY
+        }
+        await broadcast("PLAYER_JOINED", f"{role} has joined the game (bot).")
+    if len(players_data) >= MAX_PLAYERS:
+        await start_game()
 
-    # Check for voting choices first
-    voting_choice = next((c for c in node_data['choices'] if c.get("requires_vote")), None)
-    if voting_choice:
-        if game_state["vote_in_progress"]: return # Should not happen
-        game_state["vote_in_progress"] = True
-        game_state["vote_choice_data"] = voting_choice
-        game_state["player_votes"] = {}
-        timeout = 30
-        await broadcast(f"VOTE_START:{voting_choice['text']}:timeout={timeout}")
-        if game_state["vote_timer_task"] and not game_state["vote_timer_task"].done():
-            game_state["vote_timer_task"].cancel()
-        game_state["vote_timer_task"] = asyncio.create_task(vote_timeout_logic(timeout))
-    else: # Individual choices
-        if not current_player_id_for_node: # Should not happen if game active
-             print("Error: No current player for individual choices.")
-             return
-
-        active_player_role = players_data[current_player_id_for_node]["role"]
-        available_choices_for_player = []
-        for idx, choice_data in enumerate(node_data['choices']):
-            conditions_met = check_conditions_for_player(current_player_id_for_node, choice_data.get("conditions"))
-            role_match = True # Assume true unless actionable_by_roles is present
-            if "actionable_by_roles" in choice_data:
-                role_match = active_player_role in choice_data["actionable_by_roles"]
-            
-            if conditions_met and role_match:
-                available_choices_for_player.append({"text": choice_data['text'], "original_index": idx})
-        
-        if available_choices_for_player:
-            choices_str = "|".join([f"{i+1}. {c['text']}" for i, c in enumerate(available_choices_for_player)])
-            await send_to_player(current_player_id_for_node, f"ACTIVE_PLAYER_CHOICES:{choices_str}")
-        else:
-            await send_to_player(current_player_id_for_node, "INFO:No actions available for you this turn or for your role.")
-            # Potentially auto-advance turn if no choices for current player
-            # For now, this might stall if a player has no choices.
-            # A more robust system would check this or have a default "pass" action.
-            await asyncio.sleep(1) # Give a moment
-            advance_turn()
-            await send_node_to_players() # Send next player the node
+def create_bot_executor(policy):
+    """Lookahead is CPU heavy, so it gets processes (no GIL contention with the event loop); the others use threads."""
+    if policy == "lookahead":
+        return ProcessPoolExecutor(max_workers=BOT_PROCESSES)
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="bot")
 
 
+@mp_monitor.labelled("vote timeout")
 async def vote_timeout_logic(timeout_seconds):
     await asyncio.sleep(timeout_seconds)
-    if game_state["vote_in_progress"]:
+    if not await wake_table(): # A hibernating table's timers keep running
+        return
+    if table_game().vote_in_progress():
         print("Vote timed out.")
-        await broadcast("VOTE_TIMEOUT:The vote has timed out.")
-        await process_vote_outcome()
-
-async def process_vote_outcome():
-    if not game_state["vote_in_progress"]: return
-
-    game_state["vote_in_progress"] = False
-    yes_votes = sum(1 for vote in game_state["player_votes"].values() if vote == "yes")
-    no_votes = sum(1 for vote in game_state["player_votes"].values() if vote == "no")
-    total_players_with_roles = len(players_data) # Count players who have selected roles
-
-    outcome_message = ""
-    vote_passed = False
-
-    if len(game_state["player_votes"]) == total_players_with_roles: # All voted
-        if yes_votes > no_votes: # Majority wins
-            vote_passed = True
-        outcome_message = f"Vote for '{game_state['vote_choice_data']['text']}' {'passed' if vote_passed else 'failed'}! ({yes_votes} yes, {no_votes} no)"
-    else: # Timeout or not all voted
-        # PoC: if not everyone votes, it fails (could be majority of actual votes cast too)
-        vote_passed = False 
-        outcome_message = f"Vote for '{game_state['vote_choice_data']['text']}' timed out or not all voted, outcome: failed. ({yes_votes} yes, {no_votes} no, {total_players_with_roles - len(game_state['player_votes'])} did not vote)"
-    
-    await broadcast(f"VOTE_RESULT:{'passed' if vote_passed else 'failed'}:{outcome_message}")
-    game_state["player_votes"] = {}
-
-    target_node = None
-    if vote_passed:
-        target_node = game_state["vote_choice_data"].get("target_node_id")
-        # Apply global effects of the vote (if any) - not player specific
-        if "effects" in game_state["vote_choice_data"]:
-            # These are global effects. For PoC, assume they are handled by story (e.g. team_morale)
-            # or apply to all players if that's the design.
-            # For now, we'll just print them. A real system needs a target for these effects.
-            print(f"Global effects for passed vote: {game_state['vote_choice_data']['effects']}")
-            # Example: for effect in game_state["vote_choice_data"]["effects"]: if effect["stat"] == "team_morale": update_global_stat("team_morale", ...)
-    else: # Vote failed
-        current_node_data = STORY_DATA['nodes'][game_state["current_node_id"]]
-        # Find a fallback choice if vote fails (e.g., a choice not requiring a vote or a default path)
-        # This part of logic needs refinement based on story design.
-        # For mp_story_phase1, there isn't an explicit "else" path for the vote.
-        # We might just re-present the node or end if no alternative.
-        # For now, let's assume the story continues from the same node, and it's next player's turn.
-        await broadcast("INFO:The vote failed. The situation remains.")
-        # No target_node means we stay, advance turn and re-evaluate.
-
-
-    if target_node:
-        game_state["current_node_id"] = target_node
-    
-    # Whether vote passed or failed, it's usually the end of the "group action" part of the turn.
-    # Advance turn and send new node state.
-    advance_turn() 
-    await send_node_to_players()
+        await dispatch(table_game().vote_timeout())
+
+@mp_monitor.labelled("round timeout")
+async def round_timeout_logic(timeout_seconds):
+    await asyncio.sleep(timeout_seconds)
+    if not await wake_table():
+        return
+    if table_game().round_choices is not None:
+        print("Round timed out.")
+        await dispatch(table_game().round_timeout())
+
+
+def build_story_dictionary(story_data):
+    """Builds the compression dictionary from node and choice texts, most frequently sent last.
+    A node's text is sent every time a choice leads to it, so nodes are weighted by how many choices target them.
+    Only nodes a start node leads to are used, and never the endings, so the dictionary gives no ending away.
+    Returns "" if no node or choice list of the story is long enough to ever be compressed."""
+    nodes = story_data.get("nodes", {})
+    starts = [story_data.get("start_node_id")]
+    starts += [template.get("start_node_id") for template in story_data.get("player_character_templates", {}).values()]
+    reached = {node_id for node_id in starts if node_id in nodes}
+    pending = list(reached)
+    incoming = {}
+    choice_texts = []
+    largest_frame = 0
+    while pending:
+        node = nodes[pending.pop()]
+        choices = node.get("choices", [])
+        largest_frame = max(largest_frame, len(node.get("text", "").encode()),
+                            sum(len(choice.get("text", "").encode()) + 4 for choice in choices)) # "N. " and a separator
+        for choice in choices:
+            target = choice.get("target_node_id")
+            incoming[target] = incoming.get(target, 0) + 1
+            choice_texts.append(choice.get("text", ""))
+            if target in nodes and target not in reached:
+                reached.add(target)
+                pending.append(target)
+    if largest_frame < COMPRESSION_MIN_BYTES:
+        return ""
+    visible = sorted((node_id for node_id in reached if nodes[node_id].get("choices")), key=lambda node_id: incoming.get(node_id, 0))
+    return build_compression_dictionary(choice_texts + [nodes[node_id].get("text", "") for node_id in visible])
+
+def dictionary_frame(protocol):
+    """The frame that primes a seated player's compressed stream, or b"" if the story has no dictionary."""
+    if not COMPRESSION_DICTIONARY:
+        return b""
+    return encode_message(protocol, "COMPRESSION_DICT", [COMPRESSION_DICTIONARY])
+
+
+# --- Table Hibernation ---
+def table_game():
+    """The table's GameCore, None while the table hibernates. Whatever may run on a hibernating table (a message,
+    a disconnect, a timer, a bot decision) awaits wake_table() first."""
+    return game_state["game"]
+
+def table_active():
+    """Whether a game is in progress, without waking a hibernating table (only games in progress hibernate)."""
+    return bool(game_state["hibernated"]) or game_state["game"].active
+
+def touch_table():
+    game_state["last_activity"] = time.monotonic()
+
+def write_table_file(path, data):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def read_table_file(path):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    os.remove(path)
+    return data
+
+async def hibernate_table():
+    """Moves the idle game to disk: current node, turn, votes or round choices, seats with their stats and
+    inventories. The GameCore and the zlib state of compressed connections are freed. The vote or round timer
+    keeps running and wakes the table when it fires; connections, held seats and the story snapshot stay."""
+    game = game_state["game"]
+    data = json.dumps({"game": game.to_json()})
+    path = os.path.join(HIBERNATE_DIR, f"table_{os.getpid()}.json")
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, write_table_file, path, data)
+    except OSError as e:
+        print(f"Error: can't hibernate the table to {path}: {e}")
+        return
+    if game_state["game"] is not game or json.dumps({"game": game.to_json()}) != data:
+        os.remove(path) # The game moved on while the file was written: it isn't idle any more
+        return
+    game_state["game"] = None
+    game_state["hibernated"] = path
+    for player in players_data.values():
+        if player.get("compressor"):
+            player["compressor"].release(dictionary_frame(player["protocol"]))
+    print(f"Table hibernated to {path} after {HIBERNATE_AFTER:g}s without activity.")
+
+async def wake_table():
+    """Reads a hibernating game back (off the event loop); does nothing if the table is awake. Returns False if
+    the game could not be restored: the table has then been closed, and there is no game left to act on."""
+    if not game_state["hibernated"]:
+        return True
+    if game_state["wake_task"] is None: # Everything that needs the game meanwhile waits for the same read
+        game_state["wake_task"] = asyncio.create_task(restore_table(game_state["hibernated"]))
+    return await asyncio.shield(game_state["wake_task"])
+
+async def restore_table(path):
+    try:
+        data = await asyncio.get_running_loop().run_in_executor(None, read_table_file, path)
+        game = GameCore.from_json(STORY_DATA, ROLE_TABLES, data["game"])
+        if set(game.players) != set(players_data):
+            raise ValueError("its seats don't match the players at the table")
+    except (OSError, ValueError, KeyError, IndexError, TypeError) as e:
+        print(f"Error: can't wake the table from {path}: {e}")
+        try:
+            await close_table("The game could not be restored after a pause.")
+        finally:
+            game_state["hibernated"] = game_state["wake_task"] = None
+        return False
+    game_state["game"] = game
+    game_state["hibernated"] = game_state["wake_task"] = None
+    print("Table woken up.")
+    return True
 
+@mp_monitor.labelled("hibernation")
+async def watch_idle_table():
+    """Hibernates the table once its game has gone HIBERNATE_AFTER seconds without a command or bot action."""
+    while True:
+        await asyncio.sleep(HIBERNATE_SWEEP_INTERVAL)
+        game = game_state["game"]
+        if game and game.active and time.monotonic() - game_state["last_activity"] >= HIBERNATE_AFTER:
+            await hibernate_table()
 
 # --- Network Handling ---
+@mp_monitor.labelled("connect")
 async def handle_client_connection(reader, writer):
     global player_id_counter, MAX_PLAYERS, game_state
     
     temp_player_id = f"Player_{player_id_counter}"
     player_id_counter += 1
+    if TRACE:
+        writer = TRACE.wrap(writer)
     addr = writer.get_extra_info('peername')
     print(f"Incoming connection from {addr}, temp ID: {temp_player_id}")
 
-    if len(players_data) + len(connected_clients) >= MAX_PLAYERS and not any(w == writer for w, _ in connected_clients):
+    # Held seats count as taken: only their owner may come back to them, with RESUME
+    watch_only = len(players_data) + len(connected_clients) >= table_capacity() and not any(w == writer for w, _ in connected_clients)
+    if watch_only and not reclaimable_seats() and len(spectator_feed.spectators) >= MAX_SPECTATORS:
         print(f"Refusing connection from {addr}: server full.")
-        writer.write("SERVER_FULL:Server is full.\n".encode())
-        await writer.drain()
+        await send_direct(writer, PROTOCOL_TEXT, "SERVER_FULL", "Server is full.")
         writer.close(); await writer.wait_closed()
         return
 
-    connected_clients.append((writer, temp_player_id))
-    writer.write(f"WELCOME:{temp_player_id}:Welcome! Choose your role.\n".encode())
-    await writer.drain()
-    
-    roles_str = ",".join(game_state["available_roles"])
-    writer.write(f"ROLES_AVAILABLE:{roles_str}\n".encode())
-    await writer.drain()
+    protocol = PROTOCOL_TEXT # Every connection starts in text mode; PROTO: may switch it before a role is chosen
+    compressor = None
+    spectating = False
+    if watch_only: # No seat for it, but it can watch
+        await send_direct(writer, protocol, "WELCOME", temp_player_id, "The table is full. Send SPECTATE to watch the game.")
+    elif game_state["story"] is None: # Catalog mode, first at the table: pick a story first
+        await send_direct(writer, protocol, "WELCOME", temp_player_id, "Welcome! Choose a story with STORY:id.")
+        await send_direct(writer, protocol, "STORIES", *story_list_fields())
+    else:
+        await send_direct(writer, protocol, "WELCOME", temp_player_id, "Welcome! Choose your role.")
+        await send_direct(writer, protocol, "ROLES_AVAILABLE", *table_game().available_roles)
+    if not watch_only:
+        connected_clients.append((writer, temp_player_id))
+    await send_direct(writer, protocol, "PROTOCOLS", *SUPPORTED_PROTOCOLS, COMPRESSION_ZLIB) # Protocols, then compression schemes
 
+    profile = None # Set by PROFILE:name before a role is chosen
     player_id_for_logic = temp_player_id # This will be replaced by chosen role if unique, or kept if not unique for some reason
     player_role_chosen = False
+    guarded_reader = GuardedReader(reader, SERVER_MAX_FRAME_BYTES,
+                                   idle_timeout=SERVER_IDLE_TIMEOUT, read_timeout=SERVER_READ_TIMEOUT,
+                                   rate=COMMAND_RATE_PER_SEC, burst=COMMAND_BURST)
+    connection_stats[temp_player_id] = guarded_reader.stats
+    client_streams[temp_player_id] = (guarded_reader, writer)
 
     try:
         while True: # Loop for role selection and then game messages
-            data = await reader.readline()
+            data = await guarded_reader.read_message()
             if not data:
                 # If data is empty, client disconnected before role selection or during game
                 # Find which player_id this writer corresponds to for proper cleanup
@@ -355,107 +744,158 @@ async def handle_client_connection(reader, writer):
                 else: print(f"Unknown client disconnected from {addr}")
                 break 
             
-            message = data.decode().strip()
-            print(f"Received from {temp_player_id} ({addr}): {message}")
-
-            # --- Role Selection Phase ---
-            if not player_role_chosen and message.startswith("ROLE:"):
-                chosen_role = message.split(":", 1)[1]
-                if chosen_role in game_state["available_roles"]:
-                    game_state["available_roles"].remove(chosen_role) # Make role unavailable
-                    
-                    # Transition from temp client to actual player
-                    connected_clients.remove((writer, temp_player_id))
-                    player_id_for_logic = chosen_role # Use Role as Player ID for this phase
-                    
-                    template = STORY_DATA["player_character_templates"][chosen_role]
-                    players_data[player_id_for_logic] = {
-                        "writer": writer,
-                        "role": chosen_role,
-                        "stats": dict(template.get("initial_stats", {})), # Deep copy
-                        "inventory": list(template.get("initial_inventory", [])), # Deep copy
-                        "id": player_id_for_logic
-                    }
-                    player_role_chosen = True
-                    await send_to_player(player_id_for_logic, f"ROLE_CONFIRMED:{chosen_role}:Your stats: {json.dumps(players_data[player_id_for_logic]['stats'])}. Inventory: {json.dumps(players_data[player_id_for_logic]['inventory'])}")
-                    await broadcast(f"PLAYER_JOINED:{chosen_role} has joined the game.", exclude_player_id=player_id_for_logic)
-
-                    if len(players_data) == MAX_PLAYERS and not game_state["game_active"]:
-                        game_state["game_active"] = True
-                        game_state["current_node_id"] = STORY_DATA['start_node_id']
-                        # Randomly pick starting player or default to first who joined/chose role
-                        game_state["current_turn_player_idx"] = 0 # Or random.randrange(MAX_PLAYERS)
-                        
-                        await broadcast("GAME_START:All players have chosen roles. The adventure begins!")
-                        # Announce first turn
-                        first_player_id = list(players_data.keys())[game_state["current_turn_player_idx"]]
-                        await broadcast(f"TURN:{first_player_id}")
-                        await send_to_player(first_player_id, "YOUR_TURN:It's your turn to act.")
-                        await send_node_to_players()
-
-                else: # Role not available or invalid
-                    await send_to_player(temp_player_id, f"ERROR:Role '{chosen_role}' is not available or invalid. Available: {','.join(game_state['available_roles'])}")
-
-            # --- Game Phase ---
-            elif player_role_chosen and game_state["game_active"]:
-                current_player_id = get_current_player_id()
-
-                if message.startswith("CHOICE:") and player_id_for_logic == current_player_id and not game_state["vote_in_progress"]:
-                    try:
-                        choice_idx_from_player = int(message.split(":", 1)[1]) -1 # 1-based from player
-                        
-                        # Re-filter choices for the current player to map choice_idx_from_player
-                        node_data = STORY_DATA['nodes'][game_state["current_node_id"]]
-                        active_player_role = players_data[current_player_id]["role"]
-                        
-                        valid_choices_for_active_player = []
-                        for c_data in node_data['choices']:
-                            if c_data.get("requires_vote"): continue # Should not be handled here
-                            conditions_met = check_conditions_for_player(current_player_id, c_data.get("conditions"))
-                            role_match = True
-                            if "actionable_by_roles" in c_data:
-                                role_match = active_player_role in c_data["actionable_by_roles"]
-                            if conditions_met and role_match:
-                                valid_choices_for_active_player.append(c_data)
-
-                        if 0 <= choice_idx_from_player < len(valid_choices_for_active_player):
-                            chosen_action_data = valid_choices_for_active_player[choice_idx_from_player]
-                            
-                            action_text = chosen_action_data['text'].replace("{acting_player_name}", players_data[current_player_id]['role'])
-                                                                    
-                            await broadcast(f"PLAYER_ACTION:{current_player_id} (as {players_data[current_player_id]['role']}) chose: '{action_text}'")
-
-                            if "effects_for_chooser" in chosen_action_data:
-                                apply_effects_to_player(current_player_id, chosen_action_data["effects_for_chooser"])
-                            
-                            game_state["current_node_id"] = chosen_action_data["target_node_id"]
-                            # If player acts, it's their turn again for the new node's text, but then turn advances.
-                            # Or, advance turn first, then send node. Let's try advancing turn first.
-                            advance_turn()
-                            await send_node_to_players() 
+            msg_type, fields = data
+            arg = fields[0] if fields else ""
+            if TRACE:
+                TRACE.record(TRACE_IN, writer.connection, encode_message(guarded_reader.protocol, msg_type, fields))
+            with mp_monitor.step(msg_type if msg_type in MESSAGE_TYPES else "unknown command"): # Bounded set of labels
+                touch_table()
+                print(f"Received from {temp_player_id} ({addr}): {encode_text(msg_type, fields)}")
+                if not await wake_table():
+                    continue # The game was lost and the table closed: nothing to apply the message to
 
+                # --- Spectators only listen ---
+                if spectating:
+                    await send_direct(writer, protocol, "ERROR", "Spectators can only watch.")
+
+                # --- Protocol negotiation (only before a role is chosen) ---
+                elif not player_role_chosen and msg_type == "PROTO":
+                    if arg in SUPPORTED_PROTOCOLS:
+                        # The client switches its sending side right after PROTO, we switch ours after PROTO_OK
+                        guarded_reader.protocol = arg
+                        wants_zlib = arg == PROTOCOL_BINARY and COMPRESSION_ZLIB in fields[1:]
+                        await send_direct(writer, protocol, "PROTO_OK", *([arg, COMPRESSION_ZLIB] if wants_zlib else [arg]))
+                        protocol = arg
+                        client_protocols[temp_player_id] = protocol
+                        if wants_zlib:
+                            compressor = FrameCompressor() # Given the table's dictionary once the connection takes a seat
+                            compression_stats[temp_player_id] = compressor.stats
+                    else:
+                        await send_direct(writer, protocol, "ERROR", f"Unsupported protocol '{arg}'. Supported: {','.join(SUPPORTED_PROTOCOLS)}")
+
+                # --- Spectating (instead of taking a seat) ---
+                elif not player_role_chosen and msg_type == "SPECTATE":
+                    if len(spectator_feed.spectators) >= MAX_SPECTATORS:
+                        await send_direct(writer, protocol, "ERROR", "Too many spectators on this table.")
+                    else:
+                        if (writer, temp_player_id) in connected_clients:
+                            connected_clients.remove((writer, temp_player_id)) # Frees the seat slot it was holding
+                        client_protocols.pop(temp_player_id, None)
+                        guarded_reader.idle_timeout = None # Spectators never send anything
+                        spectating = True
+                        spectator_feed.add(writer, protocol) # Uncompressed: the feed's frames are shared by every spectator
+                        await writer.drain()
+
+                # --- Resuming a held seat (token from ROLE_CONFIRMED), even on a connection that found the table full ---
+                elif not player_role_chosen and msg_type == "RESUME":
+                    resumed_id = resume_tokens.get(arg)
+                    if resumed_id not in players_data or not table_game().active:
+                        if watch_only:
+                            await send_direct(writer, protocol, "ERROR", "Unknown or expired resume token. The table is full, send SPECTATE to watch the game.")
                         else:
-                            await send_to_player(current_player_id, "ERROR:Invalid choice index.")
-                    except ValueError:
-                        await send_to_player(current_player_id, "ERROR:Invalid choice format. Send CHOICE:number.")
-                
-                elif message.startswith("VOTE:") and game_state["vote_in_progress"]:
-                    vote_value = message.split(":",1)[1].lower()
-                    if vote_value in ["yes", "no"]:
-                        if player_id_for_logic not in game_state["player_votes"]:
-                            game_state["player_votes"][player_id_for_logic] = vote_value
-                            await broadcast(f"PLAYER_VOTED:{player_id_for_logic} (as {players_data[player_id_for_logic]['role']}) has voted.")
-                            if len(game_state["player_votes"]) == len(players_data): # All active players voted
-                                if game_state["vote_timer_task"] and not game_state["vote_timer_task"].done():
-                                    game_state["vote_timer_task"].cancel() # Cancel timer
-                                await process_vote_outcome()
-                        else:
-                            await send_to_player(player_id_for_logic, "INFO:You have already voted.")
+                            await send_direct(writer, protocol, "ERROR", "Unknown or expired resume token. Choose a role.")
+                            if game_state["story"] is not None:
+                                await send_direct(writer, protocol, "ROLES_AVAILABLE", *table_game().available_roles)
                     else:
-                        await send_to_player(player_id_for_logic, "ERROR:Invalid vote. Send VOTE:yes or VOTE:no.")
-                # else:
-                #     await send_to_player(player_id_for_logic, "ERROR:Not your turn or no action expected.")
+                        if (writer, temp_player_id) in connected_clients:
+                            connected_clients.remove((writer, temp_player_id))
+                        client_protocols.pop(temp_player_id, None)
+                        player_id_for_logic = resumed_id
+                        player_role_chosen = True
+                        watch_only = False
+                        if compressor:
+                            compressor.dictionary = dictionary_frame(protocol)
+                        await resume_seat(resumed_id, writer, protocol, compressor)
 
+                elif watch_only:
+                    await send_direct(writer, protocol, "ERROR", "The table is full. Send SPECTATE to watch the game.")
+
+                # --- Player Profile (optional, before choosing a role) ---
+                elif not player_role_chosen and msg_type == "PROFILE":
+                    if not PROFILES:
+                        await send_direct(writer, protocol, "ERROR", "Player profiles are off on this server.")
+                    elif not player_profiles.valid_name(arg):
+                        await send_direct(writer, protocol, "ERROR", f"Profile names are 1 to {player_profiles.MAX_NAME_LENGTH} letters, digits, '_' or '-'.")
+                    else:
+                        profile = await PROFILES.get(arg)
+                        await send_direct(writer, protocol, "INFO", describe_profile(profile))
+
+                # --- Story Selection (catalog mode) ---
+                elif not player_role_chosen and msg_type == "STORY":
+                    if not STORY_CATALOG:
+                        await send_direct(writer, protocol, "ERROR", "This server plays a single story.")
+                    elif game_state["story"] is not None:
+                        await send_direct(writer, protocol, "INFO", f"This table already plays '{STORY_DATA.get('title', '')}'. Choose your role.")
+                        await send_direct(writer, protocol, "ROLES_AVAILABLE", *table_game().available_roles)
+                    else:
+                        error = await select_story(arg)
+                        if error:
+                            await send_direct(writer, protocol, "ERROR", error)
+
+                # --- Role Selection Phase ---
+                elif not player_role_chosen and msg_type == "ROLE":
+                    chosen_role = arg
+                    if game_state["story"] is None:
+                        await send_direct(writer, protocol, "ERROR", "Choose a story first with STORY:id.")
+                    elif table_game().add_player(chosen_role, chosen_role): # Role available: it's now taken
+
+                        # Transition from temp client to actual player
+                        connected_clients.remove((writer, temp_player_id))
+                        client_protocols.pop(temp_player_id, None)
+                        player_id_for_logic = chosen_role # Use Role as Player ID for this phase
+                        if compressor:
+                            compressor.dictionary = dictionary_frame(protocol)
+
+                        players_data[player_id_for_logic] = {
+                            "writer": writer,
+                            "protocol": protocol,
+                            "compressor": compressor,
+                            "role": chosen_role,
+                            "id": player_id_for_logic,
+                            "profile": profile
+                        }
+                        player_role_chosen = True
+                        token = issue_resume_token(player_id_for_logic)
+                        seat = table_game().players[player_id_for_logic]
+                        await send_to_player(player_id_for_logic, "ROLE_CONFIRMED", chosen_role, f"Your stats: {json.dumps(seat['stats'])}. Inventory: {json.dumps(seat['inventory'])}", token)
+                        await broadcast("PLAYER_JOINED", f"{chosen_role} has joined the game.", exclude_player_id=player_id_for_logic)
+
+                        if len(players_data) == MAX_PLAYERS and not table_game().active:
+                            await start_game()
+                        elif BOT_POLICY and not table_game().active and (game_state["bot_fill_task"] is None or game_state["bot_fill_task"].done()):
+                            await send_to_player(player_id_for_logic, "INFO", f"Bots will take any open roles in {BOT_FILL_DELAY}s.")
+                            game_state["bot_fill_task"] = asyncio.create_task(fill_with_bots(BOT_FILL_DELAY))
+
+                    else: # Role not available or invalid
+                        await send_direct(writer, protocol, "ERROR", f"Role '{chosen_role}' is not available or invalid. Available: {','.join(game_state['game'].available_roles)}")
+
+                # --- Game Phase ---
+                elif player_role_chosen and table_game().active:
+                    game = table_game()
+
+                    if msg_type == "CHOICE" and game.may_choose(player_id_for_logic):
+                        try:
+                            choice_idx_from_player = int(arg) -1 # 1-based from player
+                        except ValueError:
+                            await send_to_player(player_id_for_logic, "ERROR", "Invalid choice format. Send CHOICE:number.")
+                        else:
+                            await dispatch(game.choose(player_id_for_logic, choice_idx_from_player))
+
+                    elif msg_type == "VOTE" and game.vote_in_progress():
+                        vote_value = arg.lower()
+                        if vote_value in ["yes", "no"]:
+                            await dispatch(game.vote(player_id_for_logic, vote_value))
+                        else:
+                            await send_to_player(player_id_for_logic, "ERROR", "Invalid vote. Send VOTE:yes or VOTE:no.")
+                    # else:
+                    #     await send_to_player(player_id_for_logic, "ERROR", "Not your turn or no action expected.")
+
+    except (ReadTimeout, FrameTooLarge) as e:
+        print(f"Dropping {player_id_for_logic if player_role_chosen else temp_player_id} ({addr}): {e}")
+        try:
+            await send_direct(writer, protocol, "ERROR", f"{e}. Disconnecting.")
+        except Exception: pass # Peer may already be gone
+        await handle_disconnect(player_id_for_logic if player_role_chosen else temp_player_id, writer)
     except ConnectionResetError:
         print(f"Connection reset by {addr} (ID: {player_id_for_logic if player_role_chosen else temp_player_id})")
         await handle_disconnect(player_id_for_logic if player_role_chosen else temp_player_id, writer)
@@ -467,6 +907,13 @@ async def handle_client_connection(reader, writer):
         print(f"Unhandled error for {player_id_for_logic if player_role_chosen else temp_player_id} ({addr}): {e}")
         await handle_disconnect(player_id_for_logic if player_role_chosen else temp_player_id, writer)
     finally:
+        spectator_feed.remove(writer)
+        connection_stats.pop(temp_player_id, None)
+        compression_stats.pop(temp_player_id, None)
+        client_protocols.pop(temp_player_id, None)
+        client_streams.pop(temp_player_id, None)
+        if TRACE:
+            TRACE.record(TRACE_EOF, writer.connection)
         # Final cleanup if not already handled by a specific disconnect path
         # This ensures writer is closed even if loop exits unexpectedly
         if writer and not writer.is_closing():
@@ -482,47 +929,254 @@ async def handle_client_connection(reader, writer):
         if is_temp and any(w == writer for w, tid in connected_clients if tid == final_id_to_check):
             connected_clients.remove((writer, final_id_to_check))
             print(f"Temporary client {final_id_to_check} cleaned up from connected_clients.")
+            if STORY_CATALOG and not table_active() and not players_data and not connected_clients:
+                release_story() # Everyone left before the game started: the next table picks its own story
         elif not is_temp and final_id_to_check in players_data and players_data[final_id_to_check]["writer"] == writer:
              # This case should ideally be caught by handle_disconnect, but as a safeguard:
-            if final_id_to_check in players_data: # Check again as handle_disconnect might have run
-                del players_data[final_id_to_check]
+            if await wake_table() and final_id_to_check in players_data: # Check again as handle_disconnect might have run
+                unseat_player(final_id_to_check)
                 print(f"Player {final_id_to_check} cleaned up from players_data.")
                 # Potential broadcast if game was active and player dropped.
-                if game_state["game_active"]:
-                     asyncio.create_task(broadcast(f"PLAYER_LEFT:{final_id_to_check} has left the game unexpectedly."))
+                if table_game().active:
+                     asyncio.create_task(broadcast("PLAYER_LEFT", f"{final_id_to_check} has left the game unexpectedly."))
                      if len(players_data) < MAX_PLAYERS:
                          asyncio.create_task(end_game(f"Player {final_id_to_check} disconnected. Not enough players."))
 
 
-async def main_server():
-    global STORY_DATA, MAX_PLAYERS, game_state
+STORY_FILE = "mp_story_phase1.json"
+SERVER_HOST = '127.0.0.1'
+SERVER_PORT = 8889 # Changed port to 8889
+
+def compile_story(story_data, path=None):
+    """Everything the server derives from a story once, shared by every table playing it."""
+    return {"role_tables": compile_role_tables(story_data), "compression_dictionary": build_story_dictionary(story_data),
+            "reachability": load_reachability(story_data, path, "chooser")} # Tables only apply effects_for_chooser
+
+def use_story(story):
+    """Makes the table play `story` (a CompiledStory)."""
+    global STORY_DATA, ROLE_TABLES, MAX_PLAYERS, COMPRESSION_DICTIONARY
+    game_state["story"] = story
+    STORY_DATA = story.data
+    ROLE_TABLES = story.derived["role_tables"]
+    COMPRESSION_DICTIONARY = story.derived["compression_dictionary"]
+    MAX_PLAYERS = STORY_DATA.get("max_players", 1)
+    game_state["game"] = GameCore(STORY_DATA, ROLE_TABLES)
+
+def release_story():
+    """Resets the table's story between games: the newest snapshot in single-story mode, none in catalog mode."""
+    global STORY_DATA, ROLE_TABLES, MAX_PLAYERS, COMPRESSION_DICTIONARY
+    if not STORY_CATALOG:
+        use_story(SERVED_STORY)
+        return
+    game_state["story"] = None # Our reference is dropped, so the catalog can free the story once it is cold
+    STORY_DATA, ROLE_TABLES, MAX_PLAYERS, COMPRESSION_DICTIONARY = {}, {}, 0, ""
+    game_state["game"] = GameCore(STORY_DATA, ROLE_TABLES) # No roles until a story is picked
+
+def table_capacity():
+    """Players the current table can seat (before a story is picked: the largest story in the catalog)."""
+    if game_state["story"] or not STORY_CATALOG:
+        return MAX_PLAYERS
+    return max((meta["max_players"] for meta in STORY_CATALOG.index.values()), default=0)
+
+def load_story(filepath=STORY_FILE):
+    """Loads the story and derived server state. Returns False (after printing why) if it can't be served."""
+    global SERVED_STORY
     try:
-        with open("mp_story_phase1.json", 'r') as f:
-            STORY_DATA = json.load(f)
-        MAX_PLAYERS = STORY_DATA.get("max_players", 1)
-        game_state["available_roles"] = list(STORY_DATA.get("player_character_templates", {}).keys())
-        if not game_state["available_roles"]:
-            print("Error: No player character templates defined in the story file!")
-            return
+        story = load_compiled_story(os.path.splitext(os.path.basename(filepath))[0], filepath, compile_story)
     except FileNotFoundError:
-        print("Error: mp_story_phase1.json not found.")
-        return
+        print(f"Error: {filepath} not found.")
+        return False
     except json.JSONDecodeError:
-        print("Error: mp_story_phase1.json is not valid JSON.")
+        print(f"Error: {filepath} is not valid JSON.")
+        return False
+    if not story.data.get("player_character_templates"):
+        print("Error: No player character templates defined in the story file!")
+        return False
+    SERVED_STORY = story
+    use_story(story)
+    return True
+
+def open_catalog(directory, memory_budget=None):
+    """Serves every story in a directory instead of one file. Returns False (after printing why) if there are none."""
+    global STORY_CATALOG
+    if not os.path.isdir(directory):
+        print(f"Error: {directory} is not a directory.")
+        return False
+    STORY_CATALOG = StoryCatalog(directory, compile_story=compile_story, memory_budget=memory_budget or STORY_MEMORY_BUDGET)
+    started = time.perf_counter()
+    count = STORY_CATALOG.scan()
+    print(f"Indexed {count} stories in {directory} ({time.perf_counter() - started:.2f}s).")
+    if not count:
+        print("Error: No stories found.")
+        return False
+    return True
+
+def story_list_fields():
+    """STORIES message fields: one "id: title (N players)" entry per multiplayer story of the catalog."""
+    return [f"{meta['id']}: {meta['title']} ({meta['max_players']} players)"
+            for meta in STORY_CATALOG.entries() if meta["roles"]]
+
+async def select_story(story_id):
+    """Loads a catalog story (off the event loop) for the forming table and tells every waiting client.
+    Returns an error message, or None on success."""
+    try:
+        story = await asyncio.get_running_loop().run_in_executor(None, STORY_CATALOG.get, story_id)
+    except KeyError:
+        return f"Unknown story '{story_id}'."
+    except (OSError, ValueError) as e:
+        print(f"Could not load story {story_id}: {e}")
+        return f"Story '{story_id}' could not be loaded."
+    if not story.data.get("player_character_templates"):
+        return f"Story '{story_id}' has no roles, it can't be played in multiplayer."
+    if game_state["story"] is None: # Another client may have picked one while this one was loading
+        use_story(story)
+        print(f"Table is playing {story_id} ({STORY_DATA.get('title', story_id)}).")
+    await announce_story(f"This table plays '{STORY_DATA.get('title', story_id)}'. Choose your role.")
+    return None
+
+async def announce_story(message):
+    """Sends the table's roles to every client that hasn't chosen one yet."""
+    for writer, temp_id in list(connected_clients):
+        protocol = client_protocols.get(temp_id, PROTOCOL_TEXT)
+        try:
+            await send_direct(writer, protocol, "INFO", message)
+            await send_direct(writer, protocol, "ROLES_AVAILABLE", *table_game().available_roles)
+        except Exception as e:
+            print(f"Error sending the story to {temp_id}: {e}")
+
+# --- Hot Reload ---
+def check_story_files():
+    """Returns new snapshots of the loaded stories whose file changed. Runs in an executor: stat calls, parsing
+    and compiling never block the event loop."""
+    if STORY_CATALOG:
+        return STORY_CATALOG.refresh()
+    story = SERVED_STORY
+    version = os.stat(story.path).st_mtime_ns
+    if version in (story.version, story_watch["failed_version"]):
+        return []
+    try:
+        return [load_compiled_story(story.story_id, story.path, compile_story)]
+    except (OSError, ValueError) as e:
+        story_watch["failed_version"] = version # Retried once the file is saved again
+        print(f"Keeping the current version of {story.story_id}: {e}")
+        return []
+
+async def publish_story(story):
+    """Makes a new snapshot the one new tables get. A table that already has players keeps its snapshot until the
+    game ends; the old one is freed once nothing references it."""
+    global SERVED_STORY
+    if not story.data.get("player_character_templates"):
+        print(f"Keeping the current version of {story.story_id}: the new one has no player character templates.")
+        return
+    print(f"Story {story.story_id} reloaded (version {story.version}).")
+    if not STORY_CATALOG:
+        SERVED_STORY = story
+    current = game_state["story"]
+    if current and current.story_id == story.story_id and not players_data and not table_active():
+        use_story(story)
+        await announce_story(f"'{STORY_DATA.get('title', story.story_id)}' was updated. Choose your role.")
+
+@mp_monitor.labelled("story reload")
+async def watch_stories():
+    """Polls the story files every STORY_WATCH_INTERVAL seconds and publishes the ones that changed."""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(STORY_WATCH_INTERVAL)
+        try:
+            updated = await loop.run_in_executor(None, check_story_files)
+        except OSError as e:
+            print(f"Error checking story files: {e}")
+            continue
+        for story in updated:
+            await publish_story(story)
+
+async def start_admin(address):
+    return await mp_admin.start_admin_server(address, {"sessions": get_session_dump, "stats": lambda args: get_server_stats(),
+                                                       "loop": mp_monitor.get_loop_stats, "slowlog": mp_monitor.get_slow_log})
+
+def start_loop_monitor():
+    """Times every loop callback from now on and starts the lag probe (see mp_monitor.py)."""
+    if SLOW_CALLBACK_SECONDS:
+        mp_monitor.install(SLOW_CALLBACK_SECONDS)
+        mp_monitor.monitor_state["task"] = asyncio.create_task(mp_monitor.watch_lag())
+
+def start_recording(path):
+    """Records every session of this server to a trace file (see mp_trace.py) until stop_recording()."""
+    global TRACE
+    story = game_state["story"]
+    TRACE = TraceRecorder(path, {"story_file": story.path if story else None,
+                                 "story_dir": STORY_CATALOG.directory if STORY_CATALOG else None,
+                                 "bots": BOT_POLICY, "bot_fill_delay": BOT_FILL_DELAY, "resume_grace": RESUME_GRACE_SECONDS,
+                                 "resume_token_key": RESUME_TOKEN_KEY.hex(), "profiles": PROFILES is not None,
+                                 "recorded_at": time.time()})
+    print(f"Recording sessions to {path}")
+
+def stop_recording():
+    global TRACE
+    if TRACE:
+        TRACE.close()
+        TRACE = None
+
+async def main_server(story_dir=None):
+    global bot_executor
+    if not (open_catalog(story_dir) if story_dir else load_story()):
         return
+    if BOT_POLICY:
+        bot_executor = create_bot_executor(BOT_POLICY)
+        print(f"Bots enabled ({BOT_POLICY} policy): open roles are filled after {BOT_FILL_DELAY}s, dropped players are replaced.")
+    if STORY_WATCH_INTERVAL:
+        story_watch["task"] = asyncio.create_task(watch_stories())
+    if HIBERNATE_AFTER:
+        hibernate_watch["task"] = asyncio.create_task(watch_idle_table())
+    if PROFILE_DB:
+        await open_profiles(PROFILE_DB)
+    if ADMIN_ADDRESS:
+        await start_admin(ADMIN_ADDRESS)
+    start_loop_monitor()
+    if RECORD_PATH:
+        start_recording(RECORD_PATH)
 
     server = await asyncio.start_server(
-        handle_client_connection, '127.0.0.1', 8889) # Changed port to 8889
+        handle_client_connection, SERVER_HOST, SERVER_PORT, limit=SERVER_MAX_FRAME_BYTES)
 
     addr = server.sockets[0].getsockname()
     print(f'HDVELH Multiplayer Phase 1 Server serving on {addr}')
 
-    async with server:
-        await server.serve_forever()
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        stop_recording()
+        await close_profiles()
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="HDVELH multiplayer server.")
+    parser.add_argument("--bots", choices=BOT_POLICIES, help="Let bots using this policy fill open roles and replace players who drop")
+    parser.add_argument("--bot-fill-delay", type=float, default=BOT_FILL_DELAY, help="Seconds to wait for humans before bots fill open roles")
+    parser.add_argument("--stories", metavar="DIR", help=f"Serve every story in DIR (the first player of a table picks one) instead of {STORY_FILE}")
+    parser.add_argument("--story-cache-mb", type=int, default=STORY_MEMORY_BUDGET // (1024 * 1024), help="Memory budget of the story cache")
+    parser.add_argument("--watch-interval", type=float, default=STORY_WATCH_INTERVAL, help="Seconds between checks for edited story files (0 disables hot reload)")
+    parser.add_argument("--admin", metavar="ADDRESS", help="Serve the admin socket (see mp_admin.py) on this Unix socket path or localhost port")
+    parser.add_argument("--slow-callback-ms", type=float, default=SLOW_CALLBACK_SECONDS * 1000, metavar="MS", help=f"Turn the loop monitor on and log loop callbacks slower than MS (e.g. {mp_monitor.SLOW_CALLBACK_SECONDS * 1000:g})")
+    parser.add_argument("--record", metavar="TRACE", help="Record every session to this trace file (replay it with mp_trace.py)")
+    parser.add_argument("--profiles", metavar="DB", default=PROFILE_DB, help="Keep player profiles in this SQLite database (off by default; names are not authenticated)")
+    parser.add_argument("--hibernate-after", type=float, default=HIBERNATE_AFTER, help="Seconds without activity before a game in progress is moved to disk (0: never)")
+    parser.add_argument("--hibernate-dir", default=HIBERNATE_DIR, help=f"Directory of the hibernating tables (default: {HIBERNATE_DIR})")
+    parser.add_argument("--resume-grace", type=float, default=RESUME_GRACE_SECONDS, help="Seconds a dropped player's seat is held for them to reconnect (0: no holding)")
+    cli_args = parser.parse_args()
+    BOT_POLICY = cli_args.bots
+    BOT_FILL_DELAY = cli_args.bot_fill_delay
+    STORY_MEMORY_BUDGET = cli_args.story_cache_mb * 1024 * 1024
+    STORY_WATCH_INTERVAL = cli_args.watch_interval
+    ADMIN_ADDRESS = cli_args.admin
+    SLOW_CALLBACK_SECONDS = cli_args.slow_callback_ms / 1000
+    RECORD_PATH = cli_args.record
+    RESUME_GRACE_SECONDS = cli_args.resume_grace
+    HIBERNATE_AFTER = cli_args.hibernate_after
+    HIBERNATE_DIR = cli_args.hibernate_dir
+    PROFILE_DB = cli_args.profiles
     try:
-        asyncio.run(main_server())
+        asyncio.run(main_server(cli_args.stories))
     except KeyboardInterrupt:
         print("Server shutting down manually.")
     except Exception as e:
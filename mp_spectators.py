@@ -0,0 +1,124 @@
+"""Spectators for mp_server.py: watch-only connections fed from a ring buffer of the table's public events.
+
+Public broadcasts (NODE_TEXT, PLAYER_ACTION, VOTE_*, TURN...) are published to the table's SpectatorFeed as they
+go out to the players. Publishing only appends to the ring and, if nothing is pending yet, schedules a flush
+FLUSH_DELAY seconds later: broadcast() never waits on a spectator. The flush encodes each new event once per
+protocol in use and writes the whole batch to every spectator without awaiting drain(). A spectator is only a
+cursor, the sequence number of the next event it should get.
+
+A spectator whose socket buffer is over MAX_BUFFERED_BYTES is skipped for that flush. If the ring has wrapped past
+its cursor by the time it can take data again, it gets a snapshot of the current scene instead of the events it
+missed, and carries on from the newest event.
+"""
+import asyncio
+from collections import deque
+
+from mp_protocol import encode_message
+
+PUBLIC_TYPES = {"GAME_START", "NODE_TEXT", "TURN", "PLAYER_ACTION", "VOTE_START", "PLAYER_VOTED", "VOTE_TIMEOUT",
+                "VOTE_RESULT", "ROUND_START", "ROUND_RESULT", "GAME_END"}
+RING_SIZE = 256 # Events kept for spectators that are behind
+FLUSH_DELAY = 0.05 # Seconds of events batched into one write per spectator
+MAX_BUFFERED_BYTES = 64 * 1024 # Unsent bytes after which a spectator is considered behind
+
+
+class Spectator:
+    __slots__ = ("writer", "protocol", "cursor", "skipped")
+
+    def __init__(self, writer, protocol, cursor):
+        self.writer = writer
+        self.protocol = protocol
+        self.cursor = cursor
+        self.skipped = 0 # Events this spectator never received because it fell behind
+
+
+class SpectatorFeed:
+    """Ring buffer of a table's public events, shared by all its spectators."""
+
+    def __init__(self, snapshot, ring_size=RING_SIZE):
+        self.snapshot = snapshot # Returns [(msg_type, fields)] describing the current scene
+        self.ring = deque(maxlen=ring_size) # [msg_type, fields, {protocol: frame}], oldest first
+        self.next_seq = 0 # Sequence number of the next event published; ring[-1] is next_seq - 1
+        self.flushed_seq = 0 # next_seq as of the last flush
+        self.spectators = {} # writer: Spectator
+        self.flush_handle = None
+        self.stats = {"events": 0, "flushes": 0, "bytes_out": 0, "skips": 0}
+
+    def publish(self, msg_type, fields):
+        if not self.spectators:
+            return # Nobody watching: nothing to keep, and a new spectator starts from a snapshot anyway
+        self.ring.append([msg_type, fields, {}])
+        self.next_seq += 1
+        self.stats["events"] += 1
+        if self.next_seq - self.flushed_seq >= self.ring.maxlen: # A burst would wrap the ring before the next flush
+            if self.flush_handle:
+                self.flush_handle.cancel()
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(FLUSH_DELAY, self.flush)
+
+    def _frames(self, start, protocol) -> bytes:
+        """Events from sequence number `start` to the newest, encoded in `protocol` (each frame encoded once)."""
+        first = self.next_seq - len(self.ring)
+        chunks = []
+        for pos in range(start - first, len(self.ring)):
+            msg_type, fields, frames = self.ring[pos]
+            if protocol not in frames:
+                frames[protocol] = encode_message(protocol, msg_type, fields)
+            chunks.append(frames[protocol])
+        return b"".join(chunks)
+
+    def _snapshot_frames(self, protocol, skipped) -> bytes:
+        scene = [("INFO", [f"You fell behind and missed {skipped} events. Here is the current scene."])] + self.snapshot()
+        return b"".join(encode_message(protocol, msg_type, fields) for msg_type, fields in scene)
+
+    def flush(self):
+        self.flush_handle = None
+        self.flushed_seq = self.next_seq
+        self.stats["flushes"] += 1
+        first = self.next_seq - len(self.ring)
+        batches = {} # (cursor, protocol): bytes; spectators that are keeping up all share one batch
+        for writer, spectator in list(self.spectators.items()):
+            if spectator.cursor == self.next_seq:
+                continue
+            if writer.is_closing():
+                self.remove(writer)
+                continue
+            if writer.transport.get_write_buffer_size() > MAX_BUFFERED_BYTES:
+                continue # Behind: try again on the next flush, events keep piling up in the ring meanwhile
+            if spectator.cursor < first: # The ring wrapped past it
+                skipped = first - spectator.cursor
+                spectator.skipped += skipped
+                self.stats["skips"] += 1
+                data = self._snapshot_frames(spectator.protocol, skipped)
+            else:
+                key = (spectator.cursor, spectator.protocol)
+                if key not in batches:
+                    batches[key] = self._frames(spectator.cursor, spectator.protocol)
+                data = batches[key]
+            writer.write(data)
+            self.stats["bytes_out"] += len(data)
+            spectator.cursor = self.next_seq
+
+    def add(self, writer, protocol):
+        """Starts feeding a connection, beginning with a snapshot of the current scene."""
+        writer.write(b"".join(encode_message(protocol, msg_type, fields) for msg_type, fields in self.snapshot()))
+        self.spectators[writer] = Spectator(writer, protocol, self.next_seq)
+
+    def remove(self, writer):
+        self.spectators.pop(writer, None)
+
+    def close_all(self):
+        """Sends what is pending and closes every spectator connection (the table's game is over)."""
+        if self.flush_handle:
+            self.flush_handle.cancel()
+        self.flush()
+        self.next_seq = self.flushed_seq = 0
+        for writer in list(self.spectators):
+            writer.close()
+        self.spectators.clear()
+        self.ring.clear()
+
+    def get_stats(self) -> dict:
+        return dict(self.stats, spectators=len(self.spectators), behind=sum(
+            1 for s in self.spectators.values() if s.cursor < self.next_seq - len(self.ring)))
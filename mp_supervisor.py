@@ -0,0 +1,271 @@
+"""Multi-process mode for the HDVELH multiplayer server (Unix only).
+
+The supervisor loads the story once and forks N worker processes that inherit it copy-on-write. It then acts
+as the lobby/router: it accepts every connection on the public port and hands the socket over to a worker
+through a local Unix socket (SCM_RIGHTS), so no external proxy is needed. Each worker runs the regular
+mp_server game loop and hosts one table, so a session lives entirely inside one worker; the router keeps
+filling the table that is forming until it is full before opening the next one. Workers report their load
+back over the same socket, and crashed workers are restarted.
+
+Usage: python mp_supervisor.py --workers 4
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import selectors
+import signal
+import socket
+import time
+
+import mp_server
+from mp_protocol import SERVER_MAX_FRAME_BYTES, PROTOCOL_TEXT, encode_message
+
+LOAD_REPORT_INTERVAL = 1.0 # Seconds between worker load reports (also sent after every handoff and disconnect)
+STATUS_PRINT_INTERVAL = 30 # Seconds between per-worker load summaries printed by the supervisor
+RESTART_DELAY = 1.0 # Seconds to wait before restarting a crashed worker, so a crash loop can't spin the CPU
+
+
+# --- Worker side ---
+async def worker_main(index, ctrl_sock, parent_pid):
+    """Serves connections handed over by the supervisor until the supervisor goes away."""
+    loop = asyncio.get_running_loop()
+    ctrl_sock.setblocking(False)
+    load = {"worker": index, "received": 0, "connections": 0, "players": 0, "game_active": False}
+
+    def report():
+        load["players"] = len(mp_server.players_data)
+        load["game_active"] = mp_server.table_active() # Without waking a hibernating table
+        load["capacity"] = mp_server.table_capacity() # Changes once the table picks a story (--stories)
+        try:
+            ctrl_sock.send(json.dumps(load).encode())
+        except OSError:
+            pass # Supervisor busy or gone; the next report will catch up
+
+    async def serve(sock):
+        try:
+            reader, writer = await asyncio.open_connection(sock=sock, limit=SERVER_MAX_FRAME_BYTES)
+            await mp_server.handle_client_connection(reader, writer)
+        finally:
+            load["connections"] -= 1
+            report()
+
+    def on_handoff():
+        try:
+            _, fds, _, _ = socket.recv_fds(ctrl_sock, 16, 8)
+        except BlockingIOError:
+            return
+        for fd in fds:
+            load["received"] += 1
+            load["connections"] += 1 # Counted right away so the report below never undercounts a pending handoff
+            asyncio.create_task(serve(socket.socket(fileno=fd)))
+        report()
+
+    if mp_server.BOT_POLICY:
+        mp_server.bot_executor = mp_server.create_bot_executor(mp_server.BOT_POLICY)
+    if mp_server.STORY_WATCH_INTERVAL:
+        mp_server.story_watch["task"] = asyncio.create_task(mp_server.watch_stories()) # Every worker reloads its own copy of the stories
+    if mp_server.HIBERNATE_AFTER:
+        mp_server.hibernate_watch["task"] = asyncio.create_task(mp_server.watch_idle_table()) # Files are named after the worker's pid
+    if mp_server.ADMIN_ADDRESS:
+        await mp_server.start_admin(worker_admin_address(mp_server.ADMIN_ADDRESS, index))
+    if mp_server.PROFILE_DB:
+        await mp_server.open_profiles(mp_server.PROFILE_DB) # One connection per worker; SQLite's WAL mode lets them share the file
+        loop.add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(stop_worker()))
+    mp_server.start_loop_monitor()
+    if mp_server.RECORD_PATH:
+        mp_server.start_recording(f"{mp_server.RECORD_PATH}.{index}")
+    loop.add_reader(ctrl_sock.fileno(), on_handoff)
+    print(f"Worker {index} (pid {os.getpid()}) ready.")
+    while os.getppid() == parent_pid: # Reparented means the supervisor died
+        report()
+        await asyncio.sleep(LOAD_REPORT_INTERVAL)
+
+
+async def stop_worker():
+    """SIGTERM with profiles on: save the pending profile batch (and the trace) before exiting."""
+    await mp_server.close_profiles()
+    mp_server.stop_recording()
+    os._exit(0)
+
+
+def worker_admin_address(address, index):
+    """Each worker has its own admin socket: ADDRESS.N for a socket path, or the port after ADDRESS for worker N."""
+    return str(int(address) + 1 + index) if address.isdigit() else f"{address}.{index}"
+
+
+def run_worker(index, ctrl_sock, parent_pid):
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # Ctrl-C goes to the supervisor, which stops us with SIGTERM
+    if mp_server.RECORD_PATH:
+        signal.signal(signal.SIGTERM, lambda signum, frame: (mp_server.stop_recording(), os._exit(0))) # Flush the trace first
+    try:
+        asyncio.run(worker_main(index, ctrl_sock, parent_pid))
+    except Exception as e:
+        print(f"Worker {index} crashed: {e}")
+        mp_server.stop_recording()
+        os._exit(1)
+    mp_server.stop_recording() # os._exit skips buffered file flushes
+    os._exit(0)
+
+
+# --- Supervisor side ---
+def spawn_worker(slot, listener, workers, selector):
+    parent_sock, child_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+    parent_pid = os.getpid()
+    pid = os.fork()
+    if pid == 0:
+        selector.close()
+        listener.close()
+        parent_sock.close()
+        for other in workers:
+            if other["ctrl"]:
+                other["ctrl"].close()
+        run_worker(slot["index"], child_sock, parent_pid)
+    child_sock.close()
+    parent_sock.setblocking(False)
+    slot.update(pid=pid, ctrl=parent_sock, sent=0, load={}, restart_at=None)
+    selector.register(parent_sock, selectors.EVENT_READ, slot)
+    print(f"Started worker {slot['index']} (pid {pid}).")
+
+
+def pick_worker(workers):
+    """Routes a new connection to the fullest table that is still forming, so players of a session stay together."""
+    best, best_taken = None, -1
+    for slot in workers:
+        if slot["pid"] is None:
+            continue
+        load = slot["load"]
+        in_flight = slot["sent"] - load.get("received", 0) # Handed off but not yet reported by the worker
+        taken = load.get("connections", 0) + in_flight
+        if load.get("game_active") or taken >= load.get("capacity", mp_server.table_capacity()):
+            continue
+        if taken > best_taken:
+            best, best_taken = slot, taken
+    return best
+
+
+def print_status(workers):
+    for slot in workers:
+        load = slot["load"]
+        if slot["pid"] is None:
+            print(f"[supervisor] worker {slot['index']}: down, restarting")
+        else:
+            state = "in game" if load.get("game_active") else "forming table"
+            print(f"[supervisor] worker {slot['index']} (pid {slot['pid']}): {load.get('connections', 0)} connections, "
+                  f"{load.get('players', 0)} players, {state}")
+
+
+def reap_workers(workers, selector):
+    while True:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+        for slot in workers:
+            if slot["pid"] == pid:
+                print(f"[supervisor] worker {slot['index']} (pid {pid}) exited with status {status}; restarting.")
+                selector.unregister(slot["ctrl"])
+                slot["ctrl"].close()
+                slot.update(pid=None, ctrl=None, load={}, restart_at=time.monotonic() + RESTART_DELAY)
+
+
+def run_supervisor(num_workers, host, port, story_dir=None):
+    if not (mp_server.open_catalog(story_dir) if story_dir else mp_server.load_story()):
+        return
+    gc.freeze() # Keep the story (or the catalog index) out of future GC passes so the workers' copy-on-write pages stay shared
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, "SO_REUSEPORT"):
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1) # Lets a new supervisor bind during a rolling restart
+    listener.bind((host, port))
+    listener.listen(128)
+    listener.setblocking(False)
+
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ, None)
+    workers = [{"index": i, "pid": None, "ctrl": None, "sent": 0, "load": {}, "restart_at": None} for i in range(num_workers)]
+    for slot in workers:
+        spawn_worker(slot, listener, workers, selector)
+    print(f"HDVELH Multiplayer supervisor serving on {listener.getsockname()} with {num_workers} workers")
+
+    next_status = time.monotonic() + STATUS_PRINT_INTERVAL
+    try:
+        while True:
+            for key, _ in selector.select(timeout=0.5):
+                if key.data is None: # New client on the public port
+                    try:
+                        conn, addr = listener.accept()
+                    except BlockingIOError:
+                        continue
+                    slot = pick_worker(workers)
+                    if slot is None:
+                        print(f"[supervisor] Refusing connection from {addr}: all tables busy.")
+                        try:
+                            conn.sendall(encode_message(PROTOCOL_TEXT, "SERVER_FULL", ["Server is full."]))
+                        except OSError:
+                            pass
+                    else:
+                        try:
+                            socket.send_fds(slot["ctrl"], [b"C"], [conn.fileno()])
+                            slot["sent"] += 1
+                        except OSError as e:
+                            print(f"[supervisor] Handoff to worker {slot['index']} failed: {e}")
+                    conn.close() # The worker holds its own duplicate of the descriptor now
+                else: # Load report from a worker
+                    slot = key.data
+                    try:
+                        slot["load"] = json.loads(slot["ctrl"].recv(4096))
+                    except (BlockingIOError, ValueError):
+                        pass
+            reap_workers(workers, selector)
+            now = time.monotonic()
+            for slot in workers:
+                if slot["pid"] is None and slot["restart_at"] and now >= slot["restart_at"]:
+                    spawn_worker(slot, listener, workers, selector)
+            if now >= next_status:
+                print_status(workers)
+                next_status = now + STATUS_PRINT_INTERVAL
+    finally:
+        for slot in workers:
+            if slot["pid"]:
+                os.kill(slot["pid"], signal.SIGTERM)
+        for slot in workers:
+            if slot["pid"]:
+                os.waitpid(slot["pid"], 0)
+        listener.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the HDVELH multiplayer server with one worker process per core.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--host", default=mp_server.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=mp_server.SERVER_PORT)
+    parser.add_argument("--bots", choices=mp_server.BOT_POLICIES, help="Let bots using this policy fill open roles and replace players who drop")
+    parser.add_argument("--stories", metavar="DIR", help="Serve every story in DIR, each table picks its own (see mp_server.py)")
+    parser.add_argument("--watch-interval", type=float, default=mp_server.STORY_WATCH_INTERVAL, help="Seconds between checks for edited story files (0 disables hot reload)")
+    parser.add_argument("--slow-callback-ms", type=float, default=mp_server.SLOW_CALLBACK_SECONDS * 1000, metavar="MS", help="Turn the loop monitor of each worker on and log loop callbacks slower than MS")
+    parser.add_argument("--record", metavar="TRACE", help="Record each worker's sessions to TRACE.N (see mp_trace.py)")
+    parser.add_argument("--profiles", metavar="DB", default=mp_server.PROFILE_DB, help="Keep player profiles in this SQLite database, shared by the workers (off by default)")
+    parser.add_argument("--admin", metavar="ADDRESS", help="Admin socket of each worker: ADDRESS.N (socket path) or port ADDRESS+1+N")
+    parser.add_argument("--hibernate-after", type=float, default=mp_server.HIBERNATE_AFTER, help="Seconds without activity before a game in progress is moved to disk (0: never)")
+    parser.add_argument("--hibernate-dir", default=mp_server.HIBERNATE_DIR, help="Directory of the hibernating tables, shared by the workers")
+    args = parser.parse_args()
+    mp_server.BOT_POLICY = args.bots
+    mp_server.ADMIN_ADDRESS = args.admin
+    mp_server.SLOW_CALLBACK_SECONDS = args.slow_callback_ms / 1000
+    mp_server.RECORD_PATH = args.record
+    mp_server.STORY_WATCH_INTERVAL = args.watch_interval
+    mp_server.PROFILE_DB = args.profiles
+    mp_server.HIBERNATE_AFTER = args.hibernate_after
+    mp_server.HIBERNATE_DIR = args.hibernate_dir
+    mp_server.RESUME_GRACE_SECONDS = 0 # Reconnections aren't routed back to their worker, so there is no seat to hold
+    try:
+        run_supervisor(max(1, args.workers), args.host, args.port, args.stories)
+    except KeyboardInterrupt:
+        print("Supervisor shutting down manually.")
+    finally:
+        print("Supervisor shutdown sequence complete.")
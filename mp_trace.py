@@ -0,0 +1,281 @@
+"""Session traces: recording live traffic of mp_server.py (--record PATH) and replaying it as a benchmark.
+
+A trace file starts with TRACE_MAGIC and a length-prefixed JSON header (the story served, bot settings...),
+followed by records. Each record is RECORD_HEADER (kind, connection number, microseconds since the recording
+started, payload length) and its payload:
+
+  OPEN  a connection was accepted
+  IN    a command the server accepted, encoded in the protocol the connection used at that time
+  OUT   bytes the server wrote to the connection, exactly as sent (encoded, and compressed if negotiated)
+  EOF   the connection's handler finished
+
+Replaying feeds every connection's commands to mp_server.handle_client_connection through in-memory streams.
+Each command waits until the server has written everything it had written before that command in the
+recording, so sessions interleave as they did live even when replayed as fast as possible. Every connection's
+output is then compared byte for byte with the recording.
+
+Replays are only deterministic for what the server decides itself. Bots, hot-reloaded stories and player
+profiles (replays start from an empty profile database) make traces diverge, and vote timeouts fire after their real duration even in fast mode. Rate limiting is turned off when
+replaying fast, since commands arrive in bursts.
+
+Usage: python mp_trace.py session.trace [--realtime] [--verbose]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import struct
+import sys
+import time
+
+TRACE_MAGIC = b"HDVTRACE1\n"
+TRACE_META = struct.Struct(">I") # Length of the JSON header
+RECORD_HEADER = struct.Struct(">BIQI") # kind, connection, microseconds since the start, payload length
+TRACE_OPEN, TRACE_IN, TRACE_OUT, TRACE_EOF = 1, 2, 3, 4
+TRACE_BUFFER_BYTES = 1024 * 1024 # Records are buffered in memory and written out in big chunks
+REPLAY_SLACK = 1.0 # Seconds a replayed command waits for outputs beyond the gap recorded before it
+
+
+# --- Recording ---
+class TraceRecorder:
+    """Appends records to a trace file. Only used while recording, so the server pays nothing otherwise."""
+
+    def __init__(self, path, header):
+        self.file = open(path, "wb", buffering=TRACE_BUFFER_BYTES)
+        meta = json.dumps(header).encode()
+        self.file.write(TRACE_MAGIC + TRACE_META.pack(len(meta)) + meta)
+        self.started = time.perf_counter()
+        self.connections = 0
+
+    def record(self, kind, connection, payload=b""):
+        elapsed_us = int((time.perf_counter() - self.started) * 1_000_000)
+        self.file.write(RECORD_HEADER.pack(kind, connection, elapsed_us, len(payload)))
+        if payload:
+            self.file.write(payload)
+
+    def wrap(self, writer):
+        """Records a new connection; returns a writer that records every byte written to it."""
+        self.connections += 1
+        self.record(TRACE_OPEN, self.connections)
+        return RecordingWriter(writer, self, self.connections)
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+class RecordingWriter:
+    """StreamWriter proxy that records what the server writes."""
+
+    def __init__(self, writer, recorder, connection):
+        self._writer = writer
+        self.recorder = recorder
+        self.connection = connection
+
+    def write(self, data):
+        self.recorder.record(TRACE_OUT, self.connection, bytes(data))
+        self._writer.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._writer, name)
+
+
+def read_trace(path):
+    """Returns (header, [(kind, connection, microseconds, payload), ...])."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(TRACE_MAGIC):
+        raise ValueError(f"{path} is not a trace file")
+    pos = len(TRACE_MAGIC)
+    (meta_length,) = TRACE_META.unpack_from(data, pos)
+    pos += TRACE_META.size
+    header = json.loads(data[pos:pos + meta_length])
+    pos += meta_length
+    records = []
+    while pos + RECORD_HEADER.size <= len(data):
+        kind, connection, elapsed_us, length = RECORD_HEADER.unpack_from(data, pos)
+        pos += RECORD_HEADER.size
+        if pos + length > len(data):
+            break
+        records.append((kind, connection, elapsed_us, data[pos:pos + length]))
+        pos += length
+    return header, records # A torn last record (server killed mid-write) is dropped
+
+
+# --- Replay ---
+class ReplayWriter:
+    """Stands in for a connection's StreamWriter and keeps everything the server writes to it."""
+
+    def __init__(self, connection, reader, progress):
+        self.connection = connection
+        self.reader = reader
+        self.output = bytearray()
+        self.progress = progress # Set on every write, wakes up the replay driver
+        self.closed = False
+        self.lost = None # Future resolved once the "connection" is gone, as with a real transport
+        self.transport = self
+
+    def write(self, data):
+        self.output += data
+        self.progress.set()
+
+    async def drain(self):
+        if self.closed: # Same as StreamWriter.drain() on a closing transport
+            await asyncio.sleep(0)
+            if self.lost.done():
+                raise ConnectionResetError("Connection lost")
+
+    def get_extra_info(self, name, default=None):
+        return ("replay", self.connection) if name == "peername" else default
+
+    def get_write_buffer_size(self):
+        return 0
+
+    def is_closing(self):
+        return self.closed
+
+    def close(self):
+        if not self.closed:
+            self.lost = asyncio.get_running_loop().create_future()
+            asyncio.get_running_loop().call_soon(self._connection_lost)
+        self.closed = True
+
+    def _connection_lost(self):
+        self.reader.feed_eof() # The server's pending read ends, as on a real socket
+        if not self.lost.done(): # Cancelled if the handler waiting on it was
+            self.lost.set_result(None)
+
+    async def wait_closed(self):
+        if self.lost:
+            await self.lost
+
+
+async def _wait_for_outputs(writers, expected, progress, timeout):
+    """Waits until every connection has produced as many bytes as in the recording, or the timeout expires."""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while any(len(writer.output) < len(expected[connection]) for connection, writer in writers.items()):
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining <= 0:
+            return False
+        progress.clear()
+        try:
+            await asyncio.wait_for(progress.wait(), remaining)
+        except asyncio.TimeoutError:
+            return False
+    return True
+
+
+def _first_difference(actual, expected):
+    for pos, (a, b) in enumerate(zip(actual, expected)):
+        if a != b:
+            return pos
+    return min(len(actual), len(expected))
+
+
+def configure_server(server, header, realtime):
+    """Puts mp_server in the configuration the trace was recorded with. Returns False if the story can't be loaded."""
+    server.BOT_POLICY = header.get("bots")
+    server.BOT_FILL_DELAY = header.get("bot_fill_delay", server.BOT_FILL_DELAY)
+    server.RESUME_GRACE_SECONDS = header.get("resume_grace", server.RESUME_GRACE_SECONDS)
+    if header.get("resume_token_key"):
+        server.RESUME_TOKEN_KEY = bytes.fromhex(header["resume_token_key"]) # Same tokens as when recorded
+    server.PROFILE_DB = ":memory:" if header.get("profiles") else None # Profiles start empty, unlike when recorded
+    if not realtime:
+        server.COMMAND_RATE_PER_SEC = None
+    loaded = server.open_catalog(header["story_dir"]) if header.get("story_dir") else server.load_story(header["story_file"])
+    if loaded and server.BOT_POLICY:
+        server.bot_executor = server.create_bot_executor(server.BOT_POLICY)
+    return loaded
+
+
+async def replay_trace(header, records, realtime=False) -> dict:
+    """Replays a trace against a fresh mp_server. Returns throughput figures and mismatching connections."""
+    import mp_server
+    loop = asyncio.get_running_loop()
+    progress = asyncio.Event()
+    readers, writers, expected, tasks = {}, {}, {}, []
+    commands = late = 0
+    if mp_server.PROFILE_DB:
+        await mp_server.open_profiles(mp_server.PROFILE_DB)
+    started = loop.time()
+    previous_us = 0
+    for kind, connection, elapsed_us, payload in records:
+        if kind == TRACE_OUT:
+            expected.setdefault(connection, bytearray()).extend(payload)
+            continue
+        # The client reacted to what it had received so far, so wait for the server to have sent the same
+        if not await _wait_for_outputs(writers, expected, progress, (elapsed_us - previous_us) / 1_000_000 + REPLAY_SLACK):
+            late += 1
+        previous_us = elapsed_us
+        if realtime:
+            await asyncio.sleep(max(0.0, started + elapsed_us / 1_000_000 - loop.time()))
+        if kind == TRACE_OPEN:
+            readers[connection] = asyncio.StreamReader(limit=mp_server.SERVER_MAX_FRAME_BYTES)
+            writers[connection] = ReplayWriter(connection, readers[connection], progress)
+            expected.setdefault(connection, bytearray())
+            tasks.append(asyncio.create_task(mp_server.handle_client_connection(readers[connection], writers[connection])))
+        elif kind == TRACE_IN:
+            readers[connection].feed_data(payload)
+            commands += 1
+        elif kind == TRACE_EOF:
+            readers[connection].feed_eof()
+    await _wait_for_outputs(writers, expected, progress, REPLAY_SLACK)
+    elapsed = loop.time() - started
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await mp_server.close_profiles()
+
+    mismatches = []
+    for connection, writer in writers.items():
+        if writer.output != expected[connection]:
+            pos = _first_difference(writer.output, expected[connection])
+            mismatches.append({"connection": connection, "offset": pos, "expected": bytes(expected[connection][pos:pos + 60]),
+                               "actual": bytes(writer.output[pos:pos + 60])})
+    output_bytes = sum(len(writer.output) for writer in writers.values())
+    return {"connections": len(writers), "commands": commands, "output_bytes": output_bytes,
+            "recorded_seconds": round(records[-1][2] / 1_000_000, 3) if records else 0.0, "replay_seconds": round(elapsed, 3),
+            "commands_per_second": round(commands / elapsed, 1) if elapsed else 0.0,
+            "output_mb_per_second": round(output_bytes / elapsed / 1e6, 3) if elapsed else 0.0,
+            "late_outputs": late, "mismatches": mismatches}
+
+
+def print_replay_report(report):
+    print(f"Replayed {report['commands']} commands on {report['connections']} connections in {report['replay_seconds']}s "
+          f"(recorded over {report['recorded_seconds']}s): {report['commands_per_second']} commands/s, "
+          f"{report['output_mb_per_second']} MB/s of output.")
+    if report["late_outputs"]:
+        print(f"{report['late_outputs']} commands were sent before the server had caught up with the recording.")
+    for mismatch in report["mismatches"]:
+        print(f"Connection {mismatch['connection']}: output differs at byte {mismatch['offset']}")
+        print(f"  expected: {mismatch['expected']!r}")
+        print(f"  actual:   {mismatch['actual']!r}")
+    print("Outputs match the recording." if not report["mismatches"] else f"{len(report['mismatches'])} connections differ.")
+
+
+async def replay_main(path, realtime, verbose):
+    import mp_server
+    header, records = read_trace(path)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(sys.stdout if verbose else devnull):
+        if not configure_server(mp_server, header, realtime):
+            return None
+        return await replay_trace(header, records, realtime)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a trace recorded with mp_server.py --record and check its outputs.")
+    parser.add_argument("trace", help="Trace file")
+    parser.add_argument("--realtime", action="store_true", help="Keep the recorded timing instead of replaying as fast as possible")
+    parser.add_argument("--verbose", action="store_true", help="Show the server's own output")
+    cli_args = parser.parse_args()
+    try:
+        replay_report = asyncio.run(replay_main(cli_args.trace, cli_args.realtime, cli_args.verbose))
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if replay_report is None:
+        print("Error: the trace's story could not be loaded (run with --verbose for details).")
+        sys.exit(1)
+    print_replay_report(replay_report)
+    sys.exit(1 if replay_report["mismatches"] else 0)
@@ -0,0 +1,181 @@
+"""Persistent player profiles for mp_server.py, kept in a local SQLite database.
+
+A profile is identified by the name a player gives with PROFILE:name. It holds cross-session progress (games
+played and finished, endings reached per story), how often each role was played (the most played one is the
+preferred role) and a history of past games.
+
+Names are not authenticated: anyone who sends PROFILE:alice plays on alice's profile. Profiles are a convenience for
+trusted tables, so the server only keeps them when started with --profiles.
+
+Profiles in use are cached in memory, least recently used ones are dropped past CACHE_SIZE. Updates only touch the
+cache and mark the profile dirty: a background writer (run_writer) saves every dirty profile and the new history
+rows in one transaction every WRITE_INTERVAL seconds, so a profile updated many times between two batches is
+written once. Every database call runs on the store's own thread, never on the event loop.
+
+Each mp_supervisor.py worker has its own cache, so a player on two tables at once keeps the last one saved.
+"""
+import asyncio
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+CACHE_SIZE = 10000 # Profiles kept in memory
+WRITE_INTERVAL = 1.0 # Seconds between two write-behind batches
+HISTORY_IN_PROFILE = 10 # Most recent games kept in the profile itself; the history table has them all
+MAX_NAME_LENGTH = 32
+SERIALIZE_SLICE = 200 # Profiles serialized per loop iteration when a batch is prepared
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (name TEXT PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS history (id INTEGER PRIMARY KEY, name TEXT NOT NULL, story TEXT, role TEXT,
+                                    ending TEXT, finished INTEGER, result TEXT, at REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS history_name ON history (name, at);
+"""
+
+
+def valid_name(name: str) -> bool:
+    return 0 < len(name) <= MAX_NAME_LENGTH and all(c.isalnum() or c in "_-" for c in name)
+
+
+def new_profile(name: str) -> dict:
+    return {"name": name, "games_played": 0, "games_finished": 0, "roles": {}, "stories": {}, "recent": [],
+            "created": time.time(), "last_played": None}
+
+
+def preferred_role(profile: dict):
+    """The role this player has played most, or None for a new player."""
+    return max(profile["roles"], key=profile["roles"].get) if profile["roles"] else None
+
+
+class ProfileStore:
+    def __init__(self, path):
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profiles") # Owns the connection
+        self.db = None
+        self.cache = OrderedDict() # name: profile, most recently used last
+        self.dirty = set() # Names of cached profiles changed since the last batch
+        self.writing = set() # Names in the batch being written
+        self.pending_history = [] # History rows not written yet
+        self.stats = {"loads": 0, "cache_hits": 0, "batches": 0, "profiles_written": 0, "history_written": 0,
+                      "last_batch_ms": 0.0}
+
+    # --- Database thread ---
+    def _open(self):
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL") # Readers (and other worker processes) don't block the writer
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA busy_timeout=5000")
+        self.db.executescript(SCHEMA)
+
+    def _load(self, name):
+        row = self.db.execute("SELECT data FROM profiles WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _write_batch(self, profile_rows, history_rows):
+        started = time.perf_counter()
+        with self.db: # One transaction per batch
+            self.db.executemany("INSERT INTO profiles (name, data, updated) VALUES (?, ?, ?) "
+                                "ON CONFLICT(name) DO UPDATE SET data = excluded.data, updated = excluded.updated", profile_rows)
+            self.db.executemany("INSERT INTO history (name, story, role, ending, finished, result, at) "
+                                "VALUES (?, ?, ?, ?, ?, ?, ?)", history_rows)
+        return time.perf_counter() - started
+
+    # --- Event loop side ---
+    async def open(self):
+        await asyncio.get_running_loop().run_in_executor(self.executor, self._open)
+
+    async def get(self, name) -> dict:
+        """The player's profile, created if it doesn't exist yet."""
+        profile = self.cache.get(name)
+        if profile is not None:
+            self.cache.move_to_end(name)
+            self.stats["cache_hits"] += 1
+            return profile
+        profile = await asyncio.get_running_loop().run_in_executor(self.executor, self._load, name)
+        self.stats["loads"] += 1
+        if name in self.cache: # Loaded by another connection while we waited
+            return self.cache[name]
+        profile = self.cache[name] = profile or new_profile(name)
+        self._evict()
+        return profile
+
+    def _evict(self):
+        for name in list(self.cache)[:-1]: # Never the profile just requested
+            if len(self.cache) <= CACHE_SIZE:
+                break
+            if name not in self.dirty and name not in self.writing: # Unsaved profiles stay until their batch is written
+                del self.cache[name]
+
+    def record_game(self, profile, story, role, ending, finished, result) -> dict:
+        """Adds a game to a profile from get(). Only touches memory; the writer saves it with the next batch.
+
+        Returns the profile object updated, which is the cached one: if `profile` was dropped from the cache while
+        the game went on and another connection loaded the profile again meanwhile, the game goes to that copy."""
+        name = profile["name"]
+        cached = self.cache.get(name)
+        if cached is None:
+            self.cache[name] = profile # Back in the cache, so the writer finds it
+        else:
+            profile = cached
+            self.cache.move_to_end(name)
+        now = time.time()
+        profile["games_played"] += 1
+        profile["games_finished"] += finished
+        profile["roles"][role] = profile["roles"].get(role, 0) + 1
+        progress = profile["stories"].setdefault(story, {"played": 0, "finished": 0, "endings": []})
+        progress["played"] += 1
+        if finished:
+            progress["finished"] += 1
+            if ending not in progress["endings"]:
+                progress["endings"].append(ending)
+        game = {"story": story, "role": role, "ending": ending, "finished": finished, "result": result, "at": now}
+        profile["recent"] = (profile["recent"] + [game])[-HISTORY_IN_PROFILE:]
+        profile["last_played"] = now
+        self.dirty.add(name)
+        self.pending_history.append((name, story, role, ending, int(finished), result, now))
+        return profile
+
+    async def flush(self):
+        """Writes every dirty profile and pending history row in one transaction."""
+        if not self.dirty and not self.pending_history:
+            return
+        self.writing, self.dirty = self.dirty, set()
+        # Serialized here, on the loop, so the database thread never reads a profile while it changes. Big batches
+        # are done in slices; a profile changed in between is dirty again and goes out with the next batch.
+        names = list(self.writing)
+        profile_rows = []
+        for start in range(0, len(names), SERIALIZE_SLICE):
+            now = time.time()
+            profile_rows.extend((name, json.dumps(self.cache[name]), now) for name in names[start:start + SERIALIZE_SLICE])
+            if start + SERIALIZE_SLICE < len(names):
+                await asyncio.sleep(0)
+        history_rows, self.pending_history = self.pending_history, []
+        try:
+            elapsed = await asyncio.get_running_loop().run_in_executor(self.executor, self._write_batch, profile_rows, history_rows)
+        except sqlite3.Error as e:
+            print(f"Error saving player profiles, will retry: {e}")
+            self.dirty |= self.writing
+            self.pending_history[:0] = history_rows
+            return
+        finally:
+            self.writing = set()
+        self.stats["batches"] += 1
+        self.stats["profiles_written"] += len(profile_rows)
+        self.stats["history_written"] += len(history_rows)
+        self.stats["last_batch_ms"] = round(elapsed * 1000, 3)
+
+    async def run_writer(self, interval=WRITE_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+    async def close(self):
+        await self.flush()
+        if self.db:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self.db.close)
+        self.executor.shutdown(wait=True)
+
+    def get_stats(self) -> dict:
+        return dict(self.stats, cached=len(self.cache), dirty=len(self.dirty), pending_history=len(self.pending_history))
@@ -0,0 +1,247 @@
+"""Catalog of the stories in a directory, loaded lazily and cached under a memory budget.
+
+Indexing only reads each story's metadata (title, max_players, roles): the top-level keys in front of "nodes"
+are decoded one at a time and the nodes are never parsed, which is how mp_story_phase1.json, the batch builder
+and the story creator lay files out. Stories with metadata after their nodes are parsed in full, once per file
+version, since the index is kept in a sidecar file (INDEX_FILE) and reused while a file's size and mtime match.
+
+A full story is loaded and compiled the first time a session asks for it with get(). Every session playing that
+story then shares the same immutable CompiledStory. Least recently used stories are dropped from the cache once
+the estimated memory of the cached stories exceeds the budget. A story that is dropped while sessions still
+use it stays reachable through a weak reference, so it is never loaded twice.
+
+Stories are versioned snapshots: refresh() recompiles the stories whose file changed into new CompiledStory
+objects, which get() hands out from then on. Sessions keep the snapshot they started with, and the old one is
+freed when the last of them lets go of it.
+"""
+import json
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+STORY_EXTENSION = ".json"
+INDEX_FILE = ".catalog_index.json"
+HEADER_READ_BYTES = 64 * 1024 # How far into a file the metadata is looked for before falling back to a full parse
+MEMORY_PER_FILE_BYTE = 6 # Rough size in memory of a parsed story per byte of JSON, used to charge the budget
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+
+_decoder = json.JSONDecoder()
+
+
+class CompiledStory:
+    """A fully loaded story plus whatever the catalog's compile hook derived from it (see StoryCatalog).
+    Shared by every session of the story, so it must never be mutated. version is the file's mtime_ns."""
+    __slots__ = ("story_id", "path", "data", "derived", "cost", "version", "__weakref__")
+
+    def __init__(self, story_id, path, data, derived, cost, version=0):
+        self.story_id = story_id
+        self.path = path
+        self.data = data
+        self.derived = derived
+        self.cost = cost
+        self.version = version
+
+
+def load_compiled_story(story_id: str, path: str, compile_story=None) -> CompiledStory:
+    """Reads and compiles one story file. Versions come from the file's mtime, so every process agrees on them."""
+    stat = os.stat(path) # Before reading: if the file changes meanwhile, the next check sees a newer mtime
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    derived = compile_story(data, path) if compile_story else None
+    return CompiledStory(story_id, path, data, derived, stat.st_size * MEMORY_PER_FILE_BYTE, stat.st_mtime_ns)
+
+
+def _skip_whitespace(text: str, pos: int) -> int:
+    while pos < len(text) and text[pos] in " \t\r\n":
+        pos += 1
+    return pos
+
+
+def _scan_header(text: str):
+    """Decodes the top-level keys of a story before "nodes". Returns them, or None if text ends before "nodes"
+    (or the end of the object) is reached."""
+    pos = _skip_whitespace(text, 0)
+    if not text.startswith("{", pos):
+        return None
+    header = {}
+    pos += 1
+    while True:
+        pos = _skip_whitespace(text, pos)
+        if text.startswith("}", pos):
+            return header
+        try:
+            key, pos = _decoder.raw_decode(text, pos)
+            pos = _skip_whitespace(text, pos)
+            if not text.startswith(":", pos):
+                return None
+            pos = _skip_whitespace(text, pos + 1)
+            if key == "nodes":
+                return header
+            header[key], pos = _decoder.raw_decode(text, pos)
+        except ValueError: # Value cut off by the end of the chunk
+            return None
+        pos = _skip_whitespace(text, pos)
+        if text.startswith(",", pos):
+            pos += 1
+
+
+def _summarize(story_id: str, header: dict) -> dict:
+    templates = header.get("player_character_templates") or {}
+    return {"id": story_id, "title": header.get("title") or story_id, "max_players": header.get("max_players", 1),
+            "roles": list(templates)}
+
+
+def read_story_metadata(path: str) -> dict:
+    """Returns {"id", "title", "max_players", "roles"} of a story file, without parsing its nodes when possible."""
+    story_id = os.path.splitext(os.path.basename(path))[0]
+    with open(path, encoding="utf-8") as f:
+        header = _scan_header(f.read(HEADER_READ_BYTES))
+        if header is None or "title" not in header:
+            f.seek(0)
+            header = json.load(f) # Metadata after the nodes (or none at all): one full parse per file version
+    return _summarize(story_id, header)
+
+
+class StoryCatalog:
+    """Indexes a directory of stories and hands out shared compiled copies, see the module docstring.
+
+    compile_story(story_data, path) may derive whatever a server needs once per story (role tables, compression
+    dictionary, reachability index...); its result is available as CompiledStory.derived. get() is thread-safe, so slow loads can be
+    run in an executor.
+    """
+
+    def __init__(self, directory: str, compile_story=None, memory_budget: int = DEFAULT_MEMORY_BUDGET):
+        self.directory = directory
+        self.compile_story = compile_story
+        self.memory_budget = memory_budget
+        self.index = {} # story_id -> metadata, plus the "path", "size" and "mtime_ns" it was read from
+        self._cache = OrderedDict() # story_id -> CompiledStory, least recently used first
+        self._cost = 0
+        self._live = weakref.WeakValueDictionary() # Every CompiledStory still referenced by someone
+        self._lock = threading.Lock()
+        self._load_locks = {} # story_id -> Lock, so concurrent first requests load a story only once
+        self._failed = {} # story_id -> mtime_ns of a file version that could not be read
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def scan(self) -> int:
+        """(Re)indexes the directory. Only new or changed files are read. Returns the number of stories."""
+        index_path = os.path.join(self.directory, INDEX_FILE)
+        try:
+            with open(index_path, encoding="utf-8") as f:
+                previous = json.load(f)
+        except (OSError, ValueError):
+            previous = {}
+        previous.update(self.index)
+        index, changed = {}, False
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(STORY_EXTENSION) or entry.name == INDEX_FILE or not entry.is_file():
+                continue
+            stat = entry.stat()
+            story_id = entry.name[:-len(STORY_EXTENSION)]
+            cached = previous.get(story_id)
+            if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+                index[story_id] = dict(cached, path=entry.path)
+                continue
+            try:
+                metadata = read_story_metadata(entry.path)
+            except (OSError, ValueError) as e:
+                if self._failed.get(story_id) != stat.st_mtime_ns: # Once per broken version, scans run every few seconds
+                    print(f"Catalog: skipping {entry.name}: {e}")
+                self._failed[story_id] = stat.st_mtime_ns
+                if cached:
+                    index[story_id] = dict(cached, path=entry.path) # Keep serving the last good version
+                continue
+            index[story_id] = dict(metadata, path=entry.path, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            changed = True
+        if changed or index.keys() != previous.keys():
+            try:
+                tmp_path = f"{index_path}.{os.getpid()}.tmp" # Supervisor workers may refresh at the same time
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(index, f)
+                os.replace(tmp_path, index_path)
+            except OSError as e:
+                print(f"Catalog: could not save the index: {e}") # Read-only directory: index again next time
+        with self._lock:
+            self.index = index
+        return len(index)
+
+    def entries(self) -> list:
+        """Metadata of every indexed story, sorted by title."""
+        return sorted((dict(meta) for meta in self.index.values()), key=lambda meta: meta["title"].lower())
+
+    def get(self, story_id: str) -> CompiledStory:
+        """Returns the shared compiled story, loading it on first use. Raises KeyError for an unknown story."""
+        with self._lock:
+            story = self._lookup(story_id)
+            if story is not None:
+                return story
+            if story_id not in self.index:
+                raise KeyError(story_id)
+            load_lock = self._load_locks.setdefault(story_id, threading.Lock())
+        with load_lock:
+            with self._lock:
+                story = self._lookup(story_id) # Someone else may have loaded it while we waited
+                if story is not None:
+                    return story
+                meta = self.index[story_id]
+            story = load_compiled_story(story_id, meta["path"], self.compile_story)
+            with self._lock:
+                self.stats["misses"] += 1
+                self._live[story_id] = story
+                self._remember(story)
+                self._load_locks.pop(story_id, None)
+            return story
+
+    def _lookup(self, story_id: str):
+        story = self._cache.get(story_id)
+        if story is None:
+            story = self._live.get(story_id) # Evicted, but still in use by a session: share it again
+            if story is None:
+                return None
+            self._remember(story)
+        else:
+            self._cache.move_to_end(story_id)
+        self.stats["hits"] += 1
+        return story
+
+    def refresh(self) -> list:
+        """Rescans the directory and recompiles the loaded stories whose file changed. Returns the new snapshots.
+
+        A file that fails to load keeps its previous snapshot in service until it is saved again."""
+        before = self.index
+        self.scan()
+        updated = []
+        for story_id, meta in self.index.items():
+            old = before.get(story_id)
+            if old is None or (old["size"], old["mtime_ns"]) == (meta["size"], meta["mtime_ns"]):
+                continue
+            with self._lock:
+                if story_id not in self._cache and story_id not in self._live:
+                    continue # Not loaded: the next get() reads the new file anyway
+            try:
+                story = load_compiled_story(story_id, meta["path"], self.compile_story)
+            except (OSError, ValueError) as e:
+                print(f"Catalog: keeping the previous version of {story_id}: {e}")
+                continue
+            with self._lock:
+                previous = self._cache.pop(story_id, None)
+                if previous is not None:
+                    self._cost -= previous.cost # Sessions still holding it free it when they end
+                self._live[story_id] = story
+                self._remember(story)
+            updated.append(story)
+        return updated
+
+    def _remember(self, story: CompiledStory):
+        self._cache[story.story_id] = story
+        self._cost += story.cost
+        while self._cost > self.memory_budget and len(self._cache) > 1: # Never evict the story just requested
+            _, evicted = self._cache.popitem(last=False)
+            self._cost -= evicted.cost
+            self.stats["evictions"] += 1
+
+    def cache_info(self) -> dict:
+        with self._lock:
+            return dict(self.stats, stories=len(self.index), cached=list(self._cache), live=len(self._live),
+                        cost=self._cost, budget=self.memory_budget)
@@ -0,0 +1,40 @@
+"""Load-time precomputation of role eligibility for multiplayer stories.
+
+Who may take a choice (actionable_by_roles) never changes while a story is served, so instead of scanning
+role lists every time a menu is built, compile_role_tables() interns the roles of player_character_templates
+to bit positions, gives every choice a role bitmask, and stores for every node the candidate choices of each
+role. At runtime only the dynamic conditions of a role's candidates are left to evaluate.
+"""
+
+
+def compile_role_tables(story_data: dict) -> dict:
+    """Returns the role tables of a story:
+
+    role_bits     role -> bit (1 << position), in player_character_templates order
+    choice_masks  node_id -> [bitmask of the roles allowed to take each choice]
+    role_choices  node_id -> {role: (choice index, ...)} of the non-vote choices the role may take
+    vote_choice   node_id -> index of the choice the table votes on (first requires_vote choice), if any
+    """
+    role_bits = {role: 1 << position for position, role in enumerate(story_data.get("player_character_templates", {}))}
+    all_roles = (1 << len(role_bits)) - 1
+    choice_masks, role_choices, vote_choice = {}, {}, {}
+    # Identical candidate tuples and per-role maps are stored once; most nodes share a few shapes
+    shared_candidates, shared_maps = {}, {}
+    for node_id, node in story_data.get("nodes", {}).items():
+        masks = []
+        choices = node.get("choices", [])
+        for idx, choice in enumerate(choices):
+            if "actionable_by_roles" in choice:
+                masks.append(sum(role_bits.get(role, 0) for role in set(choice["actionable_by_roles"])))
+            else:
+                masks.append(all_roles)
+            if choice.get("requires_vote") and node_id not in vote_choice:
+                vote_choice[node_id] = idx
+        per_role = {}
+        for role, bit in role_bits.items():
+            candidates = tuple(idx for idx, mask in enumerate(masks) if mask & bit and not choices[idx].get("requires_vote"))
+            per_role[role] = shared_candidates.setdefault(candidates, candidates)
+        choice_masks[node_id] = masks
+        role_choices[node_id] = shared_maps.setdefault(tuple(per_role.values()), per_role)
+    return {"role_bits": role_bits, "choice_masks": choice_masks, "role_choices": role_choices, "vote_choice": vote_choice}
+
@@ -1,15 +1,31 @@
+import argparse
+import csv
 import json
+import os
+import re
+import sys
+import time
+
+from story_validator import validate_story, print_report
+
+# Rules shared by the interactive prompts and the batch builder
+EFFECT_TYPES = ["stat_change", "inventory_change"]
+STAT_CHANGE_MODES = ["change_by", "set_to"]
+INVENTORY_ACTIONS = ["add", "remove"]
+CONDITION_TYPES = ["stat_condition", "inventory_condition"]
+STAT_REQUIREMENTS = ["requires_greater_than", "requires_less_than", "requires_equal_to"]
+INVENTORY_REQUIREMENTS = ["present", "absent"]
 
 def initialize_story() -> dict:
     """Initializes a new story structure."""
     return {
         "title": "", 
         "start_node_id": "", 
-        "nodes": {}, 
         "initial_stats": {}, 
         "initial_inventory": [],
         "max_players": 1, # Requirement 6
-        "player_character_templates": {} # Requirement 6
+        "player_character_templates": {}, # Requirement 6
+        "nodes": {} # Last, so catalogs can read the metadata without parsing the nodes
     }
 
 def prompt_for_stats_dict() -> dict:
@@ -49,7 +65,31 @@ def prompt_for_inventory_list() -> list:
             break
     return inventory
 
-def manage_player_templates(story_data: dict): # Requirement 2
+def prompt_for_template(role_name: str) -> dict:
+    """Prompts for the description, initial state and start node of a role's template."""
+    template = {}
+    template["description"] = input(f"Enter description for role '{role_name}': ").strip()
+
+    print(f"\n--- Defining initial stats for role '{role_name}' ---")
+    template["initial_stats"] = prompt_for_stats_dict()
+
+    print(f"\n--- Defining initial inventory for role '{role_name}' ---")
+    template["initial_inventory"] = prompt_for_inventory_list()
+
+    role_start_node = input(f"Enter a specific start_node_id for role '{role_name}' (optional, leave empty if none): ").strip()
+    if role_start_node:
+        template["start_node_id"] = role_start_node
+    return template
+
+def prompt_for_existing_role(story_data: dict) -> str:
+    """Asks for the role name of an existing template; returns an empty string if there is none."""
+    role_name = input("Enter the role name of the template: ").strip()
+    if role_name not in story_data["player_character_templates"]:
+        print(f"No template for role '{role_name}'.")
+        return ""
+    return role_name
+
+def manage_player_templates(story_data: dict, index: "StoryIndex"): # Requirement 2
     """Manages player character templates in the story data."""
     if "player_character_templates" not in story_data: # Should be there from initialize_story
         story_data["player_character_templates"] = {}
@@ -58,7 +98,10 @@ def manage_player_templates(story_data: dict): # Requirement 2
         print("\n--- Manage Player Character Templates ---")
         print("1. Add New Template")
         print("2. View Existing Templates")
-        print("3. Return to Main Menu")
+        print("3. Edit a Template")
+        print("4. Rename a Template")
+        print("5. Delete a Template")
+        print("6. Return to Main Menu")
         choice = input("Enter your choice: ")
 
         if choice == '1': # Add Template
@@ -70,20 +113,9 @@ def manage_player_templates(story_data: dict): # Requirement 2
                 print(f"Role name '{role_name}' already exists. Try editing or choose a new name.")
                 continue
             
-            template = {}
-            template["description"] = input(f"Enter description for role '{role_name}': ").strip()
-            
-            print(f"\n--- Defining initial stats for role '{role_name}' ---")
-            template["initial_stats"] = prompt_for_stats_dict()
-            
-            print(f"\n--- Defining initial inventory for role '{role_name}' ---")
-            template["initial_inventory"] = prompt_for_inventory_list()
-            
-            role_start_node = input(f"Enter a specific start_node_id for role '{role_name}' (optional, leave empty if none): ").strip()
-            if role_start_node:
-                template["start_node_id"] = role_start_node
-            
+            template = prompt_for_template(role_name)
             story_data["player_character_templates"][role_name] = template
+            journal_edit(story_data, "template", role_name, template)
             print(f"Player character template '{role_name}' added successfully.")
 
         elif choice == '2': # View Templates
@@ -98,7 +130,34 @@ def manage_player_templates(story_data: dict): # Requirement 2
                     print(f"  Initial Inventory: {template_data.get('initial_inventory', [])}")
                     if "start_node_id" in template_data:
                         print(f"  Role-Specific Start Node: {template_data['start_node_id']}")
-        elif choice == '3':
+        elif choice == '3': # Edit Template (redefined as a whole, like adding it)
+            role_name = prompt_for_existing_role(story_data)
+            if role_name:
+                template = prompt_for_template(role_name)
+                story_data["player_character_templates"][role_name] = template
+                journal_edit(story_data, "template", role_name, template)
+                print(f"Player character template '{role_name}' updated.")
+        elif choice == '4': # Rename Template
+            role_name = prompt_for_existing_role(story_data)
+            if role_name:
+                new_name = input(f"Enter the new role name for '{role_name}': ").strip()
+                try:
+                    changed = index.rename_role(role_name, new_name)
+                except ValueError as e:
+                    print(f"Cannot rename: {e}.")
+                    continue
+                journal_edit(story_data, "rename_template", role_name, new_name)
+                print(f"Role '{role_name}' renamed to '{new_name}' (choices updated in {changed} nodes).")
+        elif choice == '5': # Delete Template
+            role_name = prompt_for_existing_role(story_data)
+            if role_name and input(f"Delete the template of role '{role_name}'? (yes/no): ").lower() == 'yes':
+                still_used = index.delete_role(role_name)
+                journal_edit(story_data, "delete_template", role_name, None)
+                print(f"Template '{role_name}' deleted.")
+                if still_used:
+                    print(f"Warning: choices in {len(still_used)} nodes are still restricted to '{role_name}': "
+                          f"{_preview_ids(still_used)}")
+        elif choice == '6':
             break
         else:
             print("Invalid choice. Please try again.")
@@ -118,7 +177,7 @@ def prompt_for_effects() -> list:
         effect = {}
         while True:
             effect_type = input("Effect type? (stat_change / inventory_change): ").lower()
-            if effect_type in ["stat_change", "inventory_change"]:
+            if effect_type in EFFECT_TYPES:
                 effect["type"] = effect_type
                 break
             print("Invalid effect type. Choose 'stat_change' or 'inventory_change'.")
@@ -127,7 +186,7 @@ def prompt_for_effects() -> list:
             effect["stat"] = input("Enter stat name to change (e.g., health): ").strip()
             while True:
                 change_mode = input("Change mode? (change_by / set_to): ").lower()
-                if change_mode in ["change_by", "set_to"]:
+                if change_mode in STAT_CHANGE_MODES:
                     break
                 print("Invalid change mode. Choose 'change_by' or 'set_to'.")
             
@@ -143,7 +202,7 @@ def prompt_for_effects() -> list:
             effect["item"] = input("Enter item name (e.g., key): ").strip()
             while True:
                 action = input("Action? (add / remove): ").lower()
-                if action in ["add", "remove"]:
+                if action in INVENTORY_ACTIONS:
                     effect["action"] = action
                     break
                 print("Invalid action. Choose 'add' or 'remove'.")
@@ -166,7 +225,7 @@ def prompt_for_conditions() -> list:
         condition = {}
         while True:
             condition_type = input("Condition type? (stat_condition / inventory_condition): ").lower()
-            if condition_type in ["stat_condition", "inventory_condition"]:
+            if condition_type in CONDITION_TYPES:
                 condition["type"] = condition_type
                 break
             print("Invalid condition type. Choose 'stat_condition' or 'inventory_condition'.")
@@ -175,7 +234,7 @@ def prompt_for_conditions() -> list:
             condition["stat"] = input("Enter stat name for condition (e.g., charisma): ").strip()
             while True:
                 req_type = input("Requirement type? (requires_greater_than / requires_less_than / requires_equal_to): ").lower()
-                if req_type in ["requires_greater_than", "requires_less_than", "requires_equal_to"]:
+                if req_type in STAT_REQUIREMENTS:
                     condition[req_type] = None # Placeholder, will be filled next
                     break
                 print("Invalid requirement type.")
@@ -192,7 +251,7 @@ def prompt_for_conditions() -> list:
             condition["item"] = input("Enter item name for condition (e.g., map): ").strip()
             while True:
                 req = input("Requirement? (present / absent): ").lower()
-                if req in ["present", "absent"]:
+                if req in INVENTORY_REQUIREMENTS:
                     condition["requires"] = req
                     break
                 print("Invalid requirement. Choose 'present' or 'absent'.")
@@ -201,7 +260,60 @@ def prompt_for_conditions() -> list:
         print("Condition added.")
     return conditions
 
-def add_node(story_data: dict):
+def prompt_for_target(choice_text: str, current: str = "") -> str:
+    """Prompts for the target node ID of a choice; an empty answer keeps `current` when there is one."""
+    while True:
+        if current:
+            target_node_id = input(f"Enter the target node ID for the choice '{choice_text}' (leave empty for '{current}'): ").strip() or current
+        else:
+            target_node_id = input(f"Enter the target node ID for the choice '{choice_text}': ").strip()
+        if not target_node_id: # Basic check, actual node existence not validated here
+            print("Target node ID cannot be empty.")
+        else:
+            return target_node_id
+
+def prompt_for_choice_details(choice_dict: dict):
+    """Prompts for the roles, effects, conditions and vote of a choice that has its text and target."""
+    choice_text = choice_dict["text"]
+
+    # Requirement 3: actionable_by_roles
+    if input("Restrict this choice to specific player roles? (yes/no): ").lower() == 'yes':
+        roles = []
+        while True:
+            role_name = input("Enter role name allowed to make this choice (or leave empty to finish): ").strip()
+            if not role_name: break
+            roles.append(role_name)
+        if roles: choice_dict["actionable_by_roles"] = roles
+    
+    print(f"\n--- Define general effects for choice '{choice_text}' (apply to game state or all players) ---")
+    choice_general_effects = prompt_for_effects()
+    if choice_general_effects:
+        choice_dict["effects"] = choice_general_effects
+
+    # Requirement 4: effects_for_chooser
+    if input("Add effects that apply *only* to the player making this choice? (yes/no): ").lower() == 'yes':
+        print(f"\n--- Define effects *for the chooser* of choice '{choice_text}' ---")
+        chooser_effects = prompt_for_effects()
+        if chooser_effects:
+            choice_dict["effects_for_chooser"] = chooser_effects
+    
+    print(f"\n--- Define conditions for choice '{choice_text}' ---")
+    choice_conditions = prompt_for_conditions()
+    if choice_conditions:
+        choice_dict["conditions"] = choice_conditions
+
+    # Requirement 5: requires_vote
+    if input("Does this choice require a vote from all players to proceed? (yes/no): ").lower() == 'yes':
+        choice_dict["requires_vote"] = True
+
+def prompt_for_choice() -> dict:
+    """Prompts for a whole new choice."""
+    choice_text = input("Enter the text for this choice (e.g., 'Go left'): ").strip()
+    choice_dict = {"text": choice_text, "target_node_id": prompt_for_target(choice_text)}
+    prompt_for_choice_details(choice_dict)
+    return choice_dict
+
+def add_node(story_data: dict, index: "StoryIndex"):
     """Adds a new node to the story."""
     while True:
         node_id = input("Enter a unique ID for this node (e.g., 'room1', 'forest_path'): ").strip()
@@ -217,9 +329,11 @@ def add_node(story_data: dict):
     print(f"\n--- Define global effects for node '{node_id}' (apply to all players or game state) ---")
     node_effects = prompt_for_effects() # These are global effects for the node
     
-    story_data["nodes"][node_id] = {"id": node_id, "text": node_text, "choices": []}
+    node = {"id": node_id, "text": node_text, "choices": []}
     if node_effects:
-        story_data["nodes"][node_id]["effects"] = node_effects # Global effects
+        node["effects"] = node_effects # Global effects
+    index.update_node(node_id, node)
+    journal_edit(story_data, "node", node_id, node)
     
     print(f"Node '{node_id}' added.")
 
@@ -227,60 +341,155 @@ def add_node(story_data: dict):
     while True:
         add_choice_prompt = input("Add a choice for this node? (yes/no): ").lower()
         if add_choice_prompt == 'yes':
-            choice_text = input("Enter the text for this choice (e.g., 'Go left'): ").strip()
-            
-            while True:
-                target_node_id = input(f"Enter the target node ID for the choice '{choice_text}': ").strip()
-                if not target_node_id: # Basic check, actual node existence not validated here
-                    print("Target node ID cannot be empty.")
-                else:
-                    break
-            
-            choice_dict = {"text": choice_text, "target_node_id": target_node_id}
-
-            # Requirement 3: actionable_by_roles
-            if input("Restrict this choice to specific player roles? (yes/no): ").lower() == 'yes':
-                roles = []
-                while True:
-                    role_name = input("Enter role name allowed to make this choice (or leave empty to finish): ").strip()
-                    if not role_name: break
-                    roles.append(role_name)
-                if roles: choice_dict["actionable_by_roles"] = roles
-            
-            print(f"\n--- Define general effects for choice '{choice_text}' (apply to game state or all players) ---")
-            choice_general_effects = prompt_for_effects()
-            if choice_general_effects:
-                choice_dict["effects"] = choice_general_effects
-
-            # Requirement 4: effects_for_chooser
-            if input("Add effects that apply *only* to the player making this choice? (yes/no): ").lower() == 'yes':
-                print(f"\n--- Define effects *for the chooser* of choice '{choice_text}' ---")
-                chooser_effects = prompt_for_effects()
-                if chooser_effects:
-                    choice_dict["effects_for_chooser"] = chooser_effects
-            
-            print(f"\n--- Define conditions for choice '{choice_text}' ---")
-            choice_conditions = prompt_for_conditions()
-            if choice_conditions:
-                choice_dict["conditions"] = choice_conditions
-
-            # Requirement 5: requires_vote
-            if input("Does this choice require a vote from all players to proceed? (yes/no): ").lower() == 'yes':
-                choice_dict["requires_vote"] = True
-            
-            story_data["nodes"][node_id]["choices"].append(choice_dict)
+            node["choices"].append(prompt_for_choice())
+            index.update_node(node_id, node)
+            journal_edit(story_data, "node", node_id, node) # Whole node again, so replay stays one step
             print("Choice added.")
         elif add_choice_prompt == 'no':
             break
         else:
             print("Invalid input. Please enter 'yes' or 'no'.")
 
+# --- Editing and search ---
+MAX_LISTED_NODES = 20 # Search results and "linked from" lists are cut after this many ids
+
+def _preview_ids(node_ids: list) -> str:
+    shown = ", ".join(node_ids[:MAX_LISTED_NODES])
+    if len(node_ids) > MAX_LISTED_NODES:
+        shown += f", ... ({len(node_ids) - MAX_LISTED_NODES} more)"
+    return shown
+
+def _preview_text(text: str, width: int = 60) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= width else text[:width - 3] + "..."
+
+def search_nodes(story_data: dict, index: "StoryIndex"):
+    """Lists the nodes whose ID or text contains every word of a query."""
+    query = input("Enter words to search for in node IDs and text: ").strip()
+    started = time.perf_counter()
+    matches = index.search(query)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    print(f"{len(matches)} nodes match ({elapsed_ms:.2f} ms).")
+    for node_id in matches[:MAX_LISTED_NODES]:
+        print(f"  {node_id}: {_preview_text(story_data['nodes'][node_id].get('text', ''))}")
+    if len(matches) > MAX_LISTED_NODES:
+        print(f"  ... and {len(matches) - MAX_LISTED_NODES} more. Add words to narrow the search.")
+
+def find_node(story_data: dict, index: "StoryIndex") -> str:
+    """Asks for a node by ID, or by words of its text. Returns its ID, or an empty string if none was picked."""
+    query = input("Enter the node ID, or words to search for: ").strip()
+    if query in story_data["nodes"]:
+        return query
+    matches = index.search(query)
+    if not matches:
+        print("No node matches.")
+        return ""
+    if len(matches) == 1:
+        return matches[0]
+    for number, node_id in enumerate(matches[:MAX_LISTED_NODES], start=1):
+        print(f"{number}. {node_id}: {_preview_text(story_data['nodes'][node_id].get('text', ''))}")
+    if len(matches) > MAX_LISTED_NODES:
+        print(f"... and {len(matches) - MAX_LISTED_NODES} more. Add words to narrow the search.")
+    pick = input("Enter the number of the node (or leave empty to cancel): ").strip()
+    if pick.isdigit() and 1 <= int(pick) <= min(len(matches), MAX_LISTED_NODES):
+        return matches[int(pick) - 1]
+    return ""
+
+def prompt_for_choice_number(node: dict) -> int:
+    """Asks for one of the node's choices by number. Returns its index, or -1."""
+    if not node["choices"]:
+        print("This node has no choices.")
+        return -1
+    pick = input(f"Enter the choice number (1-{len(node['choices'])}): ").strip()
+    if pick.isdigit() and 1 <= int(pick) <= len(node["choices"]):
+        return int(pick) - 1
+    print("Invalid choice number.")
+    return -1
+
+def print_node(story_data: dict, index: "StoryIndex", node_id: str):
+    node = story_data["nodes"][node_id]
+    print(f"\n--- Node '{node_id}' ---")
+    print(f"Text: {node.get('text', '')}")
+    if node.get("effects"):
+        print(f"Effects: {node['effects']}")
+    for number, choice in enumerate(node["choices"], start=1):
+        missing = "" if choice["target_node_id"] in story_data["nodes"] else " (not defined yet)"
+        print(f"  {number}. {choice['text']} -> {choice['target_node_id']}{missing}")
+    referrers = index.referrers(node_id)
+    print(f"Linked from: {_preview_ids(referrers) if referrers else 'no other node'}")
+
+def edit_node(story_data: dict, index: "StoryIndex"):
+    """Edits, renames or deletes an existing node and its choices."""
+    node_id = find_node(story_data, index)
+    while node_id:
+        print_node(story_data, index, node_id)
+        node = story_data["nodes"][node_id]
+        print("1. Edit text")
+        print("2. Edit a choice")
+        print("3. Add a choice")
+        print("4. Delete a choice")
+        print("5. Rename node")
+        print("6. Delete node")
+        print("7. Return to Main Menu")
+        choice = input("Enter your choice: ")
+
+        if choice == '1':
+            node["text"] = input(f"Enter the new descriptive text for node '{node_id}': ").strip()
+        elif choice == '2':
+            idx = prompt_for_choice_number(node)
+            if idx < 0:
+                continue
+            old_choice = node["choices"][idx]
+            choice_text = input(f"Enter the text for this choice (leave empty for '{old_choice['text']}'): ").strip() or old_choice["text"]
+            new_choice = dict(old_choice, text=choice_text, target_node_id=prompt_for_target(choice_text, old_choice["target_node_id"]))
+            if input("Redefine its roles, effects, conditions and vote? (yes/no): ").lower() == 'yes':
+                new_choice = {"text": new_choice["text"], "target_node_id": new_choice["target_node_id"]}
+                prompt_for_choice_details(new_choice)
+            node["choices"][idx] = new_choice
+        elif choice == '3':
+            node["choices"].append(prompt_for_choice())
+        elif choice == '4':
+            idx = prompt_for_choice_number(node)
+            if idx < 0:
+                continue
+            del node["choices"][idx]
+        elif choice == '5':
+            new_id = input(f"Enter the new ID for node '{node_id}': ").strip()
+            try:
+                retargeted = index.rename_node(node_id, new_id)
+            except ValueError as e:
+                print(f"Cannot rename: {e}.")
+                continue
+            journal_edit(story_data, "rename_node", node_id, new_id)
+            print(f"Node '{node_id}' renamed to '{new_id}' ({retargeted} choices retargeted).")
+            node_id = new_id
+            continue
+        elif choice == '6':
+            if input(f"Delete node '{node_id}'? (yes/no): ").lower() != 'yes':
+                continue
+            still_linked = index.delete_node(node_id)
+            journal_edit(story_data, "delete_node", node_id, None)
+            print(f"Node '{node_id}' deleted.")
+            if still_linked:
+                print(f"Warning: choices in {len(still_linked)} nodes still lead to '{node_id}': {_preview_ids(still_linked)}")
+            if node_id == story_data["start_node_id"]:
+                print("Warning: it was the story's start node; set a new one.")
+            break
+        elif choice == '7':
+            break
+        else:
+            print("Invalid choice. Please try again.")
+            continue
+        index.update_node(node_id, node) # Text and choice edits change the node in place
+        journal_edit(story_data, "node", node_id, node)
+
 def set_start_node(story_data: dict):
     """Sets the start node for the story."""
     while True:
         start_node_id = input("Enter the ID of the node to be the start node: ")
         if start_node_id in story_data["nodes"]:
             story_data["start_node_id"] = start_node_id
+            journal_edit(story_data, "set", "start_node_id", start_node_id)
             print(f"Node '{start_node_id}' set as the start node.")
             break
         elif not start_node_id:
@@ -288,10 +497,13 @@ def set_start_node(story_data: dict):
         else:
             print("Node ID not found. Please enter an existing node ID.")
 
-def save_story(story_data: dict):
-    """Saves the story to a JSON file."""
+def save_story(story_data: dict, default_filename: str = None) -> str:
+    """Saves the story to a JSON file and returns its name."""
     while True:
-        filename = input("Enter a filename to save the story (e.g., my_story.json): ").strip()
+        if default_filename:
+            filename = input(f"Enter a filename to save the story (leave empty for '{default_filename}'): ").strip() or default_filename
+        else:
+            filename = input("Enter a filename to save the story (e.g., my_story.json): ").strip()
         if not filename:
             print("Filename cannot be empty.")
         elif not filename.endswith(".json"):
@@ -301,15 +513,629 @@ def save_story(story_data: dict):
         else:
             break
             
-    with open(filename, 'w') as f:
-        json.dump(story_data, f, indent=2)
+    _write_json_atomically(filename, story_data, indent=2)
     print(f"Story saved to '{filename}'.")
+    return filename
+
+# --- Edit journal and autosave ---
+# Every edit is appended to JOURNAL_FILE as one JSON line as soon as it is made, so a crash loses at most the
+# edit being typed. The first line names the base file the edits apply to. That base is the last explicit
+# save, or the autosave written every COMPACT_EVERY_EDITS edits. Recovery loads the base and replays the
+# edits, so it takes time proportional to the number of edits. Edits are "set" (a top-level story field),
+# "node" and "template", each replacing one entry, and the deletes and renames of nodes and templates, which
+# replay through the story index so a rename retargets the same choices it did when it was made.
+JOURNAL_FILE = "story_creator.journal"
+AUTOSAVE_FILE = "story_creator_autosave.json"
+COMPACT_EVERY_EDITS = 50
+
+journal_state = {"file": None, "edits": 0}
+
+def _write_json_atomically(path: str, data, **dump_args):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, **dump_args)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def start_journal(base: str = None):
+    """Starts a fresh journal whose edits apply on top of `base` (None for a new story)."""
+    if journal_state["file"]:
+        journal_state["file"].close()
+    tmp_path = JOURNAL_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(json.dumps({"op": "base", "path": base}) + "\n")
+    os.replace(tmp_path, JOURNAL_FILE) # The old journal stays valid until the new one is complete
+    journal_state.update(file=open(JOURNAL_FILE, "a"), edits=0)
+
+def close_journal():
+    """Ends the session cleanly: the story was saved, so the journal and the autosave are no longer needed."""
+    if journal_state["file"]:
+        journal_state["file"].close()
+    journal_state.update(file=None, edits=0)
+    for path in (JOURNAL_FILE, AUTOSAVE_FILE):
+        if os.path.exists(path):
+            os.remove(path)
 
-def main():
-    """Main function to run the story creator tool."""
+def journal_edit(story_data: dict, op: str, key: str, value):
+    """Records an edit already applied to story_data, and compacts into the autosave every COMPACT_EVERY_EDITS."""
+    if not journal_state["file"]:
+        return
+    journal_state["file"].write(json.dumps({"op": op, "key": key, "value": value}) + "\n")
+    journal_state["file"].flush()
+    os.fsync(journal_state["file"].fileno())
+    journal_state["edits"] += 1
+    if journal_state["edits"] >= COMPACT_EVERY_EDITS:
+        _write_json_atomically(AUTOSAVE_FILE, story_data, separators=(",", ":")) # Compact: no indent to slow it down
+        start_journal(AUTOSAVE_FILE)
+
+def apply_edit(story_data: dict, edit: dict, index: "StoryIndex"):
+    """Applies one journaled edit to story_data, keeping its index up to date."""
+    if edit["op"] == "set":
+        story_data[edit["key"]] = edit["value"]
+    elif edit["op"] == "node":
+        index.update_node(edit["key"], edit["value"])
+    elif edit["op"] == "template":
+        story_data["player_character_templates"][edit["key"]] = edit["value"]
+    elif edit["op"] == "delete_node":
+        index.delete_node(edit["key"])
+    elif edit["op"] == "rename_node":
+        index.rename_node(edit["key"], edit["value"])
+    elif edit["op"] == "delete_template":
+        index.delete_role(edit["key"])
+    elif edit["op"] == "rename_template":
+        index.rename_role(edit["key"], edit["value"])
+
+def recover_story() -> tuple:
+    """Rebuilds the story of an interrupted session from the journal and reopens the journal for appending.
+
+    Returns (story_data, its index, number of edits replayed, base file the edits applied to or None).
+    """
     story_data = initialize_story()
-    print("Welcome to the Story Creator Tool!")
+    index = StoryIndex(story_data)
+    base, replayed = None, 0
+    with open(JOURNAL_FILE, "rb+") as f:
+        good_end = 0
+        for line_no, line in enumerate(iter(f.readline, b"")):
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("incomplete line")
+                edit = json.loads(line)
+            except ValueError:
+                f.truncate(good_end) # Torn last line from the crash; everything before it is intact
+                break
+            good_end += len(line)
+            if line_no == 0 and edit.get("op") == "base":
+                base = edit.get("path")
+                if base:
+                    with open(base) as base_file:
+                        story_data.update(json.load(base_file))
+                    index = StoryIndex(story_data)
+                continue
+            apply_edit(story_data, edit, index)
+            replayed += 1
+    journal_state.update(file=open(JOURNAL_FILE, "a"), edits=replayed)
+    return story_data, index, replayed, base
+
+# --- Story index (editing and search) ---
+# Editing a large story must not rescan every node. StoryIndex keeps three tables of node ids, each keyed by:
+#   words  a lowercase word of a node's id or text (the inverted index searches use)
+#   links  a choice target, defined or not (reverse links, for renames and for "linked from")
+#   roles  a role in a choice's actionable_by_roles (for template renames)
+# Every node change goes through update_node(), rename_node() or delete_node(), which reindex only the nodes
+# involved. A search or a rename costs time proportional to the nodes it touches, not to the story size.
+WORD_PATTERN = re.compile(r"[^\W_]+") # "forest_path" is found by "forest" and by "path"
+
+def _words(text: str) -> set:
+    return set(WORD_PATTERN.findall(text.lower()))
+
+class StoryIndex:
+    """Inverted index of a story's node ids and text, with reverse links, kept in step with every edit."""
+
+    def __init__(self, story_data: dict):
+        self.story = story_data
+        self.words, self.links, self.roles = {}, {}, {}
+        self.tables = {"words": self.words, "links": self.links, "roles": self.roles}
+        self.node_keys = {} # node_id -> {table: keys the node is filed under}, to unfile it again
+        for node_id in story_data["nodes"]:
+            self._add(node_id)
+
+    def _add(self, node_id: str):
+        node = self.story["nodes"][node_id]
+        choices = node.get("choices", [])
+        keys = self.node_keys[node_id] = {
+            "words": _words(node_id) | _words(node.get("text", "")),
+            "links": {choice.get("target_node_id") for choice in choices},
+            "roles": {role for choice in choices for role in choice.get("actionable_by_roles", [])}}
+        for table, values in keys.items():
+            entries = self.tables[table]
+            for value in values:
+                entries.setdefault(value, set()).add(node_id)
+
+    def _remove(self, node_id: str):
+        for table, values in self.node_keys.pop(node_id, {}).items():
+            entries = self.tables[table]
+            for value in values:
+                entries[value].discard(node_id)
+                if not entries[value]:
+                    del entries[value]
+
+    def _reindex(self, node_id: str):
+        self._remove(node_id)
+        self._add(node_id)
+
+    def search(self, query: str) -> list:
+        """Returns the ids of the nodes whose id or text contains every word of the query, sorted."""
+        postings = sorted((self.words.get(word, set()) for word in _words(query)), key=len)
+        if not postings:
+            return []
+        return sorted(set.intersection(*postings)) # Smallest first, so the intersection stays small
 
+    def referrers(self, node_id: str) -> list:
+        """Returns the ids of the other nodes with a choice leading to node_id, sorted."""
+        return sorted(self.links.get(node_id, set()) - {node_id})
+
+    def update_node(self, node_id: str, node: dict):
+        """Adds or replaces a whole node."""
+        self.story["nodes"][node_id] = node
+        self._reindex(node_id)
+
+    def delete_node(self, node_id: str) -> list:
+        """Deletes a node and returns the other nodes whose choices still lead to it."""
+        if node_id not in self.story["nodes"]:
+            raise ValueError(f"node '{node_id}' does not exist")
+        self._remove(node_id)
+        del self.story["nodes"][node_id]
+        return self.referrers(node_id)
+
+    def rename_node(self, old_id: str, new_id: str) -> int:
+        """Renames a node and retargets every choice and start node leading to it. Returns the choices changed."""
+        nodes = self.story["nodes"]
+        if old_id not in nodes:
+            raise ValueError(f"node '{old_id}' does not exist")
+        if not new_id:
+            raise ValueError("node ID cannot be empty")
+        if new_id in nodes:
+            raise ValueError(f"node '{new_id}' already exists")
+        sources = self.referrers(old_id)
+        self._remove(old_id)
+        node = nodes[new_id] = nodes.pop(old_id) # The node moves to the end of the file
+        node["id"] = new_id
+        retargeted = 0
+        for source in sources + [new_id]: # new_id itself for its own loops
+            for choice in nodes[source].get("choices", []):
+                if choice.get("target_node_id") == old_id:
+                    choice["target_node_id"] = new_id
+                    retargeted += 1
+            self._reindex(source)
+        if self.story.get("start_node_id") == old_id:
+            self.story["start_node_id"] = new_id
+        for template in self.story["player_character_templates"].values():
+            if template.get("start_node_id") == old_id:
+                template["start_node_id"] = new_id
+        return retargeted
+
+    def delete_role(self, role: str) -> list:
+        """Deletes a player character template and returns the nodes whose choices still name its role."""
+        if role not in self.story["player_character_templates"]:
+            raise ValueError(f"role '{role}' does not exist")
+        del self.story["player_character_templates"][role]
+        return sorted(self.roles.get(role, ()))
+
+    def rename_role(self, old_role: str, new_role: str) -> int:
+        """Renames a template, keeping its place, and every choice restriction naming it. Returns the nodes changed."""
+        templates = self.story["player_character_templates"]
+        if old_role not in templates:
+            raise ValueError(f"role '{old_role}' does not exist")
+        if not new_role:
+            raise ValueError("role name cannot be empty")
+        if new_role in templates:
+            raise ValueError(f"role '{new_role}' already exists")
+        renamed = [(new_role if role == old_role else role, template) for role, template in templates.items()]
+        templates.clear()
+        templates.update(renamed)
+        node_ids = sorted(self.roles.get(old_role, ()))
+        for node_id in node_ids:
+            for choice in self.story["nodes"][node_id].get("choices", []):
+                roles = choice.get("actionable_by_roles", [])
+                if old_role in roles:
+                    choice["actionable_by_roles"] = list(dict.fromkeys(new_role if role == old_role else role
+                                                                         for role in roles))
+            self._reindex(node_id)
+        return len(node_ids)
+
+# --- Batch build (non-interactive) ---
+# A batch source is a stream of records, either CSV (one column per field, blank cells ignored) or JSON lines
+# (one object per line). The "kind" field says what a record is, and records apply in order:
+#   story      title, start_node_id, max_players (must come before the first node)
+#   template   role, description, start_node_id (must come before the first node)
+#   stat       stat and value, plus an optional role: an initial stat of the story, or of that role's template
+#   item       item, plus an optional role: an initial inventory item of the story, or of that role's template
+#   node       id and text; starts a new node (the default kind, so plain node objects also work in JSON lines)
+#   choice     text, target_node_id, actionable_by_roles ("|"-separated in CSV), requires_vote
+#   effect     an effect; scope is node, choice or chooser (default: the current choice, else the node)
+#   condition  a condition for the current choice
+BATCH_INT_FIELDS = ["max_players", "value", "change_by", "set_to"] + STAT_REQUIREMENTS
+BATCH_ROLE_SEPARATOR = "|"
+BATCH_MAX_REPORTED_ERRORS = 100 # Further errors are only counted, so a broken source can't fill memory
+BATCH_WRITE_BUFFER = 1 << 20
+CHOICE_RECORD_LISTS = ("effects", "effects_for_chooser", "conditions")
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _check_record_lists(record: dict, keys: tuple) -> str:
+    """Returns why one of the record's nested lists (effects, choices...) isn't a list of JSON objects, or ""."""
+    for key in keys:
+        value = record.get(key, [])
+        if not isinstance(value, list) or not all(isinstance(item, dict) for item in value):
+            return f"{key} must be a list of JSON objects"
+    return ""
+
+def validate_effect(effect: dict) -> str:
+    """Returns why an effect breaks the rules of prompt_for_effects, or an empty string if it is valid."""
+    if effect.get("type") not in EFFECT_TYPES:
+        return f"effect type must be one of {', '.join(EFFECT_TYPES)}"
+    if effect["type"] == "stat_change":
+        modes = [mode for mode in STAT_CHANGE_MODES if mode in effect]
+        if not effect.get("stat"):
+            return "stat_change needs a stat"
+        if len(modes) != 1:
+            return f"stat_change needs exactly one of {', '.join(STAT_CHANGE_MODES)}"
+        if not _is_int(effect[modes[0]]):
+            return f"{modes[0]} must be an integer"
+    else:
+        if not effect.get("item"):
+            return "inventory_change needs an item"
+        if effect.get("action") not in INVENTORY_ACTIONS:
+            return f"inventory_change action must be one of {', '.join(INVENTORY_ACTIONS)}"
+    return ""
+
+def validate_condition(condition: dict) -> str:
+    """Returns why a condition breaks the rules of prompt_for_conditions, or an empty string if it is valid."""
+    if condition.get("type") not in CONDITION_TYPES:
+        return f"condition type must be one of {', '.join(CONDITION_TYPES)}"
+    if condition["type"] == "stat_condition":
+        requirements = [req for req in STAT_REQUIREMENTS if req in condition]
+        if not condition.get("stat"):
+            return "stat_condition needs a stat"
+        if len(requirements) != 1:
+            return f"stat_condition needs exactly one of {', '.join(STAT_REQUIREMENTS)}"
+        if not _is_int(condition[requirements[0]]):
+            return f"{requirements[0]} must be an integer"
+    else:
+        if not condition.get("item"):
+            return "inventory_condition needs an item"
+        if condition.get("requires") not in INVENTORY_REQUIREMENTS:
+            return f"inventory_condition requires must be one of {', '.join(INVENTORY_REQUIREMENTS)}"
+    return ""
+
+def _split_roles(value: str) -> list:
+    return [role.strip() for role in value.split(BATCH_ROLE_SEPARATOR) if role.strip()]
+
+def _csv_converter(column: str):
+    """Returns the function turning a non-blank cell of this column into a record value."""
+    if column in BATCH_INT_FIELDS:
+        return int
+    if column == "actionable_by_roles":
+        return _split_roles
+    if column == "requires_vote":
+        return lambda value: value.lower() in ("yes", "true", "1")
+    return str
+
+def read_batch_records(path: str):
+    """Yields (location, record, error) for each record of a .csv or JSON-lines source, reading it lazily."""
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = csv.reader(f)
+            header = [column.strip() for column in next(rows, [])]
+            columns = [(column, _csv_converter(column)) for column in header] # Looked up once, not per cell
+            for line_no, row in enumerate(rows, start=2):
+                try:
+                    # Blank cells are skipped; surplus cells without a header are dropped by zip()
+                    record = {column: convert(value.strip()) for (column, convert), value in zip(columns, row)
+                              if value and not value.isspace()}
+                except ValueError as e:
+                    yield f"{path}:{line_no}", None, f"expected an integer ({e})"
+                    continue
+                if record:
+                    yield f"{path}:{line_no}", record, ""
+    else:
+        with open(path, encoding="utf-8") as f:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    yield f"{path}:{line_no}", None, f"invalid JSON ({e})"
+                    continue
+                if isinstance(record, dict):
+                    yield f"{path}:{line_no}", record, ""
+                else:
+                    yield f"{path}:{line_no}", None, "a record must be a JSON object"
+
+class BatchStoryBuilder:
+    """Validates batch records in order and streams the story to `out` one node at a time.
+
+    Only the node being assembled is kept in memory, plus the set of node ids (to reject duplicates) and of
+    targets not defined yet. The story metadata is written before the nodes, so it can't change after the
+    first node record.
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self.story = initialize_story()
+        del self.story["nodes"] # Streamed instead
+        self.node = None # Node being assembled, written out when the next one starts
+        self.choice = None # Last choice of that node, which effect and condition records attach to
+        self.node_ids = set()
+        self.pending_targets = set() # Choice targets not defined as nodes (yet)
+        self.nodes_written = 0
+        self.errors = []
+        self.error_count = 0
+
+    def error(self, location: str, message: str):
+        self.error_count += 1
+        if len(self.errors) < BATCH_MAX_REPORTED_ERRORS:
+            self.errors.append(f"{location}: {message}")
+
+    def add(self, location: str, record: dict):
+        record = dict(record)
+        kind = record.pop("kind", "node")
+        handler = getattr(self, f"_add_{kind}", None) if isinstance(kind, str) else None
+        if handler is None:
+            self.error(location, f"unknown record kind '{kind}'")
+            return
+        message = handler(record)
+        if message:
+            self.error(location, message)
+
+    def _add_story(self, record: dict) -> str:
+        if self.node_ids:
+            return "story records must come before the first node"
+        unknown = set(record) - {"title", "start_node_id", "max_players", "initial_stats", "initial_inventory"}
+        if unknown:
+            return f"unknown story fields: {', '.join(sorted(unknown))}"
+        if "title" in record and not str(record["title"]).strip():
+            return "title cannot be empty"
+        if "max_players" in record and (not _is_int(record["max_players"]) or record["max_players"] <= 0):
+            return "max_players must be a positive integer"
+        message = self._check_initial_state(record)
+        if not message:
+            self.story.update(record)
+        return message
+
+    def _add_template(self, record: dict) -> str:
+        if self.node_ids:
+            return "template records must come before the first node"
+        role = str(record.pop("role", "")).strip()
+        templates = self.story["player_character_templates"]
+        if not role:
+            return "role name cannot be empty"
+        if role in templates:
+            return f"role '{role}' already exists"
+        unknown = set(record) - {"description", "start_node_id", "initial_stats", "initial_inventory"}
+        if unknown:
+            return f"unknown template fields: {', '.join(sorted(unknown))}"
+        message = self._check_initial_state(record)
+        if not message:
+            templates[role] = {"description": "", "initial_stats": {}, "initial_inventory": [], **record}
+        return message
+
+    def _check_initial_state(self, record: dict) -> str:
+        stats = record.get("initial_stats", {})
+        inventory = record.get("initial_inventory", [])
+        if not isinstance(stats, dict) or not all(name and _is_int(value) for name, value in stats.items()):
+            return "initial_stats must map stat names to integers"
+        if not isinstance(inventory, list) or not all(isinstance(item, str) and item for item in inventory):
+            return "initial_inventory must be a list of item names"
+        if len(set(inventory)) != len(inventory):
+            return "initial_inventory lists an item twice"
+        return ""
+
+    def _owner(self, record: dict):
+        """Returns the story or the role template a stat/item record belongs to (None for an unknown role)."""
+        role = record.pop("role", "")
+        if not role:
+            return self.story
+        return self.story["player_character_templates"].get(role)
+
+    def _add_stat(self, record: dict) -> str:
+        if self.node_ids:
+            return "stat records must come before the first node"
+        owner = self._owner(record)
+        if owner is None:
+            return "unknown role; add its template record first"
+        if not record.get("stat"):
+            return "stat name cannot be empty"
+        if not _is_int(record.get("value")):
+            return "stat value must be an integer"
+        owner.setdefault("initial_stats", {})[record["stat"]] = record["value"]
+        return ""
+
+    def _add_item(self, record: dict) -> str:
+        if self.node_ids:
+            return "item records must come before the first node"
+        owner = self._owner(record)
+        if owner is None:
+            return "unknown role; add its template record first"
+        if not record.get("item"):
+            return "item name cannot be empty"
+        inventory = owner.setdefault("initial_inventory", [])
+        if record["item"] in inventory:
+            return f"item '{record['item']}' is already in the inventory"
+        inventory.append(record["item"])
+        return ""
+
+    def _add_node(self, record: dict) -> str:
+        node_id = str(record.get("id", "")).strip()
+        if not node_id:
+            return "node ID cannot be empty"
+        if node_id in self.node_ids:
+            return f"node ID '{node_id}' already exists"
+        message = _check_record_lists(record, ("effects", "choices"))
+        if message:
+            return message
+        for choice in record["choices"] if "choices" in record else []: # Checked before the node is started
+            message = _check_record_lists(choice, CHOICE_RECORD_LISTS)
+            if message:
+                return message
+        if not self.node_ids:
+            self._write_header(node_id)
+        self._flush_node()
+        self.node_ids.add(node_id)
+        self.pending_targets.discard(node_id)
+        self.node = {"id": node_id, "text": str(record.get("text", "")), "choices": []}
+        self.choice = None
+        for effect in record.get("effects", []):
+            message = self._add_effect(dict(effect, scope="node"))
+            if message:
+                return message
+        for choice in record.get("choices", []):
+            message = self._add_choice(dict(choice))
+            if message:
+                return message
+        return ""
+
+    def _add_choice(self, record: dict) -> str:
+        if self.node is None:
+            return "choice records must follow a node"
+        message = _check_record_lists(record, CHOICE_RECORD_LISTS)
+        if message:
+            return message
+        target = str(record.get("target_node_id", "")).strip()
+        if not target:
+            return "target node ID cannot be empty"
+        choice = {"text": str(record.get("text", "")), "target_node_id": target}
+        roles = record.get("actionable_by_roles")
+        if roles:
+            if not isinstance(roles, list) or not all(isinstance(role, str) and role for role in roles):
+                return "actionable_by_roles must be a list of role names"
+            choice["actionable_by_roles"] = roles
+        if target not in self.node_ids:
+            self.pending_targets.add(target)
+        self.node["choices"].append(choice)
+        self.choice = choice
+        for effect in record.get("effects", []):
+            message = self._add_effect(dict(effect, scope="choice"))
+            if message:
+                return message
+        for effect in record.get("effects_for_chooser", []):
+            message = self._add_effect(dict(effect, scope="chooser"))
+            if message:
+                return message
+        for condition in record.get("conditions", []):
+            message = self._add_condition(dict(condition))
+            if message:
+                return message
+        if record.get("requires_vote") is True:
+            choice["requires_vote"] = True
+        return ""
+
+    def _add_effect(self, record: dict) -> str:
+        scope = record.pop("scope", "choice" if self.choice else "node")
+        if self.node is None:
+            return "effect records must follow a node"
+        if scope not in ("node", "choice", "chooser"):
+            return "effect scope must be node, choice or chooser"
+        if scope != "node" and self.choice is None:
+            return f"{scope} effects must follow a choice"
+        message = validate_effect(record)
+        if message:
+            return message
+        owner, key = {"node": (self.node, "effects"), "choice": (self.choice, "effects"),
+                      "chooser": (self.choice, "effects_for_chooser")}[scope]
+        owner.setdefault(key, []).append(record)
+        return ""
+
+    def _add_condition(self, record: dict) -> str:
+        if self.choice is None:
+            return "condition records must follow a choice"
+        message = validate_condition(record)
+        if not message:
+            self.choice.setdefault("conditions", []).append(record)
+        return message
+
+    def _write_header(self, first_node_id: str):
+        if not self.story["start_node_id"]:
+            self.story["start_node_id"] = first_node_id
+        header = json.dumps(self.story, separators=(",", ":"))
+        self.out.write(header[:-1] + ',"nodes":{')
+
+    def _flush_node(self):
+        if self.node is not None:
+            separator = "," if self.nodes_written else ""
+            self.out.write(f'{separator}{json.dumps(self.node["id"])}:{json.dumps(self.node, separators=(",", ":"))}')
+            self.nodes_written += 1
+            self.node = self.choice = None
+
+    def finish(self) -> list:
+        """Writes the last node and closes the story. Returns warnings about choices leading nowhere."""
+        if not self.node_ids:
+            self.error("end of input", "no node records")
+            return []
+        self._flush_node()
+        self.out.write("}}\n")
+        if not self.story["title"]:
+            self.error("end of input", "title cannot be empty (add a story record)")
+        start_nodes = [("story", self.story["start_node_id"])]
+        start_nodes += [(f"role '{role}'", template["start_node_id"])
+                        for role, template in self.story["player_character_templates"].items() if template.get("start_node_id")]
+        for owner, node_id in start_nodes:
+            if node_id not in self.node_ids:
+                self.error("end of input", f"start node '{node_id}' of the {owner} does not exist")
+        return [f"choices lead to undefined node '{node_id}'" for node_id in sorted(self.pending_targets)]
+
+def build_story_batch(sources: list, output_path: str) -> dict:
+    """Builds a story from batch sources, in order. The output file is only replaced if there are no errors.
+
+    Returns a summary with the number of nodes written, the (first) errors, their count, and warnings.
+    """
+    tmp_path = output_path + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8", buffering=BATCH_WRITE_BUFFER) as out:
+            builder = BatchStoryBuilder(out)
+            for source in sources:
+                for location, record, error in read_batch_records(source):
+                    if error:
+                        builder.error(location, error)
+                    else:
+                        builder.add(location, record)
+            warnings = builder.finish()
+    except BaseException: # Unreadable source, full disk, Ctrl+C...: no partial file is left behind
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if builder.error_count:
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, output_path)
+    return {"nodes": builder.nodes_written, "errors": builder.errors, "error_count": builder.error_count,
+            "warnings": warnings}
+
+def batch_main(sources: list, output_path: str) -> int:
+    """Runs a batch build from the command line and returns the exit status."""
+    started = time.perf_counter()
+    try:
+        summary = build_story_batch(sources, output_path)
+    except OSError as e:
+        print(f"Error: {e}")
+        return 1
+    for warning in summary["warnings"]:
+        print(f"Warning: {warning}")
+    if summary["error_count"]:
+        for error in summary["errors"]:
+            print(f"Error: {error}")
+        if summary["error_count"] > len(summary["errors"]):
+            print(f"... and {summary['error_count'] - len(summary['errors'])} more errors.")
+        print(f"Build failed with {summary['error_count']} errors; '{output_path}' was not written.")
+        return 1
+    print(f"Story built: {summary['nodes']} nodes saved to '{output_path}' in {time.perf_counter() - started:.2f}s.")
+    return 0
+
+def setup_story_details(story_data: dict):
+    """Prompts for the title, player count and global initial state of a new story."""
     while True:
         title = input("Enter the title for your story: ").strip()
         if title:
@@ -317,6 +1143,7 @@ def main():
             break
         else:
             print("Title cannot be empty.")
+    journal_edit(story_data, "set", "title", story_data["title"])
     print(f"Story title set to: {story_data['title']}")
 
     # Requirement 1: max_players
@@ -336,47 +1163,114 @@ def main():
                 break
         except ValueError:
             print("Invalid input. Please enter a number.")
+    journal_edit(story_data, "set", "max_players", story_data["max_players"])
 
     # --- Global Initial Stats (Optional, for game state not tied to player templates) ---
     if input("Define global initial stats for the story (e.g., team_score)? (yes/no): ").lower() == 'yes':
         print("\n--- Defining Global Initial Stats ---")
         story_data["initial_stats"] = prompt_for_stats_dict() # Reusing new helper
+        journal_edit(story_data, "set", "initial_stats", story_data["initial_stats"])
     
     # --- Global Initial Inventory (Optional) ---
     if input("\nDefine global initial inventory items for the story? (yes/no): ").lower() == 'yes':
         print("\n--- Defining Global Initial Inventory ---")
         story_data["initial_inventory"] = prompt_for_inventory_list() # Reusing new helper
+        journal_edit(story_data, "set", "initial_inventory", story_data["initial_inventory"])
 
+def main(edit_path: str = None):
+    """Main function to run the story creator tool, on a new story or on the story file `edit_path`."""
+    print("Welcome to the Story Creator Tool!")
+    story_data, saved_filename = None, None
+    if os.path.exists(JOURNAL_FILE):
+        if input("Unsaved edits from a previous session were found. Recover them? (yes/no): ").lower() == 'yes':
+            try:
+                story_data, index, replayed, base = recover_story()
+                if base != AUTOSAVE_FILE:
+                    saved_filename = base # Saving again goes to the same file by default
+                print(f"Recovered '{story_data['title']}': {replayed} edits replayed, {len(story_data['nodes'])} nodes.")
+            except (OSError, ValueError, KeyError) as e:
+                os.replace(JOURNAL_FILE, JOURNAL_FILE + ".broken") # Kept for manual inspection, never replayed again
+                print(f"Could not recover the previous session ({e}); its journal was moved to '{JOURNAL_FILE}.broken'.")
+        if story_data is None:
+            close_journal() # Discard the old session
+
+    if story_data is None and edit_path:
+        story_data = initialize_story()
+        try:
+            with open(edit_path) as f:
+                story_data.update(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Error: could not open '{edit_path}' ({e}).")
+            return
+        index = StoryIndex(story_data)
+        start_journal(edit_path)
+        saved_filename = edit_path
+        print(f"Editing '{story_data['title']}': {len(story_data['nodes'])} nodes.")
+
+    if story_data is None:
+        story_data = initialize_story()
+        index = StoryIndex(story_data)
+        start_journal()
+        setup_story_details(story_data)
 
     while True:
         print("\n--- Main Menu ---")
         print("1. Add a new node")
         print("2. Set the story's main start node")
         print("3. Manage Player Character Templates") # Requirement 2
-        print("4. Save and exit")
-        # Future: print("5. Edit an existing node")
-        # Future: print("6. Edit story details (title, max_players, global stats/inventory)")
+        print("4. Validate story")
+        print("5. Save")
+        print("6. Save and exit")
+        print("7. Edit, rename or delete a node")
+        print("8. Search nodes")
+        # Future: print("9. Edit story details (title, max_players, global stats/inventory)")
 
         choice = input("Enter your choice: ")
 
         if choice == '1':
-            add_node(story_data)
+            add_node(story_data, index)
         elif choice == '2':
             if not story_data["nodes"]:
                 print("Please add some nodes before setting a start node.")
             else:
                 set_start_node(story_data) # Sets the global start_node_id
         elif choice == '3':
-            manage_player_templates(story_data) # New function for Requirement 2
+            manage_player_templates(story_data, index) # New function for Requirement 2
         elif choice == '4':
+            print_report(validate_story(story_data))
+        elif choice in ('5', '6'):
             if not story_data["start_node_id"] and story_data["nodes"]:
                 print("Warning: The main story start node has not been set.")
             # Additional check: if templates define role-specific start nodes, but no global start node, it might be okay.
             # For now, a global start node is still generally recommended as a fallback.
-            save_story(story_data)
-            break
+            report = validate_story(story_data)
+            if report["errors"] or report["warnings"]:
+                print_report(report) # Broken links are saved anyway, so work in progress is never lost
+            saved_filename = save_story(story_data, saved_filename)
+            if choice == '6':
+                close_journal()
+                break
+            start_journal(saved_filename) # Later edits apply on top of the saved file
+            if os.path.exists(AUTOSAVE_FILE):
+                os.remove(AUTOSAVE_FILE)
+        elif choice == '7':
+            if not story_data["nodes"]:
+                print("There are no nodes to edit yet.")
+            else:
+                edit_node(story_data, index)
+        elif choice == '8':
+            search_nodes(story_data, index)
         else:
             print("Invalid choice. Please enter a valid number.")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Create a story interactively, or build one from CSV / JSON-lines records.")
+    parser.add_argument("--build", nargs="+", metavar="SOURCE", help="Build non-interactively from these .csv/.jsonl sources, in order")
+    parser.add_argument("-o", "--output", help="Story file written by --build")
+    parser.add_argument("--edit", metavar="STORY", help="Open an existing story file for editing")
+    args = parser.parse_args()
+    if args.build:
+        if not args.output:
+            parser.error("--build needs --output")
+        sys.exit(batch_main(args.build, args.output))
+    main(args.edit)
@@ -1,7 +1,11 @@
 import json
 import argparse
+import os
 import sys
 
+from story_catalog import StoryCatalog
+import story_saves
+
 def load_story(filepath: str) -> dict:
   """Reads a JSON file and returns it as a Python dictionary."""
   with open(filepath, 'r') as f:
@@ -73,25 +77,51 @@ def check_conditions(conditions_list: list, player_stats: dict, player_inventory
             # Optionally handle unknown condition types, for now, they are ignored (effectively pass)
     return True
 
-def play_story(story_data: dict):
-  """Plays the story using the provided story data."""
-  player_stats = {}
-  player_inventory = []
-
+def new_playthrough(story_data: dict) -> tuple:
+  """Returns the starting (node id, stats, inventory) of a playthrough."""
   # Initialize player state from story_data (Requirement 1)
-  initial_stats = story_data.get("initial_stats", {})
-  player_stats.update(initial_stats)
-  
-  initial_inventory = story_data.get("initial_inventory", [])
-  for item in initial_inventory:
+  player_stats = dict(story_data.get("initial_stats", {}))
+  player_inventory = []
+  for item in story_data.get("initial_inventory", []):
       if item not in player_inventory: # Ensure uniqueness
           player_inventory.append(item)
-
-  current_node_id = story_data.get('start_node_id')
+  return story_data.get('start_node_id'), player_stats, player_inventory
+
+def get_available_choices(node: dict, player_stats: dict, player_inventory: list) -> list:
+  """Returns the node's choices whose conditions the player meets (Requirement 6), in story order."""
+  return [choice_data for choice_data in node.get("choices", [])
+          if check_conditions(choice_data.get("conditions"), player_stats, player_inventory)]
+
+def format_state(player_stats: dict, player_inventory: list) -> str:
+  """The stats and inventory block shown before every node (Requirement 2)."""
+  lines = ["", "--- Stats ---"]
+  lines += [f"{stat.capitalize()}: {value}" for stat, value in player_stats.items()] or ["None"]
+  lines.append("--- Inventory ---")
+  lines += [f"- {item.capitalize()}" for item in player_inventory] or ["Empty"]
+  lines.append("------------")
+  return "\n".join(lines)
+
+def play_story(story_data: dict, save_path: str = None):
+  """Plays the story using the provided story data.
+  With save_path, the game is saved there at every node and resumed from it on the next run."""
+  current_node_id, player_stats, player_inventory = new_playthrough(story_data)
   if not current_node_id:
       print("Error: Story has no 'start_node_id'. Cannot begin.")
       sys.exit(1)
 
+  resumed = False # A saved node's effects were applied before it was saved
+  if save_path:
+    save_tables = story_saves.compile_save_tables(story_data)
+    saved_game = story_saves.read_save(save_path)
+    if saved_game:
+      try:
+        current_node_id, player_stats, player_inventory = story_saves.restore_playthrough(save_tables, saved_game)
+        resumed = True
+        print(f"Resuming the game saved in '{save_path}'.")
+      except ValueError as e:
+        print(f"Error: Cannot resume from '{save_path}': {e}")
+        sys.exit(1)
+
   while True:
     current_node = story_data.get('nodes', {}).get(current_node_id)
     if not current_node:
@@ -100,42 +130,28 @@ def play_story(story_data: dict):
 
     # Apply node effects (Requirement 4a)
     node_effects = current_node.get("effects")
-    if node_effects:
+    if node_effects and not resumed:
         apply_effects(node_effects, player_stats, player_inventory)
+    resumed = False
 
     # Display player state (Requirement 2)
-    print("\n--- Stats ---")
-    if player_stats:
-        for stat, value in player_stats.items():
-            print(f"{stat.capitalize()}: {value}")
-    else:
-        print("None")
-    
-    print("--- Inventory ---")
-    if player_inventory:
-        for item in player_inventory:
-            print(f"- {item.capitalize()}")
-    else:
-        print("Empty")
-    print("------------")
+    print(format_state(player_stats, player_inventory))
     
     print(f"\n{current_node.get('text', 'This node has no text.')}")
 
     # Filter and display available choices (Requirement 6)
-    available_choices_display = [] # For displaying to user (text and new index)
-    possible_choices_data = [] # For mapping selection back to original choice data
-
-    original_choices = current_node.get("choices", [])
-    for original_idx, choice_data in enumerate(original_choices):
-        conditions = choice_data.get("conditions")
-        if check_conditions(conditions, player_stats, player_inventory):
-            available_choices_display.append(choice_data.get("text", "Unnamed choice"))
-            possible_choices_data.append(choice_data) # Store the full choice data
+    possible_choices_data = get_available_choices(current_node, player_stats, player_inventory)
+    available_choices_display = [choice_data.get("text", "Unnamed choice") for choice_data in possible_choices_data]
 
     if not available_choices_display:
       print("The End.") # Or some other message if no choices are available but it's not an explicit end node
+      if save_path and os.path.exists(save_path):
+        os.remove(save_path) # Finished: the next run starts a new game
       break
 
+    if save_path:
+      story_saves.write_save(save_path, story_saves.save_playthrough(save_tables, current_node_id, player_stats, player_inventory))
+
     for i, choice_text in enumerate(available_choices_display):
       print(f"{i + 1}. {choice_text}")
 
@@ -156,6 +172,8 @@ def play_story(story_data: dict):
         print("Invalid input. Please enter a number.")
       except EOFError: 
         print("\nExiting game.")
+        if save_path:
+          print(f"Your progress is saved in '{save_path}'.")
         sys.exit(0)
     
     # Apply choice effects (Requirement 4b)
@@ -169,10 +187,33 @@ def play_story(story_data: dict):
         sys.exit(1)
 
 
+def choose_story_path(directory: str) -> str:
+  """Lists the stories of a directory (see story_catalog.py) and returns the path of the one the player picks."""
+  catalog = StoryCatalog(directory)
+  if not catalog.scan():
+    print(f"Error: No stories found in '{directory}'")
+    sys.exit(1)
+  entries = catalog.entries()
+  for i, meta in enumerate(entries):
+    print(f"{i + 1}. {meta['title']}")
+  while True:
+    try:
+      choice_str = input("Choose a story: ")
+    except (EOFError, KeyboardInterrupt):
+      print("\nExiting game.")
+      sys.exit(0)
+    if choice_str.isdecimal() and 1 <= int(choice_str) <= len(entries):
+      return entries[int(choice_str) - 1]["path"]
+    print("Invalid choice. Please enter a number from the list.")
+
+
 if __name__ == "__main__":
   parser = argparse.ArgumentParser(description="Play a Choose Your Own Adventure story from a JSON file.")
-  parser.add_argument("story_filepath", help="Path to the story JSON file")
+  parser.add_argument("story_filepath", help="Path to the story JSON file, or a directory of stories to choose from")
+  parser.add_argument("--save", metavar="PATH", help="Save the game to PATH as you play, and resume from it if it exists")
   args = parser.parse_args()
+  if os.path.isdir(args.story_filepath):
+    args.story_filepath = choose_story_path(args.story_filepath)
 
   try:
     story_data = load_story(args.story_filepath)
@@ -184,4 +225,4 @@ if __name__ == "__main__":
     sys.exit(1)
   # Removed KeyError check here as play_story now handles missing keys more gracefully.
   
-  play_story(story_data)
+  play_story(story_data, args.save)
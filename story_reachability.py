@@ -0,0 +1,363 @@
+"""Precomputed reachability of a story's endings, for bots, hints and anything asking "can this player still finish?".
+
+build_reachability() indexes the story graph once:
+
+  components  strongly connected components (Tarjan), so loops are known and the endings reachable from every
+              node are a bitmask propagated over the component DAG
+  distances   for every ending, the fewest choices from each node that can reach it, ignoring conditions
+  routes      for every ending and node, one route per choice that leads there: its length and the stats and
+              items the player must have *at this node* for the whole route to be open
+
+Route requirements are composed backwards from each ending, through every choice's conditions and effects, so an
+item picked up on the way satisfies a condition further down. Which effects a choice has depends on who plays the
+story, the index is built for one effect model:
+
+  single   story_engine.py and story_server.py: the choice's "effects", then the target node's "effects"
+  chooser  multiplayer tables (mp_game.py): only the choice's "effects_for_chooser", applied to the chooser
+
+A route is the choice plus the best route of its target (the shortest one whose requirements can be met at all),
+so a node may have open detours the index doesn't list, and reachable() is the structural upper bound. can_reach()
+holds for a player who takes every choice of the route under the index's effect model; at a table, roles
+(actionable_by_roles, ignored here), votes and the other players' choices decide whether they get to.
+
+Queries only look at the node's own entries: reachable() and distance() are O(1), route()/can_reach() check the
+requirements of the node's few routes, shortest_path() is linear in the path's length.
+
+The index is saved next to the story (STORY.json.MODEL.reach) and reused while the story's content is unchanged.
+"""
+import hashlib
+import json
+import os
+from collections import deque
+
+REACH_EXTENSION = ".reach"
+REACH_FORMAT = 2
+EFFECT_MODELS = ("single", "chooser")
+EMPTY_REQUIREMENT = ((), (), ()) # (stats: ((stat, greater_than, less_than, equal_to), ...), items present, items absent)
+
+
+# --- Requirements ---
+def _effect_summary(effect_lists) -> tuple:
+    """Net result of effect lists applied in order: ({stat: ("add", delta) | ("set", value)}, {item: present?})."""
+    stats, items = {}, {}
+    for effects in effect_lists:
+        for effect in effects or []:
+            if effect.get("type") == "stat_change" and effect.get("stat"):
+                stat = effect["stat"]
+                if effect.get("change_by") is not None: # Takes precedence over set_to, as in apply_effects()
+                    kind, value = stats.get(stat, ("add", 0))
+                    try:
+                        stats[stat] = (kind, value + effect["change_by"])
+                    except TypeError: # Not a number: no condition on the stat can pass until a set_to replaces it
+                        stats[stat] = ("set", None)
+                elif effect.get("set_to") is not None:
+                    stats[stat] = ("set", effect["set_to"])
+            elif effect.get("type") == "inventory_change" and effect.get("item") and effect.get("action") in ("add", "remove"):
+                items[effect["item"]] = effect["action"] == "add"
+    return stats, items
+
+
+def _bounds_met(value, greater_than, less_than, equal_to) -> bool:
+    try:
+        return ((greater_than is None or value > greater_than) and (less_than is None or value < less_than)
+                and (equal_to is None or value == equal_to))
+    except TypeError: # A set_to put a string where a number is compared
+        return False
+
+
+def _requirement(conditions, after, effects) -> tuple:
+    """What must hold before a choice so that its conditions pass and, once `effects` (an _effect_summary) are
+    applied, the requirement `after` holds too. Returns None if no state can satisfy it, which includes bounds
+    and stat changes that aren't numbers."""
+    try:
+        return _compose_requirement(conditions, after, effects)
+    except TypeError: # A string where a number is compared or shifted, as in _bounds_met()
+        return None
+
+
+def _compose_requirement(conditions, after, effects) -> tuple:
+    stat_bounds = {} # stat: [greater_than, less_than, equal_to]
+    present, absent = set(), set()
+
+    def bound(stat, greater_than, less_than, equal_to):
+        bounds = stat_bounds.setdefault(stat, [None, None, None])
+        if greater_than is not None:
+            bounds[0] = greater_than if bounds[0] is None else max(bounds[0], greater_than)
+        if less_than is not None:
+            bounds[1] = less_than if bounds[1] is None else min(bounds[1], less_than)
+        if equal_to is not None:
+            if bounds[2] is not None and bounds[2] != equal_to:
+                return False
+            bounds[2] = equal_to
+        return True
+
+    stat_effects, item_effects = effects
+    for stat, greater_than, less_than, equal_to in after[0]:
+        kind, value = stat_effects.get(stat, ("add", 0))
+        if kind == "set":
+            if not _bounds_met(value, greater_than, less_than, equal_to):
+                return None
+        elif not bound(stat, *(None if b is None else b - value for b in (greater_than, less_than, equal_to))):
+            return None
+    for item in after[1]:
+        if item_effects.get(item) is False:
+            return None
+        if item not in item_effects:
+            present.add(item)
+    for item in after[2]:
+        if item_effects.get(item) is True:
+            return None
+        if item not in item_effects:
+            absent.add(item)
+
+    for condition in conditions or []: # Same rules as story_engine.check_conditions()
+        if condition.get("type") == "stat_condition" and condition.get("stat") is not None:
+            limits = (condition.get("requires_greater_than"), condition.get("requires_less_than"), condition.get("requires_equal_to"))
+            if limits != (None, None, None) and not bound(condition["stat"], *limits):
+                return None
+        elif condition.get("type") == "inventory_condition" and condition.get("item") is not None:
+            if condition.get("requires") == "present":
+                present.add(condition["item"])
+            elif condition.get("requires") == "absent":
+                absent.add(condition["item"])
+
+    if present & absent:
+        return None
+    for greater_than, less_than, equal_to in stat_bounds.values():
+        if equal_to is not None and not _bounds_met(equal_to, greater_than, less_than, None):
+            return None
+        if greater_than is not None and less_than is not None and not greater_than < less_than:
+            return None
+    return (tuple(sorted((stat, *bounds) for stat, bounds in stat_bounds.items())), tuple(sorted(present)), tuple(sorted(absent)))
+
+
+def requirement_met(requirement, player_stats: dict, player_inventory) -> bool:
+    stat_bounds, present, absent = requirement
+    for stat, greater_than, less_than, equal_to in stat_bounds:
+        if not _bounds_met(player_stats.get(stat, 0), greater_than, less_than, equal_to):
+            return False
+    return all(item in player_inventory for item in present) and not any(item in player_inventory for item in absent)
+
+
+# --- Graph ---
+def _components(node_ids, successors) -> list:
+    """Tarjan's strongly connected components, iteratively. Returns the component number of every node; components
+    are numbered in reverse topological order (every edge goes to a component numbered lower or equal)."""
+    index, low, component = {}, {}, {}
+    stack, on_stack = [], set()
+    count = 0
+    for root in node_ids:
+        if root in index:
+            continue
+        work = [(root, 0)]
+        while work:
+            node_id, pos = work.pop()
+            if pos == 0:
+                index[node_id] = low[node_id] = len(index)
+                stack.append(node_id)
+                on_stack.add(node_id)
+            targets = successors[node_id]
+            while pos < len(targets) and targets[pos] in index:
+                if targets[pos] in on_stack:
+                    low[node_id] = min(low[node_id], index[targets[pos]])
+                pos += 1
+            if pos < len(targets):
+                work.append((node_id, pos + 1))
+                work.append((targets[pos], 0))
+                continue
+            if low[node_id] == index[node_id]:
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component[member] = count
+                    if member == node_id:
+                        break
+                count += 1
+            if work: # Back in the parent, which reached this node through targets[pos - 1]
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node_id])
+    return [component[node_id] for node_id in node_ids]
+
+
+class ReachabilityIndex:
+    """See the module docstring. Build with build_reachability() or load_reachability()."""
+    __slots__ = ("endings", "ending_bits", "reach_masks", "cyclic", "distances", "routes", "requirements", "targets")
+
+    def __init__(self, endings, reach_masks, cyclic, distances, routes, requirements, targets):
+        self.endings = endings # Node ids of the nodes without choices
+        self.ending_bits = {ending: 1 << i for i, ending in enumerate(endings)}
+        self.reach_masks = reach_masks # node_id -> bitmask of the endings reachable, ignoring conditions
+        self.cyclic = cyclic # Node ids that are part of a loop
+        self.distances = distances # ending -> {node_id: fewest choices to it, ignoring conditions}
+        self.routes = routes # ending -> {node_id: [(choice index, length, requirement number)], shortest first}
+        self.requirements = requirements # Distinct requirements, shared by the routes
+        self.targets = targets # node_id -> target node id of each choice (None for a missing target)
+
+    def reachable(self, node_id, ending) -> bool:
+        """Whether any path leads from node_id to the ending, whatever the conditions along it."""
+        return bool(self.reach_masks.get(node_id, 0) & self.ending_bits.get(ending, 0))
+
+    def reachable_endings(self, node_id) -> list:
+        mask = self.reach_masks.get(node_id, 0)
+        return [ending for ending in self.endings if mask & self.ending_bits[ending]]
+
+    def distance(self, node_id, ending):
+        """Fewest choices from node_id to the ending ignoring conditions, or None if it can't be reached."""
+        return self.distances.get(ending, {}).get(node_id)
+
+    def in_loop(self, node_id) -> bool:
+        return node_id in self.cyclic
+
+    def route(self, node_id, ending, player_stats, player_inventory):
+        """(choice index, length) of the shortest route to the ending open to a player in this state, or None."""
+        for choice_idx, length, requirement in self.routes.get(ending, {}).get(node_id, ()):
+            if requirement_met(self.requirements[requirement], player_stats, player_inventory):
+                return choice_idx, length
+        return None
+
+    def can_reach(self, node_id, ending, player_stats, player_inventory) -> bool:
+        return self.route(node_id, ending, player_stats, player_inventory) is not None
+
+    def nearest_ending(self, node_id, player_stats, player_inventory, endings=None):
+        """(ending, length) of the closest ending (among `endings`, default all) with an open route, or None."""
+        best = None
+        for ending in self.endings if endings is None else endings:
+            if not self.reachable(node_id, ending):
+                continue
+            found = self.route(node_id, ending, player_stats, player_inventory)
+            if found and (best is None or found[1] < best[1]):
+                best = (ending, found[1])
+        return best
+
+    def shortest_path(self, node_id, ending, player_stats, player_inventory) -> list:
+        """Node ids along the route route() picks, from node_id to the ending included, or [] if there is none."""
+        found = self.route(node_id, ending, player_stats, player_inventory)
+        if found is None:
+            return []
+        path = [node_id]
+        choice_idx = found[0]
+        while choice_idx is not None:
+            node_id = self.targets[node_id][choice_idx]
+            path.append(node_id)
+            best = self.routes[ending].get(node_id)
+            choice_idx = best[0][0] if best else None # Beyond the first choice, routes follow each node's best route
+        return path
+
+    def to_json(self) -> dict:
+        return {"endings": self.endings, "reach_masks": self.reach_masks, "cyclic": sorted(self.cyclic),
+                "distances": self.distances, "routes": self.routes, "requirements": self.requirements, "targets": self.targets}
+
+    @classmethod
+    def from_json(cls, data):
+        # Tuples come back as lists, which the queries read the same way: no conversion pass over big indexes
+        return cls(data["endings"], data["reach_masks"], set(data["cyclic"]), data["distances"], data["routes"],
+                   data["requirements"], data["targets"])
+
+
+def _edge_effects(effect_model, choice, target_node) -> list:
+    """The effect lists taking `choice` applies, in order, under the effect model (see the module docstring)."""
+    if effect_model == "chooser":
+        return [choice.get("effects_for_chooser")]
+    return [choice.get("effects"), target_node.get("effects")]
+
+
+def build_reachability(story_data: dict, effect_model: str = "single") -> ReachabilityIndex:
+    if effect_model not in EFFECT_MODELS:
+        raise ValueError(f"unknown effect model '{effect_model}', use {' or '.join(EFFECT_MODELS)}")
+    nodes = story_data.get("nodes", {})
+    node_ids = list(nodes)
+    targets = {node_id: [choice.get("target_node_id") if choice.get("target_node_id") in nodes else None
+                         for choice in node.get("choices", [])] for node_id, node in nodes.items()}
+    successors = {node_id: list(dict.fromkeys(t for t in node_targets if t is not None)) for node_id, node_targets in targets.items()}
+    predecessors = {node_id: [] for node_id in nodes} # node_id -> [(source node_id, choice index)]
+    for node_id, node_targets in targets.items():
+        for choice_idx, target in enumerate(node_targets):
+            if target is not None:
+                predecessors[target].append((node_id, choice_idx))
+    endings = [node_id for node_id, node in nodes.items() if not node.get("choices")]
+
+    # Endings reachable from each component, in one pass over the component DAG (sinks first)
+    component = dict(zip(node_ids, _components(node_ids, successors)))
+    members = {}
+    for node_id in node_ids:
+        members.setdefault(component[node_id], []).append(node_id)
+    cyclic = {node_id for node_id in node_ids if len(members[component[node_id]]) > 1 or node_id in successors[node_id]}
+    ending_bits = {ending: 1 << i for i, ending in enumerate(endings)}
+    component_masks = {}
+    for number in range(len(members)):
+        mask = 0
+        for node_id in members[number]:
+            mask |= ending_bits.get(node_id, 0)
+            for target in successors[node_id]:
+                if component[target] != number:
+                    mask |= component_masks[component[target]]
+        component_masks[number] = mask
+    reach_masks = {node_id: component_masks[component[node_id]] for node_id in node_ids}
+
+    # Per ending: conditions-blind distances, and routes composed backwards in order of length
+    edge_effects = {} # (node_id, choice index) -> _effect_summary of taking the choice and entering its target
+    requirement_numbers = {EMPTY_REQUIREMENT: 0}
+    distances, routes = {}, {}
+    for ending in endings:
+        distance = {ending: 0}
+        queue = deque([ending])
+        while queue:
+            node_id = queue.popleft()
+            for source, _ in predecessors[node_id]:
+                if source not in distance:
+                    distance[source] = distance[node_id] + 1
+                    queue.append(source)
+        distances[ending] = distance
+
+        node_routes = {ending: []}
+        best = {ending: EMPTY_REQUIREMENT} # Requirement of each node's best route, set when the node is settled
+        queue = deque([(ending, 0)])
+        while queue:
+            node_id, length = queue.popleft()
+            for source, choice_idx in predecessors[node_id]:
+                key = (source, choice_idx)
+                if key not in edge_effects:
+                    edge_effects[key] = _effect_summary(_edge_effects(effect_model, nodes[source]["choices"][choice_idx], nodes[node_id]))
+                requirement = _requirement(nodes[source]["choices"][choice_idx].get("conditions"), best[node_id], edge_effects[key])
+                if requirement is None:
+                    continue
+                number = requirement_numbers.setdefault(requirement, len(requirement_numbers))
+                node_routes.setdefault(source, []).append((choice_idx, length + 1, number)) # Appended in order of length
+                if source not in best:
+                    best[source] = requirement
+                    queue.append((source, length + 1))
+        del node_routes[ending]
+        routes[ending] = node_routes
+    requirements = [None] * len(requirement_numbers)
+    for requirement, number in requirement_numbers.items():
+        requirements[number] = requirement
+    return ReachabilityIndex(endings, reach_masks, cyclic, distances, routes, requirements, targets)
+
+
+def story_fingerprint(story_data: dict) -> str:
+    return hashlib.blake2b(json.dumps(story_data, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+
+def load_reachability(story_data: dict, story_path: str = None, effect_model: str = "single") -> ReachabilityIndex:
+    """The story's index for the effect model, read from its sidecar file if that was built from the same content,
+    else built (and saved). Each model has a sidecar of its own."""
+    if story_path is None:
+        return build_reachability(story_data, effect_model)
+    fingerprint = story_fingerprint(story_data)
+    sidecar = f"{story_path}.{effect_model}{REACH_EXTENSION}"
+    try:
+        with open(sidecar, encoding="utf-8") as f:
+            saved = json.load(f)
+        if saved.get("format") == REACH_FORMAT and saved.get("story") == fingerprint and saved.get("effects") == effect_model:
+            return ReachabilityIndex.from_json(saved["index"])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass # Missing or unreadable: rebuild it
+    index = build_reachability(story_data, effect_model)
+    try:
+        tmp_path = f"{sidecar}.{os.getpid()}.tmp" # Supervisor workers and bot processes may build it at the same time
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"format": REACH_FORMAT, "story": fingerprint, "effects": effect_model, "index": index.to_json()}, f)
+        os.replace(tmp_path, sidecar)
+    except OSError as e:
+        print(f"Could not save the reachability index of {story_path}: {e}") # Read-only directory: rebuilt next time
+    return index
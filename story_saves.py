@@ -0,0 +1,121 @@
+"""Compact binary saves of single-player playthroughs (story_engine.py, story_server.py).
+
+A playthrough is (current node id, stats, inventory), taken once the node's effects have been applied, while
+the player is choosing. compile_save_tables() interns a story's node ids, stat names and items to small
+integers, in sorted order, and fingerprints these tables. A save is SAVE_HEADER (magic, format, fingerprint,
+node index, stat and item counts) followed by one STAT_VALUE per stat and one index per item, both in the
+player's order so the restored game displays the same. It's a few dozen bytes, encoded and decoded in
+microseconds, so a server can write a session out and drop it from memory.
+
+Editing texts, effects or conditions keeps old saves valid. Adding, removing or renaming a node, stat or item
+changes the fingerprint, and restore_playthrough() refuses the save (ValueError) instead of misreading it.
+"""
+import hashlib
+import json
+import os
+import struct
+
+SAVE_MAGIC = b"HDVS"
+SAVE_FORMAT = 1
+SAVE_HEADER = struct.Struct(">4sB8sIHH") # magic, format, story fingerprint, node index, stat count, item count
+STAT_VALUE = struct.Struct(">BHq") # kind, stat index, value (an int, or a float's bits)
+STAT_INT, STAT_FLOAT, STAT_JSON = 0, 1, 2 # STAT_JSON values are followed by that many bytes of JSON
+FLOAT_BITS = struct.Struct(">d")
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def _state_names(story_data: dict):
+    """Every stat and item the story can give the player: initial state plus node and choice effects."""
+    stats = set(story_data.get("initial_stats", {}))
+    items = set(story_data.get("initial_inventory", []))
+    for node in story_data.get("nodes", {}).values():
+        effect_lists = [node.get("effects") or []] + [choice.get("effects") or [] for choice in node.get("choices", [])]
+        for effects in effect_lists:
+            for effect in effects:
+                if effect.get("type") == "stat_change" and effect.get("stat"):
+                    stats.add(effect["stat"])
+                elif effect.get("type") == "inventory_change" and effect.get("item"):
+                    items.add(effect["item"])
+    return sorted(stats), sorted(items)
+
+
+def compile_save_tables(story_data: dict) -> dict:
+    """Returns the intern tables of a story:
+
+    fingerprint   8 bytes identifying the tables; saves only restore against equal tables
+    node_ids      node index -> node id, and node_index the reverse
+    stat_names    stat index -> stat name, and stat_index the reverse
+    items         item index -> item, and item_index the reverse
+    """
+    node_ids = sorted(story_data.get("nodes", {}))
+    stat_names, items = _state_names(story_data)
+    fingerprint = hashlib.blake2b(json.dumps([node_ids, stat_names, items]).encode(), digest_size=8).digest()
+    return {"fingerprint": fingerprint,
+            "node_ids": node_ids, "node_index": {node_id: i for i, node_id in enumerate(node_ids)},
+            "stat_names": stat_names, "stat_index": {stat: i for i, stat in enumerate(stat_names)},
+            "items": items, "item_index": {item: i for i, item in enumerate(items)}}
+
+
+def save_playthrough(tables: dict, node_id, player_stats: dict, player_inventory: list) -> bytes:
+    """Encodes a playthrough. Raises ValueError for a node, stat or item the story doesn't have."""
+    try:
+        parts = [SAVE_HEADER.pack(SAVE_MAGIC, SAVE_FORMAT, tables["fingerprint"], tables["node_index"][node_id],
+                                  len(player_stats), len(player_inventory))]
+        stat_index = tables["stat_index"]
+        for stat, value in player_stats.items():
+            if type(value) is int and INT64_MIN <= value <= INT64_MAX:
+                parts.append(STAT_VALUE.pack(STAT_INT, stat_index[stat], value))
+            elif type(value) is float:
+                parts.append(STAT_VALUE.pack(STAT_FLOAT, stat_index[stat], struct.unpack(">q", FLOAT_BITS.pack(value))[0]))
+            else: # Whatever else a set_to effect put there
+                encoded = json.dumps(value).encode()
+                parts.append(STAT_VALUE.pack(STAT_JSON, stat_index[stat], len(encoded)) + encoded)
+        item_index = tables["item_index"]
+        parts.append(struct.pack(f">{len(player_inventory)}H", *[item_index[item] for item in player_inventory]))
+    except KeyError as e:
+        raise ValueError(f"{e} is not part of this story") from None
+    return b"".join(parts)
+
+
+def restore_playthrough(tables: dict, data: bytes) -> tuple:
+    """Decodes a save made against the same story. Returns (node id, stats, inventory), like new_playthrough().
+    Raises ValueError if the data isn't a save, or was made for another story or version of it."""
+    try:
+        magic, save_format, fingerprint, node, stat_count, item_count = SAVE_HEADER.unpack_from(data)
+        if magic != SAVE_MAGIC or save_format != SAVE_FORMAT:
+            raise ValueError("Not a saved game, or saved by an incompatible version")
+        if fingerprint != tables["fingerprint"]:
+            raise ValueError("The game was saved with another story, or before the story's nodes, stats or items changed")
+        pos = SAVE_HEADER.size
+        player_stats = {}
+        stat_names = tables["stat_names"]
+        for _ in range(stat_count):
+            kind, stat, value = STAT_VALUE.unpack_from(data, pos)
+            pos += STAT_VALUE.size
+            if kind == STAT_FLOAT:
+                value = FLOAT_BITS.unpack(struct.pack(">q", value))[0]
+            elif kind == STAT_JSON:
+                value, pos = json.loads(data[pos:pos + value]), pos + value
+            player_stats[stat_names[stat]] = value
+        items = tables["items"]
+        player_inventory = [items[i] for i in struct.unpack_from(f">{item_count}H", data, pos)]
+        return tables["node_ids"][node], player_stats, player_inventory
+    except (struct.error, IndexError, json.JSONDecodeError):
+        raise ValueError("Corrupted saved game") from None
+
+
+def write_save(path: str, data: bytes) -> None:
+    """Writes a save atomically: a crash leaves the previous save, never a torn one."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def read_save(path: str):
+    """The save stored at path, or None if there is none."""
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,161 @@
+"""Network server for single-player stories: many players at once, each in their own playthrough of one story.
+
+The rules are story_engine.py's: initial_stats/initial_inventory, node effects on arrival, choice conditions
+and choice effects. The story is loaded once and shared read-only by every session. A session is a StorySession
+protocol object holding only the current node, the player's stats and inventory and any partial input line.
+There is no task, stream or buffer per connection, and the choice menu is recomputed from that state when the
+player answers, so tens of thousands of idle sessions fit in one process.
+
+Players get the same screens as with story_engine.py and answer with the number of a choice, or 'quit'.
+
+Usage: python story_server.py example_story.json [--port 8890]
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import story_engine
+
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8890
+MAX_LINE_BYTES = 1024 # Longer input lines close the session
+IDLE_TIMEOUT = 30 * 60 # Seconds without input after which a session is closed (0: never)
+SWEEP_INTERVAL = 60 # Seconds between two idle session sweeps
+PROMPT = b"Enter your choice: "
+
+sessions = set() # Every open StorySession
+server_stats = {"started": 0, "finished": 0, "idle_closed": 0}
+
+
+class StorySession(asyncio.Protocol):
+    """One player's playthrough, driven by the connection's callbacks."""
+    __slots__ = ("story", "transport", "node_id", "stats", "inventory", "pending", "last_input")
+
+    def __init__(self, story):
+        self.story = story
+        self.transport = None
+        self.pending = b"" # Input received after the last newline
+        self.last_input = time.monotonic()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        sessions.add(self)
+        server_stats["started"] += 1
+        self.node_id, self.stats, self.inventory = story_engine.new_playthrough(self.story)
+        if not self.node_id:
+            self.end("Error: Story has no 'start_node_id'. Cannot begin.")
+        else:
+            self.enter_node(self.node_id)
+
+    def connection_lost(self, exc):
+        sessions.discard(self)
+
+    # Pause reading while the peer isn't reading what we send, so a session can't make us buffer its output
+    def pause_writing(self):
+        self.transport.pause_reading()
+
+    def resume_writing(self):
+        self.transport.resume_reading()
+
+    def data_received(self, data):
+        self.last_input = time.monotonic()
+        lines = (self.pending + data).split(b"\n")
+        self.pending = lines.pop()
+        if len(self.pending) > MAX_LINE_BYTES:
+            self.end("Input line too long. Disconnecting.")
+            return
+        for line in lines:
+            if self.transport.is_closing():
+                return
+            self.handle_input(line.decode(errors="replace").strip())
+
+    def send(self, text):
+        self.transport.write(text.encode() + b"\n")
+
+    def end(self, message):
+        self.send(message)
+        self.transport.close()
+
+    def enter_node(self, node_id):
+        """Moves to a node, applies its effects and shows it with the choices the player can take."""
+        node = self.story.get("nodes", {}).get(node_id)
+        if not node:
+            self.end(f"Error: Node '{node_id}' not found in story data. Exiting.")
+            return
+        self.node_id = node_id
+        story_engine.apply_effects(node.get("effects"), self.stats, self.inventory)
+        lines = [story_engine.format_state(self.stats, self.inventory), "", node.get("text", "This node has no text.")]
+        choices = story_engine.get_available_choices(node, self.stats, self.inventory)
+        if not choices:
+            server_stats["finished"] += 1
+            self.end("\n".join(lines + ["The End."]))
+            return
+        lines += [f"{i + 1}. {choice.get('text', 'Unnamed choice')}" for i, choice in enumerate(choices)]
+        self.transport.write("\n".join(lines).encode() + b"\n" + PROMPT)
+
+    def handle_input(self, text):
+        if text.lower() == "quit":
+            self.end("Exiting game.")
+            return
+        node = self.story["nodes"][self.node_id]
+        choices = story_engine.get_available_choices(node, self.stats, self.inventory) # Same menu: the state hasn't changed
+        if not text:
+            self.transport.write(b"Invalid choice. Please try again.\n" + PROMPT)
+            return
+        try:
+            number = int(text) if text.isdecimal() else None # isdigit() lets through '²', which int() rejects
+        except ValueError: # Too many digits for int()
+            number = None
+        if number is None:
+            self.transport.write(b"Invalid input. Please enter a number.\n" + PROMPT)
+        elif not 1 <= number <= len(choices):
+            self.transport.write(b"Invalid choice. Please try again.\n" + PROMPT)
+        else:
+            choice = choices[number - 1]
+            story_engine.apply_effects(choice.get("effects"), self.stats, self.inventory)
+            if not choice.get("target_node_id"):
+                self.end("Error: Choice has no 'target_node_id'. Game cannot continue.")
+            else:
+                self.enter_node(choice["target_node_id"])
+
+
+async def close_idle_sessions(timeout):
+    """One sweep over all sessions instead of a timer per session."""
+    while True:
+        await asyncio.sleep(SWEEP_INTERVAL)
+        deadline = time.monotonic() - timeout
+        for session in [s for s in sessions if s.last_input < deadline]:
+            server_stats["idle_closed"] += 1
+            session.end("Idle for too long. Disconnecting.")
+
+
+async def main_server(story_data, host=SERVER_HOST, port=SERVER_PORT, idle_timeout=IDLE_TIMEOUT):
+    server = await asyncio.get_running_loop().create_server(lambda: StorySession(story_data), host, port)
+    print(f"Single-player story server for '{story_data.get('title', 'untitled')}' serving on {server.sockets[0].getsockname()}")
+    if idle_timeout:
+        asyncio.create_task(close_idle_sessions(idle_timeout))
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a single-player story to many players over TCP.")
+    parser.add_argument("story_filepath", help="Path to the story JSON file")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--idle-timeout", type=float, default=IDLE_TIMEOUT, help="Close sessions without input for this many seconds (0: never)")
+    cli_args = parser.parse_args()
+    try:
+        story = story_engine.load_story(cli_args.story_filepath)
+    except FileNotFoundError:
+        print(f"Error: Story file not found at '{cli_args.story_filepath}'")
+        sys.exit(1)
+    except json.JSONDecodeError:
+        print(f"Error: Invalid JSON format in story file '{cli_args.story_filepath}'")
+        sys.exit(1)
+    try:
+        asyncio.run(main_server(story, cli_args.host, cli_args.port, cli_args.idle_timeout))
+    except KeyboardInterrupt:
+        print("Server shutting down manually.")
@@ -0,0 +1,177 @@
+"""Whole-story validation for HDVELH stories.
+
+validate_story() builds a few indexes over the story once (reverse edges, roles, the stats and items the story
+can ever define) and then checks everything in linear sweeps, so it stays fast on very large stories:
+
+  errors:   missing start nodes, choices leading to nodes that don't exist, unknown roles in actionable_by_roles
+  warnings: orphan and unreachable nodes, nodes from which no ending can be reached (stuck in a cycle),
+            conditions on stats or items the story never defines, and vote choices that can never pass
+
+Usage: python story_validator.py my_story.json
+"""
+import argparse
+import json
+import sys
+import time
+from collections import deque
+
+MAX_PRINTED_ISSUES = 50 # Per severity, for the command line; validate_story() itself returns everything
+
+
+def build_story_index(story_data: dict) -> dict:
+    """Builds the lookup tables the checks share in a single sweep over every choice of the story."""
+    nodes = story_data.get("nodes", {})
+    templates = story_data.get("player_character_templates", {})
+    roles = set(templates)
+    successors = {} # node_id -> [target node_id] of the choices leading to existing nodes
+    predecessors = {node_id: [] for node_id in nodes} # Reverse edges: node_id -> [source node_id]
+    dangling = [] # (node_id, choice index, target)
+    unknown_roles = [] # (node_id, choice index, [role])
+    shadowed_votes = [] # (node_id, choice index) of vote choices after a node's first one
+    stat_conditions, item_conditions = [], [] # (node_id, choice index, stat/item), checked once all are known
+    stats = set(story_data.get("initial_stats", {}))
+    items = set(story_data.get("initial_inventory", []))
+    for template in templates.values():
+        stats.update(template.get("initial_stats", {}))
+        items.update(template.get("initial_inventory", []))
+    effect_lists = [] # Scanned after the sweep for the stats and items they set
+    endings = [] # Nodes without choices
+
+    for node_id, node in nodes.items():
+        if "effects" in node:
+            effect_lists.append(node["effects"])
+        targets = successors[node_id] = []
+        choices = node.get("choices")
+        if not choices:
+            endings.append(node_id)
+            continue
+        vote_seen = False
+        for idx, choice in enumerate(choices):
+            target = choice.get("target_node_id")
+            if target in predecessors:
+                targets.append(target)
+                predecessors[target].append(node_id)
+            else:
+                dangling.append((node_id, idx, target))
+            if "actionable_by_roles" in choice and not roles.issuperset(choice["actionable_by_roles"]):
+                unknown_roles.append((node_id, idx, [role for role in choice["actionable_by_roles"] if role not in roles]))
+            if "effects" in choice:
+                effect_lists.append(choice["effects"])
+            if "effects_for_chooser" in choice:
+                effect_lists.append(choice["effects_for_chooser"])
+            if "conditions" in choice:
+                for condition in choice["conditions"]:
+                    condition_type = condition.get("type")
+                    if condition_type == "stat_condition":
+                        stat_conditions.append((node_id, idx, condition.get("stat")))
+                    elif condition_type == "inventory_condition" and condition.get("requires") == "present":
+                        item_conditions.append((node_id, idx, condition.get("item")))
+            if "requires_vote" in choice and choice["requires_vote"]:
+                if vote_seen:
+                    shadowed_votes.append((node_id, idx))
+                vote_seen = True
+
+    for effects in effect_lists:
+        for effect in effects:
+            if effect.get("type") == "stat_change" and effect.get("stat"):
+                stats.add(effect["stat"])
+            elif effect.get("type") == "inventory_change" and effect.get("action") == "add" and effect.get("item"):
+                items.add(effect["item"])
+
+    starts = {}
+    if story_data.get("start_node_id"):
+        starts[story_data["start_node_id"]] = "the story"
+    for role, template in templates.items():
+        if template.get("start_node_id"):
+            starts.setdefault(template["start_node_id"], f"role '{role}'")
+    return {"successors": successors, "predecessors": predecessors, "endings": endings, "dangling": dangling,
+            "unknown_roles": unknown_roles, "shadowed_votes": shadowed_votes, "stat_conditions": stat_conditions,
+            "item_conditions": item_conditions, "roles": roles, "stats": stats, "items": items, "starts": starts}
+
+
+def _where(node_id, idx=None) -> str:
+    return f"Node '{node_id}'" if idx is None else f"Node '{node_id}', choice {idx + 1}"
+
+
+def _search(edges: dict, sources) -> set:
+    """Breadth-first search from sources along an adjacency dict; returns every node reached."""
+    seen = set(sources)
+    queue = deque(seen)
+    while queue:
+        for node_id in edges[queue.popleft()]:
+            if node_id not in seen:
+                seen.add(node_id)
+                queue.append(node_id)
+    return seen
+
+
+def validate_story(story_data: dict, index: dict = None) -> dict:
+    """Checks a whole story. Returns {"errors": [...], "warnings": [...]} of readable messages."""
+    index = index or build_story_index(story_data)
+    nodes = story_data.get("nodes", {})
+    errors, warnings = [], []
+
+    if not story_data.get("start_node_id"):
+        errors.append("The story has no start_node_id.")
+    for node_id, owner in index["starts"].items():
+        if node_id not in nodes:
+            errors.append(f"Start node '{node_id}' of {owner} does not exist.")
+    for node_id, idx, target in index["dangling"]:
+        errors.append(f"{_where(node_id, idx)}: target node '{target}' does not exist.")
+    for node_id, idx, missing in index["unknown_roles"]:
+        errors.append(f"{_where(node_id, idx)}: unknown role(s) {', '.join(missing)} in actionable_by_roles.")
+
+    for node_id, idx, stat in index["stat_conditions"]:
+        if stat not in index["stats"]:
+            warnings.append(f"{_where(node_id, idx)}: condition on stat '{stat}', which the story never defines or changes (it stays 0).")
+    for node_id, idx, item in index["item_conditions"]:
+        if item not in index["items"]:
+            warnings.append(f"{_where(node_id, idx)}: requires item '{item}', which no inventory or effect ever provides.")
+    for node_id, idx in index["shadowed_votes"]: # The server only ever puts the first vote choice of a node to a vote
+        warnings.append(f"{_where(node_id, idx)}: vote choice can never pass, only the node's first vote choice is put to a vote.")
+
+    predecessors = index["predecessors"]
+    reachable = _search(index["successors"], [node_id for node_id in index["starts"] if node_id in nodes])
+    finishing = _search(predecessors, index["endings"]) # Backwards from every ending
+    unreachable = nodes.keys() - reachable
+    stuck = reachable - finishing
+    if unreachable or stuck: # Set differences first, so a healthy story never walks its nodes again here
+        for node_id in nodes:
+            if node_id in unreachable:
+                if predecessors[node_id]:
+                    warnings.append(f"{_where(node_id)}: unreachable from every start node.")
+                else:
+                    warnings.append(f"{_where(node_id)}: orphan node, no choice leads to it.")
+            elif node_id in stuck:
+                warnings.append(f"{_where(node_id)}: no ending can be reached from here (players are stuck in a cycle).")
+    return {"errors": errors, "warnings": warnings}
+
+
+def print_report(report: dict, limit: int = MAX_PRINTED_ISSUES):
+    """Prints a validate_story() report, at most `limit` messages per severity."""
+    for severity, label in (("errors", "Error"), ("warnings", "Warning")):
+        issues = report[severity]
+        for message in issues[:limit]:
+            print(f"{label}: {message}")
+        if len(issues) > limit:
+            print(f"... and {len(issues) - limit} more {severity}.")
+    print(f"Validation finished: {len(report['errors'])} errors, {len(report['warnings'])} warnings.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate an HDVELH story file.")
+    parser.add_argument("story_filepath", help="Path to the story JSON file")
+    parser.add_argument("--limit", type=int, default=MAX_PRINTED_ISSUES, help="Messages printed per severity")
+    args = parser.parse_args()
+    try:
+        with open(args.story_filepath, encoding="utf-8") as f:
+            story = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Error: Could not load story '{args.story_filepath}': {e}")
+        sys.exit(1)
+    started = time.perf_counter()
+    story_report = validate_story(story)
+    elapsed = time.perf_counter() - started
+    print_report(story_report, args.limit)
+    print(f"Checked {len(story.get('nodes', {}))} nodes in {elapsed * 1000:.0f} ms.")
+    sys.exit(1 if story_report["errors"] else 0)
@@ -0,0 +1,145 @@
+import asyncio
+import json
+import os
+import shutil
+import sys
+import zlib
+
+import pytest
+
+# The modules live at the top of the repository, not in a package
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+import mp_server
+import mp_spectators
+from mp_protocol import (
+    GuardedReader, CLIENT_MAX_FRAME_BYTES, PROTOCOL_TEXT, PROTOCOL_BINARY, COMPRESSION_ZLIB, encode_message
+)
+
+STORY_FILE = os.path.join(REPO, "mp_story_phase1.json")
+
+
+class Client:
+    """A test connection to the server, speaking the protocol the way mp_client.py does."""
+
+    def __init__(self, reader, writer):
+        self.guarded = GuardedReader(reader, CLIENT_MAX_FRAME_BYTES)
+        self.writer = writer
+        self.protocol = PROTOCOL_TEXT
+        self.received = [] # Every message read so far, in order
+
+    async def send(self, msg_type, *fields):
+        self.writer.write(encode_message(self.protocol, msg_type, fields))
+        await self.writer.drain()
+
+    async def next(self, timeout=2.0):
+        """The next message, or None once the server closed the connection."""
+        message = await asyncio.wait_for(self.guarded.read_message(), timeout)
+        if message is not None:
+            self.received.append(message)
+            if message[0] == "PROTO_OK":
+                self.guarded.protocol = message[1][0]
+                if COMPRESSION_ZLIB in message[1][1:]:
+                    self.guarded.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        return message
+
+    async def expect(self, msg_type, timeout=2.0):
+        """Reads until a message of this type arrives and returns its fields."""
+        while True:
+            message = await self.next(timeout)
+            if message is None:
+                raise AssertionError(f"Connection closed while waiting for {msg_type}; got {self.received}")
+            if message[0] == msg_type:
+                return message[1]
+
+    async def drain_messages(self, timeout=0.2):
+        """Every message that arrives within `timeout` seconds of the previous one."""
+        messages = []
+        try:
+            while (message := await self.next(timeout)) is not None:
+                messages.append(message)
+        except asyncio.TimeoutError:
+            pass
+        return messages
+
+    async def use_binary(self, compression=False):
+        await self.expect("PROTOCOLS")
+        await self.send("PROTO", PROTOCOL_BINARY, *([COMPRESSION_ZLIB] if compression else []))
+        self.protocol = PROTOCOL_BINARY
+        await self.expect("PROTO_OK")
+
+    def close(self):
+        self.writer.close()
+
+
+class Table:
+    """mp_server serving one table in this process, on a free port."""
+
+    def __init__(self, tmp_path):
+        self.tmp_path = tmp_path
+        self.server = None
+        self.clients = []
+
+    def load(self, story=None):
+        """Plays a copy of the story (a dict, or the shipped story by default) kept under tmp_path, so files derived
+        from it (reachability index...) never land in the repository."""
+        path = os.path.join(self.tmp_path, "story.json")
+        if story is None:
+            shutil.copy(STORY_FILE, path)
+        else:
+            with open(path, "w") as f:
+                json.dump(story, f)
+        assert mp_server.load_story(path)
+        return path
+
+    async def start(self):
+        self.server = await asyncio.start_server(mp_server.handle_client_connection, "127.0.0.1", 0,
+                                                 limit=mp_server.SERVER_MAX_FRAME_BYTES)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def connect(self):
+        client = Client(*await asyncio.open_connection("127.0.0.1", self.port, limit=CLIENT_MAX_FRAME_BYTES))
+        self.clients.append(client)
+        return client
+
+    async def join(self, role, binary=False, compression=False):
+        """A new connection seated in `role`. Returns (client, resume token)."""
+        client = await self.connect()
+        await client.expect("ROLES_AVAILABLE")
+        if binary:
+            await client.use_binary(compression)
+        await client.send("ROLE", role)
+        fields = await client.expect("ROLE_CONFIRMED")
+        return client, fields[-1]
+
+    async def stop(self):
+        for client in self.clients:
+            client.close()
+        self.server.close()
+        await asyncio.sleep(0.05) # Let the handlers see the disconnects
+
+
+def reset_server(tmp_path, monkeypatch):
+    """Puts mp_server's module state back to a fresh table with every optional feature off (the story is unloaded)."""
+    for name, value in {"connected_clients": [], "client_protocols": {}, "players_data": {}, "connection_stats": {},
+                        "compression_stats": {}, "client_streams": {}, "resume_tokens": {}, "player_id_counter": 1,
+                        "resume_tokens_issued": 0, "PROFILES": None, "PROFILE_DB": None, "profile_writer": {"task": None},
+                        "STORY_CATALOG": None, "SERVED_STORY": None, "BOT_POLICY": None, "TRACE": None,
+                        "HIBERNATE_AFTER": 0, "HIBERNATE_DIR": str(tmp_path / "hibernated_tables"),
+                        "hibernate_watch": {"task": None}, "story_watch": {"task": None, "failed_version": None},
+                        "RESUME_GRACE_SECONDS": 60,
+                        "game_state": {key: None for key in mp_server.game_state}}.items():
+        monkeypatch.setattr(mp_server, name, value)
+    mp_server.game_state["last_activity"] = 0.0
+    monkeypatch.setattr(mp_server, "spectator_feed", mp_spectators.SpectatorFeed(mp_server.spectator_scene))
+
+
+@pytest.fixture
+def table(tmp_path, monkeypatch):
+    """A fresh mp_server table (module state reset) with the shipped story loaded. Every optional feature is off."""
+    monkeypatch.chdir(tmp_path) # Anything the server writes by default lands here
+    reset_server(tmp_path, monkeypatch)
+    table = Table(tmp_path)
+    table.load()
+    return table
@@ -0,0 +1,63 @@
+import asyncio
+import os
+import stat
+
+import pytest
+
+import mp_admin
+
+
+def run(line, commands=None):
+    return asyncio.run(mp_admin.run_command(line, commands or {}))
+
+
+@pytest.mark.parametrize("duration", ["0", "-1", "nan", "inf", "soon"])
+def test_bad_durations_are_refused(duration):
+    assert run(f"lag {duration}")["error"].startswith("Bad argument")
+    assert run(f"profile {duration}")["error"].startswith("Bad argument")
+
+
+def test_lag_is_measured_and_capped(monkeypatch):
+    reply = run("lag 0.12")
+    assert reply["probes"] >= 2 and reply["max_ms"] >= reply["p99_ms"] >= 0
+    seen = []
+
+    async def fake_measure(seconds):
+        seen.append(seconds)
+        return {}
+    monkeypatch.setattr(mp_admin, "measure_lag", fake_measure)
+    run("lag 100000")
+    assert seen == [mp_admin.MAX_LAG_SECONDS]
+
+
+def test_no_probe_is_an_error_not_a_crash():
+    assert "error" in asyncio.run(mp_admin.measure_lag(-1))
+
+
+def test_commands_and_errors():
+    commands = {"sessions": lambda args: {"args": args}}
+    assert run("SESSIONS a b", commands) == {"args": ["a", "b"]}
+    assert run("   ") == {"error": "Empty command."}
+    assert run("reboot")["error"] == "Unknown command 'reboot', try help."
+    assert "sessions" in run("help", commands)["commands"]
+    assert "error" in run("tracemalloc diff")
+
+
+def test_unix_socket_is_private_from_the_start(tmp_path):
+    address = str(tmp_path / "admin.sock")
+
+    async def scenario():
+        server = await mp_admin.start_admin_server(address, {"ping": lambda args: {"pong": True}})
+        mode = stat.S_IMODE(os.stat(address).st_mode)
+        reply = await asyncio.get_running_loop().run_in_executor(None, mp_admin.send_admin_command, address, "ping", 5)
+        server.close()
+        await server.wait_closed()
+        return mode, reply
+
+    umask = os.umask(0o022)
+    try:
+        mode, reply = asyncio.run(scenario())
+        assert os.umask(0o022) == 0o022 # Restored once the socket exists
+    finally:
+        os.umask(umask)
+    assert mode & 0o077 == 0 and reply == {"pong": True}
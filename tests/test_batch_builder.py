@@ -0,0 +1,127 @@
+import json
+
+import pytest
+
+import story_creator
+from story_validator import validate_story
+
+HEADER = [
+    {"kind": "story", "title": "Batch", "max_players": 2},
+    {"kind": "template", "role": "Scout", "description": "Looks around"},
+    {"kind": "stat", "stat": "health", "value": 10},
+    {"kind": "stat", "role": "Scout", "stat": "agility", "value": 3},
+    {"kind": "item", "role": "Scout", "item": "map"},
+]
+
+NODES_CSV = """kind,id,text,target_node_id,actionable_by_roles,requires_vote,type,stat,change_by,scope
+node,start,The start,,,,,,,
+choice,,Go on,middle,Scout|Technician,,,,,
+effect,,,,,,stat_change,health,-1,chooser
+choice,,Everyone votes,end,,yes,,,,
+node,middle,The middle,,,,,,,
+effect,,,,,,stat_change,health,2,node
+choice,,Finish,end,,,,,,
+node,end,The end,,,,,,,
+"""
+
+
+def write_jsonl(path, records):
+    path.write_text("".join(json.dumps(record) + "\n" for record in records))
+    return str(path)
+
+
+def test_builds_a_story_from_jsonl_and_csv(tmp_path):
+    header = write_jsonl(tmp_path / "header.jsonl", HEADER)
+    nodes = tmp_path / "nodes.csv"
+    nodes.write_text(NODES_CSV)
+    output = tmp_path / "story.json"
+    summary = story_creator.build_story_batch([header, str(nodes)], str(output))
+    assert summary["error_count"] == 0 and summary["nodes"] == 3 and summary["warnings"] == []
+    story = json.loads(output.read_text())
+    assert list(story) == list(story_creator.initialize_story()) # Metadata first, nodes last
+    assert story["start_node_id"] == "start" and story["initial_stats"] == {"health": 10}
+    assert story["player_character_templates"]["Scout"]["initial_inventory"] == ["map"]
+    first, vote = story["nodes"]["start"]["choices"]
+    assert first["actionable_by_roles"] == ["Scout", "Technician"]
+    assert first["effects_for_chooser"] == [{"type": "stat_change", "stat": "health", "change_by": -1}]
+    assert vote["requires_vote"] is True
+    assert story["nodes"]["middle"]["effects"][0]["change_by"] == 2
+    # The builder only checks record shapes; the validator catches the role nobody can play
+    assert any("unknown role(s) Technician" in error for error in validate_story(story)["errors"])
+
+
+def test_nested_node_objects_and_undefined_targets(tmp_path):
+    source = write_jsonl(tmp_path / "story.jsonl", [
+        {"kind": "story", "title": "Nested"},
+        {"id": "a", "text": "A", "choices": [{"text": "On", "target_node_id": "missing", "conditions": [
+            {"type": "inventory_condition", "item": "key", "requires": "present"}]}]},
+    ])
+    summary = story_creator.build_story_batch([source], str(tmp_path / "out.json"))
+    assert summary["error_count"] == 0
+    assert summary["warnings"] == ["choices lead to undefined node 'missing'"]
+
+
+def test_errors_are_located_and_leave_the_output_untouched(tmp_path):
+    output = tmp_path / "story.json"
+    output.write_text("previous build")
+    source = tmp_path / "bad.jsonl"
+    source.write_text("\n".join([
+        json.dumps({"kind": "story", "title": "Bad"}),
+        json.dumps({"id": "a", "text": "A"}),
+        json.dumps({"id": "a", "text": "again"}),
+        json.dumps({"kind": "effect", "type": "stat_change", "stat": "hp"}),
+        json.dumps({"kind": "mystery"}),
+        json.dumps({"kind": "template", "role": "Late"}),
+        "{not json",
+        "[1, 2]",
+    ]) + "\n")
+    summary = story_creator.build_story_batch([str(source)], str(output))
+    assert summary["error_count"] == 6
+    assert summary["errors"][0].startswith(f"{source}:3: node ID 'a' already exists")
+    assert any("stat_change needs exactly one of" in error for error in summary["errors"])
+    assert any(error.startswith(f"{source}:7: invalid JSON") for error in summary["errors"])
+    assert output.read_text() == "previous build"
+    assert not (tmp_path / "story.json.tmp").exists()
+
+
+def test_csv_integer_columns_are_checked(tmp_path):
+    source = tmp_path / "bad.csv"
+    source.write_text("kind,title,max_players\nstory,T,many\n")
+    summary = story_creator.build_story_batch([str(source)], str(tmp_path / "out.json"))
+    assert summary["errors"][0].startswith(f"{source}:2: expected an integer")
+
+
+def test_reported_errors_are_capped_but_counted(tmp_path, monkeypatch):
+    monkeypatch.setattr(story_creator, "BATCH_MAX_REPORTED_ERRORS", 3)
+    source = write_jsonl(tmp_path / "bad.jsonl", [{"kind": "mystery"}] * 10)
+    summary = story_creator.build_story_batch([source], str(tmp_path / "out.json"))
+    assert len(summary["errors"]) == 3 and summary["error_count"] == 11 # Plus "no node records"
+
+
+def test_nested_records_that_are_not_objects_are_reported(tmp_path):
+    source = write_jsonl(tmp_path / "story.jsonl", [
+        {"kind": "story", "title": "Nested"},
+        {"id": "a", "effects": ["oops"]},
+        {"id": "b", "choices": "ab"},
+        {"id": "c", "choices": [{"target_node_id": "a", "effects_for_chooser": [1]}]},
+        {"id": "d", "choices": [{"target_node_id": "a"}]},
+        {"kind": "choice", "target_node_id": "d", "conditions": {"type": "stat_condition"}},
+    ])
+    output = tmp_path / "out.json"
+    summary = story_creator.build_story_batch([source], str(output))
+    assert [error.split(": ", 1)[1] for error in summary["errors"]] == [
+        "effects must be a list of JSON objects", "choices must be a list of JSON objects",
+        "effects_for_chooser must be a list of JSON objects", "conditions must be a list of JSON objects"]
+    assert summary["nodes"] == 1 # Only d: the broken nodes were never started
+    assert not output.exists() and not (tmp_path / "out.json.tmp").exists()
+
+
+def test_a_crash_midway_leaves_no_partial_file(tmp_path, monkeypatch):
+    source = write_jsonl(tmp_path / "story.jsonl", [{"kind": "story", "title": "Crash"}, {"id": "a"}])
+    def crash(self, location, record):
+        raise RuntimeError("boom")
+    monkeypatch.setattr(story_creator.BatchStoryBuilder, "add", crash)
+    output = tmp_path / "out.json"
+    with pytest.raises(RuntimeError):
+        story_creator.build_story_batch([source], str(output))
+    assert not output.exists() and not (tmp_path / "out.json.tmp").exists()
@@ -0,0 +1,73 @@
+import json
+import os
+
+import pytest
+
+import mp_bots
+from mp_game import GameCore
+from story_catalog import load_compiled_story
+
+
+def effect(change):
+    return [{"type": "stat_change", "stat": "health", "change_by": change}]
+
+
+STORY = {
+    "title": "Bots", "start_node_id": "start", "max_players": 1,
+    "player_character_templates": {"Scout": {"initial_stats": {"health": 10}, "initial_inventory": []}},
+    "nodes": {
+        "start": {"id": "start", "text": "Two paths.", "choices": [
+            # The trap's node effects look great, but tables never apply node effects
+            {"text": "Trap", "target_node_id": "trap", "effects_for_chooser": effect(-1)},
+            {"text": "Safe", "target_node_id": "safe", "effects_for_chooser": effect(1)}]},
+        "trap": {"id": "trap", "text": "Trap.", "effects": effect(100), "choices": [{"text": "On", "target_node_id": "end"}]},
+        "safe": {"id": "safe", "text": "Safe.", "choices": [{"text": "On", "target_node_id": "end"}]},
+        "gate": {"id": "gate", "text": "Vote.", "choices": [
+            # Tables don't apply a vote choice's effects_for_chooser either
+            {"text": "Open", "target_node_id": "end", "requires_vote": True, "effects_for_chooser": effect(-50)}]},
+        "end": {"id": "end", "text": "The end.", "choices": []},
+    },
+}
+
+
+@pytest.fixture
+def story(tmp_path):
+    path = tmp_path / "bots.json"
+    path.write_text(json.dumps(STORY))
+    return load_compiled_story("bots", str(path), mp_bots._compile)
+
+
+@pytest.mark.parametrize("policy", ["greedy", "lookahead"])
+def test_policies_ignore_effects_the_table_never_applies(story, policy):
+    for _ in range(10): # Ties would be broken at random
+        assert mp_bots.choose_action(policy, story, "start", "Scout", {"health": 10}, [], [0, 1]) == 1
+
+
+@pytest.mark.parametrize("policy", ["greedy", "lookahead"])
+def test_votes_are_scored_without_the_vote_choice_effects(story, policy):
+    assert mp_bots.choose_vote(policy, story, "gate", "Scout", {"health": 10}, []) == "yes"
+
+
+def test_simulated_choice_matches_the_game_core(story):
+    game = GameCore(story.data, story.derived["role_tables"])
+    game.add_player("Scout", "Scout")
+    game.start()
+    snapshot = json.dumps(game.to_json())
+    for pos, (_, choice) in enumerate(game.available_choices("Scout")):
+        game = GameCore.from_json(story.data, story.derived["role_tables"], json.loads(snapshot))
+        predicted = mp_bots._after_choice(choice, game.players["Scout"]["stats"], game.players["Scout"]["inventory"])
+        game.choose("Scout", pos)
+        assert predicted == (game.players["Scout"]["stats"], game.players["Scout"]["inventory"])
+
+
+def test_process_reference_to_a_changed_file_falls_back_to_random(story):
+    reference = mp_bots.story_reference(story, for_process_pool=True)
+    assert reference == (story.story_id, story.version, story.path)
+    os.utime(story.path, ns=(story.version + 10**9, story.version + 10**9))
+    assert mp_bots._get_story(reference) is None
+    assert mp_bots.choose_action("greedy", reference, "start", "Scout", {"health": 10}, [], [0, 1]) in (0, 1)
+
+
+def test_random_policy_picks_a_candidate(story):
+    assert mp_bots.choose_action("random", story, "start", "Scout", {}, [], [0, 1]) in (0, 1)
+    assert mp_bots.choose_vote("random", story, "gate", "Scout", {}, []) in ("yes", "no")
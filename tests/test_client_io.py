@@ -0,0 +1,134 @@
+import asyncio
+import io
+import os
+
+import pytest
+
+import mp_client
+from mp_protocol import PROTOCOL_TEXT, encode_message
+
+
+class CountingStdout(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, text):
+        self.writes += 1
+        return super().write(text)
+
+
+class FakeWriter:
+    def __init__(self):
+        self.data = bytearray()
+        self.closed = False
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def is_closing(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+    async def wait_closed(self):
+        pass
+
+
+def capture_stdout(monkeypatch):
+    """Called from the test itself: pytest puts its own capture back on sys.stdout after the fixtures ran."""
+    stdout = CountingStdout()
+    monkeypatch.setattr(mp_client.sys, "stdout", stdout)
+    return stdout
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """mp_client's module state reset."""
+    for name, value in {"pending_output": [], "render_handle": None, "headless": False, "protocol": PROTOCOL_TEXT,
+                        "server_writer": None, "quitting": False, "spectating": False, "is_my_turn": False,
+                        "expecting_role_choice": False, "expecting_action_choice": False, "expecting_vote": False}.items():
+        monkeypatch.setattr(mp_client, name, value)
+
+
+@pytest.fixture
+def piped_stdin(monkeypatch):
+    """Replaces stdin with a pipe; returns its write end."""
+    read_fd, write_fd = os.pipe()
+    stdin = os.fdopen(read_fd, "rb", buffering=0)
+    monkeypatch.setattr(mp_client.sys, "stdin", stdin)
+    yield write_fd
+    stdin.close()
+
+
+def test_lines_shown_together_go_out_in_one_write(client, monkeypatch):
+    stdout = capture_stdout(monkeypatch)
+
+    async def scenario():
+        for number in range(3):
+            mp_client.show(f"line {number}")
+        assert stdout.writes == 0
+        await asyncio.sleep(mp_client.RENDER_DELAY * 5)
+        mp_client.show("later")
+        mp_client.flush_output() # Shutdown: no waiting for the timer
+    asyncio.run(scenario())
+    assert stdout.getvalue() == "line 0\nline 1\nline 2\nlater\n" and stdout.writes == 2
+    assert mp_client.render_handle is None
+
+
+def test_headless_clients_render_nothing(client, monkeypatch):
+    stdout = capture_stdout(monkeypatch)
+    monkeypatch.setattr(mp_client, "headless", True)
+
+    async def scenario():
+        mp_client.show("hidden")
+        mp_client.flush_output()
+    asyncio.run(scenario())
+    assert stdout.getvalue() == ""
+
+
+def test_stdin_is_read_by_the_event_loop(client, piped_stdin):
+    async def scenario():
+        stdin_reader = mp_client.open_stdin()
+        assert stdin_reader is not None
+        os.write(piped_stdin, b"ROLE:Scout\nVOTE:")
+        assert await stdin_reader.readline() == b"ROLE:Scout\n"
+        os.write(piped_stdin, b"yes\n")
+        os.close(piped_stdin)
+        assert await stdin_reader.readline() == b"VOTE:yes\n"
+        assert await stdin_reader.readline() == b"" # EOF
+    asyncio.run(scenario())
+
+
+def test_regular_files_fall_back_to_the_executor(client, tmp_path, monkeypatch):
+    path = tmp_path / "input.txt"
+    path.write_text("ROLE:Scout\n")
+    with open(path) as stdin:
+        monkeypatch.setattr(mp_client.sys, "stdin", stdin)
+
+        async def scenario():
+            return mp_client.open_stdin()
+        assert asyncio.run(scenario()) is None
+
+
+def test_commands_are_sent_and_end_of_input_quits(client, piped_stdin, monkeypatch):
+    stdout = capture_stdout(monkeypatch)
+    writer = FakeWriter()
+    monkeypatch.setattr(mp_client, "server_writer", writer)
+    os.write(piped_stdin, b"hello\n\nVOTE:yes\n")
+    os.close(piped_stdin)
+    loop = asyncio.new_event_loop()
+    try:
+        loop.create_task(mp_client.send_user_input())
+        loop.run_forever() # send_user_input() stops the loop once it is done
+        mp_client.flush_output()
+    finally:
+        loop.close()
+    assert writer.data == encode_message(PROTOCOL_TEXT, "VOTE", ["yes"]) + encode_message(PROTOCOL_TEXT, "quit", [])
+    assert writer.closed and mp_client.quitting
+    assert stdout.getvalue().splitlines() == ["Unknown command. Use PROFILE:name, STORY:id, ROLE:name, SPECTATE, "
+                                              "CHOICE:number, VOTE:yes/no or quit.", "Disconnecting..."]
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import os
+import zlib
+
+import mp_protocol
+import mp_server
+from mp_protocol import (
+    FrameCompressor, GuardedReader, PROTOCOL_BINARY, COMPRESSION_MIN_BYTES, COMPRESSION_PROBE_FRAMES, encode_message
+)
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def receive(wire: bytes):
+    """Decodes server->client bytes the way mp_client does once zlib was negotiated."""
+    async def scenario():
+        reader = asyncio.StreamReader(limit=1 << 20)
+        reader.feed_data(wire)
+        reader.feed_eof()
+        guarded = GuardedReader(reader, 1 << 20)
+        guarded.protocol = PROTOCOL_BINARY
+        guarded.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        messages = []
+        while (message := await guarded.read_message()) is not None:
+            messages.append(message)
+        return messages
+    return asyncio.run(scenario())
+
+
+def frame(msg_type, *fields):
+    return encode_message(PROTOCOL_BINARY, msg_type, fields)
+
+
+def test_small_frames_are_sent_plain_and_never_prime_the_stream():
+    dictionary = frame("COMPRESSION_DICT", "some story text " * 20)
+    compressor = FrameCompressor(dictionary=dictionary)
+    small = frame("TURN", "Scout")
+    assert compressor.pack(small) == small
+    assert compressor.dictionary == dictionary # Still pending
+    assert compressor.stats["wire_bytes"] == compressor.stats["raw_bytes"] == len(small)
+
+
+def test_dictionary_is_sent_just_before_the_first_compressed_frame():
+    text = "The corridor hums with a low, steady vibration. " * 10
+    compressor = FrameCompressor(dictionary=frame("COMPRESSION_DICT", text))
+    wire = compressor.pack(frame("TURN", "Scout")) + compressor.pack(frame("NODE_TEXT", text)) + compressor.pack(frame("NODE_TEXT", text))
+    assert receive(wire) == [("TURN", ["Scout"]), ("COMPRESSION_DICT", [text]), ("NODE_TEXT", [text]), ("NODE_TEXT", [text])]
+    assert compressor.dictionary == b""
+    assert compressor.stats["compressed_frames"] == 2
+
+
+def test_a_released_stream_is_continued_by_a_new_one_primed_again():
+    text = "The corridor hums with a low, steady vibration. " * 10
+    dictionary = frame("COMPRESSION_DICT", text)
+    compressor = FrameCompressor(dictionary=dictionary)
+    wire = compressor.pack(frame("NODE_TEXT", text))
+    compressor.release(dictionary)
+    assert compressor.compressor is None
+    wire += compressor.pack(frame("NODE_TEXT", text))
+    assert receive(wire) == [("COMPRESSION_DICT", [text]), ("NODE_TEXT", [text])] * 2
+
+
+def test_compression_stops_when_it_does_not_pay_off(monkeypatch):
+    monkeypatch.setattr(mp_protocol, "COMPRESSION_MAX_RATIO", 0.3) # Random hex digits only shrink to about half
+    compressor = FrameCompressor()
+    texts = [os.urandom(300).hex() for _ in range(COMPRESSION_PROBE_FRAMES + 1)]
+    wire = b"".join(compressor.pack(frame("NODE_TEXT", text)) for text in texts)
+    assert not compressor.enabled
+    assert compressor.stats["plain_frames"] == 1
+    assert receive(wire) == [("NODE_TEXT", [text]) for text in texts]
+
+
+def story(nodes, start="a"):
+    return {"start_node_id": start, "player_character_templates": {"Scout": {}}, "nodes": nodes}
+
+
+LONG = "A long passage of text that is repeated. " * 8
+
+
+def test_story_dictionary_leaves_out_endings_and_unreachable_nodes():
+    nodes = {
+        "a": {"text": "START " + LONG, "choices": [{"text": "Walk on", "target_node_id": "b"}]},
+        "b": {"text": "MIDDLE " + LONG, "choices": [{"text": "Finish", "target_node_id": "end"}]},
+        "end": {"text": "SECRET ENDING " + LONG, "choices": []},
+        "orphan": {"text": "ORPHAN " + LONG, "choices": [{"text": "Back", "target_node_id": "a"}]},
+    }
+    dictionary = mp_server.build_story_dictionary(story(nodes))
+    assert "START" in dictionary and "MIDDLE" in dictionary and "Walk on" in dictionary
+    assert "SECRET ENDING" not in dictionary and "ORPHAN" not in dictionary
+
+
+def test_story_with_only_small_frames_has_no_dictionary():
+    nodes = {"a": {"text": "Short.", "choices": [{"text": "On", "target_node_id": "b"}]}, "b": {"text": "x" * (COMPRESSION_MIN_BYTES - 1)}}
+    assert mp_server.build_story_dictionary(story(nodes)) == ""
+    with open(os.path.join(REPO, "mp_story_phase1.json")) as f:
+        assert mp_server.build_story_dictionary(json.load(f)) == ""
+
+
+def test_shipped_story_sends_no_dictionary_to_compressed_connections(table):
+    async def scenario():
+        await table.start()
+        scout, _ = await table.join("Scout", binary=True, compression=True)
+        technician, _ = await table.join("Technician", binary=True, compression=True)
+        await scout.expect("NODE_TEXT")
+        await scout.drain_messages()
+        stats = dict(mp_server.compression_stats)
+        await table.stop()
+        return scout.received, stats
+
+    received, stats = asyncio.run(scenario())
+    assert "COMPRESSION_DICT" not in [msg_type for msg_type, _ in received]
+    assert all(s["compressed_frames"] == 0 and s["wire_bytes"] == s["raw_bytes"] for s in stats.values())
+
+
+def test_dictionary_primes_the_stream_before_the_first_large_frame(table):
+    two_players = {"title": "Long", "start_node_id": "a", "max_players": 2,
+                   "player_character_templates": {"Scout": {}, "Technician": {}},
+                   "nodes": {"a": {"id": "a", "text": "START " + LONG, "choices": [{"text": "On", "target_node_id": "end"}]},
+                             "end": {"id": "end", "text": "The end.", "choices": []}}}
+    table.load(two_players)
+
+    async def scenario():
+        await table.start()
+        scout, _ = await table.join("Scout", binary=True, compression=True)
+        technician, _ = await table.join("Technician", binary=True, compression=True)
+        await scout.expect("NODE_TEXT")
+        await table.stop()
+        return [msg_type for msg_type, _ in scout.received]
+
+    received = asyncio.run(scenario())
+    assert received.index("COMPRESSION_DICT") == received.index("NODE_TEXT") - 1
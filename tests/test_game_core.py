@@ -0,0 +1,133 @@
+import json
+
+from mp_game import GameCore, simulate
+from story_compiler import compile_role_tables
+
+
+def effect(change):
+    return [{"type": "stat_change", "stat": "health", "change_by": change}]
+
+
+STORY = {
+    "title": "Core", "start_node_id": "start",
+    "player_character_templates": {"Scout": {"initial_stats": {"health": 10}, "initial_inventory": ["rope"]},
+                                   "Medic": {"initial_stats": {"health": 5}}},
+    "nodes": {
+        "start": {"id": "start", "text": "{current_player_name} leads.", "choices": [
+            {"text": "Climb", "target_node_id": "gate", "effects_for_chooser": effect(-1), "actionable_by_roles": ["Scout"]},
+            {"text": "Heal", "target_node_id": "gate", "actionable_by_roles": ["Medic"]}]},
+        "gate": {"id": "gate", "text": "A gate.", "choices": [
+            {"text": "Open", "target_node_id": "end", "requires_vote": True, "effects_for_chooser": effect(-50)}]},
+        "end": {"id": "end", "text": "The end.", "choices": []},
+    },
+}
+
+
+def new_game(story=STORY, roles=("Scout", "Medic")):
+    game = GameCore(story, compile_role_tables(story))
+    for role in roles:
+        assert game.add_player(role, role)
+    return game
+
+
+def types(events):
+    return [event[0] for event in events]
+
+
+def test_seats_take_the_role_template_and_free_the_role_before_the_start():
+    game = GameCore(STORY, compile_role_tables(STORY))
+    assert game.add_player("p1", "Scout")
+    assert not game.add_player("p2", "Scout") # Taken
+    assert not game.add_player("p2", "Wizard") # Not in the story
+    assert game.players["p1"] == {"role": "Scout", "stats": {"health": 10}, "inventory": ["rope"]}
+    assert game.available_roles == ["Medic"]
+    game.remove_player("p1")
+    assert game.order == [] and game.available_roles == ["Medic", "Scout"]
+    game.remove_player("p1") # Unknown: ignored
+
+
+def test_start_announces_the_first_turn_and_its_choices():
+    game = new_game()
+    events = game.start()
+    assert types(events) == ["GAME_START", "TURN", "YOUR_TURN", "NODE_TEXT", "ACTIVE_PLAYER_CHOICES"]
+    assert events[3][1] == ("Scout leads.",)
+    assert events[4][1:3] == (("1. Climb",), "Scout") # Only the Scout's choice, sent to the Scout
+    assert game.current_player() == "Scout" and game.may_choose("Scout") and not game.may_choose("Medic")
+
+
+def test_a_choice_applies_the_chooser_effects_and_passes_the_turn():
+    game = new_game()
+    game.start()
+    assert game.choose("Medic", 0) == [] # Not their turn
+    assert game.choose("Scout", 5) == [("ERROR", ("Invalid choice index.",), "Scout", None)]
+    events = game.choose("Scout", 0)
+    assert types(events) == ["PLAYER_ACTION", "PLAYER_UPDATE", "TURN", "YOUR_TURN", "NODE_TEXT", "VOTE_START"]
+    assert game.players["Scout"]["stats"] == {"health": 9}
+    assert game.node_id == "gate" and game.current_player() == "Medic" and game.vote_in_progress()
+
+
+def test_a_unanimous_vote_moves_the_story_without_the_choice_effects():
+    game = new_game()
+    game.start()
+    game.choose("Scout", 0)
+    assert types(game.vote("Scout", "yes")) == ["PLAYER_VOTED"]
+    assert game.vote("Scout", "no") == [("INFO", ("You have already voted.",), "Scout", None)]
+    events = game.vote("Medic", "yes")
+    assert events[1] == ("VOTE_RESULT", ("passed", "Vote for 'Open' passed! (2 yes, 0 no)"), None, None)
+    assert types(events)[-1] == "GAME_END"
+    assert game.at_ending() and not game.active
+    assert game.players["Medic"]["stats"] == {"health": 5}
+
+
+def test_a_vote_timeout_fails_the_vote_and_asks_again():
+    game = new_game()
+    game.start()
+    game.choose("Scout", 0)
+    game.vote("Scout", "yes")
+    events = game.vote_timeout()
+    assert types(events)[:3] == ["VOTE_TIMEOUT", "VOTE_RESULT", "INFO"]
+    assert events[1][1][0] == "failed" and "1 did not vote" in events[1][1][1]
+    assert game.node_id == "gate" and types(events)[-1] == "VOTE_START" # The situation remains
+    assert game.vote_timeout()[0][0] == "VOTE_TIMEOUT"
+    assert new_game().vote_timeout() == [] # No vote in progress
+
+
+def test_the_game_ends_when_nobody_can_act():
+    story = json.loads(json.dumps(STORY))
+    story["nodes"]["start"]["choices"] = [{"text": "Fly", "target_node_id": "end", "actionable_by_roles": []}]
+    events = new_game(story).start()
+    assert types(events).count("INFO") == 2 # Both players passed
+    assert events[-1] == ("GAME_END", ("Story ended: No player can act.",), None, None)
+
+
+def test_a_missing_node_ends_the_game():
+    story = json.loads(json.dumps(STORY))
+    story["nodes"]["start"]["choices"][0]["target_node_id"] = "nowhere"
+    game = new_game(story)
+    game.start()
+    assert game.choose("Scout", 0)[-1] == ("GAME_END", ("Error: Node 'nowhere' not found.",), None, None)
+
+
+def test_end_only_ends_an_active_game():
+    game = new_game()
+    assert game.end("Bye.") == []
+    game.start()
+    assert game.end("Bye.") == [("GAME_END", ("Bye.",), None, None)]
+    assert game.current_player() is None
+
+
+def test_a_snapshot_restores_the_game_mid_vote():
+    game = new_game()
+    game.start()
+    game.choose("Scout", 0)
+    game.vote("Scout", "no")
+    restored = GameCore.from_json(STORY, compile_role_tables(STORY), json.loads(json.dumps(game.to_json())))
+    assert restored.to_json() == game.to_json()
+    assert restored.vote_choice is STORY["nodes"]["gate"]["choices"][0]
+    assert restored.vote("Medic", "no")[1][1][0] == "failed"
+
+
+def test_simulate_plays_whole_games():
+    report = simulate(STORY, 20, seed=1)
+    assert report["games"] == 20 and sum(report["endings"].values()) == 20
+    assert set(report["endings"]) <= {"end", "(unfinished)"}
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from mp_protocol import GuardedReader, FrameTooLarge, ReadTimeout
+
+
+def make_reader(data=b"", eof=True, limit=64):
+    reader = asyncio.StreamReader(limit=limit)
+    if data:
+        reader.feed_data(data)
+    if eof:
+        reader.feed_eof()
+    return reader
+
+
+async def read_all(guarded):
+    messages = []
+    while True:
+        message = await guarded.read_message()
+        if message is None:
+            return messages
+        messages.append(message)
+
+
+def test_reads_text_messages_until_eof():
+    async def scenario():
+        guarded = GuardedReader(make_reader(b"ROLE:Scout\nCHOICE:2\n"), 64)
+        return await read_all(guarded), guarded.stats
+
+    messages, stats = asyncio.run(scenario())
+    assert messages == [("ROLE", ["Scout"]), ("CHOICE", ["2"])]
+    assert stats["frames"] == 2 and stats["bytes_in"] == len(b"ROLE:Scout\nCHOICE:2\n")
+
+
+def test_oversized_line_is_refused():
+    async def scenario():
+        guarded = GuardedReader(make_reader(b"X" * 200 + b"\n", limit=64), 64)
+        with pytest.raises(FrameTooLarge):
+            await guarded.read_message()
+        return guarded.stats
+
+    assert asyncio.run(scenario())["oversized"] == 1
+
+
+def test_idle_timeout():
+    async def scenario():
+        guarded = GuardedReader(make_reader(eof=False), 64, idle_timeout=0.05)
+        with pytest.raises(ReadTimeout):
+            await guarded.read_message()
+        return guarded.stats
+
+    assert asyncio.run(scenario())["timeouts"] == 1
+
+
+def test_read_timeout_on_unfinished_frame():
+    async def scenario():
+        guarded = GuardedReader(make_reader(b"ROLE:Sc", eof=False), 64, idle_timeout=10, read_timeout=0.05)
+        with pytest.raises(ReadTimeout, match="Read"):
+            await guarded.read_message()
+
+    asyncio.run(scenario())
+
+
+def test_partial_line_at_eof_is_returned():
+    async def scenario():
+        return await read_all(GuardedReader(make_reader(b"VOTE:yes"), 64))
+
+    assert asyncio.run(scenario()) == [("VOTE", ["yes"])]
+
+
+def test_rate_limited_frames_are_dropped():
+    async def scenario():
+        guarded = GuardedReader(make_reader(b"CHOICE:1\n" * 5), 64, rate=0.001, burst=2)
+        return await read_all(guarded), guarded.stats
+
+    messages, stats = asyncio.run(scenario())
+    assert messages == [("CHOICE", ["1"])] * 2
+    assert stats["rate_limited"] == 3 and stats["frames"] == 5
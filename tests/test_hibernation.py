@@ -0,0 +1,95 @@
+import asyncio
+import json
+import os
+
+import mp_server
+
+
+async def hibernated_table(table, compression=False):
+    """Two players at the shipped story's opening vote, then the table hibernates. Returns (scout, technician)."""
+    await table.start()
+    scout, _ = await table.join("Scout", binary=compression, compression=compression)
+    technician, _ = await table.join("Technician")
+    await scout.expect("VOTE_START")
+    await technician.expect("VOTE_START")
+    await mp_server.hibernate_table()
+    assert mp_server.table_game() is None and os.path.exists(mp_server.game_state["hibernated"])
+    return scout, technician
+
+
+def test_a_message_wakes_the_table_where_it_was(table):
+    async def scenario():
+        scout, technician = await hibernated_table(table, compression=True)
+        path = mp_server.game_state["hibernated"]
+        assert mp_server.players_data["Scout"]["compressor"].compressor is None # Its zlib state is freed
+        assert mp_server.table_active()
+        assert mp_server.get_session_dump()["table"]["hibernated"] == path # Looking doesn't wake it
+        await scout.send("VOTE", "yes")
+        await technician.send("VOTE", "yes")
+        assert (await scout.expect("VOTE_RESULT"))[0] == "passed" # The new zlib stream decodes fine
+        assert (await technician.expect("VOTE_RESULT"))[0] == "passed"
+        assert mp_server.game_state["hibernated"] is None and not os.path.exists(path)
+        assert mp_server.table_game().vote_in_progress() is False
+        await table.stop()
+    asyncio.run(scenario())
+
+
+def test_the_vote_timer_keeps_running_while_the_table_hibernates(table, monkeypatch):
+    monkeypatch.setattr(mp_server, "VOTE_TIMEOUT_SECONDS", 0.3)
+    async def scenario():
+        scout, _ = await hibernated_table(table)
+        await scout.expect("VOTE_TIMEOUT")
+        assert (await scout.expect("VOTE_RESULT"))[0] == "failed"
+        assert mp_server.table_game().active and mp_server.game_state["hibernated"] is None
+        await table.stop()
+    asyncio.run(scenario())
+
+
+def test_a_corrupt_hibernation_file_ends_the_table(table):
+    async def scenario():
+        scout, technician = await hibernated_table(table)
+        with open(mp_server.game_state["hibernated"], "w") as f:
+            f.write("{not json")
+        await scout.send("VOTE", "yes")
+        assert (await scout.expect("GAME_END"))[0] == "The game could not be restored after a pause."
+        assert (await technician.expect("GAME_END"))[0] == "The game could not be restored after a pause."
+        assert await scout.next() is None # Disconnected
+        assert not mp_server.players_data and not mp_server.table_active()
+        assert mp_server.game_state["hibernated"] is None and mp_server.game_state["wake_task"] is None
+        await table.stop()
+    asyncio.run(scenario())
+
+
+def test_a_missing_hibernation_file_ends_the_table_on_disconnect(table):
+    async def scenario():
+        scout, technician = await hibernated_table(table)
+        os.remove(mp_server.game_state["hibernated"])
+        technician.close()
+        assert (await scout.expect("GAME_END"))[0] == "The game could not be restored after a pause."
+        assert not mp_server.players_data and not mp_server.table_active()
+        await table.stop()
+    asyncio.run(scenario())
+
+
+def test_a_file_from_another_table_is_refused(table):
+    async def scenario():
+        scout, _ = await hibernated_table(table)
+        path = mp_server.game_state["hibernated"]
+        with open(path) as f:
+            data = json.load(f)
+        data["game"]["players"].pop("Technician")
+        with open(path, "w") as f:
+            json.dump(data, f)
+        await scout.send("VOTE", "yes")
+        assert (await scout.expect("GAME_END"))[0] == "The game could not be restored after a pause."
+        await table.stop()
+    asyncio.run(scenario())
+
+
+def test_everything_waiting_for_the_table_shares_one_wake(table):
+    async def scenario():
+        await hibernated_table(table)
+        results = await asyncio.gather(*(mp_server.wake_table() for _ in range(3)))
+        assert results == [True, True, True] and mp_server.table_game().vote_in_progress()
+        await table.stop()
+    asyncio.run(scenario())
@@ -0,0 +1,74 @@
+import asyncio
+import json
+import os
+
+import mp_server
+
+
+def save(path, text):
+    """Rewrites a file with a newer mtime, even on filesystems that round it."""
+    mtime = os.stat(path).st_mtime_ns
+    with open(path, "w") as f:
+        f.write(text)
+    os.utime(path, ns=(mtime + 10**9, mtime + 10**9))
+
+
+def edit_story(path, change):
+    """Saves the story file with change(story) applied."""
+    with open(path) as f:
+        story = json.load(f)
+    change(story)
+    save(path, json.dumps(story))
+
+
+def retitle(title):
+    return lambda story: story.update(title=title)
+
+
+def test_unchanged_files_are_not_reloaded(table):
+    assert mp_server.check_story_files() == []
+
+
+def test_an_idle_table_switches_to_the_new_snapshot(table):
+    old = mp_server.SERVED_STORY
+    edit_story(old.path, retitle("Edited"))
+    [story] = mp_server.check_story_files()
+    assert story.version > old.version and story.data["title"] == "Edited"
+    asyncio.run(mp_server.publish_story(story))
+    assert mp_server.SERVED_STORY is story and mp_server.game_state["story"] is story
+    assert mp_server.STORY_DATA["title"] == "Edited"
+
+
+def test_a_seated_table_keeps_its_snapshot_until_the_game_ends(table):
+    async def scenario():
+        await table.start()
+        client, _ = await table.join("Scout")
+        old = mp_server.game_state["story"]
+        edit_story(old.path, retitle("Edited"))
+        [story] = mp_server.check_story_files()
+        await mp_server.publish_story(story)
+        assert mp_server.SERVED_STORY is story and mp_server.game_state["story"] is old
+        await mp_server.close_table("Done.")
+        assert mp_server.game_state["story"] is story # The next table plays the new version
+        await table.stop()
+    asyncio.run(scenario())
+
+
+def test_a_broken_edit_keeps_the_current_version(table, capsys):
+    path = mp_server.SERVED_STORY.path
+    with open(path) as f:
+        good = f.read()
+    save(path, good + "trailing garbage")
+    assert mp_server.check_story_files() == []
+    assert "Keeping the current version" in capsys.readouterr().out
+    assert mp_server.check_story_files() == [] and capsys.readouterr().out == "" # Not retried until saved again
+    save(path, good)
+    assert len(mp_server.check_story_files()) == 1
+
+
+def test_a_snapshot_without_roles_is_not_published(table, capsys):
+    edit_story(mp_server.SERVED_STORY.path, lambda story: story.update(player_character_templates={}))
+    old = mp_server.SERVED_STORY
+    [story] = mp_server.check_story_files()
+    asyncio.run(mp_server.publish_story(story))
+    assert mp_server.SERVED_STORY is old and "no player character templates" in capsys.readouterr().out
@@ -0,0 +1,102 @@
+import asyncio
+import contextvars
+import time
+from collections import deque
+
+import pytest
+
+import mp_admin
+import mp_monitor
+import mp_server
+
+
+@pytest.fixture
+def monitor(monkeypatch):
+    """A clean monitor state, with asyncio's own Handle._run put back afterwards."""
+    monkeypatch.setattr(mp_monitor, "monitor_state", {
+        "installed": False, "task": None, "threshold": mp_monitor.SLOW_CALLBACK_SECONDS, "steps": {},
+        "lag": mp_monitor._new_histogram(), "slow_log": deque(maxlen=mp_monitor.SLOW_LOG_SIZE)})
+    yield mp_monitor.monitor_state
+    mp_monitor.uninstall()
+
+
+def test_step_restores_the_previous_label_even_on_errors():
+    with mp_monitor.step("outer"):
+        with pytest.raises(RuntimeError):
+            with mp_monitor.step("inner"):
+                assert mp_monitor.current_step.get() == "inner"
+                raise RuntimeError
+        assert mp_monitor.current_step.get() == "outer"
+    assert mp_monitor.current_step.get() == "other"
+
+
+def test_labelled_coroutines_and_the_tasks_they_create():
+    seen = {}
+
+    async def child():
+        seen["child"] = mp_monitor.current_step.get()
+
+    @mp_monitor.labelled("bot turn")
+    async def turn():
+        seen["turn"] = mp_monitor.current_step.get()
+        await asyncio.create_task(child())
+        return 7
+
+    async def scenario():
+        assert await turn() == 7
+        seen["after"] = mp_monitor.current_step.get()
+    asyncio.run(scenario())
+    assert seen == {"turn": "bot turn", "child": "bot turn", "after": "other"}
+    assert turn.__qualname__.endswith("turn") # Slow log entries still name the coroutine
+
+
+def test_a_step_closed_outside_its_context_does_not_raise():
+    class Suspend:
+        def __await__(self):
+            yield
+
+    @mp_monitor.labelled("seat expiry")
+    async def pending():
+        await Suspend()
+
+    coro = pending()
+    contextvars.copy_context().run(coro.send, None) # Started in a task's context...
+    coro.close() # ...and closed from another, as when a pending task is garbage collected
+
+
+def test_the_server_leaves_the_monitor_off_by_default(monitor):
+    assert mp_server.SLOW_CALLBACK_SECONDS == 0
+
+    async def scenario():
+        mp_server.start_loop_monitor()
+    asyncio.run(scenario())
+    assert not monitor["installed"] and monitor["task"] is None
+    assert asyncio.events.Handle._run is mp_monitor._original_run
+
+
+def test_installed_monitor_times_callbacks_per_step(monitor):
+    mp_monitor.install(threshold=0.01)
+
+    async def scenario():
+        with mp_monitor.step("CHOICE"):
+            asyncio.get_running_loop().call_soon(time.sleep, 0.02)
+        await asyncio.sleep(0.05)
+    asyncio.run(scenario())
+    [entry] = [entry for entry in monitor["slow_log"] if entry["step"] == "CHOICE"]
+    assert entry["callback"] == "sleep" and entry["ms"] >= 10
+    stats = mp_monitor.get_loop_stats()
+    assert stats["steps"]["CHOICE"]["calls"] == 1 and stats["slow_threshold_ms"] == 10
+    mp_monitor.uninstall()
+    assert asyncio.events.Handle._run is mp_monitor._original_run and not monitor["installed"]
+
+
+@pytest.mark.parametrize("limit", ["0", "-1", "1.5", "many"])
+def test_slowlog_refuses_limits_that_are_not_positive_integers(monitor, limit):
+    reply = asyncio.run(mp_admin.run_command(f"slowlog {limit}", {"slowlog": mp_monitor.get_slow_log}))
+    assert reply["error"].startswith("Bad argument: N must be a positive integer")
+
+
+def test_slowlog_returns_the_newest_entries(monitor):
+    monitor["slow_log"].extend({"step": str(number)} for number in range(5))
+    assert mp_monitor.get_slow_log(["2"]) == [{"step": "3"}, {"step": "4"}]
+    assert len(mp_monitor.get_slow_log()) == 5
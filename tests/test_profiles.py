@@ -0,0 +1,106 @@
+import asyncio
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+import player_profiles
+from conftest import REPO
+from player_profiles import ProfileStore
+
+
+def with_store(path, scenario):
+    """Runs scenario(store) against an open store, then closes it (which flushes)."""
+    async def run():
+        store = ProfileStore(str(path))
+        await store.open()
+        try:
+            return await scenario(store)
+        finally:
+            await store.close()
+    return asyncio.run(run())
+
+
+def rows(path, table):
+    with sqlite3.connect(path) as db:
+        return db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_games_are_written_behind_in_one_batch(tmp_path):
+    path = tmp_path / "profiles.db"
+
+    async def scenario(store):
+        alice = await store.get("alice")
+        for finished in (True, False, True):
+            store.record_game(alice, "outpost", "Scout", "escape", finished, "Game over.")
+        assert rows(path, "profiles") == 0 and store.get_stats()["dirty"] == 1 # Nothing written yet
+        await store.flush()
+        assert store.stats["batches"] == 1 and store.stats["profiles_written"] == 1 and store.stats["history_written"] == 3
+        await store.flush() # Nothing dirty: no empty batch
+        assert store.stats["batches"] == 1
+    with_store(path, scenario)
+
+    async def reload(store):
+        return await store.get("alice")
+    alice = with_store(path, reload)
+    assert (alice["games_played"], alice["games_finished"]) == (3, 2)
+    assert alice["stories"]["outpost"]["endings"] == ["escape"] and player_profiles.preferred_role(alice) == "Scout"
+    assert rows(path, "history") == 3
+
+
+def test_a_game_goes_to_the_copy_in_the_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(player_profiles, "CACHE_SIZE", 1)
+
+    async def scenario(store):
+        first = await store.get("alice") # A player's connection keeps this object for the whole game
+        await store.get("bob") # Drops alice, who has nothing unsaved
+        assert "alice" not in store.cache
+        second = await store.get("alice") # Another connection loads alice again
+        updated = store.record_game(first, "outpost", "Scout", "n1", False, "Left.")
+        assert updated is second and store.cache["alice"] is second and second["games_played"] == 1
+        store.record_game(second, "outpost", "Medic", "n2", False, "Left.")
+        assert second["games_played"] == 2 # Neither game was lost
+        dropped = await store.get("carol")
+        assert list(store.cache) == ["alice", "carol"] # Unsaved profiles are never dropped, nor the one just loaded
+        store.cache.pop("carol")
+        assert store.record_game(dropped, "outpost", "Scout", "n1", False, "Left.") is dropped
+        assert store.cache["carol"] is dropped # Reinserted so the writer finds it
+    with_store(tmp_path / "profiles.db", scenario)
+
+
+def test_a_failed_batch_is_retried(tmp_path, monkeypatch):
+    async def scenario(store):
+        alice = await store.get("alice")
+        store.record_game(alice, "outpost", "Scout", "end", True, "Won.")
+        real_write = store._write_batch
+
+        def locked(*args):
+            raise sqlite3.OperationalError("database is locked")
+        store._write_batch = locked
+        await store.flush()
+        assert store.get_stats()["dirty"] == 1 and store.get_stats()["pending_history"] == 1
+        store._write_batch = real_write
+        await store.flush()
+        assert store.get_stats()["dirty"] == 0 and store.stats["history_written"] == 1
+    with_store(tmp_path / "profiles.db", scenario)
+
+
+@pytest.mark.parametrize("name, valid", [("alice", True), ("a-b_9", True), ("", False), ("a b", False),
+                                         ("x" * (player_profiles.MAX_NAME_LENGTH + 1), False)])
+def test_profile_names(name, valid):
+    assert player_profiles.valid_name(name) is valid
+
+
+def test_profiles_are_off_unless_asked_for(table):
+    default = subprocess.run([sys.executable, "-c", "import mp_server; print(mp_server.PROFILE_DB)"], cwd=REPO,
+                             capture_output=True, text=True, check=True)
+    assert default.stdout.strip() == "None"
+
+    async def scenario():
+        await table.start()
+        client = await table.connect()
+        await client.send("PROFILE", "alice")
+        assert (await client.expect("ERROR"))[0] == "Player profiles are off on this server."
+        await table.stop()
+    asyncio.run(scenario())
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from mp_protocol import (
+    GuardedReader, FrameTooLarge, MESSAGE_TYPES, PROTOCOL_BINARY, PROTOCOL_TEXT, BINARY_HEADER,
+    encode_message, encode_binary, decode_binary, decode_text, encode_text
+)
+
+
+@pytest.mark.parametrize("msg_type, fields", [
+    ("NODE_TEXT", ["Déjà vu: a line with colons: and ünïcode"]),
+    ("ACTIVE_PLAYER_CHOICES", ["1. Go left", "2. Go right"]),
+    ("VOTE_START", ["Open the gate: now?", "timeout=30"]),
+    ("ROLE_CONFIRMED", ["Scout", "Your stats: {\"a\": 1}", "token"]),
+    ("TURN", []),
+])
+def test_text_and_binary_round_trip(msg_type, fields):
+    assert decode_text(encode_text(msg_type, fields)) == (msg_type, fields)
+    frame = encode_binary(msg_type, fields)
+    (length,) = BINARY_HEADER.unpack(frame[:BINARY_HEADER.size])
+    assert length == len(frame) - BINARY_HEADER.size
+    assert decode_binary(frame[BINARY_HEADER.size:]) == (msg_type, fields)
+
+
+def test_every_message_type_has_its_own_code():
+    for msg_type in MESSAGE_TYPES:
+        assert decode_binary(encode_binary(msg_type, ["x"])[BINARY_HEADER.size:]) == (msg_type, ["x"])
+
+
+def test_long_fields_use_multi_byte_lengths():
+    text = "x" * 70000
+    assert decode_binary(encode_binary("NODE_TEXT", [text])[BINARY_HEADER.size:]) == ("NODE_TEXT", [text])
+
+
+@pytest.mark.parametrize("payload", [
+    b"",                                      # No type byte
+    bytes([len(MESSAGE_TYPES)]),              # Unknown type
+    bytes([0, 0x85]),                         # Varint cut after a continuation byte
+    bytes([0, 0xff, 0xff]),                   # Varint never ends
+    bytes([0, 5]) + b"abc",                   # Field shorter than its length
+    bytes([0, 2]) + b"\xff\xfe",              # Not UTF-8
+])
+def test_malformed_binary_payloads_raise_value_error(payload):
+    with pytest.raises(ValueError):
+        decode_binary(payload)
+
+
+def binary_reader(data, limit=64):
+    reader = asyncio.StreamReader(limit=limit)
+    reader.feed_data(data)
+    reader.feed_eof()
+    guarded = GuardedReader(reader, limit)
+    guarded.protocol = PROTOCOL_BINARY
+    return guarded
+
+
+def test_guarded_reader_reads_binary_frames():
+    async def scenario():
+        guarded = binary_reader(encode_message(PROTOCOL_BINARY, "CHOICE", ["2"]) + encode_message(PROTOCOL_BINARY, "VOTE", ["yes"]))
+        return [await guarded.read_message(), await guarded.read_message(), await guarded.read_message()]
+
+    assert asyncio.run(scenario()) == [("CHOICE", ["2"]), ("VOTE", ["yes"]), None]
+
+
+def test_guarded_reader_refuses_oversized_binary_frame():
+    async def scenario():
+        guarded = binary_reader(BINARY_HEADER.pack(1000) + b"x" * 10)
+        with pytest.raises(FrameTooLarge):
+            await guarded.read_message()
+
+    asyncio.run(scenario())
+
+
+def test_guarded_reader_treats_frame_cut_by_eof_as_eof():
+    async def scenario():
+        return await binary_reader(encode_message(PROTOCOL_BINARY, "CHOICE", ["2"])[:-1]).read_message()
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_text_protocol_frames_end_with_newline():
+    assert encode_message(PROTOCOL_TEXT, "CHOICE", ["2"]) == b"CHOICE:2\n"
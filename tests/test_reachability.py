@@ -0,0 +1,148 @@
+import json
+import random
+from collections import deque
+
+import pytest
+
+import story_reachability
+from story_reachability import build_reachability, load_reachability
+
+
+def go(target, **extra):
+    return {"text": f"to {target}", "target_node_id": target, **extra}
+
+
+HAS_KEY = {"type": "inventory_condition", "item": "key", "requires": "present"}
+STRONG = {"type": "stat_condition", "stat": "strength", "requires_greater_than": 5}
+TAKE_KEY = {"type": "inventory_change", "item": "key", "action": "add"}
+
+STORY = {
+    "start_node_id": "hall",
+    "nodes": {
+        "hall": {"text": "", "choices": [go("vault"), go("shed"), go("loop_a")]},
+        "shed": {"text": "", "choices": [go("vault", effects=[TAKE_KEY]), go("hall")]},
+        "vault": {"text": "", "choices": [go("treasure", conditions=[HAS_KEY]), go("smash", conditions=[STRONG])]},
+        "smash": {"text": "", "choices": [go("treasure")]},
+        "loop_a": {"text": "", "choices": [go("loop_b")]},
+        "loop_b": {"text": "", "choices": [go("loop_a"), go("pit")]},
+        "treasure": {"text": ""},
+        "pit": {"text": ""},
+    },
+}
+
+
+def test_structural_queries():
+    index = build_reachability(STORY)
+    assert sorted(index.endings) == ["pit", "treasure"]
+    assert index.reachable_endings("hall") == index.endings and index.reachable_endings("vault") == ["treasure"]
+    assert not index.reachable("vault", "pit") and not index.reachable("nowhere", "pit")
+    assert (index.distance("hall", "treasure"), index.distance("hall", "pit"), index.distance("vault", "pit")) == (2, 3, None)
+    assert index.in_loop("loop_a") and index.in_loop("hall") and not index.in_loop("vault") # hall <-> shed
+
+
+def test_routes_follow_conditions_and_effects_on_the_way():
+    index = build_reachability(STORY)
+    assert not index.can_reach("vault", "treasure", {}, [])
+    assert index.route("vault", "treasure", {}, ["key"]) == (0, 1)
+    assert index.route("vault", "treasure", {"strength": 9}, []) == (1, 2)
+    # The key picked up in the shed opens the vault's door further down
+    assert index.shortest_path("hall", "treasure", {}, []) == ["hall", "shed", "vault", "treasure"]
+    assert index.shortest_path("hall", "treasure", {}, ["key"]) == ["hall", "vault", "treasure"]
+    assert index.nearest_ending("hall", {}, []) == ("treasure", 3)
+    assert index.nearest_ending("vault", {}, []) is None and index.shortest_path("vault", "treasure", {}, []) == []
+
+
+def random_story(rng, size):
+    nodes = {}
+    for number in range(size):
+        targets = [f"n{rng.randrange(size)}" for _ in range(rng.choice([0, 1, 2, 3]))]
+        nodes[f"n{number}"] = {"text": "", "choices": [go(target) for target in targets]}
+    return {"start_node_id": "n0", "nodes": nodes}
+
+
+def test_structural_answers_match_a_breadth_first_search():
+    rng = random.Random(7)
+    for _ in range(30):
+        story = random_story(rng, rng.randrange(2, 40))
+        index = build_reachability(story)
+        for ending in index.endings:
+            distances = {ending: 0} # Backwards from the ending
+            queue = deque([ending])
+            while queue:
+                node_id = queue.popleft()
+                for source, node in story["nodes"].items():
+                    if source not in distances and any(c["target_node_id"] == node_id for c in node["choices"]):
+                        distances[source] = distances[node_id] + 1
+                        queue.append(source)
+            for node_id in story["nodes"]:
+                assert index.reachable(node_id, ending) == (node_id in distances)
+                assert index.distance(node_id, ending) == distances.get(node_id)
+                if node_id in distances and node_id != ending: # No conditions: the shortest path is open to anyone
+                    assert len(index.shortest_path(node_id, ending, {}, [])) == distances[node_id] + 1
+
+
+def test_the_index_is_saved_next_to_the_story_and_reused(tmp_path, monkeypatch):
+    path = str(tmp_path / "story.json")
+    sidecar = tmp_path / ("story.json.single" + story_reachability.REACH_EXTENSION)
+    first = load_reachability(STORY, path)
+    assert json.loads(sidecar.read_text())["story"] == story_reachability.story_fingerprint(STORY)
+
+    builds = []
+    real_build = story_reachability.build_reachability
+    monkeypatch.setattr(story_reachability, "build_reachability", lambda story, model: builds.append(model) or real_build(story, model))
+    again = load_reachability(STORY, path)
+    assert builds == [] and again.route("vault", "treasure", {}, ["key"]) == first.route("vault", "treasure", {}, ["key"])
+    assert again.shortest_path("hall", "treasure", {}, []) == ["hall", "shed", "vault", "treasure"]
+
+    edited = json.loads(json.dumps(STORY))
+    edited["nodes"]["hall"]["text"] = "Changed"
+    load_reachability(edited, path) # Other content: rebuilt
+    sidecar.write_text("{torn")
+    load_reachability(edited, path) # Unreadable: rebuilt
+    assert builds == ["single", "single"] and json.loads(sidecar.read_text())["story"] == story_reachability.story_fingerprint(edited)
+
+
+# The key comes from the choice's effects_for_chooser in one story and from its effects and the target node's in the other
+CHOOSER_KEY = {"start_node_id": "gate", "nodes": {
+    "gate": {"text": "", "choices": [go("hut", effects_for_chooser=[TAKE_KEY])]},
+    "hut": {"text": "", "choices": [go("vault", conditions=[HAS_KEY])]},
+    "vault": {"text": ""}}}
+SINGLE_KEY = {"start_node_id": "gate", "nodes": {
+    "gate": {"text": "", "choices": [go("yard", effects=[TAKE_KEY]), go("hut")]},
+    "yard": {"text": "", "choices": [go("vault", conditions=[HAS_KEY])]},
+    "hut": {"text": "", "effects": [TAKE_KEY], "choices": [go("vault", conditions=[HAS_KEY])]},
+    "vault": {"text": ""}}}
+
+
+def test_effects_follow_the_effect_model():
+    assert build_reachability(CHOOSER_KEY, "chooser").can_reach("gate", "vault", {}, [])
+    assert not build_reachability(CHOOSER_KEY, "single").can_reach("gate", "vault", {}, [])
+    assert build_reachability(SINGLE_KEY, "single").shortest_path("gate", "vault", {}, []) == ["gate", "yard", "vault"]
+    assert not build_reachability(SINGLE_KEY, "chooser").can_reach("gate", "vault", {}, [])
+    with pytest.raises(ValueError, match="unknown effect model"):
+        build_reachability(SINGLE_KEY, "both")
+
+
+def test_each_effect_model_has_its_own_sidecar(tmp_path):
+    path = str(tmp_path / "story.json")
+    assert not load_reachability(CHOOSER_KEY, path).can_reach("gate", "vault", {}, [])
+    assert load_reachability(CHOOSER_KEY, path, "chooser").can_reach("gate", "vault", {}, [])
+    assert not load_reachability(CHOOSER_KEY, path).can_reach("gate", "vault", {}, []) # Read back, not mixed up
+    saved = json.loads((tmp_path / "story.json.chooser.reach").read_text())
+    assert saved["effects"] == "chooser"
+
+
+def test_values_that_are_not_numbers_close_routes_instead_of_failing():
+    story = {"start_node_id": "a", "nodes": {
+        "a": {"text": "", "choices": [
+            go("b", effects=[{"type": "stat_change", "stat": "gold", "change_by": "lots"}]),
+            go("end", conditions=[{"type": "stat_condition", "stat": "gold", "requires_greater_than": "five"}]),
+            go("c")]},
+        "b": {"text": "", "choices": [go("end", conditions=[{"type": "stat_condition", "stat": "gold", "requires_equal_to": 3}])]},
+        "c": {"text": "", "choices": [go("end", conditions=[{"type": "stat_condition", "stat": "gold", "requires_greater_than": 1}]),
+                                      go("end", conditions=[{"type": "stat_condition", "stat": "gold", "requires_less_than": "x"}])]},
+        "end": {"text": ""}}}
+    index = build_reachability(story)
+    assert index.route("a", "end", {"gold": 9}, []) == (2, 2) # Only through c, where gold is compared with a number
+    assert index.can_reach("b", "end", {"gold": 3}, []) # b itself is fine: its condition is numeric
+    assert index.shortest_path("a", "end", {"gold": 0}, []) == []
@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+import mp_server
+
+
+async def seated_table(table):
+    """Starts a game with two players. Returns (scout, scout's token, technician)."""
+    await table.start()
+    scout, token = await table.join("Scout")
+    technician, _ = await table.join("Technician")
+    await scout.expect("VOTE_START")
+    return scout, token, technician
+
+
+async def drop(table, client):
+    client.close()
+    table.clients.remove(client)
+    await asyncio.sleep(0.05)
+
+
+def test_a_stranger_cannot_take_a_held_seat_and_the_owner_gets_it_back(table):
+    async def scenario():
+        scout, token, technician = await seated_table(table)
+        await drop(table, scout)
+        assert "Scout" in mp_server.players_data and mp_server.players_data["Scout"]["writer"] is None
+        assert "held" in (await technician.expect("INFO"))[0]
+
+        stranger = await table.connect()
+        assert "table is full" in (await stranger.expect("WELCOME"))[1]
+        await stranger.send("ROLE", "Scout")
+        assert "table is full" in (await stranger.expect("ERROR"))[0]
+        await stranger.send("RESUME", "not-a-token")
+        assert "Unknown or expired" in (await stranger.expect("ERROR"))[0]
+
+        owner = await table.connect()
+        assert "table is full" in (await owner.expect("WELCOME"))[1] # Full too, but its token still works
+        await owner.send("RESUME", token)
+        state = json.loads((await owner.expect("STATE"))[0])
+        assert state["player"] == "Scout" and state["vote"]["voted"] is False
+        assert mp_server.players_data["Scout"]["writer"] is not None and mp_server.players_data["Scout"]["away_task"] is None
+        assert (await technician.expect("INFO"))[0] == "Scout is back."
+        await owner.send("VOTE", "yes") # Plays as Scout now, not as a watcher
+        assert not [m for m in await owner.drain_messages() if m[0] == "ERROR"]
+        await table.stop()
+    asyncio.run(scenario())
+
+
+def test_bogus_tokens_send_the_client_back_to_role_selection(table):
+    async def scenario():
+        await table.start()
+        client = await table.connect()
+        await client.expect("ROLES_AVAILABLE")
+        await client.send("RESUME", "bogus")
+        assert "Unknown or expired" in (await client.expect("ERROR"))[0]
+        assert await client.expect("ROLES_AVAILABLE") == ["Scout", "Technician"]
+        await table.stop()
+    asyncio.run(scenario())
+
+
+def test_a_held_seat_is_released_when_the_grace_period_ends(table, monkeypatch):
+    monkeypatch.setattr(mp_server, "RESUME_GRACE_SECONDS", 0.1)
+
+    async def scenario():
+        scout, token, technician = await seated_table(table)
+        await drop(table, scout)
+        await asyncio.sleep(0.2)
+        assert "Scout" not in mp_server.players_data and token not in mp_server.resume_tokens
+        late = await table.connect()
+        await late.send("RESUME", token)
+        assert "Unknown or expired" in (await late.expect("ERROR"))[0]
+        await table.stop()
+    asyncio.run(scenario())
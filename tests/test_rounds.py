@@ -0,0 +1,150 @@
+import asyncio
+import json
+
+from mp_game import GameCore
+from story_compiler import compile_role_tables
+
+
+def effect(change):
+    return [{"type": "stat_change", "stat": "health", "change_by": change}]
+
+
+STORY = {
+    "title": "Rounds", "start_node_id": "start", "max_players": 3, "turn_mode": "rounds", "round_timeout": 0.2,
+    "player_character_templates": {"Scout": {"initial_stats": {"health": 10}},
+                                   "Medic": {"initial_stats": {"health": 10}},
+                                   "Pilot": {"initial_stats": {"health": 10}}},
+    "nodes": {
+        "start": {"id": "start", "text": "An ambush.", "choices": [
+            {"text": "Run", "target_node_id": "fled", "effects_for_chooser": effect(-1)},
+            {"text": "Fight", "target_node_id": "fought", "priority": 5, "effects_for_chooser": effect(-3)},
+            {"text": "Hide", "target_node_id": "hid", "actionable_by_roles": ["Medic", "Pilot"]}]},
+        "fled": {"id": "fled", "text": "Fled.", "choices": [{"text": "On", "target_node_id": "end"}]},
+        "fought": {"id": "fought", "text": "Fought.", "choices": [{"text": "On", "target_node_id": "end"}]},
+        "hid": {"id": "hid", "text": "Hid.", "choices": [{"text": "On", "target_node_id": "end"}]},
+        "end": {"id": "end", "text": "The end.", "choices": []},
+    },
+}
+
+
+def new_game(story=STORY):
+    game = GameCore(story, compile_role_tables(story))
+    for role in ("Scout", "Medic", "Pilot"):
+        game.add_player(role, role)
+    return game
+
+
+def round_result(events):
+    return json.loads(next(fields[0] for msg_type, fields, _, _ in events if msg_type == "ROUND_RESULT"))
+
+
+def majority(story=STORY):
+    story = json.loads(json.dumps(story))
+    story["nodes"]["start"]["round_resolution"] = "majority"
+    return story
+
+
+def test_a_round_offers_everyone_their_choices_at_once():
+    game = new_game()
+    events = game.start()
+    assert [e[0] for e in events] == ["GAME_START", "NODE_TEXT", "ROUND_START"] + ["ACTIVE_PLAYER_CHOICES"] * 3
+    assert events[2][1] == ("timeout=0.2",)
+    assert events[3][1:3] == (("1. Run", "2. Fight"), "Scout")
+    assert all(game.may_choose(pid) for pid in game.order)
+
+
+def test_choices_are_locked_in_until_everyone_has_chosen():
+    game = new_game()
+    game.start()
+    assert game.choose("Scout", 0) == [("INFO", ("Your action is locked in. Waiting for the others.",), "Scout", None)]
+    assert not game.may_choose("Scout") and game.choose("Scout", 1) == []
+    assert game.choose("Medic", 9)[0][0] == "ERROR"
+    game.choose("Medic", 0)
+    assert game.players["Scout"]["stats"] == {"health": 10} # Nothing applied yet
+    result = round_result(game.choose("Pilot", 1))
+    assert result["actions"][0].startswith("Pilot") # Highest priority first, then seat order
+    assert result["outcome"] == "The story follows Pilot's action." and game.node_id == "fought"
+    assert result["updates"]["Scout"]["stats"] == {"health": 9} and result["updates"]["Pilot"]["stats"] == {"health": 7}
+    assert result["missed"] == [] and game.round_choices is not None # The next node opens the next round
+
+
+def test_seat_order_starts_with_the_lead_player_and_moves_every_round():
+    game = new_game()
+    game.start()
+    for pid in ("Pilot", "Medic", "Scout"):
+        game.choose(pid, 0)
+    assert game.node_id == "fled" and game.current_player() == "Medic"
+    game.choose("Scout", 0)
+    game.choose("Pilot", 0)
+    result = round_result(game.choose("Medic", 0))
+    assert [line.split()[0] for line in result["actions"]] == ["Medic", "Pilot", "Scout"]
+
+
+def test_majority_follows_the_most_chosen_target():
+    game = new_game(majority())
+    game.start()
+    game.choose("Scout", 1) # Fight: the highest priority, but alone
+    game.choose("Medic", 2)
+    result = round_result(game.choose("Pilot", 2))
+    assert game.node_id == "hid" and result["outcome"] == "The story follows Medic's action."
+
+
+def test_a_majority_tie_goes_to_the_first_in_resolution_order():
+    game = new_game(majority())
+    game.start()
+    game.choose("Scout", 0)
+    game.choose("Medic", 2)
+    game.choose("Pilot", 1) # Three targets, one vote each: Pilot's Fight resolves first
+    assert game.node_id == "fought"
+
+
+def test_a_timeout_resolves_with_what_was_submitted():
+    game = new_game()
+    game.start()
+    game.choose("Medic", 0)
+    result = round_result(game.round_timeout())
+    assert result["missed"] == ["Scout", "Pilot"] and game.node_id == "fled"
+
+
+def test_a_round_where_nobody_acts_keeps_the_node():
+    game = new_game()
+    game.start()
+    events = game.round_timeout()
+    assert round_result(events)["outcome"] == "Nobody acted in time. The situation remains."
+    assert game.node_id == "start" and events[-1][0] == "ACTIVE_PLAYER_CHOICES"
+    assert new_game().round_timeout() == [] # No round open
+
+
+def test_the_game_ends_when_nobody_can_act_in_a_round():
+    story = json.loads(json.dumps(STORY))
+    story["nodes"]["start"]["choices"] = [{"text": "Fly", "target_node_id": "end", "actionable_by_roles": []}]
+    events = new_game(story).start()
+    assert events[-1] == ("GAME_END", ("Story ended: No player can act.",), None, None)
+
+
+def test_a_snapshot_restores_an_open_round():
+    game = new_game()
+    game.start()
+    game.choose("Scout", 1)
+    restored = GameCore.from_json(STORY, compile_role_tables(STORY), json.loads(json.dumps(game.to_json())))
+    assert restored.to_json() == game.to_json() and not restored.may_choose("Scout")
+    restored.choose("Medic", 0)
+    restored.choose("Pilot", 0)
+    assert restored.node_id == "fought"
+
+
+def test_the_server_times_out_a_round(table):
+    async def scenario():
+        table.load(STORY)
+        await table.start()
+        scout, _ = await table.join("Scout")
+        await table.join("Medic")
+        await table.join("Pilot")
+        await scout.expect("ROUND_START")
+        await scout.send("CHOICE", "1")
+        assert "locked in" in (await scout.expect("INFO"))[0]
+        result = json.loads((await scout.expect("ROUND_RESULT", timeout=2.0))[0])
+        assert result["missed"] == ["Medic", "Pilot"] and result["outcome"] == "The story follows Scout's action."
+        assert (await scout.expect("NODE_TEXT"))[0] == "Fled."
+        await table.stop()
+    asyncio.run(scenario())
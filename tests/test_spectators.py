@@ -0,0 +1,123 @@
+import asyncio
+
+import mp_spectators
+from mp_protocol import PROTOCOL_TEXT, PROTOCOL_BINARY, encode_message
+
+
+class FakeTransport:
+    def __init__(self):
+        self.buffered = 0
+
+    def get_write_buffer_size(self):
+        return self.buffered
+
+
+class FakeWriter:
+    def __init__(self):
+        self.data = bytearray()
+        self.transport = FakeTransport()
+        self.closed = False
+
+    def write(self, data):
+        self.data += data
+
+    def is_closing(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+
+def scene():
+    return [("NODE_TEXT", ["The scene"])]
+
+
+def text(*messages):
+    return b"".join(encode_message(PROTOCOL_TEXT, msg_type, fields) for msg_type, fields in messages)
+
+
+def test_nothing_is_kept_without_spectators():
+    feed = mp_spectators.SpectatorFeed(scene)
+    feed.publish("TURN", ["Scout"])
+    assert len(feed.ring) == 0 and feed.next_seq == 0
+
+
+def test_events_are_batched_and_encoded_once_per_protocol(monkeypatch):
+    encoded = []
+
+    def counting_encode(protocol, msg_type, fields):
+        encoded.append(protocol)
+        return encode_message(protocol, msg_type, fields)
+    monkeypatch.setattr(mp_spectators, "encode_message", counting_encode)
+
+    async def scenario():
+        feed = mp_spectators.SpectatorFeed(scene)
+        first, second, binary = FakeWriter(), FakeWriter(), FakeWriter()
+        feed.add(first, PROTOCOL_TEXT)
+        feed.add(second, PROTOCOL_TEXT)
+        feed.add(binary, PROTOCOL_BINARY)
+        assert first.data == text(("NODE_TEXT", ["The scene"])) # The snapshot comes first
+        encoded.clear()
+        feed.publish("TURN", ["Scout"])
+        feed.publish("PLAYER_ACTION", ["Scout chose 1"])
+        assert first.data == text(("NODE_TEXT", ["The scene"])) # Nothing written until the flush
+        await asyncio.sleep(mp_spectators.FLUSH_DELAY * 2)
+        assert first.data.endswith(text(("TURN", ["Scout"]), ("PLAYER_ACTION", ["Scout chose 1"])))
+        assert second.data == first.data
+        assert sorted(encoded) == sorted([PROTOCOL_TEXT, PROTOCOL_TEXT, PROTOCOL_BINARY, PROTOCOL_BINARY])
+        assert feed.stats["flushes"] == 1
+    asyncio.run(scenario())
+
+
+def test_a_spectator_that_fell_behind_gets_a_snapshot(monkeypatch):
+    async def scenario():
+        feed = mp_spectators.SpectatorFeed(scene, ring_size=4)
+        slow, fast = FakeWriter(), FakeWriter()
+        feed.add(slow, PROTOCOL_TEXT)
+        feed.add(fast, PROTOCOL_TEXT)
+        slow.transport.buffered = mp_spectators.MAX_BUFFERED_BYTES + 1
+        for turn in range(6): # Wraps the ring: every 4 events flush at once
+            feed.publish("TURN", [str(turn)])
+        await asyncio.sleep(mp_spectators.FLUSH_DELAY * 2)
+        assert fast.data.endswith(text(*[("TURN", [str(turn)]) for turn in range(6)]))
+        assert slow.data == text(*scene()) and feed.get_stats()["behind"] == 1
+        slow.data.clear()
+        slow.transport.buffered = 0
+        feed.publish("TURN", ["6"])
+        feed.flush()
+        assert slow.data == text(("INFO", ["You fell behind and missed 3 events. Here is the current scene."]), *scene())
+        assert feed.spectators[slow].skipped == 3 and feed.stats["skips"] == 1
+        assert fast.data.endswith(text(("TURN", ["6"])))
+    asyncio.run(scenario())
+
+
+def test_closed_spectators_are_dropped_and_close_all_resets_the_feed():
+    async def scenario():
+        feed = mp_spectators.SpectatorFeed(scene)
+        gone, staying = FakeWriter(), FakeWriter()
+        feed.add(gone, PROTOCOL_TEXT)
+        feed.add(staying, PROTOCOL_TEXT)
+        gone.closed = True
+        feed.publish("GAME_END", ["Over"])
+        feed.close_all()
+        assert staying.closed and staying.data.endswith(text(("GAME_END", ["Over"])))
+        assert feed.spectators == {} and len(feed.ring) == 0 and feed.next_seq == 0
+    asyncio.run(scenario())
+
+
+def test_a_full_table_can_be_watched(table):
+    async def scenario():
+        await table.start()
+        scout, _ = await table.join("Scout")
+        technician, _ = await table.join("Technician")
+        watcher = await table.connect()
+        await watcher.expect("PROTOCOLS")
+        await watcher.send("SPECTATE")
+        assert (await watcher.expect("NODE_TEXT"))[0]
+        await scout.send("VOTE", "yes")
+        await technician.send("VOTE", "yes")
+        assert await watcher.expect("VOTE_RESULT")
+        await watcher.send("CHOICE", "1")
+        assert (await watcher.expect("ERROR"))[0] == "Spectators can only watch."
+        await table.stop()
+    asyncio.run(scenario())
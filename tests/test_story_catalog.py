@@ -0,0 +1,95 @@
+import json
+import os
+
+import pytest
+
+import story_catalog
+import story_engine
+from story_catalog import StoryCatalog, read_story_metadata
+
+
+def write_story(directory, story_id, title, padding=0, nodes_first=False):
+    nodes = {"start": {"text": "x" * padding}}
+    story = {"nodes": nodes, "title": title} if nodes_first else {"title": title, "max_players": 2,
+                                                                  "player_character_templates": {"Scout": {}}, "nodes": nodes}
+    path = directory / f"{story_id}.json"
+    path.write_text(json.dumps(story))
+    return path
+
+
+def test_metadata_is_read_without_parsing_the_nodes(tmp_path):
+    path = tmp_path / "lazy.json"
+    path.write_text('{"title": "Lazy", "max_players": 3, "player_character_templates": {"A": {}}, "nodes": {broken')
+    assert read_story_metadata(str(path)) == {"id": "lazy", "title": "Lazy", "max_players": 3, "roles": ["A"]}
+
+
+def test_metadata_after_the_nodes_falls_back_to_a_full_parse(tmp_path):
+    path = write_story(tmp_path, "late", "Late", nodes_first=True)
+    assert read_story_metadata(str(path))["title"] == "Late"
+    path.write_text('{"nodes": {broken')
+    with pytest.raises(ValueError):
+        read_story_metadata(str(path))
+
+
+def test_scan_reuses_the_index_file_for_unchanged_stories(tmp_path, monkeypatch):
+    write_story(tmp_path, "b", "Bravo")
+    write_story(tmp_path, "a", "alpha")
+    assert StoryCatalog(str(tmp_path)).scan() == 2
+    assert (tmp_path / story_catalog.INDEX_FILE).exists()
+    reads = []
+    monkeypatch.setattr(story_catalog, "read_story_metadata", lambda path: reads.append(path))
+    catalog = StoryCatalog(str(tmp_path))
+    assert catalog.scan() == 2 and reads == []
+    assert [meta["title"] for meta in catalog.entries()] == ["alpha", "Bravo"]
+
+
+def test_broken_stories_are_skipped(tmp_path, capsys):
+    write_story(tmp_path, "good", "Good")
+    (tmp_path / "bad.json").write_text("{nope")
+    catalog = StoryCatalog(str(tmp_path))
+    assert catalog.scan() == 1 and "skipping bad.json" in capsys.readouterr().out
+    catalog.scan()
+    assert capsys.readouterr().out == "" # Reported once per file version
+    with pytest.raises(KeyError):
+        catalog.get("bad")
+
+
+def test_get_compiles_once_and_shares_the_story(tmp_path):
+    write_story(tmp_path, "one", "One")
+    compiled = []
+    catalog = StoryCatalog(str(tmp_path), compile_story=lambda data, path: compiled.append(path) or len(data["nodes"]))
+    catalog.scan()
+    story = catalog.get("one")
+    assert catalog.get("one") is story and story.derived == 1 and len(compiled) == 1
+    assert catalog.cache_info()["hits"] == 1 and catalog.cache_info()["misses"] == 1
+
+
+def test_least_recently_used_stories_are_evicted_but_live_ones_are_shared(tmp_path):
+    for story_id in "abc":
+        write_story(tmp_path, story_id, story_id.upper(), padding=1000)
+    cost = os.path.getsize(tmp_path / "a.json") * story_catalog.MEMORY_PER_FILE_BYTE
+    catalog = StoryCatalog(str(tmp_path), memory_budget=2 * cost)
+    catalog.scan()
+    held = catalog.get("a") # A session keeps playing this one
+    catalog.get("b")
+    catalog.get("c")
+    assert catalog.cache_info()["cached"] == ["b", "c"] and catalog.stats["evictions"] == 1
+    assert catalog.get("a") is held # Not loaded a second time
+    assert catalog.cache_info()["cached"] == ["c", "a"] # Taking "a" back pushed "b" out
+    catalog.get("b") # Nobody held it, so it is read again
+    assert catalog.stats["misses"] == 4 and catalog.cache_info()["cached"] == ["a", "b"]
+
+
+def test_choose_story_path_exits_cleanly_on_end_of_input(tmp_path, monkeypatch, capsys):
+    write_story(tmp_path, "only", "Only")
+    answers = iter(["9", "x", "1"])
+    monkeypatch.setattr("builtins.input", lambda prompt: next(answers))
+    assert story_engine.choose_story_path(str(tmp_path)) == str(tmp_path / "only.json")
+    assert capsys.readouterr().out.count("Invalid choice") == 2
+
+    def interrupted(prompt):
+        raise EOFError
+    monkeypatch.setattr("builtins.input", interrupted)
+    with pytest.raises(SystemExit) as exit_info:
+        story_engine.choose_story_path(str(tmp_path))
+    assert exit_info.value.code == 0 and "Exiting game." in capsys.readouterr().out
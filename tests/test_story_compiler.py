@@ -0,0 +1,60 @@
+import json
+
+from conftest import STORY_FILE
+from story_compiler import compile_role_tables
+
+STORY = {
+    "player_character_templates": {"Scout": {}, "Medic": {}, "Pilot": {}},
+    "nodes": {
+        "start": {"text": "S", "choices": [
+            {"text": "anyone", "target_node_id": "end"},
+            {"text": "scouts", "target_node_id": "end", "actionable_by_roles": ["Scout", "Scout", "Ghost"]},
+            {"text": "vote", "target_node_id": "end", "requires_vote": True},
+            {"text": "medics and pilots", "target_node_id": "end", "actionable_by_roles": ["Medic", "Pilot"]},
+            {"text": "second vote", "target_node_id": "end", "requires_vote": True},
+        ]},
+        "other": {"text": "O", "choices": [{"text": "anyone", "target_node_id": "end"}]},
+        "end": {"text": "E"},
+    },
+}
+
+
+def test_roles_get_bits_and_choices_get_masks():
+    tables = compile_role_tables(STORY)
+    assert tables["role_bits"] == {"Scout": 1, "Medic": 2, "Pilot": 4}
+    # Duplicated and unknown roles add nothing; a choice without actionable_by_roles is open to every role
+    assert tables["choice_masks"]["start"] == [7, 1, 7, 6, 7]
+    assert tables["choice_masks"]["end"] == []
+
+
+def test_candidates_leave_out_vote_choices_and_votes_use_the_first():
+    tables = compile_role_tables(STORY)
+    assert tables["role_choices"]["start"] == {"Scout": (0, 1), "Medic": (0, 3), "Pilot": (0, 3)}
+    assert tables["role_choices"]["end"] == {"Scout": (), "Medic": (), "Pilot": ()}
+    assert tables["vote_choice"] == {"start": 2}
+
+
+def test_identical_shapes_are_stored_once():
+    tables = compile_role_tables(STORY)
+    assert tables["role_choices"]["other"]["Scout"] is tables["role_choices"]["other"]["Medic"]
+    twin = json.loads(json.dumps(STORY))
+    twin["nodes"]["other_twin"] = twin["nodes"]["other"]
+    twin_tables = compile_role_tables(twin)
+    assert twin_tables["role_choices"]["other_twin"] is twin_tables["role_choices"]["other"]
+
+
+def test_a_story_without_templates_has_no_candidates():
+    tables = compile_role_tables({"nodes": STORY["nodes"]})
+    assert tables["role_bits"] == {} and tables["choice_masks"]["start"] == [0, 0, 0, 0, 0]
+    assert tables["role_choices"]["start"] == {}
+
+
+def test_the_shipped_story_matches_a_direct_scan():
+    with open(STORY_FILE) as f:
+        story = json.load(f)
+    tables = compile_role_tables(story)
+    for node_id, node in story["nodes"].items():
+        for role in story["player_character_templates"]:
+            expected = tuple(idx for idx, choice in enumerate(node.get("choices", []))
+                             if not choice.get("requires_vote") and role in choice.get("actionable_by_roles", [role]))
+            assert tables["role_choices"][node_id][role] == expected, (node_id, role)
@@ -0,0 +1,95 @@
+import pytest
+
+from story_creator import StoryIndex, initialize_story
+
+
+def choice(target, *roles):
+    data = {"text": f"to {target}", "target_node_id": target}
+    if roles:
+        data["actionable_by_roles"] = list(roles)
+    return data
+
+
+@pytest.fixture
+def story():
+    story_data = initialize_story()
+    story_data.update(start_node_id="forest_path", player_character_templates={
+        "Scout": {"start_node_id": "forest_path"}, "Medic": {}, "Pilot": {}})
+    story_data["nodes"] = {
+        "forest_path": {"id": "forest_path", "text": "A dark forest.", "choices": [choice("cave", "Scout"), choice("river")]},
+        "cave": {"id": "cave", "text": "A dark, damp cave.", "choices": [choice("cave", "Scout", "Medic"), choice("forest_path")]},
+        "river": {"id": "river", "text": "A cold river.", "choices": [choice("cave", "Medic")]},
+    }
+    return story_data
+
+
+def test_search_matches_every_word_of_ids_and_text(story):
+    index = StoryIndex(story)
+    assert index.search("dark") == ["cave", "forest_path"]
+    assert index.search("Dark FOREST") == ["forest_path"]
+    assert index.search("path") == ["forest_path"] # Ids are split on "_"
+    assert index.search("dark river") == [] and index.search("  ") == []
+
+
+def test_referrers_leave_out_the_node_itself(story):
+    index = StoryIndex(story)
+    assert index.referrers("cave") == ["forest_path", "river"]
+    assert index.referrers("nowhere") == []
+
+
+def test_an_updated_node_is_refiled(story):
+    index = StoryIndex(story)
+    index.update_node("river", {"id": "river", "text": "A warm lake.", "choices": [choice("forest_path")]})
+    assert index.search("cold") == [] and index.search("lake") == ["river"]
+    assert index.referrers("cave") == ["forest_path"] and index.referrers("forest_path") == ["cave", "river"]
+
+
+def test_rename_node_retargets_choices_loops_and_start_nodes(story):
+    index = StoryIndex(story)
+    assert index.rename_node("cave", "grotto") == 3 # Two referrers and the cave's own loop
+    nodes = story["nodes"]
+    assert "cave" not in nodes and nodes["grotto"]["id"] == "grotto"
+    assert nodes["forest_path"]["choices"][0]["target_node_id"] == "grotto"
+    assert nodes["grotto"]["choices"][0]["target_node_id"] == "grotto"
+    assert index.referrers("grotto") == ["forest_path", "river"] and index.referrers("cave") == []
+    assert index.search("grotto") == ["grotto"] and index.search("cave") == ["grotto"] # Still in the text
+    index.rename_node("forest_path", "woods")
+    assert story["start_node_id"] == "woods" and story["player_character_templates"]["Scout"]["start_node_id"] == "woods"
+
+
+@pytest.mark.parametrize("old_id, new_id, error", [("nowhere", "x", "does not exist"), ("cave", "", "cannot be empty"),
+                                                   ("cave", "river", "already exists")])
+def test_rename_node_refuses_bad_ids(story, old_id, new_id, error):
+    index = StoryIndex(story)
+    with pytest.raises(ValueError, match=error):
+        index.rename_node(old_id, new_id)
+    assert list(story["nodes"]) == ["forest_path", "cave", "river"]
+
+
+def test_delete_node_reports_the_choices_left_dangling(story):
+    index = StoryIndex(story)
+    assert index.delete_node("cave") == ["forest_path", "river"]
+    assert "cave" not in story["nodes"] and index.search("damp") == []
+    with pytest.raises(ValueError, match="does not exist"):
+        index.delete_node("cave")
+
+
+def test_rename_role_keeps_the_template_order_and_updates_restrictions(story):
+    index = StoryIndex(story)
+    assert index.rename_role("Medic", "Doctor") == 2
+    assert list(story["player_character_templates"]) == ["Scout", "Doctor", "Pilot"]
+    assert story["nodes"]["cave"]["choices"][0]["actionable_by_roles"] == ["Scout", "Doctor"]
+    assert story["nodes"]["river"]["choices"][0]["actionable_by_roles"] == ["Doctor"]
+    assert index.rename_role("Doctor", "Medic") == 2 # The index followed the first rename
+    for old, new, error in [("Nobody", "X", "does not exist"), ("Scout", "", "cannot be empty"), ("Scout", "Pilot", "already exists")]:
+        with pytest.raises(ValueError, match=error):
+            index.rename_role(old, new)
+
+
+def test_delete_role_reports_the_nodes_still_naming_it(story):
+    index = StoryIndex(story)
+    assert index.delete_role("Scout") == ["cave", "forest_path"]
+    assert index.delete_role("Pilot") == []
+    assert list(story["player_character_templates"]) == ["Medic"]
+    with pytest.raises(ValueError, match="does not exist"):
+        index.delete_role("Scout")
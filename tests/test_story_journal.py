@@ -0,0 +1,120 @@
+import json
+
+import pytest
+
+import story_creator
+from story_creator import JOURNAL_FILE, AUTOSAVE_FILE
+
+
+@pytest.fixture
+def journal(tmp_path, monkeypatch):
+    """A fresh journal in tmp_path for a new story; the test plays the creator, then "crashes" by dropping it."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(story_creator, "journal_state", {"file": None, "edits": 0})
+    story_creator.start_journal()
+    yield
+    if story_creator.journal_state["file"]:
+        story_creator.journal_state["file"].close()
+
+
+def crash():
+    story_creator.journal_state["file"].close()
+    story_creator.journal_state.update(file=None, edits=0)
+
+
+def node(text, *targets):
+    return {"text": text, "choices": [{"text": f"to {target}", "target_node_id": target} for target in targets]}
+
+
+def edit(story_data, index, op, key, value=None):
+    story_creator.apply_edit(story_data, {"op": op, "key": key, "value": value}, index)
+    story_creator.journal_edit(story_data, op, key, value)
+
+
+def test_recovery_replays_every_edit(journal):
+    story_data = story_creator.initialize_story()
+    index = story_creator.StoryIndex(story_data)
+    edit(story_data, index, "set", "title", "Crashy")
+    edit(story_data, index, "node", "start", node("Start", "end"))
+    edit(story_data, index, "node", "end", node("End"))
+    edit(story_data, index, "rename_node", "end", "finale")
+    crash()
+    recovered, recovered_index, replayed, base = story_creator.recover_story()
+    assert (replayed, base) == (4, None)
+    assert recovered == story_data
+    assert recovered["nodes"]["start"]["choices"][0]["target_node_id"] == "finale"
+    assert recovered_index.referrers("finale") == ["start"]
+
+
+def test_recovery_replays_template_renames_and_deletes(journal):
+    story_data = story_creator.initialize_story()
+    index = story_creator.StoryIndex(story_data)
+    edit(story_data, index, "template", "Scout", {"initial_stats": {"health": 10}})
+    edit(story_data, index, "template", "Medic", {})
+    gated = node("Start", "end")
+    gated["choices"][0]["actionable_by_roles"] = ["Scout", "Medic"]
+    edit(story_data, index, "node", "start", gated)
+    edit(story_data, index, "rename_template", "Scout", "Ranger")
+    edit(story_data, index, "delete_template", "Medic")
+    edit(story_data, index, "node", "side", node("Side path", "start"))
+    edit(story_data, index, "delete_node", "side")
+    crash()
+    recovered, recovered_index, replayed, _ = story_creator.recover_story()
+    assert replayed == 7 and recovered == story_data
+    assert recovered["player_character_templates"] == {"Ranger": {"initial_stats": {"health": 10}}}
+    assert recovered["nodes"]["start"]["choices"][0]["actionable_by_roles"] == ["Ranger", "Medic"] # Deleting a role keeps restrictions
+    assert recovered_index.search("side") == [] and recovered_index.referrers("start") == []
+    assert recovered_index.rename_role("Ranger", "Scout") == 1 # The recovered index knows the renamed role
+
+
+def test_a_torn_last_line_is_dropped_and_the_journal_stays_appendable(journal):
+    story_data = story_creator.initialize_story()
+    index = story_creator.StoryIndex(story_data)
+    edit(story_data, index, "set", "title", "Kept")
+    crash()
+    with open(JOURNAL_FILE, "a") as f:
+        f.write('{"op": "set", "key": "title", "val') # The crash hit in the middle of this write
+    recovered, index, replayed, _ = story_creator.recover_story()
+    assert (recovered["title"], replayed) == ("Kept", 1)
+    story_creator.journal_edit(recovered, "set", "max_players", 3) # Appends after the truncated tail
+    crash()
+    assert story_creator.recover_story()[0]["max_players"] == 3
+
+
+def test_edits_apply_on_top_of_the_saved_base(journal, tmp_path):
+    base = tmp_path / "saved.json"
+    base.write_text(json.dumps({"title": "Saved", "start_node_id": "a", "nodes": {"a": node("A")}}))
+    story_creator.start_journal(str(base))
+    story_data = story_creator.initialize_story()
+    story_data.update(json.loads(base.read_text()))
+    index = story_creator.StoryIndex(story_data)
+    edit(story_data, index, "node", "b", node("B", "a"))
+    edit(story_data, index, "delete_node", "a")
+    crash()
+    recovered, _, replayed, recovered_base = story_creator.recover_story()
+    assert (replayed, recovered_base) == (2, str(base))
+    assert list(recovered["nodes"]) == ["b"] and recovered["title"] == "Saved"
+
+
+def test_compaction_writes_the_autosave_and_restarts_the_journal(journal, monkeypatch):
+    monkeypatch.setattr(story_creator, "COMPACT_EVERY_EDITS", 3)
+    story_data = story_creator.initialize_story()
+    index = story_creator.StoryIndex(story_data)
+    for number in range(4):
+        edit(story_data, index, "node", f"n{number}", node(f"Node {number}"))
+    with open(JOURNAL_FILE) as f:
+        lines = [json.loads(line) for line in f]
+    assert lines[0] == {"op": "base", "path": AUTOSAVE_FILE} and len(lines) == 2 # The base, then the 4th edit
+    with open(AUTOSAVE_FILE) as f:
+        assert list(json.load(f)["nodes"]) == ["n0", "n1", "n2"]
+    crash()
+    recovered, _, replayed, base = story_creator.recover_story()
+    assert (replayed, base) == (1, AUTOSAVE_FILE)
+    assert recovered == story_data
+
+
+def test_closing_the_journal_removes_its_files(journal, tmp_path):
+    story_data = story_creator.initialize_story()
+    story_creator._write_json_atomically(AUTOSAVE_FILE, story_data)
+    story_creator.close_journal()
+    assert not (tmp_path / JOURNAL_FILE).exists() and not (tmp_path / AUTOSAVE_FILE).exists()
@@ -0,0 +1,94 @@
+import copy
+
+import pytest
+
+import story_engine
+import story_saves
+from story_saves import compile_save_tables, restore_playthrough, save_playthrough
+
+STORY = {
+    "start_node_id": "hall", "initial_stats": {"gold": 1, "luck": 0.5, "title": "Squire", "hoard": 0, "brave": False}, "initial_inventory": ["torch"],
+    "nodes": {
+        "hall": {"text": "A hall.", "effects": [{"type": "stat_change", "stat": "visits", "change_by": 1}], "choices": [
+            {"text": "Take the key", "target_node_id": "cellar",
+             "effects": [{"type": "inventory_change", "item": "key", "action": "add"}]}]},
+        "cellar": {"text": "A cellar.", "choices": [{"text": "Leave", "target_node_id": "out"}]},
+        "out": {"text": "Outside."},
+    },
+}
+
+
+def test_a_playthrough_round_trips_in_the_players_order():
+    tables = compile_save_tables(STORY)
+    stats = {"visits": 2, "gold": -7, "luck": 0.25, "title": "Sir", "hoard": 2 ** 70, "brave": True}
+    inventory = ["torch", "key", "torch"]
+    data = save_playthrough(tables, "cellar", stats, inventory)
+    node_id, restored_stats, restored_inventory = restore_playthrough(tables, data)
+    assert (node_id, restored_inventory) == ("cellar", inventory)
+    assert restored_stats == stats and list(restored_stats) == list(stats)
+    assert type(restored_stats["brave"]) is bool and type(restored_stats["luck"]) is float
+    assert len(save_playthrough(tables, "hall", {"gold": 1}, ["torch"])) < 40
+
+
+def test_things_the_story_does_not_have_cannot_be_saved():
+    tables = compile_save_tables(STORY)
+    for args in (("attic", {}, []), ("hall", {"mana": 1}, []), ("hall", {}, ["sword"])):
+        with pytest.raises(ValueError, match="is not part of this story"):
+            save_playthrough(tables, *args)
+
+
+def test_saves_survive_text_edits_but_not_new_nodes():
+    data = save_playthrough(compile_save_tables(STORY), "hall", {"gold": 1}, ["torch"])
+    edited = copy.deepcopy(STORY)
+    edited["nodes"]["hall"]["text"] = "A long hall."
+    assert restore_playthrough(compile_save_tables(edited), data)[0] == "hall"
+    edited["nodes"]["attic"] = {"text": "An attic."}
+    with pytest.raises(ValueError, match="another story"):
+        restore_playthrough(compile_save_tables(edited), data)
+
+
+def test_corrupted_saves_are_refused():
+    tables = compile_save_tables(STORY)
+    data = save_playthrough(tables, "cellar", {"gold": 3, "title": "Sir"}, ["key"])
+    for length in range(len(data)):
+        with pytest.raises(ValueError):
+            restore_playthrough(tables, data[:length])
+    with pytest.raises(ValueError, match="Not a saved game"):
+        restore_playthrough(tables, b"XXXX" + data[4:])
+    bad_item = data[:-2] + b"\xff\xff"
+    with pytest.raises(ValueError, match="Corrupted"):
+        restore_playthrough(tables, bad_item)
+    bad_json = data.replace(b'"Sir"', b'"Si\x00')
+    with pytest.raises(ValueError):
+        restore_playthrough(tables, bad_json)
+
+
+def test_save_files(tmp_path):
+    path = str(tmp_path / "game.sav")
+    assert story_saves.read_save(path) is None
+    story_saves.write_save(path, b"first")
+    story_saves.write_save(path, b"second")
+    assert story_saves.read_save(path) == b"second" and not (tmp_path / "game.sav.tmp").exists()
+
+
+def test_the_engine_resumes_where_the_player_stopped(tmp_path, monkeypatch, capsys):
+    path = str(tmp_path / "game.sav")
+    answers = iter(["1"])
+
+    def answer(prompt):
+        try:
+            return next(answers)
+        except StopIteration:
+            raise EOFError from None # The player closes the game in the cellar
+    monkeypatch.setattr("builtins.input", answer)
+    with pytest.raises(SystemExit):
+        story_engine.play_story(STORY, path)
+    assert restore_playthrough(compile_save_tables(STORY), story_saves.read_save(path)) == \
+        ("cellar", dict(STORY["initial_stats"], visits=1), ["torch", "key"])
+
+    answers = iter(["1"])
+    capsys.readouterr()
+    story_engine.play_story(STORY, path)
+    out = capsys.readouterr().out
+    assert "Resuming the game" in out and "Visits: 1" in out and "The End." in out
+    assert story_saves.read_save(path) is None # Finished games are not kept
@@ -0,0 +1,85 @@
+import story_server
+
+STORY = {
+    "title": "Corridor", "start_node_id": "hall", "initial_stats": {"gold": 1}, "initial_inventory": [],
+    "nodes": {
+        "hall": {"text": "A hall.", "choices": [
+            {"text": "Pick up the key", "target_node_id": "hall_key",
+             "effects": [{"type": "inventory_change", "item": "key", "action": "add"}]},
+            {"text": "Open the door", "target_node_id": "out",
+             "conditions": [{"type": "inventory_condition", "item": "key", "requires": "present"}]},
+        ]},
+        "hall_key": {"text": "Key in hand.", "effects": [{"type": "stat_change", "stat": "gold", "change_by": 2}],
+                     "choices": [{"text": "Open the door", "target_node_id": "out"}]},
+        "out": {"text": "Outside."},
+    },
+}
+
+
+class FakeTransport:
+    def __init__(self):
+        self.output = bytearray()
+        self.closed = False
+
+    def write(self, data):
+        self.output += data
+
+    def is_closing(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        text = self.output.decode()
+        self.output.clear()
+        return text
+
+
+def start():
+    session = story_server.StorySession(STORY)
+    transport = FakeTransport()
+    session.connection_made(transport)
+    return session, transport
+
+
+def test_a_playthrough_to_an_ending():
+    session, transport = start()
+    screen = transport.take()
+    assert "A hall." in screen and "1. Pick up the key" in screen and "Open the door" not in screen
+    assert screen.endswith("Enter your choice: ")
+    session.data_received(b"1\n")
+    screen = transport.take()
+    assert "Gold: 3" in screen and "- Key" in screen and "1. Open the door" in screen
+    session.data_received(b"1\r\n")
+    assert transport.take().endswith("Outside.\nThe End.\n") and transport.closed
+    story_server.sessions.discard(session)
+
+
+def test_bad_answers_keep_the_player_on_the_same_menu():
+    session, transport = start()
+    transport.take()
+    for answer, reply in [(b"", "Invalid choice."), (b"2", "Invalid choice."), (b"0", "Invalid choice."),
+                          (b"one", "Invalid input."), ("²".encode(), "Invalid input."), # isdigit() but not int()
+                          (b"9" * 5000, "Invalid input."), (b"-1", "Invalid input.")]: # Past int()'s digit limit
+        session.data_received(answer + b"\n")
+        assert transport.take().startswith(reply), answer
+    assert session.node_id == "hall" and not transport.closed
+    story_server.sessions.discard(session)
+
+
+def test_input_is_buffered_across_packets():
+    session, transport = start()
+    transport.take()
+    session.data_received(b"q")
+    session.data_received(b"uit\n1\n") # The line after quit is never handled
+    assert transport.take() == "Exiting game.\n" and transport.closed
+    story_server.sessions.discard(session)
+
+
+def test_overlong_lines_close_the_session():
+    session, transport = start()
+    transport.take()
+    session.data_received(b"x" * (story_server.MAX_LINE_BYTES + 1))
+    assert transport.take() == "Input line too long. Disconnecting.\n" and transport.closed
+    story_server.sessions.discard(session)
@@ -0,0 +1,90 @@
+import json
+
+from conftest import STORY_FILE
+from story_validator import validate_story, print_report
+
+
+def story(nodes, **extra):
+    return {"title": "T", "start_node_id": "start", "player_character_templates": {"Scout": {}}, "nodes": nodes, **extra}
+
+
+def choice(target, **extra):
+    return {"text": f"to {target}", "target_node_id": target, **extra}
+
+
+def test_the_shipped_story_has_no_errors():
+    with open(STORY_FILE) as f:
+        assert validate_story(json.load(f))["errors"] == []
+
+
+def test_dangling_targets_unknown_roles_and_missing_starts():
+    report = validate_story(story({
+        "start": {"text": "S", "choices": [choice("nowhere"), choice("end", actionable_by_roles=["Scout", "Pilot"])]},
+        "end": {"text": "E"},
+    }, player_character_templates={"Scout": {}, "Ghost": {"start_node_id": "gone"}}))
+    assert report["errors"] == [
+        "Start node 'gone' of role 'Ghost' does not exist.",
+        "Node 'start', choice 1: target node 'nowhere' does not exist.",
+        "Node 'start', choice 2: unknown role(s) Pilot in actionable_by_roles.",
+    ]
+    assert validate_story({"nodes": {}})["errors"] == ["The story has no start_node_id."]
+
+
+def test_orphan_unreachable_and_stuck_nodes():
+    report = validate_story(story({
+        "start": {"text": "S", "choices": [choice("end"), choice("loop_a")]},
+        "loop_a": {"text": "A", "choices": [choice("loop_b")]},
+        "loop_b": {"text": "B", "choices": [choice("loop_a")]},
+        "orphan": {"text": "O", "choices": [choice("island")]},
+        "island": {"text": "I"},
+        "end": {"text": "E"},
+    }))
+    assert report["errors"] == []
+    assert report["warnings"] == [
+        "Node 'loop_a': no ending can be reached from here (players are stuck in a cycle).",
+        "Node 'loop_b': no ending can be reached from here (players are stuck in a cycle).",
+        "Node 'orphan': orphan node, no choice leads to it.",
+        "Node 'island': unreachable from every start node.",
+    ]
+
+
+def test_role_start_nodes_make_their_branch_reachable():
+    report = validate_story(story({
+        "start": {"text": "S"},
+        "scout_start": {"text": "Scout", "choices": [choice("start")]},
+    }, player_character_templates={"Scout": {"start_node_id": "scout_start"}}))
+    assert report == {"errors": [], "warnings": []}
+
+
+def test_conditions_need_stats_and_items_the_story_can_provide():
+    report = validate_story(story({
+        "start": {"text": "S", "effects": [{"type": "stat_change", "stat": "luck", "change_by": 1}], "choices": [
+            choice("end", conditions=[{"type": "stat_condition", "stat": "luck", "operator": ">", "value": 0},
+                                      {"type": "stat_condition", "stat": "mana", "operator": ">", "value": 0}]),
+            choice("end", conditions=[{"type": "inventory_condition", "item": "key", "requires": "present"},
+                                      {"type": "inventory_condition", "item": "rope", "requires": "absent"}],
+                   effects_for_chooser=[{"type": "inventory_change", "item": "gem", "action": "add"}]),
+            choice("end", conditions=[{"type": "inventory_condition", "item": "gem", "requires": "present"}]),
+        ]},
+        "end": {"text": "E"},
+    }))
+    assert report["warnings"] == [
+        "Node 'start', choice 1: condition on stat 'mana', which the story never defines or changes (it stays 0).",
+        "Node 'start', choice 2: requires item 'key', which no inventory or effect ever provides.",
+    ]
+
+
+def test_only_the_first_vote_choice_can_pass():
+    report = validate_story(story({
+        "start": {"text": "S", "choices": [choice("end", requires_vote=True), choice("end", requires_vote=True),
+                                           choice("end", requires_vote=False)]},
+        "end": {"text": "E"},
+    }))
+    assert report["warnings"] == ["Node 'start', choice 2: vote choice can never pass, only the node's first vote choice is put to a vote."]
+
+
+def test_print_report_caps_each_severity(capsys):
+    print_report({"errors": ["a", "b", "c"], "warnings": ["w"]}, limit=2)
+    assert capsys.readouterr().out.splitlines() == [
+        "Error: a", "Error: b", "... and 1 more errors.", "Warning: w", "Validation finished: 3 errors, 1 warnings.",
+    ]
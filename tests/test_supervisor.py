@@ -0,0 +1,89 @@
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+import mp_supervisor
+from conftest import REPO, STORY_FILE, Client
+from mp_protocol import CLIENT_MAX_FRAME_BYTES
+
+
+def slot(index, connections=0, sent=0, received=0, game_active=False, capacity=2):
+    load = {"connections": connections, "received": received, "game_active": game_active, "capacity": capacity}
+    return {"index": index, "pid": 100 + index, "sent": sent, "load": load}
+
+
+def test_pick_worker_fills_the_forming_table_first():
+    workers = [slot(0), slot(1, connections=1, sent=1, received=1), slot(2)]
+    assert mp_supervisor.pick_worker(workers)["index"] == 1
+
+
+def test_pick_worker_counts_handoffs_not_reported_yet():
+    workers = [slot(0, connections=1, sent=2, received=1), slot(1)] # Worker 0's table is full once its handoff lands
+    assert mp_supervisor.pick_worker(workers)["index"] == 1
+
+
+def test_pick_worker_skips_tables_in_game_and_workers_down():
+    down = dict(slot(1), pid=None)
+    assert mp_supervisor.pick_worker([slot(0, game_active=True), down]) is None
+
+
+def test_worker_admin_addresses():
+    assert mp_supervisor.worker_admin_address("9000", 0) == "9001"
+    assert mp_supervisor.worker_admin_address("/tmp/admin.sock", 2) == "/tmp/admin.sock.2"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.mark.skipif(not hasattr(socket, "send_fds") or not hasattr(os, "fork"), reason="needs fork and SCM_RIGHTS")
+def test_supervisor_routes_a_full_table_and_the_next_one_to_different_workers(tmp_path):
+    shutil.copy(STORY_FILE, tmp_path) # The supervisor loads it from its working directory
+    port = free_port()
+    supervisor = subprocess.Popen([sys.executable, os.path.join(REPO, "mp_supervisor.py"), "--workers", "2", "--port", str(port),
+                                   "--watch-interval", "0", "--slow-callback-ms", "0", "--hibernate-after", "0"],
+                                  cwd=tmp_path, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    async def connect():
+        deadline = time.monotonic() + 20
+        while True:
+            try:
+                return Client(*await asyncio.open_connection("127.0.0.1", port, limit=CLIENT_MAX_FRAME_BYTES))
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.1)
+
+    async def scenario():
+        scout = await connect()
+        await scout.expect("ROLES_AVAILABLE", timeout=10)
+        technician = await connect()
+        await technician.expect("ROLES_AVAILABLE", timeout=10)
+        await scout.send("ROLE", "Scout")
+        await scout.expect("ROLE_CONFIRMED")
+        await technician.send("ROLE", "Technician") # Only accepted if both share a worker
+        await technician.expect("ROLE_CONFIRMED")
+        await scout.expect("GAME_START")
+        await asyncio.sleep(2 * mp_supervisor.LOAD_REPORT_INTERVAL) # The worker reports that its game started
+        newcomer = await connect()
+        welcome = await newcomer.expect("WELCOME", timeout=10)
+        roles = await newcomer.expect("ROLES_AVAILABLE")
+        for client in (scout, technician, newcomer):
+            client.close()
+        return welcome, roles
+
+    try:
+        welcome, roles = asyncio.run(scenario())
+    finally:
+        supervisor.terminate()
+        supervisor.wait(10)
+    assert "full" not in welcome[-1]
+    assert sorted(roles) == ["Scout", "Technician"] # A fresh table on the other worker
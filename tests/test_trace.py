@@ -0,0 +1,84 @@
+import asyncio
+import struct
+
+import pytest
+
+import mp_server
+import mp_trace
+from conftest import reset_server
+
+
+async def play_session(table, trace_path):
+    await table.start()
+    mp_server.start_recording(trace_path)
+    scout, _ = await table.join("Scout")
+    technician, _ = await table.join("Technician", binary=True, compression=True)
+    for client in (scout, technician):
+        await client.drain_messages()
+        await client.send("VOTE", "yes")
+    for client in (scout, technician):
+        await client.drain_messages()
+        await client.send("CHOICE", "1")
+    await scout.drain_messages()
+    await technician.drain_messages()
+    await table.stop()
+    mp_server.stop_recording()
+
+
+@pytest.fixture
+def recorded(table, tmp_path, monkeypatch):
+    """A trace of a two player session, and the server reset as mp_trace.py would find it."""
+    path = str(tmp_path / "session.trace")
+    asyncio.run(play_session(table, path))
+    for name in ("RESUME_TOKEN_KEY", "COMMAND_RATE_PER_SEC", "BOT_FILL_DELAY"): # configure_server() sets them
+        monkeypatch.setattr(mp_server, name, getattr(mp_server, name))
+    reset_server(tmp_path, monkeypatch)
+    return path
+
+
+def replay(path):
+    header, records = mp_trace.read_trace(path)
+    assert mp_trace.configure_server(mp_server, header, realtime=False)
+    return asyncio.run(mp_trace.replay_trace(header, records))
+
+
+def test_a_replay_reproduces_the_recorded_outputs(recorded):
+    header, records = mp_trace.read_trace(recorded)
+    kinds = [record[0] for record in records]
+    assert header["story_file"].endswith("story.json") and header["bots"] is None
+    assert kinds.count(mp_trace.TRACE_OPEN) == 2 and kinds.count(mp_trace.TRACE_EOF) == 2
+    report = replay(recorded)
+    assert report["connections"] == 2 and report["commands"] == kinds.count(mp_trace.TRACE_IN)
+    assert report["mismatches"] == [] and report["output_bytes"] > 0
+
+
+def test_a_replay_reports_where_outputs_differ(recorded):
+    header, records = mp_trace.read_trace(recorded)
+    with open(recorded, "rb") as f:
+        data = bytearray(f.read())
+    first_output = next(record for record in records if record[0] == mp_trace.TRACE_OUT)
+    data[data.index(first_output[3])] ^= 0xFF # Flip the first byte the server sent
+    with open(recorded, "wb") as f:
+        f.write(data)
+    [mismatch] = replay(recorded)["mismatches"]
+    assert mismatch["connection"] == first_output[1] and mismatch["offset"] == 0
+
+
+def test_a_torn_last_record_is_dropped(tmp_path):
+    path = tmp_path / "torn.trace"
+    recorder = mp_trace.TraceRecorder(str(path), {"story_file": "s.json"})
+    recorder.record(mp_trace.TRACE_OPEN, 1)
+    recorder.record(mp_trace.TRACE_IN, 1, b"ROLE:Scout\n")
+    recorder.close()
+    with open(path, "ab") as f:
+        f.write(mp_trace.RECORD_HEADER.pack(mp_trace.TRACE_IN, 1, 5, 100) + b"cut") # Killed mid-write
+    header, records = mp_trace.read_trace(str(path))
+    assert header == {"story_file": "s.json"}
+    assert [(kind, payload) for kind, _, _, payload in records] == [(mp_trace.TRACE_OPEN, b""), (mp_trace.TRACE_IN, b"ROLE:Scout\n")]
+
+
+def test_other_files_are_refused(tmp_path):
+    path = tmp_path / "not.trace"
+    path.write_bytes(b"{}" + struct.pack(">I", 0))
+    with pytest.raises(ValueError):
+        mp_trace.read_trace(str(path))